@@ -3,6 +3,7 @@ from __future__ import annotations
 
 from flask import Flask
 
+from .cli import register_commands
 from .config import config_from_env
 from .extensions import (
     horizon_extension,
@@ -11,11 +12,13 @@ from .extensions import (
     twilio_extension,
     db_extension,
 )
+from .repositories import bot_config_cache, start_invalidation_listener
 from .routes import register_blueprints
 from .services.horizon_service import HorizonService
 from .services.openai_service import OpenAIAssistantService
 from .services.twilio_service import TwilioMessagingService
 from .logging_config import configure_logging
+from .utils.codec import configure_codec
 
 
 def create_app(config_name: str | None = None) -> Flask:
@@ -35,6 +38,14 @@ def create_app(config_name: str | None = None) -> Flask:
     twilio_extension.init_app(app)
     horizon_extension.init_app(app)
     db_extension.init_app(app)
+    configure_codec(app.config)
+
+    bot_config_cache.configure(
+        max_entries=int(app.config.get("BOT_CACHE_MAX_ENTRIES", 512)),
+        ttl_seconds=float(app.config.get("BOT_CACHE_TTL_SECONDS", 60)),
+    )
+    if bot_config_cache.enabled:
+        start_invalidation_listener(redis_extension.client)
 
     # Bind higher-level services so they can be injected from the Flask app context
     app.extensions["openai_service"] = OpenAIAssistantService(openai_extension)
@@ -42,6 +53,7 @@ def create_app(config_name: str | None = None) -> Flask:
     app.extensions["horizon_service"] = HorizonService(horizon_extension)
 
     register_blueprints(app)
+    register_commands(app)
 
     @app.get("/test/log")
     def test_logging():
@@ -0,0 +1,16 @@
+"""Flask CLI maintenance commands (``flask --app wsgi.py <command>``)."""
+from __future__ import annotations
+
+import click
+from flask import Flask
+
+from .extensions import redis_extension
+from .repositories import BotRepository
+
+
+def register_commands(app: Flask) -> None:
+    @app.cli.command("rebuild-bot-index")
+    def rebuild_bot_index() -> None:
+        """Rebuild the Twilio number -> bot id index from bots:registry."""
+        count = BotRepository(redis_extension.client).rebuild_number_index()
+        click.echo(f"Indexed {count} bot number(s)")
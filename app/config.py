@@ -12,6 +12,42 @@ class BaseConfig:
 
     REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
     REDIS_SESSION_TTL_SECONDS = int(os.getenv("REDIS_SESSION_TTL_SECONDS", "86400"))
+    # Per-message unit of work: the turn's Redis reads are prefetched in one
+    # pipeline and its data writes flushed in one MULTI. When disabled the
+    # round trips are still counted (and logged) per message.
+    REDIS_UNIT_OF_WORK_ENABLED = os.getenv("REDIS_UNIT_OF_WORK_ENABLED", "true").lower() in {"1", "true", "yes"}
+    # Client data storage: "json" (one document per client) or "hash" (one Redis
+    # hash, field-level HSET/HSETNX; JSON documents are migrated when read).
+    CLIENT_DATA_STORAGE = os.getenv("CLIENT_DATA_STORAGE", "json")
+    # Codec for JSON payloads in Redis (bots, sessions, client data, caches).
+    # Serializer: "auto" (orjson when installed), "orjson" or "json".
+    CODEC_SERIALIZER = os.getenv("CODEC_SERIALIZER", "auto")
+    # Compression of payloads >= CODEC_COMPRESS_MIN_BYTES: "none", "auto"
+    # (zstd when installed, else zlib), "zstd" or "zlib". Reads always detect it.
+    CODEC_COMPRESSION = os.getenv("CODEC_COMPRESSION", "none")
+    CODEC_COMPRESS_MIN_BYTES = int(os.getenv("CODEC_COMPRESS_MIN_BYTES", "1024"))
+    CODEC_COMPRESSION_LEVEL = int(os.getenv("CODEC_COMPRESSION_LEVEL", "3"))
+    # Comma-separated dictionary files (train_codec_dictionary.py). The first
+    # compresses new values; keep older ones listed so their values stay readable.
+    CODEC_DICTIONARY_PATHS = os.getenv("CODEC_DICTIONARY_PATHS", "")
+    # Process-local cache of decoded bot configs, evicted cluster-wide via pub/sub.
+    # Set BOT_CACHE_TTL_SECONDS=0 to disable.
+    BOT_CACHE_TTL_SECONDS = float(os.getenv("BOT_CACHE_TTL_SECONDS", "60"))
+    BOT_CACHE_MAX_ENTRIES = int(os.getenv("BOT_CACHE_MAX_ENTRIES", "512"))
+    # How long a bot snapshot enriched from SQL (or found to have nothing more in
+    # SQL) skips re-enrichment; after it, only the row's updated_at is compared.
+    # 0 re-reads the SQL row on every message that still lacks fields.
+    BOT_SQL_ENRICHMENT_TTL_SECONDS = float(os.getenv("BOT_SQL_ENRICHMENT_TTL_SECONDS", "300"))
+    # Per-conversation lock: one turn at a time per (bot, user), in arrival order.
+    # The TTL must outlast a full turn (run + tools); waiters give up after
+    # CONVERSATION_LOCK_WAIT_SECONDS (defaults to TTL + 30s), or earlier when the
+    # message deadline runs out (the turn then gets the deadline fallback).
+    CONVERSATION_LOCK_TTL_SECONDS = int(os.getenv("CONVERSATION_LOCK_TTL_SECONDS", "180"))
+    CONVERSATION_LOCK_WAIT_SECONDS = (
+        float(os.getenv("CONVERSATION_LOCK_WAIT_SECONDS"))
+        if os.getenv("CONVERSATION_LOCK_WAIT_SECONDS")
+        else None
+    )
 
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
     OPENAI_DEFAULT_MODEL = os.getenv("OPENAI_DEFAULT_MODEL", "gpt-4.1-mini")
@@ -19,6 +55,51 @@ class BaseConfig:
         "OPENAI_DEFAULT_INSTRUCTIONS",
         "You are a WhatsApp support assistant. Provide concise, helpful answers in Spanish by default.",
     )
+    # Consume assistant runs as server-sent events; "false" falls back to polling.
+    OPENAI_RUN_STREAMING = os.getenv("OPENAI_RUN_STREAMING", "true").lower() in {"1", "true", "yes"}
+    # How long a cached assistant thread is trusted without threads.retrieve;
+    # a thread lost in between is recreated when adding the message fails (0 = always verify).
+    THREAD_VERIFY_TTL_SECONDS = int(os.getenv("THREAD_VERIFY_TTL_SECONDS", "86400"))
+    # Bots with openai_backend="responses": how long the last response id per
+    # (bot, user) is kept for previous_response_id chaining.
+    OPENAI_RESPONSES_CHAIN_TTL_SECONDS = int(os.getenv("OPENAI_RESPONSES_CHAIN_TTL_SECONDS", "604800"))
+    # Rate/concurrency governor for OpenAI calls that generate (run, response and
+    # completion creation), per tenant (bot metadata tenant_id, else the bot)
+    # and per API key. Opt-in: every limit defaults to 0 (off) and a scope
+    # without limits costs nothing. Bots set their own tenant limits with
+    # metadata openai_rpm / openai_burst / openai_max_concurrency. Burst 0
+    # means rpm / 10.
+    OPENAI_GOVERNOR_ENABLED = os.getenv("OPENAI_GOVERNOR_ENABLED", "true").lower() in {"1", "true", "yes"}
+    OPENAI_TENANT_RPM = float(os.getenv("OPENAI_TENANT_RPM", "0"))
+    OPENAI_TENANT_BURST = int(os.getenv("OPENAI_TENANT_BURST", "0"))
+    OPENAI_TENANT_MAX_CONCURRENCY = int(os.getenv("OPENAI_TENANT_MAX_CONCURRENCY", "0"))
+    OPENAI_KEY_RPM = float(os.getenv("OPENAI_KEY_RPM", "0"))
+    OPENAI_KEY_BURST = int(os.getenv("OPENAI_KEY_BURST", "0"))
+    OPENAI_KEY_MAX_CONCURRENCY = int(os.getenv("OPENAI_KEY_MAX_CONCURRENCY", "0"))
+    # Longest wait for a permit outside a turn (a turn waits up to its deadline), how long an
+    # in-flight lease survives a crashed worker, and attempts on 429/5xx.
+    OPENAI_GOVERNOR_MAX_WAIT_SECONDS = float(os.getenv("OPENAI_GOVERNOR_MAX_WAIT_SECONDS", "10"))
+    OPENAI_GOVERNOR_LEASE_SECONDS = float(os.getenv("OPENAI_GOVERNOR_LEASE_SECONDS", "120"))
+    OPENAI_RETRY_MAX_ATTEMPTS = int(os.getenv("OPENAI_RETRY_MAX_ATTEMPTS", "3"))
+    # Bots with their own openai_api_key get one client per key, each with its
+    # own keep-alive connection pool; at most OPENAI_CLIENT_POOL_SIZE are kept
+    # (least recently used evicted).
+    OPENAI_CLIENT_POOL_SIZE = int(os.getenv("OPENAI_CLIENT_POOL_SIZE", "32"))
+    OPENAI_HTTP_MAX_CONNECTIONS = int(os.getenv("OPENAI_HTTP_MAX_CONNECTIONS", "100"))
+    OPENAI_HTTP_MAX_KEEPALIVE = int(os.getenv("OPENAI_HTTP_MAX_KEEPALIVE", "20"))
+    OPENAI_HTTP_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv("OPENAI_HTTP_KEEPALIVE_EXPIRY_SECONDS", "60"))
+    # Chat-completions bots (no assistant_id): history sent per turn is capped by
+    # estimated tokens; older turns are folded into a rolling summary.
+    CONTEXT_HISTORY_TOKEN_BUDGET = int(os.getenv("CONTEXT_HISTORY_TOKEN_BUDGET", "3000"))
+    # Per-model overrides by model-name prefix, e.g. {"gpt-4.1": 6000, "gpt-4o-mini": 2500}.
+    _CONTEXT_HISTORY_TOKEN_BUDGETS_RAW = os.getenv("CONTEXT_HISTORY_TOKEN_BUDGETS", "{}")
+    try:
+        CONTEXT_HISTORY_TOKEN_BUDGETS = json.loads(_CONTEXT_HISTORY_TOKEN_BUDGETS_RAW)
+        if not isinstance(CONTEXT_HISTORY_TOKEN_BUDGETS, dict):
+            CONTEXT_HISTORY_TOKEN_BUDGETS = {}
+    except json.JSONDecodeError:
+        CONTEXT_HISTORY_TOKEN_BUDGETS = {}
+    CONTEXT_SUMMARY_MAX_TOKENS = int(os.getenv("CONTEXT_SUMMARY_MAX_TOKENS", "300"))
 
     TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID")
     TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
@@ -64,6 +145,49 @@ class BaseConfig:
 
     LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
 
+    # Async webhook ingestion: the webhook only enqueues into a Redis Stream and
+    # worker.py processes the conversation and sends the reply via Twilio REST.
+    WEBHOOK_ASYNC_MODE = os.getenv("WEBHOOK_ASYNC_MODE", "false").lower() in {"1", "true", "yes"}
+    INBOUND_STREAM_KEY = os.getenv("INBOUND_STREAM_KEY", "wa:inbound:stream")
+    INBOUND_STREAM_GROUP = os.getenv("INBOUND_STREAM_GROUP", "conversation-workers")
+    INBOUND_STREAM_MAXLEN = int(os.getenv("INBOUND_STREAM_MAXLEN", "10000"))
+    INBOUND_WORKER_CONCURRENCY = int(os.getenv("INBOUND_WORKER_CONCURRENCY", "8"))
+    INBOUND_WORKER_BLOCK_MS = int(os.getenv("INBOUND_WORKER_BLOCK_MS", "5000"))
+    INBOUND_CLAIM_IDLE_MS = int(os.getenv("INBOUND_CLAIM_IDLE_MS", "120000"))
+    # "threads" (one pool thread per conversation) or "asyncio" (event loop:
+    # waits on OpenAI/CRM/locks yield, so one process carries many conversations).
+    INBOUND_WORKER_MODE = os.getenv("INBOUND_WORKER_MODE", "threads").lower()
+    INBOUND_ASYNC_CONCURRENCY = int(os.getenv("INBOUND_ASYNC_CONCURRENCY", "200"))
+    INBOUND_ASYNC_THREADS = int(os.getenv("INBOUND_ASYNC_THREADS", "32"))
+    # Twilio retries share the MessageSid: only the first delivery is processed.
+    # In sync mode a retry waits up to INBOUND_DEDUP_WAIT_SECONDS for that reply.
+    INBOUND_DEDUP_TTL_SECONDS = int(os.getenv("INBOUND_DEDUP_TTL_SECONDS", "3600"))
+    INBOUND_DEDUP_WAIT_SECONDS = float(os.getenv("INBOUND_DEDUP_WAIT_SECONDS", "10"))
+    # Time budget per inbound message, shared by every hop (OpenAI, tools, CRM,
+    # Twilio). Webhook turns must answer before Twilio's 15s timeout; queued
+    # turns count from when the webhook enqueued them. On expiry the run is
+    # cancelled and a fallback reply is sent.
+    WEBHOOK_DEADLINE_SECONDS = float(os.getenv("WEBHOOK_DEADLINE_SECONDS", "12"))
+    INBOUND_DEADLINE_SECONDS = float(os.getenv("INBOUND_DEADLINE_SECONDS", "45"))
+    # Tool calls returned together in one run step run concurrently; each step
+    # waits at most TOOL_CALL_TIMEOUT_SECONDS and a call over it answers with an error.
+    TOOL_CALLS_PARALLEL = os.getenv("TOOL_CALLS_PARALLEL", "true").lower() in {"1", "true", "yes"}
+    TOOL_CALL_TIMEOUT_SECONDS = float(os.getenv("TOOL_CALL_TIMEOUT_SECONDS", "20"))
+    # Twilio REST timeout; sends keep at least TWILIO_SEND_MIN_TIMEOUT_SECONDS
+    # even past the deadline so the fallback reply still goes out.
+    TWILIO_HTTP_TIMEOUT_SECONDS = float(os.getenv("TWILIO_HTTP_TIMEOUT_SECONDS", "10"))
+    TWILIO_SEND_MIN_TIMEOUT_SECONDS = float(os.getenv("TWILIO_SEND_MIN_TIMEOUT_SECONDS", "3"))
+    # Answer cache for bots with metadata.answer_cache_enabled: how long a
+    # first-turn answer is reused and how similar (estimated Jaccard over
+    # character 3-grams) a new question must be to reuse it.
+    ANSWER_CACHE_TTL_SECONDS = int(os.getenv("ANSWER_CACHE_TTL_SECONDS", "86400"))
+    ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.8"))
+
+    # Human handoff status cache. Polled CRM answers live briefly; modes pushed
+    # by the CRM to POST /handoff/control-status are trusted for longer.
+    HANDOFF_STATUS_CACHE_TTL_SECONDS = int(os.getenv("HANDOFF_STATUS_CACHE_TTL_SECONDS", "60"))
+    HANDOFF_STATUS_PUSH_TTL_SECONDS = int(os.getenv("HANDOFF_STATUS_PUSH_TTL_SECONDS", "1800"))
+
     OUTBOUND_API_KEY = os.getenv("OUTBOUND_API_KEY")
     OUTBOUND_HMAC_SECRET = os.getenv("OUTBOUND_HMAC_SECRET")
     OUTBOUND_MAX_TIMESTAMP_SKEW_SECONDS = int(
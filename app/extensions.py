@@ -1,26 +1,39 @@
 """Application extensions and service clients."""
 from __future__ import annotations
 
+import hashlib
 import logging
-from typing import Optional
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
 
 import redis
 from flask import Flask
 
 try:  # Optional dependencies for type checking
-    from openai import OpenAI  # type: ignore
+    from openai import AsyncOpenAI, OpenAI  # type: ignore
 except ImportError:  # pragma: no cover - handled in runtime
+    AsyncOpenAI = None  # type: ignore
     OpenAI = None  # type: ignore
 
 try:
+    import httpx
+except ImportError:  # pragma: no cover - installed with openai
+    httpx = None  # type: ignore
+
+try:
+    from twilio.http.http_client import TwilioHttpClient  # type: ignore
     from twilio.rest import Client as TwilioClient  # type: ignore
 except ImportError:  # pragma: no cover - handled in runtime
     TwilioClient = None  # type: ignore
+    TwilioHttpClient = object  # type: ignore
 
 import requests
 from sqlalchemy import create_engine, text
 from sqlalchemy.engine import Engine
 
+from .utils.deadline import budget_timeout
+
 logger = logging.getLogger(__name__)
 
 
@@ -29,6 +42,8 @@ class RedisExtension:
 
     def __init__(self) -> None:
         self._client: Optional[redis.Redis] = None
+        self._redis_url: Optional[str] = None
+        self._fake_server = None
 
     def init_app(self, app: Flask) -> None:
         if self._client is not None:
@@ -37,12 +52,15 @@ class RedisExtension:
         redis_url = app.config.get("REDIS_URL")
         use_fake = app.config.get("USE_FAKE_REDIS")
         decode_responses = True
+        self._redis_url = redis_url
 
         if use_fake:
             try:
                 import fakeredis  # type: ignore
 
-                self._client = fakeredis.FakeRedis(decode_responses=decode_responses)
+                # Explicit server so async clients (create_async_client) see the same data.
+                self._fake_server = fakeredis.FakeServer()
+                self._client = fakeredis.FakeRedis(server=self._fake_server, decode_responses=decode_responses)
                 logger.info("Initialized FakeRedis for testing use case")
             except ImportError:  # pragma: no cover - executed only when fakeredis missing
                 logger.warning("fakeredis not installed; falling back to real Redis client")
@@ -61,18 +79,53 @@ class RedisExtension:
             raise RuntimeError("Redis client not initialized")
         return self._client
 
+    def create_async_client(self):
+        """New ``redis.asyncio`` client for the same server.
+
+        Async connections are bound to the event loop that first uses them, so
+        callers create one per loop and close it when the loop ends.
+        """
+        if self._fake_server is not None:
+            from fakeredis import aioredis  # type: ignore
+
+            return aioredis.FakeRedis(server=self._fake_server, decode_responses=True)
+        if not self._redis_url:
+            raise RuntimeError("Redis client not initialized")
+        import redis.asyncio as redis_asyncio
+
+        return redis_asyncio.Redis.from_url(self._redis_url, decode_responses=True)
+
 
 class OpenAIExtension:
-    """Configure access to OpenAI assistants API."""
+    """Configure access to OpenAI assistants API.
+
+    ``client`` uses ``OPENAI_API_KEY``. Bots with their own
+    ``openai_api_key`` get a client from :meth:`client_for`: one per distinct
+    key, each with its own keep-alive pool, kept in an LRU of
+    ``OPENAI_CLIENT_POOL_SIZE`` entries. Clients are thread-safe and shared by
+    every request using that key.
+    """
 
     def __init__(self) -> None:
         self._client: Optional[OpenAI] = None
+        self._api_key: Optional[str] = None
+        self._pool: "OrderedDict[str, OpenAI]" = OrderedDict()
+        self._pool_lock = threading.Lock()
+        self._pool_size = 32
+        self._http_settings: Dict[str, Any] = {}
 
     def init_app(self, app: Flask) -> None:
         if self._client is not None:
             return
 
+        self._pool_size = int(app.config.get("OPENAI_CLIENT_POOL_SIZE", 32))
+        self._http_settings = {
+            "max_connections": int(app.config.get("OPENAI_HTTP_MAX_CONNECTIONS", 100)),
+            "max_keepalive_connections": int(app.config.get("OPENAI_HTTP_MAX_KEEPALIVE", 20)),
+            "keepalive_expiry": float(app.config.get("OPENAI_HTTP_KEEPALIVE_EXPIRY_SECONDS", 60)),
+        }
         api_key = app.config.get("OPENAI_API_KEY")
+        self._api_key = api_key
         if not api_key:
             logger.warning("OPENAI_API_KEY not configured; assistant features disabled")
             app.extensions["openai_extension"] = self
@@ -83,31 +136,117 @@ class OpenAIExtension:
                 "openai package not installed. Please add 'openai' to requirements.txt"
             )
 
+        self._client = self._build_client(api_key)
+        app.extensions["openai_extension"] = self
+        logger.info("OpenAI client initialized")
+
+    @property
+    def client(self) -> Optional[OpenAI]:
+        return self._client
+
+    def client_for(self, api_key: Optional[str]) -> Optional[OpenAI]:
+        """Pooled client for a bot's own API key; the default client without one."""
+        if not api_key or api_key == self._api_key or OpenAI is None:
+            return self._client
+        pool_key = _key_digest(api_key)
+        with self._pool_lock:
+            client = self._pool.get(pool_key)
+            if client is not None:
+                self._pool.move_to_end(pool_key)
+                return client
+        # Built outside the lock: requests for other keys don't wait on it.
+        client = self._build_client(api_key)
+        if client is None:
+            return self._client
+        with self._pool_lock:
+            existing = self._pool.get(pool_key)
+            if existing is None:
+                self._pool[pool_key] = client
+                while len(self._pool) > self._pool_size:
+                    # In-flight callers keep their reference; the evicted client's
+                    # connections close once the last one drops it.
+                    evicted_key, _ = self._pool.popitem(last=False)
+                    logger.info("♻️ OpenAI client for key %s evicted from the pool", evicted_key)
+                return client
+            self._pool.move_to_end(pool_key)
+        client.close()  # lost a creation race: nobody else has seen this one
+        return existing
+
+    def create_async_client(self, api_key: Optional[str] = None) -> Optional["AsyncOpenAI"]:
+        """AsyncOpenAI client for the asyncio worker (one per event loop and key)."""
+        api_key = api_key or self._api_key
+        if not api_key or AsyncOpenAI is None:
+            return None
+        http_client = httpx.AsyncClient(timeout=60.0, limits=self._http_limits())
+        return AsyncOpenAI(api_key=api_key, http_client=http_client)
+
+    def _http_limits(self) -> "httpx.Limits":
+        settings = self._http_settings or {"max_connections": 100, "max_keepalive_connections": 20}
+        return httpx.Limits(**settings)
+
+    def _build_client(self, api_key: str) -> Optional[OpenAI]:
         # Initialize OpenAI client with explicit HTTP client configuration
         try:
-            import httpx
             # Create HTTP client without proxy configuration
-            http_client = httpx.Client(
-                timeout=60.0,
-                limits=httpx.Limits(max_keepalive_connections=1, max_connections=10)
-            )
-            self._client = OpenAI(api_key=api_key, http_client=http_client)
+            http_client = _PooledHttpClient(timeout=60.0, limits=self._http_limits())
+            client = OpenAI(api_key=api_key, http_client=http_client)
             logger.info("OpenAI client initialized successfully")
+            return client
         except Exception as e:
             logger.error(f"OpenAI client initialization failed: {e}")
             # Try fallback initialization
             try:
-                self._client = OpenAI(api_key=api_key, max_retries=0)
+                client = OpenAI(api_key=api_key, max_retries=0)
                 logger.info("OpenAI client initialized with fallback configuration")
+                return client
             except Exception as e2:
                 logger.error(f"OpenAI fallback initialization also failed: {e2}")
-                self._client = None
-        app.extensions["openai_extension"] = self
-        logger.info("OpenAI client initialized")
+                return None
 
-    @property
-    def client(self) -> Optional[OpenAI]:
-        return self._client
+
+if httpx is not None:
+
+    class _PooledHttpClient(httpx.Client):
+        """httpx client that closes its connections when garbage collected (evicted from the pool)."""
+
+        def __del__(self) -> None:
+            try:
+                self.close()
+            except Exception:
+                pass
+
+
+def _key_digest(api_key: str) -> str:
+    return hashlib.sha1(api_key.encode("utf-8")).hexdigest()[:12]
+
+
+class DeadlineTwilioHttpClient(TwilioHttpClient):  # type: ignore[misc,valid-type]
+    """Twilio HTTP client whose timeout follows the current message deadline.
+
+    Sends never get less than ``min_timeout``: the fallback reply of a turn
+    that ran out of budget still has to go out.
+    """
+
+    def __init__(self, *, timeout: float = 10.0, min_timeout: float = 3.0, **kwargs) -> None:
+        super().__init__(timeout=timeout, **kwargs)
+        self.min_timeout = min_timeout
+
+    def request(self, method, url, params=None, data=None, headers=None, auth=None, timeout=None, allow_redirects=False):
+        timeout = budget_timeout(timeout or self.timeout, floor=self.min_timeout)
+        return super().request(
+            method, url, params=params, data=data, headers=headers, auth=auth,
+            timeout=timeout, allow_redirects=allow_redirects,
+        )
+
+
+def build_twilio_client(account_sid: str, auth_token: str, config=None):
+    """Twilio REST client wired to :class:`DeadlineTwilioHttpClient`."""
+    config = config or {}
+    http_client = DeadlineTwilioHttpClient(
+        timeout=float(config.get("TWILIO_HTTP_TIMEOUT_SECONDS", 10)),
+        min_timeout=float(config.get("TWILIO_SEND_MIN_TIMEOUT_SECONDS", 3)),
+    )
+    return TwilioClient(account_sid, auth_token, http_client=http_client)
 
 
 class TwilioExtension:
@@ -133,7 +272,7 @@ class TwilioExtension:
                 "twilio package not installed. Please add 'twilio' to requirements.txt"
             )
 
-        self._client = TwilioClient(account_sid, auth_token)
+        self._client = build_twilio_client(account_sid, auth_token, app.config)
         app.extensions["twilio_extension"] = self
         logger.info("Twilio client initialized")
 
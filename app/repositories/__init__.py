@@ -1,4 +1,4 @@
 """Repository package exports."""
-from .bot_repository import BotRepository
+from .bot_repository import BotConfigCache, BotRepository, bot_config_cache, start_invalidation_listener
 
-__all__ = ["BotRepository"]
+__all__ = ["BotConfigCache", "BotRepository", "bot_config_cache", "start_invalidation_listener"]
@@ -1,43 +1,348 @@
 """Redis-backed repository to manage bot metadata."""
 from __future__ import annotations
 
-import json
+import copy
+import logging
+import os
+import threading
+import time
 import uuid
-from typing import Any, Dict, List, Optional
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import redis
+
+from ..utils import codec
 
 BOT_COLLECTION_KEY = "bots:registry"
+# Secondary index: normalized Twilio number -> bot id (kept in sync on every write)
+BOT_NUMBER_INDEX_KEY = "bots:by_number"
+# Set once the index has been built from the registry (the index key itself is
+# absent whenever no bot has a number, so it can't tell "empty" from "never built").
+BOT_NUMBER_INDEX_BUILT_KEY = "bots:by_number:built"
+# Monotonic per-bot version stamp, bumped on every write and published for eviction
+BOT_VERSION_KEY = "bots:versions"
+BOT_INVALIDATION_CHANNEL = "bots:invalidate"
+# Last SQL enrichment per bot ({"checked_at", "updated_at"}), kept outside the
+# versioned payload so renewing it never evicts cached bots.
+BOT_SQL_ENRICHMENT_KEY = "bots:sql_enrichment"
+BOT_SQL_ENRICHMENT_RETENTION_SECONDS = 7 * 24 * 3600
+
+_MAX_WRITE_RETRIES = 5
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_bot_number(number: Optional[str]) -> Optional[str]:
+    if not number:
+        return None
+    normalized = str(number).strip().replace("whatsapp:", "").replace(" ", "")
+    return normalized or None
+
+
+class BotConfigCache:
+    """Process-local LRU+TTL cache of decoded bot configs.
+
+    Entries carry the bot's version stamp. Invalidations received over
+    ``bots:invalidate`` record the newest version seen, so a read that raced
+    with a write can never re-insert the stale payload.
+    """
+
+    def __init__(self, *, max_entries: int = 512, ttl_seconds: float = 60) -> None:
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[float, int, Dict[str, Any]]]" = OrderedDict()
+        self._min_versions: Dict[str, int] = {}
+        self._numbers: Dict[str, str] = {}
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl_seconds > 0
+
+    def configure(self, *, max_entries: int, ttl_seconds: float) -> None:
+        with self._lock:
+            self.max_entries = max_entries
+            self.ttl_seconds = ttl_seconds
+            self._entries.clear()
+            self._min_versions.clear()
+            self._numbers.clear()
+
+    def get(self, bot_id: str) -> Optional[Dict[str, Any]]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(bot_id)
+            if entry is None:
+                return None
+            expires_at, _version, payload = entry
+            if expires_at <= time.monotonic():
+                del self._entries[bot_id]
+                return None
+            self._entries.move_to_end(bot_id)
+        return copy.deepcopy(payload)
+
+    def put(self, bot_id: str, version: int, payload: Dict[str, Any]) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            if version < self._min_versions.get(bot_id, 0):
+                return
+            self._entries[bot_id] = (time.monotonic() + self.ttl_seconds, version, copy.deepcopy(payload))
+            self._entries.move_to_end(bot_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def bot_id_for_number(self, number: str) -> Optional[str]:
+        # Hints only: callers re-check the number against the cached payload.
+        return self._numbers.get(number) if self.enabled else None
+
+    def remember_number(self, number: str, bot_id: str) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            if len(self._numbers) >= self.max_entries:
+                self._numbers.clear()
+            self._numbers[number] = bot_id
+
+    def invalidate(self, bot_id: str, version: Optional[int] = None) -> None:
+        with self._lock:
+            if version is not None and version > self._min_versions.get(bot_id, 0):
+                self._min_versions[bot_id] = version
+            entry = self._entries.get(bot_id)
+            if entry is not None and (version is None or entry[1] < version):
+                del self._entries[bot_id]
+
+    def apply_invalidation(self, data: Any) -> None:
+        """Handle a ``<bot_id>:<version>`` message from the invalidation channel."""
+        if isinstance(data, bytes):
+            data = data.decode("utf-8")
+        bot_id, _, raw_version = str(data).rpartition(":")
+        try:
+            version = int(raw_version)
+        except ValueError:
+            bot_id, version = str(data), None
+        if bot_id:
+            self.invalidate(bot_id, version)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._numbers.clear()
+
+
+bot_config_cache = BotConfigCache()
+
+_listener_lock = threading.Lock()
+_listener_pid: Optional[int] = None
+
+
+def start_invalidation_listener(redis_client, cache: Optional[BotConfigCache] = None) -> None:
+    """Subscribe this process to bot invalidations (idempotent per process)."""
+    global _listener_pid
+    cache = cache or bot_config_cache
+    with _listener_lock:
+        if _listener_pid == os.getpid():
+            return
+        _listener_pid = os.getpid()
+    thread = threading.Thread(
+        target=_listen_for_invalidations,
+        args=(redis_client, cache),
+        name="bot-cache-invalidation",
+        daemon=True,
+    )
+    thread.start()
+
+
+def _listen_for_invalidations(redis_client, cache: BotConfigCache) -> None:
+    while True:
+        pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+        try:
+            pubsub.subscribe(BOT_INVALIDATION_CHANNEL)
+            # Anything published while we were (re)connecting is lost; start clean.
+            cache.clear()
+            while True:
+                message = pubsub.get_message(timeout=1.0)
+                if message and message.get("type") == "message":
+                    cache.apply_invalidation(message.get("data"))
+        except Exception as exc:  # pragma: no cover - depends on Redis availability
+            logger.warning("Bot cache invalidation listener reconnecting: %s", exc)
+            cache.clear()
+            time.sleep(1)
+        finally:
+            try:
+                pubsub.close()
+            except Exception:  # pragma: no cover
+                pass
 
 
 class BotRepository:
     """CRUD operations for bot metadata stored in Redis."""
 
-    def __init__(self, redis_client) -> None:
+    def __init__(self, redis_client, cache: Optional[BotConfigCache] = None) -> None:
         self._redis = redis_client
+        self._cache = cache or bot_config_cache
 
     def list_bots(self) -> List[Dict[str, Any]]:
         records = self._redis.hvals(BOT_COLLECTION_KEY)
-        return [json.loads(record) for record in records]
+        return [codec.loads(record) for record in records]
 
     def get_bot(self, bot_id: str) -> Optional[Dict[str, Any]]:
-        payload = self._redis.hget(BOT_COLLECTION_KEY, bot_id)
-        return json.loads(payload) if payload else None
+        cached = self._cache.get(bot_id)
+        if cached is not None:
+            return cached
+        pipe = self._redis.pipeline(transaction=False)
+        pipe.hget(BOT_COLLECTION_KEY, bot_id)
+        pipe.hget(BOT_VERSION_KEY, bot_id)
+        payload, version = pipe.execute()
+        if not payload:
+            return None
+        bot = codec.loads(payload)
+        self._cache.put(bot_id, int(version or 0), bot)
+        return bot
+
+    def find_bot_by_number(self, number: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Resolve a bot by its Twilio number through the number index."""
+        normalized = normalize_bot_number(number)
+        if not normalized:
+            return None
+        cached_id = self._cache.bot_id_for_number(normalized)
+        if cached_id:
+            bot = self.get_bot(cached_id)
+            if bot and normalize_bot_number(bot.get("twilio_phone_number")) == normalized:
+                return bot
+        bot_id = self._redis.hget(BOT_NUMBER_INDEX_KEY, normalized)
+        if not bot_id and not self._redis.exists(BOT_NUMBER_INDEX_BUILT_KEY):
+            # Index never built for this registry (data written before the index
+            # existed); the marker makes this O(N) fallback a one-off.
+            self.rebuild_number_index()
+            bot_id = self._redis.hget(BOT_NUMBER_INDEX_KEY, normalized)
+        if not bot_id:
+            return None
+        bot = self.get_bot(bot_id)
+        if not bot or normalize_bot_number(bot.get("twilio_phone_number")) != normalized:
+            return None
+        self._cache.remember_number(normalized, bot_id)
+        return bot
 
     def create_bot(self, bot_data: Dict[str, Any]) -> Dict[str, Any]:
         bot_id = bot_data.get("id") or uuid.uuid4().hex
         bot_data = {**bot_data, "id": bot_id}
-        self._redis.hset(BOT_COLLECTION_KEY, bot_id, json.dumps(bot_data))
+        self._write_bot(bot_id, lambda _current: bot_data)
         return bot_data
 
     def update_bot(self, bot_id: str, updates: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-        current = self.get_bot(bot_id)
-        if not current:
-            return None
-        current.update({k: v for k, v in updates.items() if v is not None})
-        self._redis.hset(BOT_COLLECTION_KEY, bot_id, json.dumps(current))
-        return current
+        def _merge(current: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+            if not current:
+                return None
+            current.update({k: v for k, v in updates.items() if v is not None})
+            return current
+
+        return self._write_bot(bot_id, _merge)
 
     def delete_bot(self, bot_id: str) -> bool:
-        return bool(self._redis.hdel(BOT_COLLECTION_KEY, bot_id))
+        return self._write_bot(bot_id, lambda _current: None, delete=True) is not None
+
+    def get_sql_enrichment(self, bot_id: str) -> Optional[Dict[str, Any]]:
+        raw = self._redis.hget(BOT_SQL_ENRICHMENT_KEY, bot_id)
+        try:
+            stamp = codec.loads(raw) if raw else None
+        except ValueError:
+            return None
+        return stamp if isinstance(stamp, dict) else None
+
+    def set_sql_enrichment(self, bot_id: str, stamp: Dict[str, Any]) -> None:
+        pipe = self._redis.pipeline(transaction=True)
+        pipe.hset(BOT_SQL_ENRICHMENT_KEY, bot_id, codec.dumps(stamp))
+        pipe.expire(BOT_SQL_ENRICHMENT_KEY, BOT_SQL_ENRICHMENT_RETENTION_SECONDS)
+        pipe.execute()
+
+    def clear_sql_enrichment(self, bot_id: str) -> None:
+        self._redis.hdel(BOT_SQL_ENRICHMENT_KEY, bot_id)
+
+    def invalidate(self, bot_id: str) -> int:
+        """Bump the bot's version and evict it from every process cache."""
+        version = int(self._redis.hincrby(BOT_VERSION_KEY, bot_id, 1))
+        self._publish_invalidation(bot_id, version)
+        return version
+
+    def rebuild_number_index(self) -> int:
+        """Recreate the number index from the registry; returns indexed bot count."""
+        for _attempt in range(_MAX_WRITE_RETRIES):
+            with self._redis.pipeline() as pipe:
+                try:
+                    pipe.watch(BOT_COLLECTION_KEY)
+                    mapping: Dict[str, str] = {}
+                    for bot_id, payload in pipe.hgetall(BOT_COLLECTION_KEY).items():
+                        try:
+                            number = normalize_bot_number(codec.loads(payload).get("twilio_phone_number"))
+                        except (TypeError, ValueError):
+                            continue
+                        if number:
+                            mapping[number] = bot_id
+                    pipe.multi()
+                    pipe.delete(BOT_NUMBER_INDEX_KEY)
+                    if mapping:
+                        pipe.hset(BOT_NUMBER_INDEX_KEY, mapping=mapping)
+                    pipe.set(BOT_NUMBER_INDEX_BUILT_KEY, "1")
+                    pipe.execute()
+                    return len(mapping)
+                except redis.WatchError:
+                    continue
+        raise RuntimeError("Could not rebuild the bot number index after concurrent modifications")
 
     def clear(self) -> None:
-        self._redis.delete(BOT_COLLECTION_KEY)
+        self._redis.delete(BOT_COLLECTION_KEY, BOT_NUMBER_INDEX_KEY, BOT_NUMBER_INDEX_BUILT_KEY, BOT_VERSION_KEY)
+        self._cache.clear()
+
+    def _publish_invalidation(self, bot_id: str, version: int) -> None:
+        self._cache.invalidate(bot_id, version)
+        try:
+            self._redis.publish(BOT_INVALIDATION_CHANNEL, f"{bot_id}:{version}")
+        except redis.RedisError as exc:
+            logger.warning("Could not publish bot invalidation for %s: %s", bot_id, exc)
+
+    def _write_bot(self, bot_id: str, mutate, *, delete: bool = False) -> Optional[Dict[str, Any]]:
+        """Apply ``mutate`` to the stored bot and update registry, index and version in one MULTI.
+
+        Returns the new bot payload, the deleted payload when ``delete`` is set,
+        or None when there was nothing to update/delete.
+        """
+        for _attempt in range(_MAX_WRITE_RETRIES):
+            with self._redis.pipeline() as pipe:
+                try:
+                    # The index is read below to decide the HDEL: a concurrent rebuild or
+                    # number move must restart this write.
+                    pipe.watch(BOT_COLLECTION_KEY, BOT_VERSION_KEY, BOT_NUMBER_INDEX_KEY)
+                    raw_current = pipe.hget(BOT_COLLECTION_KEY, bot_id)
+                    current = codec.loads(raw_current) if raw_current else None
+                    old_number = normalize_bot_number((current or {}).get("twilio_phone_number"))
+                    old_owner = pipe.hget(BOT_NUMBER_INDEX_KEY, old_number) if old_number else None
+
+                    if delete:
+                        if current is None:
+                            return None
+                        result = current
+                    else:
+                        result = mutate(dict(current) if current else None)
+                        if result is None:
+                            return None
+                    new_number = None if delete else normalize_bot_number(result.get("twilio_phone_number"))
+                    new_version = int(pipe.hget(BOT_VERSION_KEY, bot_id) or 0) + 1
+
+                    pipe.multi()
+                    if delete:
+                        pipe.hdel(BOT_COLLECTION_KEY, bot_id)
+                    else:
+                        pipe.hset(BOT_COLLECTION_KEY, bot_id, codec.dumps(result))
+                    if old_number and old_number != new_number and old_owner == bot_id:
+                        pipe.hdel(BOT_NUMBER_INDEX_KEY, old_number)
+                    if new_number:
+                        pipe.hset(BOT_NUMBER_INDEX_KEY, new_number, bot_id)
+                    pipe.hset(BOT_VERSION_KEY, bot_id, new_version)
+                    pipe.execute()
+                    self._publish_invalidation(bot_id, new_version)
+                    return result
+                except redis.WatchError:
+                    continue
+        raise RuntimeError(f"Could not write bot '{bot_id}' after concurrent modifications")
@@ -27,6 +27,12 @@ class SQLBotRepository:
             row = result.mappings().first()
             return dict(row) if row else None
 
+    def get_updated_at(self, bot_id: str) -> Optional[Any]:
+        """Only the row's ``updated_at`` (None when the row does not exist)."""
+        sql = "SELECT updated_at FROM gestion_whatsappbot WHERE id = :id"
+        with self._engine.connect() as conn:
+            return conn.execute(text(sql), {"id": bot_id}).scalar()
+
     def list(self, *, client_id: str | None = None) -> Iterable[Dict[str, Any]]:
         if client_id:
             sql = SELECT_BASE + " WHERE client_id = :cid ORDER BY created_at DESC"
@@ -1,6 +1,7 @@
 """Endpoints for managing bot definitions."""
 from __future__ import annotations
 
+from datetime import datetime, timezone
 from http import HTTPStatus
 from typing import Any, Dict, Optional
 
@@ -10,6 +11,7 @@ from werkzeug.exceptions import BadRequest, NotFound
 from ..extensions import redis_extension
 from ..extensions import db_extension
 from ..repositories import BotRepository
+from ..services.metrics_service import answer_cache_summary, usage_summary
 from ..services.openai_service import OpenAIAssistantService
 from ..utils.validation import ValidationError, require_fields
 from ..repositories.sql_bot_repository import SQLBotRepository
@@ -25,11 +27,25 @@ def _get_openai_service() -> OpenAIAssistantService:
     return current_app.extensions["openai_service"]
 
 
+def _public(bot: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Bot as returned by the API: a per-bot OpenAI key only shows its last 4 characters."""
+    if not bot or not bot.get("openai_api_key"):
+        return bot
+    return {**bot, "openai_api_key": f"***{str(bot['openai_api_key'])[-4:]}"}
+
+
+def _is_masked_key(value: Any, current: Dict[str, Any]) -> bool:
+    """True for an ``openai_api_key`` that is the mask :func:`_public` hands out."""
+    if not isinstance(value, str):
+        return False
+    return value.startswith("***") or value == (_public(current) or {}).get("openai_api_key")
+
+
 @blueprint.get("/")
 def list_bots() -> Response:
     repository = _get_repository()
     bots = repository.list_bots()
-    return jsonify({"data": bots})
+    return jsonify({"data": [_public(bot) for bot in bots]})
 
 
 @blueprint.post("/")
@@ -55,6 +71,7 @@ def create_bot() -> Response:
             model=assistant_config.get("model"),
             tools=assistant_config.get("tools"),
             metadata=assistant_config.get("metadata"),
+            bot={"openai_api_key": payload.get("openai_api_key")},
         )
 
     bot_data: Dict[str, Any] = {
@@ -71,24 +88,39 @@ def create_bot() -> Response:
         "twilio_phone_number": payload.get("twilio_phone_number"),
         "twilio_account_sid": payload.get("twilio_account_sid"),
         "twilio_messaging_service_sid": payload.get("twilio_messaging_service_sid"),
+        "openai_api_key": payload.get("openai_api_key"),
     }
 
     repository = _get_repository()
     created_bot = repository.create_bot(bot_data)
 
-    response_body: Dict[str, Any] = {"data": created_bot}
+    response_body: Dict[str, Any] = {"data": _public(created_bot)}
     if assistant_response:
         response_body["assistant"] = assistant_response
     return jsonify(response_body), HTTPStatus.CREATED
 
 
+@blueprint.get("/metrics/openai-usage")
+def get_openai_usage() -> Response:
+    """Daily OpenAI token counters per source (``?date=YYYY-MM-DD``, UTC, default today)."""
+    day = request.args.get("date") or datetime.now(timezone.utc).date().isoformat()
+    return jsonify({"date": day, "data": usage_summary(redis_extension.client, day=day)})
+
+
+@blueprint.get("/metrics/answer-cache")
+def get_answer_cache_metrics() -> Response:
+    """Daily answer-cache lookups, hits, hit rate and saved milliseconds per bot (``?date=YYYY-MM-DD``)."""
+    day = request.args.get("date") or datetime.now(timezone.utc).date().isoformat()
+    return jsonify({"date": day, "data": answer_cache_summary(redis_extension.client, day=day)})
+
+
 @blueprint.get("/<bot_id>")
 def get_bot(bot_id: str) -> Response:
     repository = _get_repository()
     bot = repository.get_bot(bot_id)
     if not bot:
         raise NotFound(f"Bot '{bot_id}' not found")
-    return jsonify({"data": bot})
+    return jsonify({"data": _public(bot)})
 
 
 @blueprint.put("/<bot_id>")
@@ -98,6 +130,9 @@ def update_bot(bot_id: str) -> Response:
     current = repository.get_bot(bot_id)
     if not current:
         raise NotFound(f"Bot '{bot_id}' not found")
+    if _is_masked_key(payload.get("openai_api_key"), current):
+        # GET -> edit -> PUT sends the mask back: keep the stored key.
+        payload.pop("openai_api_key")
 
     assistant_updates: Optional[Dict[str, Any]] = payload.get("assistant_updates")
     assistant_response: Optional[Dict[str, Any]] = None
@@ -109,13 +144,15 @@ def update_bot(bot_id: str) -> Response:
         )
         if not assistant_id:
             raise BadRequest("assistant_id is required to update the assistant")
-        assistant_response = openai_service.update_assistant(assistant_id, **assistant_updates)
+        assistant_response = openai_service.update_assistant(
+            assistant_id, bot={**current, **payload}, **assistant_updates
+        )
         payload.setdefault("assistant_id", assistant_response.get("id"))
         payload.setdefault("openai_model", assistant_response.get("model"))
         payload.setdefault("instructions", assistant_response.get("instructions"))
 
     updated_bot = repository.update_bot(bot_id, payload)
-    response_body: Dict[str, Any] = {"data": updated_bot}
+    response_body: Dict[str, Any] = {"data": _public(updated_bot)}
     if assistant_response:
         response_body["assistant"] = assistant_response
     return jsonify(response_body)
@@ -155,9 +192,11 @@ def refresh_bot(bot_id: str) -> Response:
         "horizon_actions": record.get("horizon_actions") or [],
         "twilio_phone_number": record.get("twilio_phone_number"),
         "metadata": record.get("metadata") or {},
+        "openai_api_key": record.get("openai_api_key"),
     }
     repository.create_bot(snapshot)
-    return jsonify({"data": snapshot, "source": "database"}), 200
+    repository.clear_sql_enrichment(bot_id)
+    return jsonify({"data": _public(snapshot), "source": "database"}), 200
 
 
 @blueprint.get("/clients/<phone_number>")
@@ -0,0 +1,44 @@
+"""Push endpoint for the CRM to announce human handoff changes."""
+from __future__ import annotations
+
+import logging
+from typing import Any, Dict
+
+from flask import Blueprint, Response, jsonify, request
+from werkzeug.exceptions import BadRequest, Unauthorized
+
+from ..services.conversation_service import store_pushed_handoff_status
+from .outbound import _verify_service_auth
+
+blueprint = Blueprint("handoff", __name__)
+logger = logging.getLogger(__name__)
+
+_CONTROL_MODES = {"human", "bot"}
+
+
+@blueprint.post("/handoff/control-status")
+def push_control_status() -> Response:
+    """CRM push: an agent took (``human``) or released (``bot``) a conversation.
+
+    Signed like the outbound API (X-Api-Key, X-Timestamp, X-Signature).
+    Body: {"tenant_id": "...", "telefono": "+569...", "control_mode": "human" | "bot"}
+    """
+    raw_body = request.get_data(cache=True) or b"{}"
+    try:
+        _verify_service_auth(raw_body)
+    except Unauthorized as exc:
+        code = getattr(exc, "description", "unauthorized") or "unauthorized"
+        return jsonify({"status": "error", "reason_code": str(code)}), 401
+    except BadRequest as exc:
+        return jsonify({"status": "error", "reason_code": "invalid_timestamp", "reason_message": str(exc.description)}), 400
+
+    payload: Dict[str, Any] = request.get_json(silent=True) or {}
+    tenant_id = payload.get("tenant_id")
+    telefono = payload.get("telefono")
+    control_mode = payload.get("control_mode")
+    if not tenant_id or not telefono or control_mode not in _CONTROL_MODES:
+        return jsonify({"status": "error", "reason_code": "invalid_payload"}), 400
+
+    store_pushed_handoff_status(tenant_id=str(tenant_id), user_number=str(telefono), control_mode=control_mode)
+    logger.info("[control-status] push tenant=%s telefono=%s control_mode=%s", tenant_id, telefono, control_mode)
+    return jsonify({"status": "ok", "control_mode": control_mode}), 200
@@ -11,13 +11,20 @@ from werkzeug.exceptions import BadRequest
 
 from ..extensions import redis_extension
 from ..repositories import BotRepository
+from ..services.burst_coalescer import BurstCoalescer, resolve_debounce_ms
 from ..services.conversation_service import (
+    DEADLINE_FALLBACK_REPLY,
     handle_incoming_message,
-    human_agent_has_control,
     record_inbound_during_handoff,
+    start_handoff_check,
 )
 from ..services.horizon_config_loader import HorizonConfigLoader
+from ..services.inbound_dedup_service import InboundDeduplicator
+from ..services.inbound_queue_service import InboundMessage, InboundQueueService
 from ..services.outbound_whatsapp_service import OutboundWhatsAppService
+from ..utils.concurrency import submit
+from ..utils.deadline import Deadline, DeadlineExceeded, deadline_scope
+from ..utils.unit_of_work import redis_unit_of_work
 
 blueprint = Blueprint("whatsapp", __name__)
 logger = logging.getLogger(__name__)
@@ -51,14 +58,7 @@ def _normalize_number(number: Optional[str]) -> Optional[str]:
 
 
 def _find_bot_by_number(repository: BotRepository, target_number: Optional[str]):
-    normalized = _normalize_number(target_number)
-    if not normalized:
-        return None
-    for bot in repository.list_bots():
-        stored = _normalize_number(bot.get("twilio_phone_number"))
-        if stored == normalized:
-            return bot
-    return None
+    return repository.find_bot_by_number(target_number)
 
 
 def _resolve_tenant_id(bot: dict) -> str:
@@ -91,7 +91,16 @@ def webhook_health() -> Response:
 @blueprint.post("/webhook/whatsapp")
 def receive_whatsapp() -> Response:
     """Handle incoming WhatsApp message webhook from Twilio."""
-    
+    # Twilio gives up on the webhook after 15s: every hop of this message shares one budget.
+    deadline = Deadline.after(float(current_app.config.get("WEBHOOK_DEADLINE_SECONDS", 12)))
+    # One unit of work per message: the turn's Redis reads and writes are batched.
+    with redis_unit_of_work(
+        redis_extension.client, enabled=current_app.config.get("REDIS_UNIT_OF_WORK_ENABLED", True), label="webhook"
+    ):
+        return _receive_whatsapp(deadline)
+
+
+def _receive_whatsapp(deadline: Deadline) -> Response:
     # Log incoming request for debugging
     logger.info(f"📨 Webhook received:")
     logger.info(f"   From: {request.values.get('From')}")
@@ -146,8 +155,22 @@ def receive_whatsapp() -> Response:
     from_number = _normalize_number(request.values.get("From"))
     body = request.values.get("Body", "").strip()
 
-    _register_last_inbound(bot, from_number)
-    
+    # Independent of everything below: overlap it with the handoff check and the turn.
+    last_inbound = submit(_register_last_inbound, bot, from_number)
+    try:
+        return _respond(bot=bot, from_number=from_number, body=body, repository=repository, deadline=deadline)
+    finally:
+        last_inbound.result()
+
+
+def _respond(
+    *,
+    bot: dict,
+    from_number: Optional[str],
+    body: str,
+    repository: BotRepository,
+    deadline: Optional[Deadline] = None,
+) -> Response:
     logger.info(f"📞 Processing message:")
     logger.info(f"   From: {from_number}")
     logger.info(f"   Message: {body}")
@@ -156,31 +179,114 @@ def receive_whatsapp() -> Response:
         logger.error("❌ Empty message body")
         raise BadRequest("Body is required")
 
-    # Respect human handoff: if an agent took control in the CRM, stay silent
-    # but still record the inbound message so the agent sees it in the CRM.
-    if human_agent_has_control(bot, from_number or "unknown"):
-        logger.info("🛑 Human control active — recording inbound, bot skipping reply for %s", from_number)
-        record_inbound_during_handoff(bot, user_number=from_number or "unknown", message=body)
-        # Empty TwiML => Twilio sends no message.
-        return Response(str(MessagingResponse()), mimetype="application/xml")
+    message_sid = request.values.get("MessageSid")
+    dedup = InboundDeduplicator.from_config(redis_extension.client, current_app.config)
+    if not dedup.claim(message_sid):
+        return _duplicate_delivery_response(dedup, message_sid)
 
     try:
-        logger.info(f"🤖 Generating response...")
-        reply_text = handle_incoming_message(
+        reply_text = _process_inbound(
+            bot=bot,
+            from_number=from_number,
+            body=body,
+            message_sid=message_sid,
+            repository=repository,
+            deadline=deadline,
+        )
+    except Exception:
+        # Nothing was answered: let Twilio's retry process the message again.
+        dedup.release(message_sid)
+        raise
+    dedup.complete(message_sid, reply_text)
+
+    return _twiml_response(reply_text)
+
+
+def _twiml_response(reply_text: Optional[str]) -> Response:
+    # Empty TwiML => Twilio sends no message.
+    twiml = MessagingResponse()
+    if reply_text:
+        twiml.message(reply_text)
+        logger.info(f"📤 Sending TwiML response")
+    return Response(str(twiml), mimetype="application/xml")
+
+
+def _duplicate_delivery_response(dedup: InboundDeduplicator, message_sid: str) -> Response:
+    """Twilio retry of a message we already took: reuse its reply, never re-run it."""
+    logger.info("♻️ Duplicate delivery for MessageSid %s", message_sid)
+    if current_app.config.get("WEBHOOK_ASYNC_MODE"):
+        # The worker replies over REST; the retry only needs an acknowledgement.
+        return _twiml_response(None)
+    wait_seconds = float(current_app.config.get("INBOUND_DEDUP_WAIT_SECONDS", 10))
+    return _twiml_response(dedup.wait_for_reply(message_sid, wait_seconds))
+
+
+def _process_inbound(
+    *,
+    bot: dict,
+    from_number: Optional[str],
+    body: str,
+    message_sid: Optional[str],
+    repository: BotRepository,
+    deadline: Optional[Deadline] = None,
+) -> Optional[str]:
+    """Run the message through the bot; returns the reply text or None for no reply."""
+    if current_app.config.get("WEBHOOK_ASYNC_MODE"):
+        # Acknowledge Twilio right away; a stream worker runs the handoff check,
+        # the conversation and sends the reply (see worker.py).
+        queue = InboundQueueService.from_config(redis_extension.client, current_app.config)
+        queue.enqueue(
+            InboundMessage(
+                bot_id=bot["id"],
+                user_number=from_number or "unknown",
+                body=body,
+                message_sid=message_sid,
+            )
+        )
+        return None
+
+    with deadline_scope(deadline):
+        # Respect human handoff: if an agent took control in the CRM, stay silent
+        # but still record the inbound message so the agent sees it in the CRM.
+        # The check runs in the background through the burst window and the
+        # turn's pre-LLM I/O; the turn drops its reply if it says "human".
+        handoff = start_handoff_check(bot, from_number or "unknown")
+        coalesced = BurstCoalescer(redis_extension.client).collect(
             bot_id=bot["id"],
             user_number=from_number or "unknown",
             message=body,
-            repository=repository,
+            window_ms=resolve_debounce_ms(bot),
         )
-        logger.info(f"✅ Response generated: {reply_text[:100]}...")
+        if coalesced is None:
+            # A newer message of the same burst will answer for all of them.
+            if handoff.result():
+                record_inbound_during_handoff(bot, user_number=from_number or "unknown", message=body)
+            return None
+
+        try:
+            logger.info(f"🤖 Generating response...")
+            reply_text = handle_incoming_message(
+                bot_id=bot["id"],
+                user_number=from_number or "unknown",
+                message=coalesced,
+                repository=repository,
+                deadline=deadline,
+                handoff=handoff,
+            )
+            if reply_text is None:
+                logger.info("🛑 Human control active — recording inbound, bot skipping reply for %s", from_number)
+                record_inbound_during_handoff(bot, user_number=from_number or "unknown", message=body)
+                return None
+            logger.info(f"✅ Response generated: {reply_text[:100]}...")
         
-    except Exception as e:
-        logger.error(f"❌ Error generating response: {e}")
-        import traceback
-        logger.error(traceback.format_exc())
-        reply_text = "Lo siento, hubo un error al procesar tu mensaje."
+        except DeadlineExceeded as exc:
+            logger.warning("⏱️ Deadline agotado antes de responder a %s: %s", from_number, exc)
+            reply_text = DEADLINE_FALLBACK_REPLY
+        except Exception as e:
+            logger.error(f"❌ Error generating response: {e}")
+            import traceback
+            logger.error(traceback.format_exc())
+            reply_text = "Lo siento, hubo un error al procesar tu mensaje."
+
+    return reply_text
 
-    twiml = MessagingResponse()
-    twiml.message(reply_text)
-    logger.info(f"📤 Sending TwiML response")
-    return Response(str(twiml), mimetype="application/xml")
@@ -0,0 +1,269 @@
+"""Opt-in per-bot cache of answers to repeated FAQ-style questions.
+
+Many users open with the same question ("horario", "dónde están", "precio
+batería"). For bots with ``metadata.answer_cache_enabled`` a first-turn
+question without client state is looked up here before paying a model run:
+
+* The question is normalized (case/accent folding, punctuation and Spanish
+  stopwords removed) and turned into character 3-gram shingles.
+* A MinHash signature of the shingles estimates Jaccard similarity; LSH bands
+  (sets in Redis) find candidate entries without scanning the whole cache.
+* A candidate whose estimated similarity reaches ``ANSWER_CACHE_SIMILARITY``
+  answers the turn.
+
+Keys embed a version derived from the bot's instructions, model and
+assistant, so editing the bot invalidates its cache; old entries expire with
+``ANSWER_CACHE_TTL_SECONDS``. Lookups, hits and the generation time they
+saved are counted in :mod:`metrics_service`.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import re
+import unicodedata
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from flask import current_app
+
+from .metrics_service import arecord_answer_cache, record_answer_cache
+
+ANSWER_CACHE_PREFIX = "answers:{bot_id}:{version}"
+
+# 32 hash functions in 8 bands of 4 rows: pairs above ~0.7 similarity share a
+# band with high probability, pairs below ~0.4 rarely do.
+_NUM_HASHES = 32
+_BANDS = 8
+_ROWS = _NUM_HASHES // _BANDS
+_SHINGLE_SIZE = 3
+# Long, specific messages are not FAQ traffic.
+_MAX_QUESTION_CHARS = 300
+_MAX_CANDIDATES = 20
+
+_STOPWORDS = frozenset(
+    """
+    a al algo ante con de del desde e el en entre es esta este esto estoy hay la las le les lo los me mi mis
+    muy nos o os para pero por que se si sin su sus te tu tus un una unas unos y ya yo
+    hola buenas buenos dias tardes noches gracias favor porfa porfavor quisiera queria quiero saber necesito
+    consulta pregunta usted ustedes
+    """.split()
+)
+
+logger = logging.getLogger(__name__)
+
+
+def answer_cache_enabled(bot: Dict[str, Any]) -> bool:
+    metadata = bot.get("metadata") or {}
+    value = metadata.get("answer_cache_enabled")
+    if isinstance(value, bool):
+        return value
+    return str(value or "").strip().lower() in {"1", "true", "yes", "si", "sí", "on"}
+
+
+def normalize_question(text: str) -> str:
+    """Lowercase, accent-free, punctuation-free words minus stopwords ("" if nothing is left)."""
+    folded = unicodedata.normalize("NFKD", text or "").encode("ascii", "ignore").decode("ascii").lower()
+    words = re.findall(r"[a-z0-9]+", folded)
+    return " ".join(word for word in words if word not in _STOPWORDS)
+
+
+def minhash_signature(normalized: str) -> List[int]:
+    padded = f" {normalized} "
+    shingles = {padded[i:i + _SHINGLE_SIZE] for i in range(max(len(padded) - _SHINGLE_SIZE + 1, 1))}
+    encoded = [shingle.encode("utf-8") for shingle in shingles]
+    # blake2b with a per-function salt: stable across processes, unlike hash().
+    return [
+        min(
+            int.from_bytes(hashlib.blake2b(shingle, digest_size=8, salt=seed.to_bytes(8, "big")).digest(), "big")
+            for shingle in encoded
+        )
+        for seed in range(_NUM_HASHES)
+    ]
+
+
+def similarity(a: List[int], b: List[int]) -> float:
+    """Estimated Jaccard similarity of the shingle sets behind two signatures."""
+    if not a or len(a) != len(b):
+        return 0.0
+    return sum(x == y for x, y in zip(a, b)) / len(a)
+
+
+def bot_cache_version(bot: Dict[str, Any]) -> str:
+    """Changes whenever what the model would answer with changes."""
+    material = "|".join(
+        str(bot.get(field) or "") for field in ("instructions", "openai_model", "model", "assistant_id")
+    )
+    return hashlib.sha1(material.encode("utf-8")).hexdigest()[:12]
+
+
+@dataclass
+class CachedAnswer:
+    answer: str
+    similarity: float
+    saved_ms: int
+
+
+class _AnswerCacheBase:
+    def __init__(self, redis_client, *, bot: Dict[str, Any], ttl_seconds: int, threshold: float) -> None:
+        self._redis = redis_client
+        self.bot_id = str(bot.get("id"))
+        self.prefix = ANSWER_CACHE_PREFIX.format(bot_id=self.bot_id, version=bot_cache_version(bot))
+        self.ttl_seconds = ttl_seconds
+        self.threshold = threshold
+
+    @classmethod
+    def for_bot(cls, redis_client, bot: Dict[str, Any]):
+        config = current_app.config
+        return cls(
+            redis_client,
+            bot=bot,
+            ttl_seconds=int(config.get("ANSWER_CACHE_TTL_SECONDS", 86400)),
+            threshold=float(config.get("ANSWER_CACHE_SIMILARITY", 0.8)),
+        )
+
+    def _fingerprint(self, question: str) -> Optional[Tuple[str, List[int]]]:
+        if not question or len(question) > _MAX_QUESTION_CHARS:
+            return None
+        normalized = normalize_question(question)
+        if not normalized:
+            return None
+        return normalized, minhash_signature(normalized)
+
+    def _entry_key(self, normalized: str) -> str:
+        return f"{self.prefix}:entry:{hashlib.sha1(normalized.encode('utf-8')).hexdigest()[:16]}"
+
+    def _band_keys(self, signature: List[int]) -> List[str]:
+        keys = []
+        for band in range(_BANDS):
+            rows = signature[band * _ROWS:(band + 1) * _ROWS]
+            digest = hashlib.sha1(",".join(map(str, rows)).encode("ascii")).hexdigest()[:16]
+            keys.append(f"{self.prefix}:band:{band}:{digest}")
+        return keys
+
+    def _best(self, signature: List[int], candidates: List[str], signatures: List[Optional[str]]) -> Optional[Tuple[str, float]]:
+        best: Optional[Tuple[str, float]] = None
+        for key, raw in zip(candidates, signatures):
+            if not raw:
+                continue
+            score = similarity(signature, [int(value) for value in raw.split(",")])
+            if score >= self.threshold and (best is None or score > best[1]):
+                best = (key, score)
+        return best
+
+    def _store_writes(self, pipe, normalized: str, signature: List[int], question: str, answer: str, elapsed_ms: int) -> None:
+        entry_key = self._entry_key(normalized)
+        pipe.hset(entry_key, mapping={
+            "question": question,
+            "answer": answer,
+            "sig": ",".join(map(str, signature)),
+            "elapsed_ms": int(elapsed_ms),
+        })
+        pipe.expire(entry_key, self.ttl_seconds)
+        for band_key in self._band_keys(signature):
+            pipe.sadd(band_key, entry_key)
+            pipe.expire(band_key, self.ttl_seconds)
+
+
+class AnswerCache(_AnswerCacheBase):
+    def lookup(self, question: str) -> Optional[CachedAnswer]:
+        fingerprint = self._fingerprint(question)
+        if fingerprint is None:
+            return None
+        normalized, signature = fingerprint
+        try:
+            hit = self._find(normalized, signature)
+        except Exception as exc:  # the cache must never fail the turn
+            logger.warning("Answer cache lookup failed for bot %s: %s", self.bot_id, exc)
+            return None
+        record_answer_cache(self._redis, bot_id=self.bot_id, hit=hit is not None, saved_ms=hit.saved_ms if hit else 0)
+        if hit:
+            logger.info("💾 Answer cache hit for bot %s (similarity=%.2f)", self.bot_id, hit.similarity)
+        return hit
+
+    def store(self, question: str, answer: str, *, elapsed_ms: int) -> None:
+        fingerprint = self._fingerprint(question)
+        if fingerprint is None or not answer:
+            return
+        normalized, signature = fingerprint
+        try:
+            pipe = self._redis.pipeline()
+            self._store_writes(pipe, normalized, signature, question, answer, elapsed_ms)
+            pipe.execute()
+        except Exception as exc:
+            logger.warning("Answer cache store failed for bot %s: %s", self.bot_id, exc)
+
+    def _find(self, normalized: str, signature: List[int]) -> Optional[CachedAnswer]:
+        exact = self._redis.hmget(self._entry_key(normalized), "answer", "elapsed_ms")
+        if exact[0]:
+            return CachedAnswer(answer=exact[0], similarity=1.0, saved_ms=int(exact[1] or 0))
+        pipe = self._redis.pipeline()
+        for band_key in self._band_keys(signature):
+            pipe.smembers(band_key)
+        candidates = sorted(set().union(*pipe.execute()))[:_MAX_CANDIDATES]
+        if not candidates:
+            return None
+        pipe = self._redis.pipeline()
+        for key in candidates:
+            pipe.hget(key, "sig")
+        best = self._best(signature, candidates, pipe.execute())
+        if best is None:
+            return None
+        answer, elapsed_ms = self._redis.hmget(best[0], "answer", "elapsed_ms")
+        if not answer:
+            return None
+        return CachedAnswer(answer=answer, similarity=best[1], saved_ms=int(elapsed_ms or 0))
+
+
+class AsyncAnswerCache(_AnswerCacheBase):
+    """:class:`AnswerCache` for ``redis.asyncio`` clients."""
+
+    async def lookup(self, question: str) -> Optional[CachedAnswer]:
+        fingerprint = self._fingerprint(question)
+        if fingerprint is None:
+            return None
+        normalized, signature = fingerprint
+        try:
+            hit = await self._find(normalized, signature)
+        except Exception as exc:
+            logger.warning("Answer cache lookup failed for bot %s: %s", self.bot_id, exc)
+            return None
+        await arecord_answer_cache(
+            self._redis, bot_id=self.bot_id, hit=hit is not None, saved_ms=hit.saved_ms if hit else 0
+        )
+        if hit:
+            logger.info("💾 Answer cache hit for bot %s (similarity=%.2f)", self.bot_id, hit.similarity)
+        return hit
+
+    async def store(self, question: str, answer: str, *, elapsed_ms: int) -> None:
+        fingerprint = self._fingerprint(question)
+        if fingerprint is None or not answer:
+            return
+        normalized, signature = fingerprint
+        try:
+            pipe = self._redis.pipeline()
+            self._store_writes(pipe, normalized, signature, question, answer, elapsed_ms)
+            await pipe.execute()
+        except Exception as exc:
+            logger.warning("Answer cache store failed for bot %s: %s", self.bot_id, exc)
+
+    async def _find(self, normalized: str, signature: List[int]) -> Optional[CachedAnswer]:
+        exact = await self._redis.hmget(self._entry_key(normalized), "answer", "elapsed_ms")
+        if exact[0]:
+            return CachedAnswer(answer=exact[0], similarity=1.0, saved_ms=int(exact[1] or 0))
+        pipe = self._redis.pipeline()
+        for band_key in self._band_keys(signature):
+            pipe.smembers(band_key)
+        candidates = sorted(set().union(*await pipe.execute()))[:_MAX_CANDIDATES]
+        if not candidates:
+            return None
+        pipe = self._redis.pipeline()
+        for key in candidates:
+            pipe.hget(key, "sig")
+        best = self._best(signature, candidates, await pipe.execute())
+        if best is None:
+            return None
+        answer, elapsed_ms = await self._redis.hmget(best[0], "answer", "elapsed_ms")
+        if not answer:
+            return None
+        return CachedAnswer(answer=answer, similarity=best[1], saved_ms=int(elapsed_ms or 0))
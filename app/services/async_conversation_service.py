@@ -0,0 +1,586 @@
+"""asyncio execution path for queued conversations (``INBOUND_WORKER_MODE=asyncio``).
+
+Same flow as :func:`conversation_service.process_queued_message`, but every
+long wait — the handoff HTTP check, the burst window, the conversation lock,
+OpenAI run polling and Horizon actions — yields the event loop, so a single
+worker process can carry hundreds of conversations at once. Short synchronous
+steps of the existing business logic (bot lookup, client data, CRM history
+sync, custom functions, Twilio send) run through ``asyncio.to_thread`` and
+still see the Flask app context.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Dict, List, Optional
+
+import httpx
+import redis
+from werkzeug.exceptions import BadRequest
+
+from ..extensions import openai_extension, redis_extension
+from ..repositories import BotRepository
+from ..utils.deadline import DeadlineExceeded, budget_timeout, deadline_scope, raise_if_expired
+from ..utils.unit_of_work import current_unit_of_work, redis_unit_of_work
+from .answer_cache import AsyncAnswerCache
+from .burst_coalescer import AsyncBurstCoalescer, resolve_debounce_ms
+from .context_window import SUMMARY_KEY_PATTERN
+from .conversation_lock import AsyncConversationLock, LockWaitExpired
+from .conversation_service import (
+    CONTINUE_CHAT,
+    CONTINUE_RESPONSE,
+    CONTINUE_RUN,
+    CONTINUE_SUMMARY,
+    DEADLINE_FALLBACK_REPLY,
+    MISSING_TOOL_OUTPUTS_REPLY,
+    _answer_cache_applies,
+    _append_tool_results,
+    _client_state_message,
+    _control_status_request,
+    _enrich_bot_from_sql,
+    _execute_tool_calls,
+    _handoff_status_key,
+    _handoff_status_ttl,
+    _has_server_side_context,
+    _log_control_status_error,
+    _log_control_status_fail_open,
+    _prefetch_turn,
+    _read_control_status,
+    _refresh_client_data,
+    _resolve_bot,
+    _resolve_control_status_token,
+    _send_reply,
+    _session_payload,
+    _session_writer,
+    _sync_lead_flow_history,
+    _tool_continuation,
+    _tool_failure_result,
+    _try_auto_dispatch_lead_notification,
+    _without_client_state,
+    dispatch_deferred_messages,
+    fold_summary_later,
+    inbound_deadline,
+    record_inbound_during_handoff,
+    resolve_handoff_tenant_id,
+    tool_call_timeout,
+    tool_error_result,
+)
+from .custom_functions_service import CustomFunctionsService
+from .inbound_queue_service import InboundMessage, InboundQueueService
+from .openai_service import AssistantFunctionCall, ToolResult
+from .session_store import AsyncSessionStore
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncConversationService:
+    def __init__(
+        self,
+        app,
+        *,
+        redis_client,
+        openai_client,
+        http_client: httpx.AsyncClient,
+    ) -> None:
+        self.app = app
+        self._redis = redis_client
+        self._openai_client = openai_client
+        # Loop-bound clients for bots with their own openai_api_key (LRU).
+        self._openai_clients: "OrderedDict[str, Any]" = OrderedDict()
+        self._closing: set = set()
+        self._http = http_client
+
+    @classmethod
+    def create(cls, app) -> "AsyncConversationService":
+        """Build the loop-bound clients; call from inside the running event loop."""
+        return cls(
+            app,
+            redis_client=redis_extension.create_async_client(),
+            openai_client=openai_extension.create_async_client(),
+            http_client=httpx.AsyncClient(timeout=15.0),
+        )
+
+    async def aclose(self) -> None:
+        await self._http.aclose()
+        if self._openai_client is not None:
+            await self._openai_client.close()
+        for client in self._openai_clients.values():
+            await client.close()
+        self._openai_clients.clear()
+        await self._redis.aclose()
+
+    def _openai_client_for(self, bot: Dict[str, Any]):
+        """Client for the bot's own ``openai_api_key`` (one per key on this loop), else the default one."""
+        api_key = bot.get("openai_api_key")
+        if not api_key:
+            return self._openai_client
+        client = self._openai_clients.get(api_key)
+        if client is not None:
+            self._openai_clients.move_to_end(api_key)
+            return client
+        client = openai_extension.create_async_client(api_key)
+        if client is None:
+            return self._openai_client
+        self._openai_clients[api_key] = client
+        while len(self._openai_clients) > int(self.app.config.get("OPENAI_CLIENT_POOL_SIZE", 32)):
+            _, evicted = self._openai_clients.popitem(last=False)
+            task = asyncio.create_task(self._close_when_idle(evicted))
+            self._closing.add(task)
+            task.add_done_callback(self._closing.discard)
+        return client
+
+    @staticmethod
+    async def _close_when_idle(client) -> None:
+        # Turns already holding the evicted client finish within the request timeout.
+        await asyncio.sleep(60)
+        await client.close()
+
+    @property
+    def _openai(self):
+        return self.app.extensions["openai_service"]
+
+    @property
+    def _horizon(self):
+        return self.app.extensions["horizon_service"]
+
+    # ------------------------------------------------------------------
+    # Entry points
+    # ------------------------------------------------------------------
+    async def process_queued_message(self, message: InboundMessage) -> Optional[str]:
+        with self.app.app_context():
+            repository = BotRepository(redis_extension.client)
+            bot = await asyncio.to_thread(repository.get_bot, message.bot_id)
+            if not bot:
+                logger.error("❌ Queued message %s references unknown bot %s", message.entry_id, message.bot_id)
+                return None
+
+            user_number = message.user_number or "unknown"
+            with deadline_scope(inbound_deadline(message)), redis_unit_of_work(
+                redis_extension.client, enabled=self.app.config.get("REDIS_UNIT_OF_WORK_ENABLED", True), label="cola"
+            ) as unit:
+                # Overlaps the burst window and the turn's pre-LLM I/O (see start_handoff_check).
+                handoff = asyncio.create_task(self.human_agent_has_control(bot, user_number))
+                body = await AsyncBurstCoalescer(self._redis).collect(
+                    bot_id=bot["id"],
+                    user_number=user_number,
+                    message=message.body,
+                    window_ms=resolve_debounce_ms(bot),
+                )
+                if body is None:
+                    if await handoff:
+                        await asyncio.to_thread(
+                            record_inbound_during_handoff, bot, user_number=user_number, message=message.body
+                        )
+                    return None
+
+                try:
+                    reply_text = await self.handle_incoming_message(
+                        bot_id=bot["id"], user_number=user_number, message=body, handoff=handoff
+                    )
+                    if reply_text is None:
+                        logger.info("🛑 Human control active — recording queued inbound for %s", user_number)
+                        await asyncio.to_thread(
+                            record_inbound_during_handoff, bot, user_number=user_number, message=message.body
+                        )
+                        return None
+                except DeadlineExceeded as exc:
+                    logger.warning("⏱️ Deadline agotado antes de responder a %s: %s", user_number, exc)
+                    reply_text = DEADLINE_FALLBACK_REPLY
+                except Exception as exc:
+                    logger.error("❌ Error generating queued response: %s", exc, exc_info=True)
+                    reply_text = "Lo siento, hubo un error al procesar tu mensaje."
+
+                await asyncio.to_thread(_send_reply, bot=bot, user_number=user_number, body=reply_text)
+                await asyncio.to_thread(unit.flush)  # keep the exit flush off the event loop
+            return reply_text
+
+    async def handle_incoming_message(
+        self, *, bot_id: str, user_number: str, message: str, handoff: Optional[Awaitable[bool]] = None
+    ) -> Optional[str]:
+        """Async :func:`conversation_service.handle_incoming_message`.
+
+        None when ``handoff`` says human; ``""`` when the message was deferred
+        to the turn holding the lock.
+        """
+        if not user_number:
+            raise BadRequest("Missing sender number")
+        if not message:
+            raise BadRequest("Message body is required")
+
+        repository = BotRepository(redis_extension.client)
+        lock = AsyncConversationLock.for_conversation(self._redis, bot_id=bot_id, user_number=user_number)
+
+        async def _bot() -> Dict[str, Any]:
+            bot = await asyncio.to_thread(_resolve_bot, bot_id, repository)
+            return await asyncio.to_thread(_enrich_bot_from_sql, bot_id, bot, repository)
+
+        async def _conversation() -> List[Dict[str, str]]:
+            await lock.acquire_or_proceed()
+            return await self._load_conversation(bot_id, user_number)
+
+        async def _handoff() -> bool:
+            return bool(await handoff) if handoff is not None else False
+
+        # Joined from process_queued_message; absent when called directly.
+        unit = current_unit_of_work()
+        try:
+            # Settle every branch before raising so a late lock grant is still released below.
+            outcomes = await asyncio.gather(_bot(), _conversation(), _handoff(), return_exceptions=True)
+            if isinstance(outcomes[1], LockWaitExpired):
+                logger.warning("⏳ %s — el turno en curso se hará cargo del mensaje de %s", outcomes[1], user_number)
+                if not await lock.defer(message):
+                    await asyncio.to_thread(
+                        dispatch_deferred_messages, bot_id=bot_id, user_number=user_number, messages=[message]
+                    )
+                return ""
+            for outcome in outcomes:
+                if isinstance(outcome, BaseException):
+                    raise outcome
+            bot, conversation, human_has_control = outcomes
+            if human_has_control:
+                logger.info("🛑 Human control active — bot skipping reply for %s", user_number)
+                return None
+            if unit is not None:
+                await asyncio.to_thread(_prefetch_turn, unit, bot, bot_id, user_number, for_async=True)
+            client_data_manager, client_data = await asyncio.to_thread(
+                _refresh_client_data, bot_id, user_number, message
+            )
+            loaded = len(conversation)
+            history_summary = None
+            if not _has_server_side_context(bot):
+                history_summary = await self._redis.get(
+                    SUMMARY_KEY_PATTERN.format(bot_id=bot_id, user_number=user_number)
+                )
+
+            await asyncio.to_thread(
+                _try_auto_dispatch_lead_notification,
+                bot=bot,
+                user_number=user_number,
+                client_data_manager=client_data_manager,
+                client_data=client_data,
+            )
+
+            answer_cache = (
+                AsyncAnswerCache.for_bot(self._redis, bot)
+                if _answer_cache_applies(bot, conversation, history_summary, client_data)
+                else None
+            )
+            conversation.append({"role": "user", "content": message})
+            cached = await answer_cache.lookup(message) if answer_cache else None
+            if cached is not None:
+                reply_text = cached.answer
+                await self._openai.aappend_exchange(
+                    client=self._openai_client_for(bot),
+                    redis_client=self._redis,
+                    bot=bot,
+                    user_phone=user_number,
+                    question=message,
+                    answer=reply_text,
+                )
+            else:
+                try:
+                    reply_text = await self._generate_turn_reply(
+                        bot=bot,
+                        user_number=user_number,
+                        conversation=conversation,
+                        client_data=client_data,
+                        history_summary=history_summary,
+                        answer_cache=answer_cache,
+                    )
+                except DeadlineExceeded as exc:
+                    logger.warning("⏱️ Deadline agotado para %s: %s — enviando respuesta de respaldo", user_number, exc)
+                    reply_text = DEADLINE_FALLBACK_REPLY
+            conversation.append({"role": "assistant", "content": reply_text})
+            # Counting tokens of the whole history is CPU work: keep it off the loop.
+            session, evicted = await asyncio.to_thread(
+                _session_payload, bot=bot, conversation=conversation, summary=history_summary
+            )
+            write = _session_writer(
+                bot_id=bot_id, user_number=user_number, appended=len(conversation) - loaded, **session
+            )
+            if not await lock.fenced_write(write):
+                logger.warning("🔒 Session write for %s skipped: conversation lock lost to a newer turn", user_number)
+            elif evicted:
+                fold_summary_later(
+                    bot=bot, user_number=user_number, summary=history_summary, evicted=evicted,
+                    provisional=session["summary"], openai_service=self._openai,
+                )
+            await asyncio.to_thread(
+                _sync_lead_flow_history, bot=bot, user_number=user_number, conversation=conversation
+            )
+        finally:
+            if unit is not None:
+                await asyncio.to_thread(unit.flush)
+            deferred = await lock.release()
+            if deferred:
+                await asyncio.to_thread(
+                    dispatch_deferred_messages, bot_id=bot_id, user_number=user_number, messages=deferred
+                )
+
+        return reply_text
+
+    async def human_agent_has_control(self, bot: Dict[str, Any], user_number: str) -> bool:
+        """Async :func:`conversation_service.human_agent_has_control` (same cache, same fail-open)."""
+        cache_key = _handoff_status_key(resolve_handoff_tenant_id(bot), user_number)
+        try:
+            cached_mode = await self._redis.get(cache_key)
+        except redis.RedisError as exc:  # pragma: no cover - Redis hiccup: just ask the CRM
+            logger.warning("[control-status] cache read failed for %s: %s", user_number, exc)
+            cached_mode = None
+        if cached_mode:
+            return cached_mode == "human"
+
+        token = await asyncio.to_thread(_resolve_control_status_token, bot)
+        request = _control_status_request(self.app.config.get("HORIZON_CONTROL_BASE_URL"), token, user_number)
+        if request is None:
+            return False
+
+        last_exc: Any = None
+        for attempt in (1, 2):
+            try:
+                resp = await self._http.get(
+                    request["url"], headers=request["headers"], params=request["params"], timeout=budget_timeout(8)
+                )
+                control_mode, last_exc = _read_control_status(resp, user_number, attempt, request["token_tail"])
+                if last_exc:
+                    continue
+                if control_mode in ("human", "bot"):
+                    ttl = _handoff_status_ttl(self.app.config)
+                    if ttl > 0:
+                        await self._redis.set(cache_key, control_mode, ex=ttl, nx=True)
+                return control_mode == "human"
+            except httpx.HTTPError as exc:
+                last_exc = exc
+                _log_control_status_error(user_number, attempt, exc)
+            except DeadlineExceeded as exc:
+                last_exc = exc
+                break
+
+        _log_control_status_fail_open(user_number, last_exc)
+        return False
+
+    # ------------------------------------------------------------------
+    # Internal helpers
+    # ------------------------------------------------------------------
+    async def _generate_turn_reply(
+        self,
+        *,
+        bot: Dict[str, Any],
+        user_number: str,
+        conversation: List[Dict[str, str]],
+        client_data: Optional[Dict[str, Any]],
+        history_summary: Optional[str] = None,
+        answer_cache: Optional[AsyncAnswerCache] = None,
+    ) -> str:
+        started = time.monotonic()
+        client_state = _client_state_message(client_data)
+
+        assistant_response = await self._openai.agenerate_reply(
+            client=self._openai_client_for(bot),
+            redis_client=self._redis,
+            bot=bot,
+            conversation=conversation,
+            tool_definitions=bot.get("assistant_functions"),
+            user_phone=user_number,
+            history_summary=history_summary,
+            client_state=client_state,
+        )
+        if not assistant_response.function_calls:
+            if answer_cache is not None and not assistant_response.failed:
+                await answer_cache.store(
+                    conversation[-1]["content"],
+                    assistant_response.reply_text,
+                    elapsed_ms=int((time.monotonic() - started) * 1000),
+                )
+            return assistant_response.reply_text
+
+        try:
+            tool_results = await self._execute_tool_calls(
+                bot=bot,
+                function_calls=assistant_response.function_calls,
+                user_number=user_number,
+                conversation=conversation,
+            )
+        except DeadlineExceeded:
+            if assistant_response.thread_id and assistant_response.run_id:
+                await self._openai.acancel_run(
+                    client=self._openai_client_for(bot),
+                    thread_id=assistant_response.thread_id,
+                    run_id=assistant_response.run_id,
+                )
+            raise
+
+        async def _on_tool_calls(calls: List[AssistantFunctionCall]) -> List[ToolResult]:
+            return await self._execute_tool_calls(
+                bot=bot, function_calls=calls, user_number=user_number, conversation=conversation
+            )
+
+        continuation, tool_outputs = _tool_continuation(assistant_response, tool_results)
+        if continuation == CONTINUE_RUN:
+            return await self._openai.asubmit_tool_outputs_and_wait(
+                client=self._openai_client_for(bot),
+                redis_client=self._redis,
+                thread_id=assistant_response.thread_id,
+                run_id=assistant_response.run_id,
+                tool_outputs=tool_outputs,
+                on_tool_calls=_on_tool_calls,
+                bot=bot,
+            )
+        if continuation == CONTINUE_RESPONSE:
+            return await self._openai.asubmit_response_tool_outputs(
+                client=self._openai_client_for(bot),
+                redis_client=self._redis,
+                bot=bot,
+                user_phone=user_number,
+                response_id=assistant_response.response_id,
+                tool_outputs=tool_outputs,
+                on_tool_calls=_on_tool_calls,
+            )
+        if continuation == CONTINUE_CHAT:
+            return await self._openai.asubmit_chat_tool_outputs(
+                client=self._openai_client_for(bot),
+                redis_client=self._redis,
+                bot=bot,
+                messages=assistant_response.chat_messages,
+                tool_outputs=tool_outputs,
+                tool_definitions=bot.get("assistant_functions"),
+                on_tool_calls=_on_tool_calls,
+            )
+        if continuation == CONTINUE_SUMMARY:
+            _append_tool_results(conversation, tool_results)
+            return await self._openai.asummarize_tool_results(
+                client=self._openai_client_for(bot),
+                bot=bot,
+                conversation=conversation,
+                tool_results=tool_results,
+                history_summary=history_summary,
+                client_state=client_state,
+                redis_client=self._redis,
+            )
+        return MISSING_TOOL_OUTPUTS_REPLY
+
+    async def _execute_tool_calls(
+        self,
+        *,
+        bot: Dict[str, Any],
+        function_calls: List[AssistantFunctionCall],
+        user_number: str,
+        conversation: List[Dict[str, Any]],
+    ) -> List[ToolResult]:
+        """Run the step's tool calls concurrently; results keep the call order (tool_call_ids)."""
+        defined_actions = bot.get("horizon_actions", [])
+        custom_functions = CustomFunctionsService()
+
+        async def _run_call(call: AssistantFunctionCall) -> ToolResult:
+            if custom_functions.supports_function(call.name):
+                # Custom handlers are synchronous (requests + Redis); keep them off the loop.
+                custom_results = await asyncio.to_thread(
+                    _execute_tool_calls,
+                    bot=bot,
+                    horizon_service=self._horizon,
+                    defined_actions=defined_actions,
+                    function_calls=[call],
+                    user_number=user_number,
+                    conversation=conversation,
+                )
+                return custom_results[0]
+            logger.info(f"Executing Horizon action: {call.name}")
+            result = await self._horizon.aexecute_action(
+                action_name=call.name,
+                defined_actions=defined_actions,
+                arguments=call.arguments,
+                client=self._http,
+            )
+            return ToolResult(name=call.name, content=json.dumps(result))
+
+        timeout = tool_call_timeout()
+
+        async def _isolated(call: AssistantFunctionCall) -> ToolResult:
+            try:
+                return await asyncio.wait_for(_run_call(call), timeout=budget_timeout(timeout))
+            except DeadlineExceeded:
+                raise
+            except asyncio.TimeoutError:
+                raise_if_expired(f"tool {call.name}")
+                logger.warning("⏱️ Tool %s superó %.1fs, se responde con error", call.name, timeout)
+                return tool_error_result(call.name, "timeout")
+            except Exception as exc:
+                return _tool_failure_result(call, exc)
+
+        if not self.app.config.get("TOOL_CALLS_PARALLEL", True):
+            return [await _isolated(call) for call in function_calls]
+        return list(await asyncio.gather(*(_isolated(call) for call in function_calls)))
+
+    async def _load_conversation(self, bot_id: str, user_number: str) -> List[Dict[str, str]]:
+        store = AsyncSessionStore.for_conversation(
+            self._redis, bot_id=bot_id, user_number=user_number, migrate=_without_client_state
+        )
+        return _without_client_state(await store.load())
+
+
+async def run_async_worker(app, *, consumer_name: str, stop_event: Optional[asyncio.Event] = None) -> None:
+    """Event-loop consumer: up to INBOUND_ASYNC_CONCURRENCY conversations in flight."""
+    config = app.config
+    queue = InboundQueueService.from_config(redis_extension.client, config)
+    queue.ensure_group()
+
+    concurrency = max(1, int(config.get("INBOUND_ASYNC_CONCURRENCY", 200)))
+    block_ms = int(config.get("INBOUND_WORKER_BLOCK_MS", 5000))
+    min_idle_ms = int(config.get("INBOUND_CLAIM_IDLE_MS", 120000))
+    stop_event = stop_event or asyncio.Event()
+    slots = asyncio.Semaphore(concurrency)
+
+    loop = asyncio.get_running_loop()
+    # Bounded pool for the short synchronous steps (and the blocking stream read).
+    loop.set_default_executor(
+        ThreadPoolExecutor(
+            max_workers=max(2, int(config.get("INBOUND_ASYNC_THREADS", 32))),
+            thread_name_prefix="inbound-async",
+        )
+    )
+    service = AsyncConversationService.create(app)
+    in_flight: set[asyncio.Task] = set()
+
+    async def _run(message: InboundMessage) -> None:
+        try:
+            await service.process_queued_message(message)
+        except Exception as exc:
+            logger.error("❌ Error processing queued message %s: %s", message.entry_id, exc, exc_info=True)
+        finally:
+            slots.release()
+            if message.entry_id:
+                await asyncio.to_thread(queue.ack, message.entry_id)
+
+    logger.info(
+        "👷 Async inbound worker %s listening on %s (group=%s, concurrency=%s)",
+        consumer_name, queue.stream_key, queue.group, concurrency,
+    )
+    claim_stale = True
+    try:
+        while not stop_event.is_set():
+            await slots.acquire()
+            try:
+                if claim_stale:
+                    messages = await asyncio.to_thread(queue.claim_stale, consumer_name, min_idle_ms=min_idle_ms, count=1)
+                    claim_stale = bool(messages)
+                if not claim_stale:
+                    messages = await asyncio.to_thread(queue.read, consumer_name, count=1, block_ms=block_ms)
+                    claim_stale = not messages
+            except redis.RedisError as exc:
+                logger.warning("⚠️ Async inbound worker could not read stream: %s", exc)
+                messages = []
+                await asyncio.sleep(1)
+            if not messages:
+                slots.release()
+                continue
+            task = asyncio.create_task(_run(messages[0]))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+    finally:
+        if in_flight:
+            await asyncio.gather(*in_flight, return_exceptions=True)
+        await service.aclose()
@@ -0,0 +1,116 @@
+"""Debounce bursts of consecutive user messages into a single assistant turn.
+
+Each inbound message is buffered per conversation and waits ``window_ms``.
+Only the message that is still the most recent one after its wait drains the
+buffer and answers; earlier ones return ``None`` so the caller stays silent.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Dict, Optional
+
+import redis
+
+BURST_BUFFER_KEY = "burst:{bot_id}:{user_number}:messages"
+BURST_SEQ_KEY = "burst:{bot_id}:{user_number}:seq"
+
+logger = logging.getLogger(__name__)
+
+
+def resolve_debounce_ms(bot: Dict[str, Any]) -> int:
+    """Per-bot window from ``metadata.message_debounce_ms`` (0/absent disables it)."""
+    metadata = bot.get("metadata") or {}
+    try:
+        return max(0, int(metadata.get("message_debounce_ms") or 0))
+    except (TypeError, ValueError):
+        return 0
+
+
+class BurstCoalescer:
+    def __init__(self, redis_client, *, sleep: Callable[[float], None] = time.sleep) -> None:
+        self._redis = redis_client
+        self._sleep = sleep
+
+    def collect(self, *, bot_id: str, user_number: str, message: str, window_ms: int) -> Optional[str]:
+        """Buffer ``message``; return the joined burst if this call should answer it."""
+        if window_ms <= 0:
+            return message
+
+        buffer_key = BURST_BUFFER_KEY.format(bot_id=bot_id, user_number=user_number)
+        seq_key = BURST_SEQ_KEY.format(bot_id=bot_id, user_number=user_number)
+        # Keys outlive the window comfortably, but never strand old text for long.
+        ttl_ms = max(window_ms * 10, 60000)
+
+        pipe = self._redis.pipeline(transaction=True)
+        pipe.rpush(buffer_key, message)
+        pipe.incr(seq_key)
+        pipe.pexpire(buffer_key, ttl_ms)
+        pipe.pexpire(seq_key, ttl_ms)
+        _, my_seq, _, _ = pipe.execute()
+
+        self._sleep(window_ms / 1000.0)
+
+        with self._redis.pipeline() as pipe:
+            try:
+                pipe.watch(seq_key)
+                latest = pipe.get(seq_key)
+                if latest is None or int(latest) != int(my_seq):
+                    logger.info("🧺 Message from %s folded into a newer burst", user_number)
+                    return None
+                pipe.multi()
+                pipe.lrange(buffer_key, 0, -1)
+                pipe.delete(buffer_key)
+                messages, _ = pipe.execute()
+            except redis.WatchError:
+                # A newer message arrived while draining; it owns the burst now.
+                return None
+
+        parts = [part.strip() for part in messages if part and part.strip()]
+        if len(parts) > 1:
+            logger.info("🧺 Coalesced %d messages from %s into one turn", len(parts), user_number)
+        return "\n".join(parts) or message
+
+
+class AsyncBurstCoalescer:
+    """:class:`BurstCoalescer` for ``redis.asyncio`` clients; the window wait yields the loop."""
+
+    def __init__(self, redis_client) -> None:
+        self._redis = redis_client
+
+    async def collect(self, *, bot_id: str, user_number: str, message: str, window_ms: int) -> Optional[str]:
+        if window_ms <= 0:
+            return message
+
+        buffer_key = BURST_BUFFER_KEY.format(bot_id=bot_id, user_number=user_number)
+        seq_key = BURST_SEQ_KEY.format(bot_id=bot_id, user_number=user_number)
+        ttl_ms = max(window_ms * 10, 60000)
+
+        pipe = self._redis.pipeline(transaction=True)
+        pipe.rpush(buffer_key, message)
+        pipe.incr(seq_key)
+        pipe.pexpire(buffer_key, ttl_ms)
+        pipe.pexpire(seq_key, ttl_ms)
+        _, my_seq, _, _ = await pipe.execute()
+
+        await asyncio.sleep(window_ms / 1000.0)
+
+        async with self._redis.pipeline() as pipe:
+            try:
+                await pipe.watch(seq_key)
+                latest = await pipe.get(seq_key)
+                if latest is None or int(latest) != int(my_seq):
+                    logger.info("🧺 Message from %s folded into a newer burst", user_number)
+                    return None
+                pipe.multi()
+                pipe.lrange(buffer_key, 0, -1)
+                pipe.delete(buffer_key)
+                messages, _ = await pipe.execute()
+            except redis.WatchError:
+                return None
+
+        parts = [part.strip() for part in messages if part and part.strip()]
+        if len(parts) > 1:
+            logger.info("🧺 Coalesced %d messages from %s into one turn", len(parts), user_number)
+        return "\n".join(parts) or message
@@ -1,22 +1,73 @@
 """
 Cliente data storage using Redis.
 Stores customer information to avoid repetitive questions.
+
+Two storage modes (``CLIENT_DATA_STORAGE``):
+
+* ``json`` (default): one JSON document per client, rewritten on each update.
+* ``hash``: one Redis hash per client, one JSON-encoded value per field.
+  Updates ``HSET`` only the changed fields (concurrent messages no longer
+  overwrite each other), reads are one ``HGETALL``, flags use ``HSETNX`` and
+  :meth:`ClientDataManager.has_required_info` is a single ``HMGET``.
+  Documents stored in JSON are migrated to a hash the first time they are read.
 """
-import json
 import logging
-from typing import Dict, Optional, Any
+from typing import Dict, Iterable, Optional, Any
 from datetime import datetime
 
+import redis
+
+from ..utils import codec
+from ..utils.unit_of_work import cached_read, deferred_write, forget
+
+STORAGE_JSON = "json"
+STORAGE_HASH = "hash"
+
 logger = logging.getLogger(__name__)
 
+
+def _configured_storage() -> str:
+    try:
+        from flask import current_app, has_app_context
+
+        if has_app_context():
+            return str(current_app.config.get("CLIENT_DATA_STORAGE") or STORAGE_JSON).lower()
+    except ImportError:  # pragma: no cover - flask is always installed with the app
+        pass
+    return STORAGE_JSON
+
+
+def _is_wrong_type(exc: Exception) -> bool:
+    # Pipelines prefix the server error with the failing command.
+    return isinstance(exc, redis.ResponseError) and "WRONGTYPE" in str(exc)
+
+
+def _decode_field(value: Any) -> Any:
+    if isinstance(value, bytes):
+        value = value.decode('utf-8')
+    try:
+        return codec.loads(value)
+    except (TypeError, ValueError):
+        return value
+
+
 class ClientDataManager:
     """Manages client data storage in Redis."""
     
-    def __init__(self, redis_client, namespace: str | None = None):
+    def __init__(self, redis_client, namespace: str | None = None, storage: str | None = None):
         self.redis_client = redis_client
         self.expiration_days = 30  # Data expires after 30 days
         # Optional namespace to isolate by bot/assistant
         self.namespace = namespace
+        self.storage = (storage or _configured_storage()).lower()
+
+    @property
+    def uses_hash(self) -> bool:
+        return self.storage == STORAGE_HASH
+
+    @property
+    def expiration_seconds(self) -> int:
+        return self.expiration_days * 24 * 3600
     
     def _get_client_key(self, phone_number: str) -> str:
         """Generate Redis key for client data."""
@@ -30,7 +81,9 @@ class ClientDataManager:
         """Get stored client data."""
         try:
             key = self._get_client_key(phone_number)
-            data = self.redis_client.get(key)
+            if self.uses_hash:
+                return self._get_hash(key)
+            data = cached_read(self.redis_client, "get", key)
             
             if data:
                 # Handle both string and bytes from Redis
@@ -39,7 +92,7 @@ class ClientDataManager:
                 else:
                     data_str = data
                 
-                client_data = json.loads(data_str)
+                client_data = codec.loads(data_str)
                 return client_data
             
             return {}
@@ -48,14 +101,23 @@ class ClientDataManager:
             logger.error(f"Error getting client data for {phone_number}: {e}")
             return {}
     
-    def update_client_data(self, phone_number: str, field: str, value: str) -> bool:
+    def update_client_data(self, phone_number: str, field: str, value: Any) -> bool:
         """Update specific field in client data."""
+        return self.update_client_fields(phone_number, {field: value})
+
+    def update_client_fields(self, phone_number: str, fields: Dict[str, Any]) -> bool:
+        """Update several fields at once (hash mode writes only these fields)."""
+        if not fields:
+            return True
         try:
+            if self.uses_hash:
+                return self._write_hash(phone_number, fields)
+
             # Get existing data
             client_data = self.get_client_data(phone_number)
             
-            # Update field
-            client_data[field] = value
+            # Update fields
+            client_data.update(fields)
             client_data['last_updated'] = datetime.now().isoformat()
             
             # Save back to Redis
@@ -64,6 +126,61 @@ class ClientDataManager:
         except Exception as e:
             logger.error(f"Error updating client data for {phone_number}: {e}")
             return False
+
+    def set_flag_once(self, phone_number: str, field: str, value: Any = True) -> bool:
+        """Set ``field`` only if it is not set yet; True if this call set it.
+
+        Atomic in both modes (``HSETNX``, or ``WATCH`` on the JSON document),
+        so concurrent turns can use it to claim a one-off action.
+        """
+        try:
+            if self.uses_hash:
+                return self._write_hash(phone_number, {field: value}, only_if_new=field)
+            return self._set_json_flag_once(phone_number, field, value)
+        except Exception as e:
+            logger.error(f"Error setting flag {field} for {phone_number}: {e}")
+            return False
+
+    def clear_flag(self, phone_number: str, field: str) -> bool:
+        """Undo :meth:`set_flag_once` (e.g. the action it claimed failed)."""
+        try:
+            key = self._get_client_key(phone_number)
+            if self.uses_hash:
+                forget(self.redis_client, key)
+                self.redis_client.hdel(key, field)
+                return True
+            client_data = self.get_client_data(phone_number)
+            if field not in client_data:
+                return True
+            client_data.pop(field)
+            return self.save_client_data(phone_number, client_data)
+        except Exception as e:
+            logger.error(f"Error clearing flag {field} for {phone_number}: {e}")
+            return False
+
+    def _set_json_flag_once(self, phone_number: str, field: str, value: Any, attempts: int = 5) -> bool:
+        key = self._get_client_key(phone_number)
+        forget(self.redis_client, key)  # buffered writes of the document land first
+        for _attempt in range(attempts):
+            with self.redis_client.pipeline() as pipe:
+                try:
+                    pipe.watch(key)
+                    payload = pipe.get(key)
+                    data = _decode_field(payload) if payload else {}
+                    data = data if isinstance(data, dict) else {}
+                    if data.get(field):
+                        return False
+                    now = datetime.now().isoformat()
+                    data.update({field: value, 'phone_number': phone_number, 'last_updated': now})
+                    data.setdefault('created_at', now)
+                    pipe.multi()
+                    pipe.setex(key, self.expiration_seconds, codec.dumps(data))
+                    pipe.execute()
+                    return True
+                except redis.WatchError:
+                    # The document changed under us: look at it again.
+                    continue
+        return False
     
     def save_client_data(self, phone_number: str, data: Dict[str, Any]) -> bool:
         """Save complete client data."""
@@ -74,13 +191,23 @@ class ClientDataManager:
             data['phone_number'] = phone_number
             data['created_at'] = data.get('created_at', datetime.now().isoformat())
             data['last_updated'] = datetime.now().isoformat()
+
+            if self.uses_hash:
+                forget(self.redis_client, key)
+                pipe = self.redis_client.pipeline(transaction=True)
+                pipe.delete(key)
+                pipe.hset(key, mapping=self._encode(data))
+                pipe.expire(key, self.expiration_seconds)
+                pipe.execute()
+                return True
             
             # Store in Redis with expiration
-            expiration_seconds = self.expiration_days * 24 * 3600
-            self.redis_client.setex(
+            deferred_write(
+                self.redis_client,
+                "setex",
                 key, 
-                expiration_seconds, 
-                json.dumps(data, ensure_ascii=False)
+                self.expiration_seconds, 
+                codec.dumps(data)
             )
             
             return True
@@ -91,16 +218,18 @@ class ClientDataManager:
     
     def has_required_info(self, phone_number: str, required_fields: list) -> bool:
         """Check if client has all required information."""
-        client_data = self.get_client_data(phone_number)
-        
-        for field in required_fields:
-            if field not in client_data or not client_data[field]:
-                return False
-        
-        return True
+        return not self.get_missing_fields(phone_number, required_fields)
     
     def get_missing_fields(self, phone_number: str, required_fields: list) -> list:
         """Get list of missing required fields."""
+        if self.uses_hash and required_fields:
+            try:
+                values = self._hmget(self._get_client_key(phone_number), required_fields)
+                return [field for field, value in zip(required_fields, values) if not _decode_field(value)]
+            except Exception as e:
+                logger.error(f"Error checking client data for {phone_number}: {e}")
+                return list(required_fields)
+
         client_data = self.get_client_data(phone_number)
         missing_fields = []
         
@@ -114,11 +243,98 @@ class ClientDataManager:
         """Clear all data for a client."""
         try:
             key = self._get_client_key(phone_number)
-            self.redis_client.delete(key)
+            deferred_write(self.redis_client, "delete", key)
             return True
         except Exception as e:
             logger.error(f"Error clearing client data for {phone_number}: {e}")
             return False
+
+    # ------------------------------------------------------------------
+    # Hash storage
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _encode(fields: Dict[str, Any]) -> Dict[str, str]:
+        return {field: codec.dumps(value) for field, value in fields.items()}
+
+    def _get_hash(self, key: str) -> Dict[str, Any]:
+        try:
+            raw = cached_read(self.redis_client, "hgetall", key)
+        except redis.ResponseError as exc:
+            if not _is_wrong_type(exc):
+                raise
+            raw = self._migrate_to_hash(key)
+        return {
+            (field.decode('utf-8') if isinstance(field, bytes) else field): _decode_field(value)
+            for field, value in (raw or {}).items()
+        }
+
+    def _hmget(self, key: str, fields: Iterable[str]) -> list:
+        try:
+            return cached_read(self.redis_client, "hmget", key, list(fields))
+        except redis.ResponseError as exc:
+            if not _is_wrong_type(exc):
+                raise
+            raw = self._migrate_to_hash(key)
+            return [raw.get(field) for field in fields]
+
+    def _write_hash(self, phone_number: str, fields: Dict[str, Any], *, only_if_new: Optional[str] = None) -> bool:
+        """``HSET`` the given fields (plus bookkeeping) and refresh the TTL in one MULTI.
+
+        With ``only_if_new`` that field is written with ``HSETNX`` instead;
+        the return value then says whether it was set by this call.
+        """
+        key = self._get_client_key(phone_number)
+        now = datetime.now().isoformat()
+        encoded = self._encode(fields)
+        flag = (only_if_new, encoded.pop(only_if_new)) if only_if_new else None
+        mapping = {**encoded, **self._encode({'phone_number': phone_number, 'last_updated': now})}
+
+        def _execute() -> list:
+            pipe = self.redis_client.pipeline(transaction=True)
+            if flag:
+                pipe.hsetnx(key, *flag)
+            pipe.hset(key, mapping=mapping)
+            pipe.hsetnx(key, 'created_at', codec.dumps(now))
+            pipe.expire(key, self.expiration_seconds)
+            return pipe.execute()
+
+        forget(self.redis_client, key)
+        try:
+            results = _execute()
+        except redis.ResponseError as exc:
+            if not _is_wrong_type(exc):
+                raise
+            self._migrate_to_hash(key)
+            results = _execute()
+        return bool(results[0]) if flag else True
+
+    def _migrate_to_hash(self, key: str) -> Dict[str, str]:
+        """Convert a JSON document under ``key`` into a hash, keeping its TTL; returns the raw hash."""
+        forget(self.redis_client, key)
+        with self.redis_client.pipeline() as pipe:
+            try:
+                pipe.watch(key)
+                if pipe.type(key) in ("hash", b"hash"):
+                    pipe.unwatch()
+                    return self.redis_client.hgetall(key)
+                payload = pipe.get(key)
+                ttl = pipe.ttl(key)
+                try:
+                    document = codec.loads(payload) if payload else {}
+                except (TypeError, ValueError):
+                    document = {}
+                mapping = self._encode(document if isinstance(document, dict) else {})
+                pipe.multi()
+                pipe.delete(key)
+                if mapping:
+                    pipe.hset(key, mapping=mapping)
+                    pipe.expire(key, ttl if ttl and ttl > 0 else self.expiration_seconds)
+                pipe.execute()
+                logger.info(f"📦 Client data {key} migrated from JSON to hash ({len(mapping)} fields)")
+                return mapping
+            except redis.WatchError:
+                # Migrated (or rewritten) concurrently: read whatever is there now.
+                return self.redis_client.hgetall(key)
     
     def extract_info_from_message(self, message: str) -> Dict[str, str]:
         """Extract structured information from user message."""
@@ -0,0 +1,136 @@
+"""Token-budgeted conversation history for the chat-completions path.
+
+Bots without ``assistant_id`` resend their session history on every turn, so
+the history is bounded by an estimated token budget per model instead of a
+fixed message count. Turns that fall out of the window are folded into a
+rolling summary stored next to the session (``session:{bot}:{user}:summary``)
+and sent as a system message ahead of the kept turns.
+
+Token counts use ``tiktoken`` when installed; otherwise a conservative
+characters-per-token estimate, which is all a budget needs.
+"""
+from __future__ import annotations
+
+import functools
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+try:  # optional: exact counts for OpenAI models
+    import tiktoken
+except ImportError:  # pragma: no cover - depends on the deployment image
+    tiktoken = None
+
+SUMMARY_KEY_PATTERN = "session:{bot_id}:{user_number}:summary"
+
+# Role/formatting tokens the API adds around every message.
+_MESSAGE_OVERHEAD_TOKENS = 4
+# Without tiktoken: ~3 chars per token over-estimates Spanish text slightly.
+_CHARS_PER_TOKEN = 3
+# When the saved history overflows, trim down to this share of the budget so
+# the summary is refolded every few turns rather than on every turn.
+_COMPACT_TARGET_RATIO = 0.6
+
+logger = logging.getLogger(__name__)
+
+
+@functools.lru_cache(maxsize=16)
+def _encoding_for(model: Optional[str]):
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model or "")
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    if not text:
+        return 0
+    encoding = _encoding_for(model)
+    if encoding is None:
+        return len(text) // _CHARS_PER_TOKEN + 1
+    return len(encoding.encode(text))
+
+
+def message_tokens(message: Mapping[str, Any], model: Optional[str] = None) -> int:
+    return count_tokens(str(message.get("content") or ""), model) + _MESSAGE_OVERHEAD_TOKENS
+
+
+def history_token_budget(model: Optional[str], config: Mapping[str, Any]) -> int:
+    """CONTEXT_HISTORY_TOKEN_BUDGETS entry with the longest matching model prefix, else the default."""
+    budgets: Dict[str, int] = config.get("CONTEXT_HISTORY_TOKEN_BUDGETS") or {}
+    matches = [prefix for prefix in budgets if model and model.startswith(prefix)]
+    if matches:
+        return int(budgets[max(matches, key=len)])
+    return int(config.get("CONTEXT_HISTORY_TOKEN_BUDGET", 3000))
+
+
+@dataclass
+class ContextWindow:
+    model: Optional[str]
+    budget_tokens: int
+
+    @classmethod
+    def for_model(cls, model: Optional[str], config: Mapping[str, Any]) -> "ContextWindow":
+        return cls(model=model, budget_tokens=history_token_budget(model, config))
+
+    def fit(
+        self,
+        messages: List[Dict[str, Any]],
+        *,
+        budget_tokens: Optional[int] = None,
+        pin_system: bool = False,
+    ) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Split ``messages`` into ``(evicted, kept)``; ``kept`` is the newest suffix within budget.
+
+        The latest message is always kept. With ``pin_system`` system messages
+        (instructions, client state) are kept regardless and charged first.
+        A kept window never starts with an orphaned ``tool`` message.
+        """
+        budget = self.budget_tokens if budget_tokens is None else budget_tokens
+        pinned = {i for i, m in enumerate(messages) if pin_system and m.get("role") == "system"}
+        remaining = budget - sum(message_tokens(messages[i], self.model) for i in pinned)
+
+        start = len(messages)
+        for index in range(len(messages) - 1, -1, -1):
+            if index in pinned:
+                continue
+            cost = message_tokens(messages[index], self.model)
+            if cost > remaining and start < len(messages):
+                break
+            remaining -= cost
+            start = index
+        while start < len(messages) - 1 and messages[start].get("role") == "tool":
+            start += 1
+
+        evicted = [m for i, m in enumerate(messages) if i < start and i not in pinned]
+        kept = [m for i, m in enumerate(messages) if i >= start or i in pinned]
+        return evicted, kept
+
+    def compact(self, messages: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Like :meth:`fit` for persisting: once over budget, trim well below it."""
+        if sum(message_tokens(m, self.model) for m in messages) <= self.budget_tokens:
+            return [], list(messages)
+        evicted, kept = self.fit(messages, budget_tokens=int(self.budget_tokens * _COMPACT_TARGET_RATIO))
+        logger.info(
+            "🧮 History over %s tokens: folding %s messages into the summary, keeping %s",
+            self.budget_tokens, len(evicted), len(kept),
+        )
+        return evicted, kept
+
+
+def fallback_summary(summary: Optional[str], evicted: List[Dict[str, Any]], *, max_tokens: int, model: Optional[str] = None) -> str:
+    """Extractive summary used when no model is available to write one."""
+    lines = [summary] if summary else []
+    for message in evicted:
+        if message.get("role") not in ("user", "assistant") or not message.get("content"):
+            continue
+        speaker = "Cliente" if message["role"] == "user" else "Asistente"
+        lines.append(f"- {speaker}: {str(message['content'])[:200]}")
+    text = "\n".join(lines)
+    # Keep the most recent part when it grows past the summary budget.
+    while lines and count_tokens(text, model) > max_tokens:
+        lines.pop(0)
+        text = "\n".join(lines)
+    return text
@@ -0,0 +1,376 @@
+"""Per-conversation (bot, user) lock with fencing tokens and a FIFO wait queue.
+
+Turns of the same conversation run one at a time and in arrival order:
+
+* ``INCR`` on the fence key hands every message a monotonically increasing
+  token, which also orders the wait queue (a sorted set).
+* The queue head takes the lock with ``SET`` under ``WATCH``; everybody else
+  blocks on a pub/sub channel that the holder publishes to on release.
+* The wait is capped by the message's deadline (:mod:`app.utils.deadline`):
+  when the budget runs out first, :class:`LockWaitExpired` is raised rather
+  than running the turn unserialized long after the user gave up. The caller
+  then hands its message to the holder with :meth:`ConversationLock.defer`;
+  :meth:`ConversationLock.release` returns those messages so the holder can
+  schedule a turn for them (nothing the user wrote is dropped).
+* Writes done under the lock (e.g. the session history) go through
+  :meth:`ConversationLock.fenced_write`, which refuses to write once the
+  token no longer owns the lock (expired and taken over by a newer turn).
+"""
+from __future__ import annotations
+
+import logging
+import time
+from typing import Any, Callable, List, Optional
+
+import redis
+
+from ..utils.deadline import DeadlineExceeded, current_deadline
+
+LOCK_KEY = "lock:conv:{bot_id}:{user_number}"
+
+logger = logging.getLogger(__name__)
+
+
+class LockWaitExpired(DeadlineExceeded):
+    """The message deadline ran out while a previous turn still held the lock."""
+
+
+class _ConversationLockBase:
+    def __init__(
+        self,
+        redis_client,
+        *,
+        bot_id: str,
+        user_number: str,
+        ttl_seconds: int = 180,
+        wait_seconds: Optional[float] = None,
+    ) -> None:
+        self._redis = redis_client
+        self.ttl_seconds = ttl_seconds
+        # Waiting a bit longer than the TTL guarantees a crashed holder is outlived.
+        self.wait_seconds = wait_seconds if wait_seconds is not None else ttl_seconds + 30
+        base = LOCK_KEY.format(bot_id=bot_id, user_number=user_number)
+        self.lock_key = base
+        self.fence_key = f"{base}:fence"
+        self.queue_key = f"{base}:queue"
+        self.channel = f"{base}:released"
+        self.pending_key = f"{base}:pending"
+        self.token: Optional[int] = None
+
+    @classmethod
+    def for_conversation(cls, redis_client, *, bot_id: str, user_number: str):
+        from flask import current_app
+
+        ttl = int(current_app.config.get("CONVERSATION_LOCK_TTL_SECONDS", 180))
+        wait = current_app.config.get("CONVERSATION_LOCK_WAIT_SECONDS")
+        return cls(
+            redis_client,
+            bot_id=bot_id,
+            user_number=user_number,
+            ttl_seconds=ttl,
+            wait_seconds=float(wait) if wait is not None else None,
+        )
+
+    def _wait_budget(self) -> tuple[float, bool]:
+        """Seconds to wait for the lock, and whether the message deadline set them."""
+        deadline = current_deadline()
+        if deadline is not None and deadline.remaining() < self.wait_seconds:
+            return deadline.remaining(), True
+        return self.wait_seconds, False
+
+    def _give_up(self, token: int, by_deadline: bool) -> bool:
+        if by_deadline:
+            raise LockWaitExpired(f"deadline exceeded waiting for conversation lock {self.lock_key} (token={token})")
+        logger.warning("⏳ Timed out waiting for conversation lock %s (token=%s)", self.lock_key, token)
+        return False
+
+    def _waiter_key(self, token: Any) -> str:
+        return f"{self.lock_key}:waiter:{token}"
+
+    @staticmethod
+    def _decode(value: Any) -> Optional[str]:
+        if isinstance(value, bytes):
+            return value.decode("utf-8")
+        return value
+
+
+class ConversationLock(_ConversationLockBase):
+    # ------------------------------------------------------------------
+    # Acquire / release
+    # ------------------------------------------------------------------
+    def acquire(self) -> bool:
+        """Wait for our turn; False on timeout, :class:`DeadlineExceeded` if the message deadline ran out."""
+        token = int(self._redis.incr(self.fence_key))
+        waiter_ttl = int(self.wait_seconds) + 5
+        pipe = self._redis.pipeline(transaction=True)
+        pipe.zadd(self.queue_key, {str(token): token})
+        pipe.set(self._waiter_key(token), "1", ex=waiter_ttl)
+        pipe.expire(self.queue_key, waiter_ttl + self.ttl_seconds)
+        pipe.expire(self.fence_key, 7 * 24 * 3600)
+        pipe.execute()
+
+        pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(self.channel)  # subscribe before the first attempt: no missed wakeups
+        wait_seconds, by_deadline = self._wait_budget()
+        try:
+            deadline = time.monotonic() + wait_seconds
+            while True:
+                if self._try_acquire(token):
+                    self.token = token
+                    return True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                # Released holders publish; the 1s cap also catches holders whose TTL expired.
+                pubsub.get_message(timeout=min(remaining, 1.0))
+        finally:
+            pubsub.close()
+
+        self._leave_queue(token)
+        return self._give_up(token, by_deadline)
+
+    def release(self) -> List[str]:
+        """Free the lock; returns the messages deferred to this turn (see :meth:`defer`)."""
+        token, self.token = self.token, None
+        if token is None:
+            return []
+        with self._redis.pipeline() as pipe:
+            try:
+                pipe.watch(self.lock_key)
+                owner = self._decode(pipe.get(self.lock_key))
+                pipe.multi()
+                if owner == str(token):
+                    pipe.delete(self.lock_key)
+                pipe.publish(self.channel, str(token))
+                if owner in (None, str(token)):
+                    # Nobody else owns the conversation: the deferred messages are ours.
+                    pipe.lrange(self.pending_key, 0, -1)
+                    pipe.delete(self.pending_key)
+                    return [self._decode(message) for message in pipe.execute()[-2]]
+                pipe.execute()
+            except redis.WatchError:
+                # Lock changed hands after expiring; still wake the next waiter.
+                self._redis.publish(self.channel, str(token))
+        return []
+
+    def defer(self, message: str) -> bool:
+        """Leave ``message`` to the turn holding the lock; False when nobody holds it."""
+        for _attempt in range(5):
+            with self._redis.pipeline() as pipe:
+                try:
+                    # WATCH: a release between the check and the push would strand the message.
+                    pipe.watch(self.lock_key)
+                    if not pipe.exists(self.lock_key):
+                        return False
+                    pipe.multi()
+                    pipe.rpush(self.pending_key, message)
+                    pipe.expire(self.pending_key, self.ttl_seconds)
+                    pipe.execute()
+                    return True
+                except redis.WatchError:
+                    continue
+        return False
+
+    def is_held(self) -> bool:
+        return self.token is not None and self._decode(self._redis.get(self.lock_key)) == str(self.token)
+
+    def fenced_write(self, write: Callable[[Any], None]) -> bool:
+        """Queue ``write(pipe)`` in a MULTI that only commits while we still own the lock.
+
+        Without a token (lock not acquired) the write is applied unconditionally.
+        """
+        with self._redis.pipeline() as pipe:
+            try:
+                if self.token is not None:
+                    pipe.watch(self.lock_key)
+                    if self._decode(pipe.get(self.lock_key)) != str(self.token):
+                        return False
+                pipe.multi()
+                write(pipe)
+                pipe.execute()
+                return True
+            except redis.WatchError:
+                return False
+
+    def acquire_or_proceed(self) -> bool:
+        if self.acquire():
+            return True
+        # Never drop the user's message: run unserialized rather than not at all
+        # (a deadline that runs out while waiting raises LockWaitExpired instead).
+        logger.warning("⚠️ Proceeding without conversation lock for %s", self.lock_key)
+        return False
+
+    def __enter__(self) -> "ConversationLock":
+        self.acquire_or_proceed()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.release()
+
+    # ------------------------------------------------------------------
+    # Internal helpers
+    # ------------------------------------------------------------------
+    def _try_acquire(self, token: int, attempts: int = 5) -> bool:
+        for _attempt in range(attempts):
+            with self._redis.pipeline() as pipe:
+                try:
+                    pipe.watch(self.lock_key, self.queue_key)
+                    head = self._queue_head(pipe)
+                    if head is not None and head != str(token) and not pipe.exists(self._waiter_key(head)):
+                        # Waiter gave up or its process died: drop it and look again.
+                        self._redis.zrem(self.queue_key, head)
+                        continue
+                    if head != str(token) or pipe.exists(self.lock_key):
+                        return False
+                    pipe.multi()
+                    pipe.set(self.lock_key, str(token), ex=self.ttl_seconds)
+                    pipe.zrem(self.queue_key, str(token))
+                    pipe.delete(self._waiter_key(token))
+                    pipe.execute()
+                    return True
+                except redis.WatchError:
+                    # Queue changed under us (new arrival); look again right away.
+                    continue
+        return False
+
+    def _queue_head(self, pipe) -> Optional[str]:
+        head = pipe.zrange(self.queue_key, 0, 0)
+        return self._decode(head[0]) if head else None
+
+    def _leave_queue(self, token: int) -> None:
+        pipe = self._redis.pipeline(transaction=True)
+        pipe.zrem(self.queue_key, str(token))
+        pipe.delete(self._waiter_key(token))
+        pipe.publish(self.channel, str(token))
+        pipe.execute()
+
+
+class AsyncConversationLock(_ConversationLockBase):
+    """:class:`ConversationLock` for ``redis.asyncio`` clients (same keys, same protocol).
+
+    Waiting yields to the event loop, so the asyncio worker can keep hundreds
+    of conversations queued behind their previous turn in one process.
+    """
+
+    async def acquire(self) -> bool:
+        token = int(await self._redis.incr(self.fence_key))
+        waiter_ttl = int(self.wait_seconds) + 5
+        pipe = self._redis.pipeline(transaction=True)
+        pipe.zadd(self.queue_key, {str(token): token})
+        pipe.set(self._waiter_key(token), "1", ex=waiter_ttl)
+        pipe.expire(self.queue_key, waiter_ttl + self.ttl_seconds)
+        pipe.expire(self.fence_key, 7 * 24 * 3600)
+        await pipe.execute()
+
+        pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        await pubsub.subscribe(self.channel)
+        wait_seconds, by_deadline = self._wait_budget()
+        try:
+            deadline = time.monotonic() + wait_seconds
+            while True:
+                if await self._try_acquire(token):
+                    self.token = token
+                    return True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                await pubsub.get_message(timeout=min(remaining, 1.0))
+        finally:
+            await pubsub.aclose()
+
+        await self._leave_queue(token)
+        return self._give_up(token, by_deadline)
+
+    async def acquire_or_proceed(self) -> bool:
+        if await self.acquire():
+            return True
+        logger.warning("⚠️ Proceeding without conversation lock for %s", self.lock_key)
+        return False
+
+    async def release(self) -> List[str]:
+        token, self.token = self.token, None
+        if token is None:
+            return []
+        async with self._redis.pipeline() as pipe:
+            try:
+                await pipe.watch(self.lock_key)
+                owner = self._decode(await pipe.get(self.lock_key))
+                pipe.multi()
+                if owner == str(token):
+                    pipe.delete(self.lock_key)
+                pipe.publish(self.channel, str(token))
+                if owner in (None, str(token)):
+                    pipe.lrange(self.pending_key, 0, -1)
+                    pipe.delete(self.pending_key)
+                    return [self._decode(message) for message in (await pipe.execute())[-2]]
+                await pipe.execute()
+            except redis.WatchError:
+                await self._redis.publish(self.channel, str(token))
+        return []
+
+    async def defer(self, message: str) -> bool:
+        for _attempt in range(5):
+            async with self._redis.pipeline() as pipe:
+                try:
+                    await pipe.watch(self.lock_key)
+                    if not await pipe.exists(self.lock_key):
+                        return False
+                    pipe.multi()
+                    pipe.rpush(self.pending_key, message)
+                    pipe.expire(self.pending_key, self.ttl_seconds)
+                    await pipe.execute()
+                    return True
+                except redis.WatchError:
+                    continue
+        return False
+
+    async def fenced_write(self, write: Callable[[Any], None]) -> bool:
+        """Same contract as :meth:`ConversationLock.fenced_write` (``write`` queues on the pipeline)."""
+        async with self._redis.pipeline() as pipe:
+            try:
+                if self.token is not None:
+                    await pipe.watch(self.lock_key)
+                    if self._decode(await pipe.get(self.lock_key)) != str(self.token):
+                        return False
+                pipe.multi()
+                write(pipe)
+                await pipe.execute()
+                return True
+            except redis.WatchError:
+                return False
+
+    async def __aenter__(self) -> "AsyncConversationLock":
+        await self.acquire_or_proceed()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.release()
+
+    async def _try_acquire(self, token: int, attempts: int = 5) -> bool:
+        for _attempt in range(attempts):
+            async with self._redis.pipeline() as pipe:
+                try:
+                    await pipe.watch(self.lock_key, self.queue_key)
+                    head = await pipe.zrange(self.queue_key, 0, 0)
+                    head = self._decode(head[0]) if head else None
+                    if head is not None and head != str(token) and not await pipe.exists(self._waiter_key(head)):
+                        await self._redis.zrem(self.queue_key, head)
+                        continue
+                    if head != str(token) or await pipe.exists(self.lock_key):
+                        return False
+                    pipe.multi()
+                    pipe.set(self.lock_key, str(token), ex=self.ttl_seconds)
+                    pipe.zrem(self.queue_key, str(token))
+                    pipe.delete(self._waiter_key(token))
+                    await pipe.execute()
+                    return True
+                except redis.WatchError:
+                    continue
+        return False
+
+    async def _leave_queue(self, token: int) -> None:
+        pipe = self._redis.pipeline(transaction=True)
+        pipe.zrem(self.queue_key, str(token))
+        pipe.delete(self._waiter_key(token))
+        pipe.publish(self.channel, str(token))
+        await pipe.execute()
@@ -3,8 +3,11 @@ from __future__ import annotations
 
 import json
 import logging
-from typing import Any, Dict, Iterable, List, Optional
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
+import redis
 import requests
 from flask import current_app
 from sqlalchemy import text
@@ -14,19 +17,41 @@ from ..extensions import redis_extension
 from ..repositories import BotRepository
 from ..extensions import db_extension
 from ..repositories.sql_bot_repository import SQLBotRepository
+from ..utils.concurrency import TaskGraph, submit, submit_detached
+from ..utils.deadline import Deadline, DeadlineExceeded, budget_timeout, deadline_scope, raise_if_expired
+from ..utils.unit_of_work import RedisUnitOfWork, cached_read, redis_unit_of_work
+from .answer_cache import AnswerCache, answer_cache_enabled
+from .burst_coalescer import BurstCoalescer, resolve_debounce_ms
 from .horizon_config_loader import HorizonConfigLoader
 from .horizon_service import HorizonService
 from .client_data_service import ClientDataManager
-from .custom_functions_service import CustomFunctionsService
+from .context_window import SUMMARY_KEY_PATTERN, ContextWindow, fallback_summary
+from .conversation_lock import ConversationLock, LockWaitExpired
+from .custom_functions_service import CustomFunctionsService, lead_cache_keys
+from .inbound_queue_service import InboundMessage, InboundQueueService
 from .openai_service import (
     AssistantFunctionCall,
     AssistantResponse,
     OpenAIAssistantService,
     ToolResult,
+    uses_responses_backend,
 )
-
-SESSION_KEY_PATTERN = "session:{bot_id}:{user_number}"
-MAX_HISTORY_MESSAGES = 20
+from .session_store import MAX_HISTORY_MESSAGES, SESSION_KEY_PATTERN, SessionStore
+# Cached CRM control mode ("human" | "bot") per tenant and customer phone.
+HANDOFF_STATUS_KEY = "handoff:{tenant_id}:{user_number}"
+CLIENT_STATE_PREFIX = "ESTADO ACTUAL DEL CLIENTE:"
+# Sent when the message's time budget runs out before the model answered.
+DEADLINE_FALLBACK_REPLY = (
+    "Estoy tardando más de lo normal en responder. Por favor, escríbeme de nuevo en un momento."
+)
+# Sent when tool calls came back from a run/response without usable call ids.
+MISSING_TOOL_OUTPUTS_REPLY = "Lo siento, hubo un error procesando las acciones."
+# How the model continues after a tool step (see _tool_continuation).
+CONTINUE_RUN = "run"
+CONTINUE_RESPONSE = "response"
+CONTINUE_CHAT = "chat"
+CONTINUE_SUMMARY = "summary"
+CONTINUE_NONE = "none"
 
 logger = logging.getLogger(__name__)
 
@@ -39,7 +64,20 @@ def handle_incoming_message(
     repository: Optional[BotRepository] = None,
     openai_service: Optional[OpenAIAssistantService] = None,
     horizon_service: Optional[HorizonService] = None,
-) -> str:
+    deadline: Optional[Deadline] = None,
+    handoff: Optional[Future] = None,
+) -> Optional[str]:
+    """Run one conversation turn and return the reply text.
+
+    ``deadline`` bounds the whole turn (see :mod:`app.utils.deadline`); without
+    one the enclosing deadline, if any, applies. ``handoff`` is a pending
+    :func:`start_handoff_check`: it is awaited alongside the pre-LLM I/O and,
+    when a human agent has control, the turn stops there and returns None
+    (the caller records the inbound message). When the deadline runs out
+    while a previous turn of the same user holds the lock, the message is
+    handed to that turn (:func:`defer_behind_lock`) and ``""`` is returned:
+    nothing to answer now, the reply follows out-of-band.
+    """
     logger.info(f"🎯 handle_incoming_message called:")
     logger.info(f"   bot_id: {bot_id}")
     logger.info(f"   user_number: {user_number}")
@@ -50,8 +88,149 @@ def handle_incoming_message(
     if not message:
         raise BadRequest("Message body is required")
 
-    repository = repository or BotRepository(redis_extension.client)
-    
+    with deadline_scope(deadline), redis_unit_of_work(
+        redis_extension.client, enabled=current_app.config.get("REDIS_UNIT_OF_WORK_ENABLED", True), label=f"turno {user_number}"
+    ) as unit:
+        repository = repository or BotRepository(redis_extension.client)
+        openai_service = openai_service or current_app.extensions["openai_service"]
+        lock = ConversationLock.for_conversation(redis_extension.client, bot_id=bot_id, user_number=user_number)
+
+        # Independent pre-LLM I/O runs concurrently; only real dependencies wait.
+        # The conversation lock (one turn per user, in order) is taken in parallel
+        # with the bot lookup, so waiting behind a previous turn overlaps with it.
+        # Once both are in, everything the turn reads comes in one pipeline; the
+        # SQL enrichment and the CRM handoff check run alongside all of it.
+        graph = TaskGraph()
+        graph.add("bot", lambda _results: _resolve_bot(bot_id, repository))
+        graph.add("enriched_bot", lambda results: _enrich_bot_from_sql(bot_id, results["bot"], repository), after=("bot",))
+        graph.add(
+            "lock",
+            lambda _results: lock.acquire_or_proceed(),
+            inline=True,  # may wait for the previous turn: don't park a pool thread on it
+        )
+        if handoff is not None:
+            graph.add("handoff", lambda _results: handoff.result(), inline=True)
+        graph.add(
+            "prefetch",
+            # Keys only depend on the cached snapshot; anything the enrichment adds is read on demand.
+            lambda results: _prefetch_turn(unit, results["bot"], bot_id, user_number),
+            after=("bot", "lock"),
+        )
+        # Extraction writes client data: never for a message a human agent is handling.
+        graph.add(
+            "client_data",
+            lambda results: None if results.get("handoff") else _refresh_client_data(bot_id, user_number, message),
+            after=("prefetch", "handoff") if handoff is not None else ("prefetch",),
+        )
+        graph.add(
+            "conversation",
+            lambda _results: _load_conversation(bot_id=bot_id, user_number=user_number),
+            after=("prefetch",),
+        )
+        try:
+            try:
+                results = graph.run()
+            except LockWaitExpired as exc:
+                logger.warning("⏳ %s — el turno en curso se hará cargo del mensaje de %s", exc, user_number)
+                defer_behind_lock(lock, bot_id=bot_id, user_number=user_number, message=message)
+                return ""
+            if results.get("handoff"):
+                logger.info("🛑 Human control active — bot skipping reply for %s", user_number)
+                return None
+            bot = results["enriched_bot"]
+            client_data_manager, client_data = results["client_data"]
+            conversation = results["conversation"]
+            loaded = len(conversation)
+            history_summary = None if _has_server_side_context(bot) else _load_history_summary(bot_id=bot_id, user_number=user_number)
+
+            _try_auto_dispatch_lead_notification(
+                bot=bot,
+                user_number=user_number,
+                client_data_manager=client_data_manager,
+                client_data=client_data,
+            )
+
+            answer_cache = (
+                AnswerCache.for_bot(redis_extension.client, bot)
+                if _answer_cache_applies(bot, conversation, history_summary, client_data)
+                else None
+            )
+            conversation.append({"role": "user", "content": message})
+            cached = answer_cache.lookup(message) if answer_cache else None
+            if cached is not None:
+                reply_text = cached.answer
+                openai_service.append_exchange(bot=bot, user_phone=user_number, question=message, answer=reply_text)
+            else:
+                try:
+                    reply_text = _generate_turn_reply(
+                        bot=bot,
+                        user_number=user_number,
+                        conversation=conversation,
+                        client_data=client_data,
+                        openai_service=openai_service,
+                        horizon_service=horizon_service,
+                        history_summary=history_summary,
+                        answer_cache=answer_cache,
+                    )
+                except DeadlineExceeded as exc:
+                    # The run (if any) was cancelled; answer now instead of pinning the worker.
+                    logger.warning("⏱️ Deadline agotado para %s: %s — enviando respuesta de respaldo", user_number, exc)
+                    reply_text = DEADLINE_FALLBACK_REPLY
+            conversation.append({"role": "assistant", "content": reply_text})
+            session, evicted = _session_payload(bot=bot, conversation=conversation, summary=history_summary)
+            if _save_conversation(
+                bot_id=bot_id, user_number=user_number, lock=lock, appended=len(conversation) - loaded, **session
+            ) and evicted:
+                fold_summary_later(
+                    bot=bot, user_number=user_number, summary=history_summary, evicted=evicted,
+                    provisional=session["summary"], openai_service=openai_service,
+                )
+            _sync_lead_flow_history(bot=bot, user_number=user_number, conversation=conversation)
+        finally:
+            # Buffered writes land before the next turn of this user can start.
+            unit.flush()
+            deferred = lock.release()
+            if deferred:
+                dispatch_deferred_messages(bot_id=bot_id, user_number=user_number, messages=deferred)
+
+    return reply_text
+
+
+def defer_behind_lock(lock, *, bot_id: str, user_number: str, message: str) -> None:
+    """Hand a message whose lock wait ran out to the turn holding the lock.
+
+    The holder gets it back from ``lock.release()``; if the lock was freed in
+    the meantime nobody would, so the message is dispatched right away.
+    """
+    if not lock.defer(message):
+        dispatch_deferred_messages(bot_id=bot_id, user_number=user_number, messages=[message])
+
+
+def dispatch_deferred_messages(*, bot_id: str, user_number: str, messages: List[str]) -> None:
+    """Run one more turn for messages deferred behind the lock; its reply goes out over REST.
+
+    With ``WEBHOOK_ASYNC_MODE`` the turn goes to the inbound stream (the
+    workers keep the per-user order through the lock); otherwise it runs in
+    the background as :func:`process_queued_message`.
+    """
+    message = InboundMessage(bot_id=bot_id, user_number=user_number, body="\n".join(messages))
+    logger.info("📥 %d deferred message(s) from %s get their own turn", len(messages), user_number)
+    if current_app.config.get("WEBHOOK_ASYNC_MODE"):
+        InboundQueueService.from_config(redis_extension.client, current_app.config).enqueue(message)
+        return
+    submit_detached(_process_deferred_message, current_app._get_current_object(), message)
+
+
+def _process_deferred_message(app, message: InboundMessage) -> None:
+    with app.app_context():
+        try:
+            process_queued_message(message)
+        except Exception as exc:  # pragma: no cover - background turn: nobody to raise to
+            logger.error("❌ Deferred turn for %s failed: %s", message.user_number, exc, exc_info=True)
+
+
+def _resolve_bot(bot_id: str, repository: BotRepository) -> Dict[str, Any]:
+    """Bot config from Redis, then SQL, then Horizon; NotFound if none has it."""
     bot = repository.get_bot(bot_id)
     # Fallback tier 2: SQL database
     if not bot:
@@ -70,6 +249,7 @@ def handle_incoming_message(
                     "assistant_functions": bot.get("assistant_functions") or [],
                     "horizon_actions": bot.get("horizon_actions") or [],
                     "twilio_phone_number": bot.get("twilio_phone_number"),
+                    "openai_api_key": bot.get("openai_api_key"),
                 })
         except Exception:  # pragma: no cover
             pass
@@ -105,6 +285,10 @@ def handle_incoming_message(
     if not bot:
         raise NotFound(f"Bot '{bot_id}' not found")
 
+    return bot
+
+
+def _enrich_bot_from_sql(bot_id: str, bot: Dict[str, Any], repository: BotRepository) -> Dict[str, Any]:
     # Enrich Redis snapshot with SQL source-of-truth when key fields are missing
     # or when WhatsApp routing metadata is incomplete in Redis cache.
     bot_metadata = bot.get("metadata") if isinstance(bot.get("metadata"), dict) else {}
@@ -117,27 +301,72 @@ def handle_incoming_message(
         or not bot.get("metadata")
         or not bot.get("twilio_account_sid")
         or missing_notification_routing
+        # Snapshots cached before per-bot OpenAI keys were carried over.
+        or "openai_api_key" not in bot
     )
-    if needs_enrichment:
-        try:
-            engine = db_extension.engine
-            sql_repo = SQLBotRepository(engine)
-            sql_bot = sql_repo.get(bot_id)
-            if sql_bot:
-                sql_metadata = sql_bot.get("metadata") if isinstance(sql_bot.get("metadata"), dict) else {}
-                enriched_updates = {
-                    "client_id": sql_bot.get("client_id"),
-                    "metadata": sql_metadata or bot_metadata,
-                    "twilio_account_sid": sql_bot.get("twilio_account_sid") or bot.get("twilio_account_sid"),
-                    "twilio_messaging_service_sid": sql_bot.get("twilio_messaging_service_sid") or bot.get("twilio_messaging_service_sid"),
-                }
-                updated = repository.update_bot(bot_id, enriched_updates)
-                if updated:
-                    bot = updated
-                    logger.info("🔄 Bot enriched from SQL: client_id=%s", bot.get("client_id"))
-        except Exception:
-            pass
+    if not needs_enrichment:
+        return bot
+
+    # Many bots simply have nothing more in SQL: the stamp of the last
+    # enrichment (kept beside the bot, not in it) doubles as a negative cache
+    # until the TTL runs out.
+    try:
+        engine = db_extension.engine
+    except RuntimeError:
+        return bot  # no SQL database configured
+    ttl = float(current_app.config.get("BOT_SQL_ENRICHMENT_TTL_SECONDS", 300))
+    now = time.time()
+    try:
+        stamp = repository.get_sql_enrichment(bot_id) if ttl > 0 else None
+        if stamp and now - float(stamp.get("checked_at") or 0) < ttl:
+            return bot
+
+        sql_repo = SQLBotRepository(engine)
+        if stamp:
+            updated_at = _sql_timestamp(sql_repo.get_updated_at(bot_id))
+            if updated_at == stamp.get("updated_at"):
+                # Row unchanged since the last enrichment: only renew the stamp.
+                logger.debug("⏭️ SQL row of bot %s unchanged, enrichment skipped", bot_id)
+                repository.set_sql_enrichment(bot_id, {"checked_at": now, "updated_at": updated_at})
+                return bot
+        sql_bot = sql_repo.get(bot_id)
+        if sql_bot:
+            sql_metadata = sql_bot.get("metadata") if isinstance(sql_bot.get("metadata"), dict) else {}
+            enriched_updates = {
+                "client_id": sql_bot.get("client_id"),
+                "metadata": sql_metadata or bot_metadata,
+                "twilio_account_sid": sql_bot.get("twilio_account_sid") or bot.get("twilio_account_sid"),
+                "twilio_messaging_service_sid": sql_bot.get("twilio_messaging_service_sid") or bot.get("twilio_messaging_service_sid"),
+                "openai_api_key": sql_bot.get("openai_api_key") or bot.get("openai_api_key"),
+            }
+            # Only a real change rewrites (and re-versions) the bot.
+            changed = {
+                field: value for field, value in enriched_updates.items()
+                if value is not None and (field not in bot or bot.get(field) != value)
+            }
+            updated = repository.update_bot(bot_id, changed) if changed else None
+            if updated:
+                bot = updated
+                logger.info("🔄 Bot enriched from SQL: client_id=%s", bot.get("client_id"))
+        if ttl > 0:
+            repository.set_sql_enrichment(bot_id, {
+                "checked_at": now,
+                "updated_at": _sql_timestamp(sql_bot.get("updated_at")) if sql_bot else None,
+            })
+    except Exception as exc:
+        logger.warning("⚠️ SQL enrichment of bot %s failed: %s", bot_id, exc)
+
+    return bot
 
+
+def _sql_timestamp(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    return value.isoformat() if hasattr(value, "isoformat") else str(value)
+
+
+def _refresh_client_data(bot_id: str, user_number: str, message: str):
+    """Extract slots from ``message`` into the client data store and read it back."""
     # Initialize client data manager (namespaced per bot)
     logger.info(f"🗃️ Initializing client data manager...")
     client_data_manager = ClientDataManager(redis_extension.client, namespace=bot_id)
@@ -147,25 +376,169 @@ def handle_incoming_message(
     extracted_info = client_data_manager.extract_info_from_message(message)
     logger.info(f"   Extracted: {extracted_info}")
     
-    # Update client data with any extracted information
-    for field, value in extracted_info.items():
-        logger.info(f"   Updating {field}: {value}")
-        client_data_manager.update_client_data(user_number, field, value)
+    # Update client data with any extracted information (one write for all fields)
+    if extracted_info:
+        logger.info(f"   Updating {sorted(extracted_info)}")
+        client_data_manager.update_client_fields(user_number, extracted_info)
     
     # Get current client data
     client_data = client_data_manager.get_client_data(user_number)
     logger.info(f"💾 Current client data: {client_data}")
 
-    _try_auto_dispatch_lead_notification(
+    return client_data_manager, client_data
+
+
+def _prefetch_turn(
+    unit: RedisUnitOfWork, bot: Dict[str, Any], bot_id: str, user_number: str, *, for_async: bool = False
+) -> None:
+    """Read the turn's session, client data, lead ids, tenant credentials and thread in one round trip.
+
+    ``for_async`` leaves out the keys the async service reads with its own client.
+    """
+    client_data = ClientDataManager(unit, namespace=bot_id)
+    gets = lead_cache_keys(user_number)
+    hashes = [f"tenant:twilio:{tenant_id}" for tenant_id in _tenant_candidates(bot)]
+    (hashes if client_data.uses_hash else gets).append(client_data._get_client_key(user_number))
+    lists = []
+    if not for_async:
+        gets.append(SUMMARY_KEY_PATTERN.format(bot_id=bot_id, user_number=user_number))
+        lists.append((SESSION_KEY_PATTERN.format(bot_id=bot_id, user_number=user_number), 0, -1))
+        if bot.get("assistant_id"):
+            thread_key = f"thread:{bot['assistant_id']}:{user_number}"
+            gets += [thread_key, f"{thread_key}:verified"]
+    unit.prefetch(
+        get=gets,
+        hgetall=hashes,
+        lrange=lists,
+    )
+
+
+def _generate_turn_reply(
+    *,
+    bot: Dict[str, Any],
+    user_number: str,
+    conversation: List[Dict[str, str]],
+    client_data: Optional[Dict[str, Any]],
+    openai_service: OpenAIAssistantService,
+    horizon_service: Optional[HorizonService],
+    history_summary: Optional[str] = None,
+    answer_cache: Optional[AnswerCache] = None,
+) -> str:
+    """Ask the model for the next reply, running any requested tools.
+
+    With ``answer_cache`` a plain model answer (no tools, no error) is stored for
+    similar first-turn questions.
+    """
+    started = time.monotonic()
+    client_state = _client_state_message(client_data)
+
+    assistant_response = openai_service.generate_reply(
         bot=bot,
-        user_number=user_number,
-        client_data_manager=client_data_manager,
-        client_data=client_data,
+        conversation=conversation,
+        tool_definitions=bot.get("assistant_functions"),
+        user_phone=user_number,
+        history_summary=history_summary,
+        client_state=client_state,
+    )
+
+    tool_results: List[ToolResult] = []
+    if assistant_response.function_calls:
+        horizon_service = horizon_service or current_app.extensions["horizon_service"]
+        try:
+            tool_results = _execute_tool_calls(
+                bot=bot,
+                horizon_service=horizon_service,
+                defined_actions=bot.get("horizon_actions", []),
+                function_calls=assistant_response.function_calls,
+                user_number=user_number,
+                conversation=conversation,
+            )
+        except DeadlineExceeded:
+            if assistant_response.thread_id and assistant_response.run_id:
+                openai_service.cancel_run(assistant_response.thread_id, assistant_response.run_id, bot=bot)
+            raise
+        
+        # Define executor for subsequent tool calls if the model asks again
+        def _on_tool_calls(calls: List[AssistantFunctionCall]) -> List[ToolResult]:
+            return _execute_tool_calls(
+                bot=bot,
+                horizon_service=horizon_service,
+                defined_actions=bot.get("horizon_actions", []),
+                function_calls=calls,
+                user_number=user_number,
+                conversation=conversation,
+            )
+
+        continuation, tool_outputs = _tool_continuation(assistant_response, tool_results)
+        if continuation == CONTINUE_RUN:
+            # Assistants: submit the outputs to the run (supports multi-round tools)
+            reply_text = openai_service.submit_tool_outputs_and_wait(
+                thread_id=assistant_response.thread_id,
+                run_id=assistant_response.run_id,
+                tool_outputs=tool_outputs,
+                on_tool_calls=_on_tool_calls,
+                bot=bot,
+            )
+        elif continuation == CONTINUE_RESPONSE:
+            # Responses backend: chain the tool outputs onto the pending response
+            reply_text = openai_service.submit_response_tool_outputs(
+                bot=bot,
+                user_phone=user_number,
+                response_id=assistant_response.response_id,
+                tool_outputs=tool_outputs,
+                on_tool_calls=_on_tool_calls,
+            )
+        elif continuation == CONTINUE_CHAT:
+            # Chat completions: continue the same completion with the matching tool messages
+            reply_text = openai_service.submit_chat_tool_outputs(
+                bot=bot,
+                messages=assistant_response.chat_messages,
+                tool_outputs=tool_outputs,
+                tool_definitions=bot.get("assistant_functions"),
+                on_tool_calls=_on_tool_calls,
+            )
+        elif continuation == CONTINUE_SUMMARY:
+            # No continuation state (e.g. tool calls without ids): summarize in a second request
+            _append_tool_results(conversation, tool_results)
+            reply_text = openai_service.summarize_tool_results(
+                bot=bot,
+                conversation=conversation,
+                tool_results=tool_results,
+                history_summary=history_summary,
+                client_state=client_state,
+            )
+        else:
+            reply_text = MISSING_TOOL_OUTPUTS_REPLY
+    else:
+        reply_text = assistant_response.reply_text
+        if answer_cache is not None and not assistant_response.failed:
+            elapsed_ms = int((time.monotonic() - started) * 1000)
+            answer_cache.store(conversation[-1]["content"], reply_text, elapsed_ms=elapsed_ms)
+
+    return reply_text
+
+
+def _answer_cache_applies(
+    bot: Dict[str, Any],
+    conversation: List[Dict[str, str]],
+    history_summary: Optional[str],
+    client_data: Optional[Dict[str, Any]],
+) -> bool:
+    """Cached answers only fit stateless turns: opted-in bot, first turn, nothing known about the client."""
+    return (
+        answer_cache_enabled(bot)
+        and not conversation
+        and not history_summary
+        and _client_state_message(client_data) is None
     )
 
-    conversation = _load_conversation(bot_id=bot_id, user_number=user_number)
-    conversation.append({"role": "user", "content": message})
 
+def _client_state_message(client_data: Optional[Dict[str, Any]]) -> Optional[str]:
+    """Per-turn "ESTADO ACTUAL DEL CLIENTE" note (slots), or None when nothing is known.
+
+    It changes every turn, so it is sent after the history (see
+    ``OpenAIAssistantService._build_messages``) and never stored in the session.
+    """
     # Construir mensaje de estado actualizado (slots) como mensaje de sistema adicional
     client_info = []
     if client_data:
@@ -182,116 +555,292 @@ def handle_incoming_message(
         if client_data.get('comuna'):
             client_info.append(f"Comuna: {client_data['comuna']}")
 
-    # Mensaje de sistema con slots actuales
-    if client_info:
-        estado_slots = "\n".join(client_info)
-        system_state_msg = {
-            "role": "system",
-            "content": f"ESTADO ACTUAL DEL CLIENTE:\n{estado_slots}\n\nNO preguntes por información que ya tienes. Usa esta información para ayudar mejor al cliente."
-        }
-        # Insertar el mensaje de estado al inicio de la conversación (después del system original si existe)
-        if conversation and conversation[0]["role"] == "system":
-            conversation.insert(1, system_state_msg)
-        else:
-            conversation.insert(0, system_state_msg)
+    if not client_info:
+        return None
+    estado_slots = "\n".join(client_info)
+    return f"{CLIENT_STATE_PREFIX}\n{estado_slots}\n\nNO preguntes por información que ya tienes. Usa esta información para ayudar mejor al cliente."
 
-    openai_service = openai_service or current_app.extensions["openai_service"]
-    assistant_response = openai_service.generate_reply(
-        bot=bot,
-        conversation=conversation,
-        tool_definitions=bot.get("assistant_functions"),
-        user_phone=user_number,
+
+def _without_client_state(messages: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    # Sessions saved before the state note moved out of the history still carry copies of it.
+    return [
+        m for m in messages
+        if not (m.get("role") == "system" and str(m.get("content", "")).startswith(CLIENT_STATE_PREFIX))
+    ]
+
+
+def _tool_continuation(
+    assistant_response: AssistantResponse, tool_results: List[ToolResult]
+) -> Tuple[str, List[Dict[str, Any]]]:
+    """How the model picks up the step's tool results, and the outputs to send.
+
+    One of the ``CONTINUE_*`` values: the pending assistant run, the pending
+    Responses response, the same chat completion, a second summarizing
+    request when there is no continuation state, or ``CONTINUE_NONE`` when a
+    run or response is pending but no output could be paired with a call id.
+    """
+    tool_outputs = _tool_outputs_for(assistant_response, tool_results)
+    if assistant_response.thread_id and assistant_response.run_id:
+        return (CONTINUE_RUN if tool_outputs else CONTINUE_NONE), tool_outputs
+    if assistant_response.response_id:
+        return (CONTINUE_RESPONSE if tool_outputs else CONTINUE_NONE), tool_outputs
+    if assistant_response.chat_messages:
+        return CONTINUE_CHAT, tool_outputs
+    return CONTINUE_SUMMARY, tool_outputs
+
+
+def _append_tool_results(conversation: List[Dict[str, Any]], tool_results: List[ToolResult]) -> None:
+    conversation.extend(
+        {"role": "tool", "name": result.name, "content": result.content}
+        for result in tool_results
     )
 
-    tool_results: List[ToolResult] = []
-    if assistant_response.function_calls:
-        horizon_service = horizon_service or current_app.extensions["horizon_service"]
-        tool_results = _execute_tool_calls(
-            bot=bot,
-            horizon_service=horizon_service,
-            defined_actions=bot.get("horizon_actions", []),
-            function_calls=assistant_response.function_calls,
+
+def _tool_outputs_for(assistant_response: AssistantResponse, tool_results: List[ToolResult]) -> List[Dict[str, Any]]:
+    """Pair tool results with the run's tool_call ids (results without an id are dropped)."""
+    tool_outputs = []
+    for i, result in enumerate(tool_results):
+        tool_output = {
+            "tool_call_id": assistant_response.tool_call_ids[i] if assistant_response.tool_call_ids and i < len(assistant_response.tool_call_ids) else None,
+            "output": result.content
+        }
+        if tool_output["tool_call_id"]:
+            tool_outputs.append(tool_output)
+    return tool_outputs
+
+
+def process_queued_message(message: InboundMessage) -> Optional[str]:
+    """Run a stream-queued inbound message end to end and deliver the reply.
+
+    Counterpart of the synchronous webhook path: the handoff check, the
+    conversation and the Twilio send all happen here, outside the HTTP request.
+    """
+    repository = BotRepository(redis_extension.client)
+    bot = repository.get_bot(message.bot_id)
+    if not bot:
+        logger.error("❌ Queued message %s references unknown bot %s", message.entry_id, message.bot_id)
+        return None
+
+    user_number = message.user_number or "unknown"
+    with deadline_scope(inbound_deadline(message)), redis_unit_of_work(
+        redis_extension.client, enabled=current_app.config.get("REDIS_UNIT_OF_WORK_ENABLED", True), label="cola"
+    ):
+        handoff = start_handoff_check(bot, user_number)
+        body = BurstCoalescer(redis_extension.client).collect(
+            bot_id=bot["id"],
             user_number=user_number,
-            conversation=conversation,
+            message=message.body,
+            window_ms=resolve_debounce_ms(bot),
         )
-        
-        # If using assistants (thread_id and run_id present), submit tool outputs
-        if assistant_response.thread_id and assistant_response.run_id:
-            # Prepare tool outputs for submission
-            tool_outputs = []
-            for i, result in enumerate(tool_results):
-                tool_output = {
-                    "tool_call_id": assistant_response.tool_call_ids[i] if assistant_response.tool_call_ids and i < len(assistant_response.tool_call_ids) else None,
-                    "output": result.content
-                }
-                if tool_output["tool_call_id"]:
-                    tool_outputs.append(tool_output)
-            
-            # Define executor for subsequent tool calls if the run asks again
-            def _on_tool_calls(calls: List[AssistantFunctionCall]) -> List[ToolResult]:
-                return _execute_tool_calls(
-                    bot=bot,
-                    horizon_service=horizon_service,
-                    defined_actions=bot.get("horizon_actions", []),
-                    function_calls=calls,
-                    user_number=user_number,
-                    conversation=conversation,
-                )
+        if body is None:
+            if handoff.result():
+                record_inbound_during_handoff(bot, user_number=user_number, message=message.body)
+            return None
 
-            # Submit tool outputs and get final response (supports multi-round tools)
-            if tool_outputs:
-                reply_text = openai_service.submit_tool_outputs_and_wait(
-                    thread_id=assistant_response.thread_id,
-                    run_id=assistant_response.run_id,
-                    tool_outputs=tool_outputs,
-                    on_tool_calls=_on_tool_calls,
-                )
-            else:
-                reply_text = "Lo siento, hubo un error procesando las acciones."
-        else:
-            # Using chat completions (not assistant), use old flow
-            conversation.extend(
-                {"role": "tool", "name": result.name, "content": result.content}
-                for result in tool_results
-            )
-            reply_text = openai_service.summarize_tool_results(
-                bot=bot,
-                conversation=conversation,
-                tool_results=tool_results,
+        try:
+            reply_text = handle_incoming_message(
+                bot_id=bot["id"],
+                user_number=user_number,
+                message=body,
+                repository=repository,
+                handoff=handoff,
             )
-    else:
-        reply_text = assistant_response.reply_text
+            if reply_text is None:
+                logger.info("🛑 Human control active — recording queued inbound for %s", user_number)
+                record_inbound_during_handoff(bot, user_number=user_number, message=message.body)
+                return None
+        except DeadlineExceeded as exc:
+            logger.warning("⏱️ Deadline agotado antes de responder a %s: %s", user_number, exc)
+            reply_text = DEADLINE_FALLBACK_REPLY
+        except Exception as exc:
+            logger.error("❌ Error generating queued response: %s", exc, exc_info=True)
+            reply_text = "Lo siento, hubo un error al procesar tu mensaje."
+
+        _send_reply(bot=bot, user_number=user_number, body=reply_text)
+    return reply_text
 
-    conversation.append({"role": "assistant", "content": reply_text})
-    _save_conversation(bot_id=bot_id, user_number=user_number, conversation=conversation)
-    _sync_lead_flow_history(bot=bot, user_number=user_number, conversation=conversation)
 
-    return reply_text
+def inbound_deadline(message: InboundMessage) -> Deadline:
+    """Budget of a queued message, counted from when the webhook enqueued it."""
+    return Deadline.since(message.received_at, float(current_app.config.get("INBOUND_DEADLINE_SECONDS", 45)))
 
 
-def _load_conversation(*, bot_id: str, user_number: str) -> List[Dict[str, str]]:
-    redis_client = redis_extension.client
-    key = SESSION_KEY_PATTERN.format(bot_id=bot_id, user_number=user_number)
-    payload = redis_client.get(key)
-    if not payload:
-        return []
+def _send_reply(*, bot: Dict[str, Any], user_number: str, body: str) -> Optional[str]:
+    """Deliver an assistant reply out-of-band (used when the webhook already answered)."""
+    if not body:
+        return None
+    twilio_service = current_app.extensions["twilio_service"]
+    credentials = _resolve_bot_twilio_credentials(bot)
+    account_sid = credentials.get("twilio_account_sid")
+    auth_token = credentials.get("twilio_auth_token")
+    has_bot_credentials = bool(account_sid and auth_token)
     try:
-        messages: List[Dict[str, str]] = json.loads(payload)
-        return messages
-    except json.JSONDecodeError:
-        redis_client.delete(key)
-        return []
+        sid = twilio_service.send_whatsapp_message(
+            to_number=user_number,
+            body=body,
+            from_number=credentials.get("twilio_from_whatsapp") or bot.get("twilio_phone_number"),
+            messaging_service_sid=credentials.get("twilio_messaging_service_sid"),
+            twilio_account_sid=account_sid if has_bot_credentials else None,
+            twilio_auth_token=auth_token if has_bot_credentials else None,
+        )
+        logger.info("📤 Reply sent to %s sid=%s", user_number, sid)
+        return sid
+    except Exception as exc:
+        logger.error("❌ Could not send reply to %s: %s", user_number, exc)
+        return None
 
 
-def _save_conversation(*, bot_id: str, user_number: str, conversation: Iterable[Dict[str, str]]) -> None:
-    redis_client = redis_extension.client
-    key = SESSION_KEY_PATTERN.format(bot_id=bot_id, user_number=user_number)
-    serialized = json.dumps(list(conversation)[-MAX_HISTORY_MESSAGES:])
+def _load_conversation(*, bot_id: str, user_number: str) -> List[Dict[str, str]]:
+    store = SessionStore.for_conversation(
+        redis_extension.client, bot_id=bot_id, user_number=user_number, migrate=_without_client_state
+    )
+    return _without_client_state(store.load())
+
+
+def _has_server_side_context(bot: Dict[str, Any]) -> bool:
+    """OpenAI keeps the history (assistant thread or chained responses)."""
+    return bool(bot.get("assistant_id")) or uses_responses_backend(bot)
+
+
+def _load_history_summary(*, bot_id: str, user_number: str) -> Optional[str]:
+    return cached_read(redis_extension.client, "get", SUMMARY_KEY_PATTERN.format(bot_id=bot_id, user_number=user_number))
+
+
+def _session_payload(
+    *,
+    bot: Dict[str, Any],
+    conversation: List[Dict[str, str]],
+    summary: Optional[str],
+) -> Tuple[Dict[str, Any], List[Dict[str, str]]]:
+    """``_save_conversation`` arguments for this turn's history, and the evicted turns.
+
+    Assistant and Responses-backend bots keep their context server-side, so
+    the session is only a capped log. Chat-completions bots keep the newest
+    turns that fit the model's token budget; the rest goes into the rolling
+    summary right away with the extractive :func:`fallback_summary` (no model
+    call before the reply), and :func:`fold_summary_later` has the model
+    rewrite it once the session is saved.
+    """
+    if _has_server_side_context(bot):
+        return {"conversation": conversation}, []
+    model = bot.get("openai_model") or bot.get("model") or current_app.config.get("OPENAI_DEFAULT_MODEL")
+    evicted, kept = ContextWindow.for_model(model, current_app.config).compact(conversation)
+    if evicted:
+        summary = fallback_summary(
+            summary, evicted, max_tokens=int(current_app.config.get("CONTEXT_SUMMARY_MAX_TOKENS", 300)), model=model
+        )
+    return {"conversation": kept, "summary": summary, "max_messages": None}, evicted
+
+
+def fold_summary_later(
+    *,
+    bot: Dict[str, Any],
+    user_number: str,
+    summary: Optional[str],
+    evicted: List[Dict[str, str]],
+    provisional: Optional[str],
+    openai_service: OpenAIAssistantService,
+) -> Future:
+    """Fold ``evicted`` into ``summary`` with the model, off the reply path.
+
+    The result replaces the stored summary only while it is still the
+    ``provisional`` one this turn saved; a newer turn's summary wins.
+    """
+    return submit_detached(
+        _fold_summary,
+        current_app._get_current_object(),
+        openai_service,
+        bot,
+        user_number,
+        summary,
+        evicted,
+        provisional,
+    )
+
+
+def _fold_summary(app, openai_service, bot, user_number, summary, evicted, provisional) -> None:
+    with app.app_context():
+        folded = openai_service.fold_history_summary(bot=bot, summary=summary, evicted=evicted)
+        if not folded or folded == provisional:
+            return
+        key = SUMMARY_KEY_PATTERN.format(bot_id=bot.get("id"), user_number=user_number)
+        ttl = current_app.config.get("REDIS_SESSION_TTL_SECONDS")
+        with redis_extension.client.pipeline() as pipe:
+            try:
+                pipe.watch(key)
+                if pipe.get(key) != provisional:
+                    logger.info("🧮 Summary for %s changed meanwhile: folded summary discarded", user_number)
+                    return
+                pipe.multi()
+                if ttl:
+                    pipe.setex(key, ttl, folded)
+                else:
+                    pipe.set(key, folded)
+                pipe.execute()
+            except redis.WatchError:
+                return
+
+
+def _save_conversation(
+    *,
+    bot_id: str,
+    user_number: str,
+    conversation: Iterable[Dict[str, str]],
+    lock: Optional[ConversationLock] = None,
+    summary: Optional[str] = None,
+    max_messages: Optional[int] = MAX_HISTORY_MESSAGES,
+    appended: Optional[int] = None,
+) -> bool:
+    """Persist the session history; under ``lock`` the write is fenced.
+
+    ``appended`` counts the trailing messages added since the session was
+    loaded; only those are pushed (see :mod:`session_store`).
+
+    Returns False when the lock expired and a newer turn took over, in which
+    case this (stale) history is not written.
+    """
+    _write = _session_writer(
+        bot_id=bot_id,
+        user_number=user_number,
+        conversation=conversation,
+        summary=summary,
+        max_messages=max_messages,
+        appended=appended,
+    )
+    if lock is None:
+        SessionStore(redis_extension.client, bot_id=bot_id, user_number=user_number).save(_write)
+        return True
+    if not lock.fenced_write(_write):
+        logger.warning("🔒 Session write for %s skipped: conversation lock lost to a newer turn", user_number)
+        return False
+    return True
+
+
+def _session_writer(
+    *,
+    bot_id: str,
+    user_number: str,
+    conversation: Iterable[Dict[str, str]],
+    summary: Optional[str] = None,
+    max_messages: Optional[int] = MAX_HISTORY_MESSAGES,
+    appended: Optional[int] = None,
+):
+    """Return ``write(pipe)`` that appends the new history (and stores the summary) on a pipeline."""
     ttl = current_app.config.get("REDIS_SESSION_TTL_SECONDS")
-    if ttl:
-        redis_client.setex(key, ttl, serialized)
-    else:
-        redis_client.set(key, serialized)
+    store = SessionStore(redis_extension.client, bot_id=bot_id, user_number=user_number, ttl_seconds=ttl)
+    write_history = store.writer(conversation, appended=appended, max_messages=max_messages)
+    summary_key = SUMMARY_KEY_PATTERN.format(bot_id=bot_id, user_number=user_number)
+
+    def _write(pipe) -> None:
+        write_history(pipe)
+        if not summary:
+            return
+        if ttl:
+            pipe.setex(summary_key, ttl, summary)
+        else:
+            pipe.set(summary_key, summary)
+
+    return _write
 
 
 def _resolve_twilio_auth_token_from_metadata(bot_metadata: Dict[str, Any]) -> Optional[str]:
@@ -311,7 +860,7 @@ def _resolve_twilio_auth_token_from_metadata(bot_metadata: Dict[str, Any]) -> Op
 def _resolve_tenant_twilio_field(tenant_candidates: List[str], field_name: str) -> Optional[str]:
     for tenant_id in tenant_candidates:
         try:
-            value = redis_extension.client.hget(f"tenant:twilio:{tenant_id}", field_name)
+            value = cached_read(redis_extension.client, "hget", f"tenant:twilio:{tenant_id}", field_name)
             if value:
                 if isinstance(value, bytes):
                     return value.decode("utf-8")
@@ -463,16 +1012,34 @@ def record_inbound_during_handoff(bot: Dict[str, Any], user_number: str, message
     """
     try:
         bot_id = str(bot.get("id"))
-        conversation = _load_conversation(bot_id=bot_id, user_number=user_number)
-        conversation.append({"role": "user", "content": message})
-        _save_conversation(bot_id=bot_id, user_number=user_number, conversation=conversation)
-        _sync_lead_flow_history(bot=bot, user_number=user_number, conversation=conversation)
+        with ConversationLock.for_conversation(
+            redis_extension.client, bot_id=bot_id, user_number=user_number
+        ) as lock:
+            conversation = _load_conversation(bot_id=bot_id, user_number=user_number)
+            conversation.append({"role": "user", "content": message})
+            summary = None if _has_server_side_context(bot) else _load_history_summary(bot_id=bot_id, user_number=user_number)
+            session, evicted = _session_payload(bot=bot, conversation=conversation, summary=summary)
+            if _save_conversation(bot_id=bot_id, user_number=user_number, lock=lock, appended=1, **session) and evicted:
+                fold_summary_later(
+                    bot=bot, user_number=user_number, summary=summary, evicted=evicted,
+                    provisional=session["summary"], openai_service=current_app.extensions["openai_service"],
+                )
+            _sync_lead_flow_history(bot=bot, user_number=user_number, conversation=conversation)
     except Exception as exc:
         logger.warning(
             "[handoff] Could not record inbound message for %s: %s", user_number, exc
         )
 
 
+def start_handoff_check(bot: Dict[str, Any], user_number: str) -> Future:
+    """Run :func:`human_agent_has_control` on the I/O pool.
+
+    Started before the burst window, so the CRM round trip overlaps it and the
+    turn's lock, bot lookup and prefetch instead of delaying them.
+    """
+    return submit(human_agent_has_control, bot, user_number)
+
+
 def human_agent_has_control(bot: Dict[str, Any], user_number: str) -> bool:
     """Query the CRM handoff endpoint; True if a human agent took over the chat.
 
@@ -485,58 +1052,144 @@ def human_agent_has_control(bot: Dict[str, Any], user_number: str) -> bool:
     silence the bot for everyone. Every call logs the queried number, HTTP
     status, and the control_mode received for diagnosis.
     """
-    base = current_app.config.get("HORIZON_CONTROL_BASE_URL")
-    token = _resolve_control_status_token(bot)
-    if not base or not token:
-        logger.warning(
-            "[control-status] Missing base_url or token (base=%s, token=%s) "
-            "for %s -> fail-open (bot replies)",
-            bool(base), bool(token), user_number,
-        )
+    cache_key = _handoff_status_key(resolve_handoff_tenant_id(bot), user_number)
+    try:
+        cached_mode = redis_extension.client.get(cache_key)
+    except Exception as exc:  # pragma: no cover - Redis hiccup: just ask the CRM
+        logger.warning("[control-status] cache read failed for %s: %s", user_number, exc)
+        cached_mode = None
+    if cached_mode:
+        return cached_mode == "human"
+
+    request = _control_status_request(
+        current_app.config.get("HORIZON_CONTROL_BASE_URL"), _resolve_control_status_token(bot), user_number
+    )
+    if request is None:
         return False
 
-    url = f"{base}/api/bot/control-status/"
-    headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
-    params = {"telefono": user_number}
-    token_tail = token[-4:] if len(token) >= 4 else "short"
-
     last_exc = None
     for attempt in (1, 2):  # ponytail: one retry then fail-open; enough for a transient hiccup
         try:
-            resp = requests.get(url, headers=headers, params=params, timeout=8)
-            control_mode = None
-            try:
-                control_mode = (resp.json() or {}).get("control_mode")
-            except ValueError:
-                pass
-            logger.info(
-                "[control-status] telefono=%s status=%s control_mode=%s token_tail=%s (attempt %s)",
-                user_number, resp.status_code, control_mode, token_tail, attempt,
+            resp = requests.get(
+                request["url"], headers=request["headers"], params=request["params"], timeout=budget_timeout(8)
             )
-            if resp.status_code >= 400:
-                last_exc = f"HTTP {resp.status_code}"
+            control_mode, last_exc = _read_control_status(resp, user_number, attempt, request["token_tail"])
+            if last_exc:
                 continue  # retry on 4xx/5xx
+            if control_mode in ("human", "bot"):
+                # NX: never overwrite a mode the CRM pushed while we were asking.
+                _cache_handoff_status(
+                    cache_key, control_mode, ttl=_handoff_status_ttl(current_app.config), only_if_missing=True
+                )
             return control_mode == "human"
         except requests.RequestException as exc:
             last_exc = exc
-            logger.warning(
-                "[control-status] telefono=%s request error (attempt %s): %s",
-                user_number, attempt, exc,
-            )
+            _log_control_status_error(user_number, attempt, exc)
+        except DeadlineExceeded as exc:
+            last_exc = exc
+            break  # no budget left for (another) attempt
+
+    _log_control_status_fail_open(user_number, last_exc)
+    return False
+
+
+def _control_status_request(base: Optional[str], token: Optional[str], user_number: str) -> Optional[Dict[str, Any]]:
+    """URL, headers and params of the control-status call; None (fail-open) when unconfigured."""
+    if not base or not token:
+        logger.warning(
+            "[control-status] Missing base_url or token (base=%s, token=%s) "
+            "for %s -> fail-open (bot replies)",
+            bool(base), bool(token), user_number,
+        )
+        return None
+    return {
+        "url": f"{base}/api/bot/control-status/",
+        "headers": {"Authorization": f"Bearer {token}", "Content-Type": "application/json"},
+        "params": {"telefono": user_number},
+        "token_tail": token[-4:] if len(token) >= 4 else "short",
+    }
 
+
+def _read_control_status(resp: Any, user_number: str, attempt: int, token_tail: str) -> Tuple[Optional[str], Optional[str]]:
+    """``(control_mode, error)`` of a control-status response; ``error`` is set when it is worth a retry.
+
+    Works for both ``requests`` and ``httpx`` responses.
+    """
+    control_mode = None
+    try:
+        control_mode = (resp.json() or {}).get("control_mode")
+    except ValueError:
+        pass
+    logger.info(
+        "[control-status] telefono=%s status=%s control_mode=%s token_tail=%s (attempt %s)",
+        user_number, resp.status_code, control_mode, token_tail, attempt,
+    )
+    if resp.status_code >= 400:
+        return control_mode, f"HTTP {resp.status_code}"
+    return control_mode, None
+
+
+def _handoff_status_ttl(config: Any) -> int:
+    return int(config.get("HANDOFF_STATUS_CACHE_TTL_SECONDS", 60))
+
+
+def _log_control_status_error(user_number: str, attempt: int, exc: Exception) -> None:
+    logger.warning(
+        "[control-status] telefono=%s request error (attempt %s): %s",
+        user_number, attempt, exc,
+    )
+
+
+def _log_control_status_fail_open(user_number: str, last_exc: Any) -> None:
     logger.warning(
         "[control-status] telefono=%s failed after retry (%s) -> fail-open (bot replies)",
         user_number, last_exc,
     )
-    return False
 
 
-def _resolve_bot_twilio_credentials(bot: Dict[str, Any]) -> Dict[str, Optional[str]]:
+def resolve_handoff_tenant_id(bot: Dict[str, Any]) -> str:
+    """Tenant the CRM uses for handoff pushes (same resolution as outbound)."""
+    metadata = bot.get("metadata") or {}
+    return str(metadata.get("tenant_id") or bot.get("client_id") or bot.get("id"))
+
+
+def store_pushed_handoff_status(*, tenant_id: str, user_number: str, control_mode: str) -> None:
+    """Record a control change pushed by the CRM; it wins over any polled value."""
+    _cache_handoff_status(
+        _handoff_status_key(tenant_id, user_number),
+        control_mode,
+        ttl=int(current_app.config.get("HANDOFF_STATUS_PUSH_TTL_SECONDS", 1800)),
+        only_if_missing=False,
+    )
+
+
+def _handoff_status_key(tenant_id: str, user_number: str) -> str:
+    number = (user_number or "").replace("whatsapp:", "").strip()
+    return HANDOFF_STATUS_KEY.format(tenant_id=tenant_id, user_number=number)
+
+
+def _cache_handoff_status(key: str, control_mode: str, *, ttl: int, only_if_missing: bool) -> None:
+    if ttl <= 0:
+        return
+    try:
+        redis_extension.client.set(key, control_mode, ex=ttl, nx=only_if_missing)
+    except Exception as exc:  # pragma: no cover - cache is best effort
+        logger.warning("[control-status] could not cache %s: %s", key, exc)
+
+
+def _tenant_candidates(bot: Dict[str, Any]) -> List[str]:
+    """``tenant:twilio:*`` hashes to try for a bot, most specific first."""
     metadata = bot.get("metadata") or {}
     tenant_candidates: List[str] = []
     for candidate in [metadata.get("tenant_id"), bot.get("client_id"), bot.get("id")]:
         if candidate and str(candidate) not in tenant_candidates:
             tenant_candidates.append(str(candidate))
+    return tenant_candidates
+
+
+def _resolve_bot_twilio_credentials(bot: Dict[str, Any]) -> Dict[str, Optional[str]]:
+    metadata = bot.get("metadata") or {}
+    tenant_candidates = _tenant_candidates(bot)
 
     token_from_metadata = _resolve_twilio_auth_token_from_metadata(metadata)
     token_ref = metadata.get("twilio_auth_token_ref")
@@ -619,8 +1272,8 @@ def _execute_tool_calls(
     )
 
     twilio_credentials = _resolve_bot_twilio_credentials(bot)
-    
-    for call in function_calls:
+
+    def _run_call(call: AssistantFunctionCall) -> ToolResult:
         # Check if it's a custom function
         if custom_functions_service.supports_function(call.name):
             logger.info(f"🔧 Executing custom function: {call.name}")
@@ -651,20 +1304,61 @@ def _execute_tool_calls(
                 bot_context=bot_context,
             )
             logger.info(f"   Result: {result}")
-            results.append(ToolResult(name=call.name, content=json.dumps(result)))
-        else:
-            # Execute as Horizon action
-            logger.info(f"Executing Horizon action: {call.name}")
-            result = horizon_service.execute_action(
-                action_name=call.name,
-                defined_actions=defined_actions,
-                arguments=call.arguments,
-            )
-            results.append(ToolResult(name=call.name, content=json.dumps(result)))
-    
+            return ToolResult(name=call.name, content=json.dumps(result))
+        # Execute as Horizon action
+        logger.info(f"Executing Horizon action: {call.name}")
+        result = horizon_service.execute_action(
+            action_name=call.name,
+            defined_actions=defined_actions,
+            arguments=call.arguments,
+        )
+        return ToolResult(name=call.name, content=json.dumps(result))
+
+    if len(function_calls) < 2 or not current_app.config.get("TOOL_CALLS_PARALLEL", True):
+        return [_isolated_tool_call(_run_call, call) for call in function_calls]
+
+    # Calls of one run step are independent: run them side by side on the shared
+    # I/O pool and collect them in call order, so outputs stay aligned with tool_call_ids.
+    futures = [submit(_isolated_tool_call, _run_call, call) for call in function_calls]
+    timeout = tool_call_timeout()
+    started = time.monotonic()
+    for call, future in zip(function_calls, futures):
+        remaining = max(timeout - (time.monotonic() - started), 0.0)
+        try:
+            results.append(future.result(timeout=budget_timeout(remaining)))
+        except FutureTimeout:
+            raise_if_expired(f"tool {call.name}")
+            # The handler thread can't be interrupted; its late result is dropped.
+            logger.warning("⏱️ Tool %s superó %.1fs, se responde con error", call.name, timeout)
+            results.append(tool_error_result(call.name, "timeout"))
     return results
 
 
+def tool_call_timeout() -> float:
+    """Wall-clock cap for one run step's tool calls (they run concurrently)."""
+    return float(current_app.config.get("TOOL_CALL_TIMEOUT_SECONDS", 20))
+
+
+def tool_error_result(name: str, error: str) -> ToolResult:
+    # Same shape CustomFunctionsService.execute_custom_function returns on failure.
+    return ToolResult(name=name, content=json.dumps({"error": error, "success": False}))
+
+
+def _isolated_tool_call(run_call, call: AssistantFunctionCall) -> ToolResult:
+    """One failing tool must not take the other calls of its step down with it."""
+    try:
+        return run_call(call)
+    except DeadlineExceeded:
+        raise
+    except Exception as exc:
+        return _tool_failure_result(call, exc)
+
+
+def _tool_failure_result(call: AssistantFunctionCall, exc: Exception) -> ToolResult:
+    logger.error("❌ Tool %s failed: %s", call.name, exc, exc_info=True)
+    return tool_error_result(call.name, str(exc))
+
+
 def _try_auto_dispatch_lead_notification(
     *,
     bot: Dict[str, Any],
@@ -707,6 +1401,12 @@ def _try_auto_dispatch_lead_notification(
         logger.info("⏭️ Auto-dispatch omitido para %s: faltan campos %s", user_number, missing)
         return
 
+    # Claim the flag before dispatching: of two concurrent turns only one sends the lead.
+    if not client_data_manager.set_flag_once(user_number, sent_flag_field, True):
+        logger.info("⏭️ Auto-dispatch omitido: otro turno ya reclamó %s para %s", sent_flag_field, user_number)
+        return
+
+    dispatched = False
     try:
         twilio_extension = current_app.extensions.get("twilio_extension")
         from .twilio_service import TwilioMessagingService
@@ -782,16 +1482,21 @@ def _try_auto_dispatch_lead_notification(
         )
 
         if result.get("success"):
-            client_data_manager.update_client_data(user_number, sent_flag_field, True)
-            if result.get("message_sid"):
-                client_data_manager.update_client_data(user_number, "notification_message_sid", result.get("message_sid"))
-            if result.get("target_phone"):
-                client_data_manager.update_client_data(user_number, "notification_target_phone", result.get("target_phone"))
+            dispatched = True
+            details = {
+                "notification_message_sid": result.get("message_sid"),
+                "notification_target_phone": result.get("target_phone"),
+            }
+            client_data_manager.update_client_fields(user_number, {k: v for k, v in details.items() if v})
             logger.info(f"✅ Auto-dispatch ejecutado para {user_number}: {result}")
         else:
             logger.warning(f"⚠️ Auto-dispatch sin éxito para {user_number}: {result}")
     except Exception as exc:
         logger.error(f"❌ Error en auto-dispatch para {user_number}: {exc}")
+    finally:
+        if not dispatched:
+            # Release the claim so a later turn can retry the dispatch.
+            client_data_manager.clear_flag(user_number, sent_flag_field)
 
 
 def _sync_lead_flow_history(
@@ -8,6 +8,9 @@ import requests
 from typing import Any, Dict, List, Optional, Set
 from flask import current_app
 
+from ..utils.deadline import DeadlineExceeded, budget_timeout
+from ..utils.unit_of_work import cached_read, deferred_write
+
 logger = logging.getLogger(__name__)
 
 
@@ -73,6 +76,8 @@ class CustomFunctionsService:
         
         try:
             return handler(arguments, bot_context or {})
+        except DeadlineExceeded:
+            raise  # the turn is out of time: let the caller cancel the run
         except Exception as e:
             logger.error(f"Error executing custom function {function_name}: {e}")
             return {"error": str(e), "success": False}
@@ -86,7 +91,7 @@ class CustomFunctionsService:
             "Content-Type": "application/json",
         }
         url = f"{self.horizon_api_base}{path}"
-        resp = requests.get(url, headers=headers, params=params, timeout=self.request_timeout)
+        resp = requests.get(url, headers=headers, params=params, timeout=budget_timeout(self.request_timeout))
         resp.raise_for_status()
         return resp.json()
 
@@ -96,7 +101,7 @@ class CustomFunctionsService:
             "Content-Type": "application/json",
         }
         url = f"{self.horizon_api_base}{path}"
-        resp = requests.post(url, headers=headers, json=payload, timeout=self.request_timeout)
+        resp = requests.post(url, headers=headers, json=payload, timeout=budget_timeout(self.request_timeout))
         resp.raise_for_status()
         return resp.json() if resp.content else {}
 
@@ -106,7 +111,7 @@ class CustomFunctionsService:
             "Content-Type": "application/json",
         }
         url = f"{self.horizon_api_base}{path}"
-        resp = requests.patch(url, headers=headers, json=payload, timeout=self.request_timeout)
+        resp = requests.patch(url, headers=headers, json=payload, timeout=budget_timeout(self.request_timeout))
         resp.raise_for_status()
         return resp.json() if resp.content else {}
 
@@ -614,7 +619,7 @@ class CustomFunctionsService:
             if custom_fields:
                 payload["custom_fields"] = custom_fields
             # flow_history intentionally omitted — see docstring above.
-            response = requests.post(url, headers=headers, json=payload, timeout=10)
+            response = requests.post(url, headers=headers, json=payload, timeout=budget_timeout(10))
             response.raise_for_status()
             lead_data = response.json()
             logger.info(f"Lead created in Horizon: ID={lead_data.get('id')}")
@@ -727,7 +732,7 @@ class CustomFunctionsService:
 
             # Store lead ID with 30 days expiration under canonical + compatibility keys
             for key in keys:
-                self.redis_client.setex(key, 2592000, str(lead_id))  # 30 days
+                deferred_write(self.redis_client, "setex", key, 2592000, str(lead_id))  # 30 days
             logger.info(f"Lead ID {lead_id} saved for phone {phone_number}")
             return True
             
@@ -743,7 +748,7 @@ class CustomFunctionsService:
         
         try:
             for key in self._build_lead_cache_keys(phone_number):
-                lead_id = self.redis_client.get(key)
+                lead_id = cached_read(self.redis_client, "get", key)
                 if lead_id:
                     if isinstance(lead_id, bytes):
                         lead_id = lead_id.decode('utf-8')
@@ -765,7 +770,7 @@ class CustomFunctionsService:
             keys = self._build_lead_cache_keys(phone_number)
             if not keys:
                 return False
-            self.redis_client.delete(*keys)
+            deferred_write(self.redis_client, "delete", *keys)
             return True
         except Exception as e:
             logger.error(f"Error deleting lead ID from Redis: {e}")
@@ -777,21 +782,7 @@ class CustomFunctionsService:
 
     def _build_lead_cache_keys(self, phone_number: Any) -> List[str]:
         """Build compatible Redis keys for lead cache lookup/save."""
-        keys: List[str] = []
-        seen: Set[str] = set()
-        candidates = [phone_number]
-        normalized = self._normalize_phone_number(phone_number)
-        if normalized:
-            candidates.append(normalized)
-
-        for candidate in candidates:
-            clean_phone = self._clean_phone_for_lead_key(candidate)
-            if not clean_phone or clean_phone in seen:
-                continue
-            keys.append(f"lead_id:{clean_phone}")
-            seen.add(clean_phone)
-
-        return keys
+        return lead_cache_keys(phone_number)
 
     @staticmethod
     def _flatten_payload(prefix: str, value: Any, result: Dict[str, Any]) -> None:
@@ -1370,3 +1361,22 @@ class CustomFunctionsService:
                 "success": False,
                 "error": str(e),
             }
+
+
+def lead_cache_keys(phone_number: Any) -> List[str]:
+    """``lead_id:*`` keys for a phone: as given and normalized (+56...), deduplicated."""
+    keys: List[str] = []
+    seen: Set[str] = set()
+    candidates = [phone_number]
+    normalized = CustomFunctionsService._normalize_phone_number(phone_number)
+    if normalized:
+        candidates.append(normalized)
+
+    for candidate in candidates:
+        clean_phone = CustomFunctionsService._clean_phone_for_lead_key(candidate)
+        if not clean_phone or clean_phone in seen:
+            continue
+        keys.append(f"lead_id:{clean_phone}")
+        seen.add(clean_phone)
+
+    return keys
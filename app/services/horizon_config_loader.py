@@ -5,12 +5,14 @@ minimal.  Redis is no longer the source of truth; Horizon is.
 """
 from __future__ import annotations
 
-import json
 import logging
 from typing import Optional
 
 import requests
 
+from ..repositories.bot_repository import BOT_NUMBER_INDEX_KEY, BotRepository, normalize_bot_number
+from ..utils import codec
+
 logger = logging.getLogger(__name__)
 
 CACHE_TTL_SECONDS = 300  # 5 minutos
@@ -43,7 +45,7 @@ class HorizonConfigLoader:
                         "[HorizonConfigLoader] Cache hit para phone=%s",
                         phone_number,
                     )
-                    return json.loads(cached)
+                    return codec.loads(cached)
             except Exception as e:
                 logger.warning(
                     "[HorizonConfigLoader] Error leyendo cache Redis: %s", e
@@ -60,7 +62,7 @@ class HorizonConfigLoader:
                 self.redis.setex(
                     cache_key,
                     CACHE_TTL_SECONDS,
-                    json.dumps(config, ensure_ascii=False),
+                    codec.dumps(config),
                 )
                 logger.debug(
                     "[HorizonConfigLoader] Config cacheada para phone=%s TTL=%ds",
@@ -116,10 +118,13 @@ class HorizonConfigLoader:
         return None
 
     def invalidate_cache(self, phone_number: str) -> None:
-        """Invalida el cache de un bot específico."""
+        """Invalida el cache de un bot específico (Redis y cache local de cada worker)."""
         if self.redis:
             cache_key = f"horizon_bot_config:{phone_number}"
             self.redis.delete(cache_key)
+            bot_id = self.redis.hget(BOT_NUMBER_INDEX_KEY, normalize_bot_number(phone_number) or "")
+            if bot_id:
+                BotRepository(self.redis).invalidate(bot_id)
             logger.info(
                 "[HorizonConfigLoader] Cache invalidado para phone=%s", phone_number
             )
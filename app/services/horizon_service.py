@@ -2,10 +2,13 @@
 from __future__ import annotations
 
 import json
-from typing import Any, Dict, Iterable, Optional
+from typing import Any, Dict, Iterable, Optional, Tuple
 from urllib.parse import urljoin
 
+import httpx
+
 from ..extensions import HorizonExtension
+from ..utils.deadline import budget_timeout
 
 
 class HorizonService:
@@ -19,23 +22,9 @@ class HorizonService:
         defined_actions: Iterable[Dict[str, Any]],
         arguments: Dict[str, Any],
     ) -> Dict[str, Any]:
-        definition = next(
-            (action for action in defined_actions if action.get("name") == action_name), None
+        method, path, query_params, json_body = self._build_action_request(
+            action_name, defined_actions, arguments
         )
-        if not definition:
-            raise ValueError(f"Action '{action_name}' is not defined for this bot")
-
-        method = (definition.get("method") or "GET").upper()
-        path_template = definition.get("path") or "/"
-        path = path_template.format(**arguments)
-
-        query_params = definition.get("query")
-        body_template = definition.get("body")
-
-        json_body: Optional[Dict[str, Any]] = None
-        if body_template:
-            json_body = json.loads(json.dumps(body_template).format(**arguments))
-
         response = self.request(
             method=method,
             path=path,
@@ -44,6 +33,25 @@ class HorizonService:
         )
         return response
 
+    async def aexecute_action(
+        self,
+        *,
+        action_name: str,
+        defined_actions: Iterable[Dict[str, Any]],
+        arguments: Dict[str, Any],
+        client: Optional[httpx.AsyncClient] = None,
+    ) -> Dict[str, Any]:
+        method, path, query_params, json_body = self._build_action_request(
+            action_name, defined_actions, arguments
+        )
+        return await self.arequest(
+            method=method,
+            path=path,
+            params=query_params,
+            json_body=json_body,
+            client=client,
+        )
+
     def request(
         self,
         *,
@@ -56,7 +64,37 @@ class HorizonService:
         session = self._extension.session
         base_url = self._extension.base_url
         url = urljoin(base_url, path)
-        response = session.request(method=method, url=url, params=params, json=json_body, timeout=timeout)
+        response = session.request(method=method, url=url, params=params, json=json_body, timeout=budget_timeout(timeout))
+        response.raise_for_status()
+        if response.content:
+            try:
+                return response.json()
+            except ValueError:
+                return {"raw": response.text}
+        return {}
+
+    async def arequest(
+        self,
+        *,
+        method: str,
+        path: str,
+        params: Optional[Dict[str, Any]] = None,
+        json_body: Optional[Dict[str, Any]] = None,
+        timeout: int = 15,
+        client: Optional[httpx.AsyncClient] = None,
+    ) -> Dict[str, Any]:
+        """Async counterpart of :meth:`request` (same headers as the sync session)."""
+        url = urljoin(self._extension.base_url, path)
+        headers = dict(self._extension.session.headers)
+        if client is None:
+            async with httpx.AsyncClient() as own_client:
+                response = await own_client.request(
+                    method, url, params=params, json=json_body, headers=headers, timeout=budget_timeout(timeout)
+                )
+        else:
+            response = await client.request(
+                method, url, params=params, json=json_body, headers=headers, timeout=budget_timeout(timeout)
+            )
         response.raise_for_status()
         if response.content:
             try:
@@ -64,3 +102,27 @@ class HorizonService:
             except ValueError:
                 return {"raw": response.text}
         return {}
+
+    @staticmethod
+    def _build_action_request(
+        action_name: str,
+        defined_actions: Iterable[Dict[str, Any]],
+        arguments: Dict[str, Any],
+    ) -> Tuple[str, str, Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        definition = next(
+            (action for action in defined_actions if action.get("name") == action_name), None
+        )
+        if not definition:
+            raise ValueError(f"Action '{action_name}' is not defined for this bot")
+
+        method = (definition.get("method") or "GET").upper()
+        path_template = definition.get("path") or "/"
+        path = path_template.format(**arguments)
+
+        query_params = definition.get("query")
+        body_template = definition.get("body")
+
+        json_body: Optional[Dict[str, Any]] = None
+        if body_template:
+            json_body = json.loads(json.dumps(body_template).format(**arguments))
+        return method, path, query_params, json_body
@@ -0,0 +1,78 @@
+"""Idempotency for Twilio webhook deliveries keyed by ``MessageSid``.
+
+Twilio retries the webhook with the same ``MessageSid`` when our answer is
+slow. The first delivery claims the SID with ``SET NX EX``; retries find the
+claim and, instead of running the conversation again, wait for the reply the
+first delivery stores (or give up and answer with empty TwiML).
+"""
+from __future__ import annotations
+
+import logging
+import time
+from typing import Any, Callable, Mapping, Optional
+
+DEDUP_KEY = "wa:inbound:sid:{message_sid}"
+_PENDING = "pending"
+_DONE_PREFIX = "done:"
+
+logger = logging.getLogger(__name__)
+
+
+class InboundDeduplicator:
+    def __init__(
+        self,
+        redis_client,
+        *,
+        ttl_seconds: int = 3600,
+        poll_interval: float = 0.2,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self._redis = redis_client
+        self.ttl_seconds = ttl_seconds
+        self.poll_interval = poll_interval
+        self._sleep = sleep
+
+    @classmethod
+    def from_config(cls, redis_client, config: Mapping[str, Any]) -> "InboundDeduplicator":
+        return cls(redis_client, ttl_seconds=int(config.get("INBOUND_DEDUP_TTL_SECONDS", 3600)))
+
+    def claim(self, message_sid: Optional[str]) -> bool:
+        """True for the first delivery of ``message_sid`` (or when there is no SID)."""
+        if not message_sid:
+            return True
+        return bool(self._redis.set(self._key(message_sid), _PENDING, nx=True, ex=self.ttl_seconds))
+
+    def complete(self, message_sid: Optional[str], reply_text: Optional[str]) -> None:
+        """Store the outcome so retries can reuse it (``None`` means "no reply")."""
+        if not message_sid:
+            return
+        self._redis.set(
+            self._key(message_sid),
+            _DONE_PREFIX + (reply_text or ""),
+            xx=True,
+            keepttl=True,
+        )
+
+    def release(self, message_sid: Optional[str]) -> None:
+        """Drop the claim so a later retry is processed from scratch."""
+        if message_sid:
+            self._redis.delete(self._key(message_sid))
+
+    def wait_for_reply(self, message_sid: str, timeout_seconds: float) -> Optional[str]:
+        """Reply stored by the in-flight delivery, or None if it is not ready in time."""
+        deadline = time.monotonic() + max(0.0, timeout_seconds)
+        while True:
+            value = self._redis.get(self._key(message_sid))
+            if isinstance(value, bytes):
+                value = value.decode("utf-8")
+            if value is None:
+                return None
+            if value.startswith(_DONE_PREFIX):
+                return value[len(_DONE_PREFIX):] or None
+            if time.monotonic() >= deadline:
+                return None
+            self._sleep(self.poll_interval)
+
+    @staticmethod
+    def _key(message_sid: str) -> str:
+        return DEDUP_KEY.format(message_sid=message_sid)
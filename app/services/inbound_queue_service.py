@@ -0,0 +1,210 @@
+"""Redis Streams queue that decouples the Twilio webhook from conversation processing.
+
+When ``WEBHOOK_ASYNC_MODE`` is enabled the webhook only appends the inbound
+message to a stream and answers Twilio with an empty TwiML. Worker processes
+(see ``worker.py``) read the stream through a consumer group, run the
+conversation and deliver the reply with ``TwilioMessagingService``.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import UTC, datetime
+from typing import Any, Callable, Dict, List, Optional
+
+import redis
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class InboundMessage:
+    bot_id: str
+    user_number: str
+    body: str
+    message_sid: Optional[str] = None
+    received_at: Optional[str] = None
+    entry_id: Optional[str] = None
+
+    def to_fields(self) -> Dict[str, str]:
+        return {
+            "bot_id": self.bot_id,
+            "user_number": self.user_number,
+            "body": self.body,
+            "message_sid": self.message_sid or "",
+            "received_at": self.received_at or datetime.now(UTC).isoformat(),
+        }
+
+    @classmethod
+    def from_fields(cls, entry_id: str, fields: Dict[str, Any]) -> "InboundMessage":
+        return cls(
+            bot_id=str(fields.get("bot_id") or ""),
+            user_number=str(fields.get("user_number") or ""),
+            body=str(fields.get("body") or ""),
+            message_sid=fields.get("message_sid") or None,
+            received_at=fields.get("received_at") or None,
+            entry_id=entry_id,
+        )
+
+
+class InboundQueueService:
+    """Thin wrapper over XADD / XREADGROUP / XAUTOCLAIM / XACK."""
+
+    def __init__(
+        self,
+        redis_client,
+        *,
+        stream_key: str,
+        group: str,
+        maxlen: int = 10000,
+    ) -> None:
+        self._redis = redis_client
+        self.stream_key = stream_key
+        self.group = group
+        self.maxlen = maxlen
+
+    @classmethod
+    def from_config(cls, redis_client, config) -> "InboundQueueService":
+        return cls(
+            redis_client,
+            stream_key=config.get("INBOUND_STREAM_KEY", "wa:inbound:stream"),
+            group=config.get("INBOUND_STREAM_GROUP", "conversation-workers"),
+            maxlen=int(config.get("INBOUND_STREAM_MAXLEN", 10000)),
+        )
+
+    def ensure_group(self) -> None:
+        try:
+            self._redis.xgroup_create(self.stream_key, self.group, id="0", mkstream=True)
+        except redis.ResponseError as exc:
+            if "BUSYGROUP" not in str(exc):
+                raise
+
+    def enqueue(self, message: InboundMessage) -> str:
+        entry_id = self._redis.xadd(
+            self.stream_key,
+            message.to_fields(),
+            maxlen=self.maxlen,
+            approximate=True,
+        )
+        logger.info(
+            "📥 Inbound message queued entry=%s bot_id=%s from=%s",
+            entry_id, message.bot_id, message.user_number,
+        )
+        return entry_id
+
+    def read(self, consumer: str, *, count: int = 10, block_ms: Optional[int] = None) -> List[InboundMessage]:
+        response = self._redis.xreadgroup(
+            self.group,
+            consumer,
+            {self.stream_key: ">"},
+            count=count,
+            block=block_ms,
+        )
+        messages: List[InboundMessage] = []
+        for _stream, entries in response or []:
+            for entry_id, fields in entries:
+                messages.append(InboundMessage.from_fields(entry_id, fields))
+        return messages
+
+    def claim_stale(self, consumer: str, *, min_idle_ms: int, count: int = 10) -> List[InboundMessage]:
+        """Take over entries left pending by a worker that died mid-conversation."""
+        response = self._redis.xautoclaim(
+            self.stream_key,
+            self.group,
+            consumer,
+            min_idle_time=min_idle_ms,
+            start_id="0-0",
+            count=count,
+        )
+        entries = response[1] if response and len(response) > 1 else []
+        return [
+            InboundMessage.from_fields(entry_id, fields)
+            for entry_id, fields in entries
+            if fields
+        ]
+
+    def ack(self, entry_id: str) -> None:
+        pipe = self._redis.pipeline()
+        pipe.xack(self.stream_key, self.group, entry_id)
+        pipe.xdel(self.stream_key, entry_id)
+        pipe.execute()
+
+    def consume_batch(
+        self,
+        consumer: str,
+        handler: Callable[[InboundMessage], Any],
+        *,
+        count: int = 10,
+        block_ms: Optional[int] = None,
+        min_idle_ms: Optional[int] = None,
+    ) -> int:
+        """Process one batch synchronously; used by tests and single-threaded workers."""
+        messages: List[InboundMessage] = []
+        if min_idle_ms is not None:
+            messages.extend(self.claim_stale(consumer, min_idle_ms=min_idle_ms, count=count))
+        if len(messages) < count:
+            messages.extend(self.read(consumer, count=count - len(messages), block_ms=block_ms))
+        for message in messages:
+            self._handle(message, handler)
+        return len(messages)
+
+    def _handle(self, message: InboundMessage, handler: Callable[[InboundMessage], Any]) -> None:
+        try:
+            handler(message)
+        except Exception as exc:
+            # The handler owns user-facing fallbacks; anything escaping here is
+            # logged and acked so a poison message does not loop forever.
+            logger.error("❌ Error processing queued message %s: %s", message.entry_id, exc, exc_info=True)
+        finally:
+            if message.entry_id:
+                self.ack(message.entry_id)
+
+
+def run_worker(app, *, consumer_name: str, stop_event: Optional[threading.Event] = None) -> None:
+    """Blocking consumer loop with a bounded pool of conversation threads."""
+    from ..extensions import redis_extension
+    from .conversation_service import process_queued_message
+
+    config = app.config
+    queue = InboundQueueService.from_config(redis_extension.client, config)
+    queue.ensure_group()
+
+    concurrency = max(1, int(config.get("INBOUND_WORKER_CONCURRENCY", 8)))
+    block_ms = int(config.get("INBOUND_WORKER_BLOCK_MS", 5000))
+    min_idle_ms = int(config.get("INBOUND_CLAIM_IDLE_MS", 120000))
+    stop_event = stop_event or threading.Event()
+    slots = threading.BoundedSemaphore(concurrency)
+
+    def _run(message: InboundMessage) -> None:
+        try:
+            with app.app_context():
+                queue._handle(message, process_queued_message)
+        finally:
+            slots.release()
+
+    logger.info(
+        "👷 Inbound worker %s listening on %s (group=%s, concurrency=%s)",
+        consumer_name, queue.stream_key, queue.group, concurrency,
+    )
+    claim_stale = True
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="inbound") as pool:
+        while not stop_event.is_set():
+            slots.acquire()
+            try:
+                if claim_stale:
+                    messages = queue.claim_stale(consumer_name, min_idle_ms=min_idle_ms, count=1)
+                    claim_stale = bool(messages)
+                if not claim_stale:
+                    messages = queue.read(consumer_name, count=1, block_ms=block_ms)
+                    # Check for orphaned entries again once the stream is idle.
+                    claim_stale = not messages
+            except redis.RedisError as exc:
+                logger.warning("⚠️ Inbound worker could not read stream: %s", exc)
+                messages = []
+                stop_event.wait(1)
+            if not messages:
+                slots.release()
+                continue
+            pool.submit(_run, messages[0])
@@ -0,0 +1,151 @@
+"""Daily OpenAI token counters, including prompt-cache hits.
+
+Every chat completion, response and finished assistant run adds its usage to
+``metrics:openai:usage:{YYYY-MM-DD}`` (a hash of ``{source}:{counter}``
+fields), so the share of prompt tokens served from the provider's prompt
+cache can be followed over time. Answer-cache lookups are counted per bot in
+``metrics:answer_cache:{YYYY-MM-DD}`` the same way. Recording never fails the
+caller.
+"""
+from __future__ import annotations
+
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+USAGE_KEY_PATTERN = "metrics:openai:usage:{day}"
+USAGE_TTL_SECONDS = 30 * 24 * 3600
+ANSWER_CACHE_KEY_PATTERN = "metrics:answer_cache:{day}"
+
+_COUNTERS = ("requests", "prompt_tokens", "cached_tokens", "completion_tokens")
+
+logger = logging.getLogger(__name__)
+
+
+def usage_counts(usage: Any) -> Optional[Dict[str, int]]:
+    """Normalize chat-completions, responses and run ``usage`` objects (or dicts)."""
+    if usage is None:
+        return None
+    prompt = _field(usage, "prompt_tokens", "input_tokens")
+    completion = _field(usage, "completion_tokens", "output_tokens")
+    details = _field(usage, "prompt_tokens_details", "input_tokens_details")
+    cached = _field(details, "cached_tokens") if details is not None else None
+    return {
+        "requests": 1,
+        "prompt_tokens": int(prompt or 0),
+        "cached_tokens": int(cached or 0),
+        "completion_tokens": int(completion or 0),
+    }
+
+
+def record_usage(redis_client, *, source: str, usage: Any) -> Optional[Dict[str, int]]:
+    counts = usage_counts(usage)
+    if counts is None:
+        return None
+    try:
+        key = _usage_key()
+        pipe = redis_client.pipeline()
+        for counter, value in counts.items():
+            pipe.hincrby(key, f"{source}:{counter}", value)
+        pipe.expire(key, USAGE_TTL_SECONDS)
+        pipe.execute()
+    except Exception as exc:
+        logger.warning("Could not record OpenAI usage: %s", exc)
+    _log_usage(source, counts)
+    return counts
+
+
+async def arecord_usage(redis_client, *, source: str, usage: Any) -> Optional[Dict[str, int]]:
+    """Async :func:`record_usage` for a redis.asyncio client."""
+    counts = usage_counts(usage)
+    if counts is None:
+        return None
+    try:
+        key = _usage_key()
+        pipe = redis_client.pipeline()
+        for counter, value in counts.items():
+            pipe.hincrby(key, f"{source}:{counter}", value)
+        pipe.expire(key, USAGE_TTL_SECONDS)
+        await pipe.execute()
+    except Exception as exc:
+        logger.warning("Could not record OpenAI usage: %s", exc)
+    _log_usage(source, counts)
+    return counts
+
+
+def usage_summary(redis_client, *, day: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+    """Counters for ``day`` (UTC, default today) per source, with the cached-prompt ratio."""
+    raw = redis_client.hgetall(_usage_key(day))
+    summary: Dict[str, Dict[str, Any]] = {}
+    for field, value in raw.items():
+        source, _, counter = field.partition(":")
+        summary.setdefault(source, {name: 0 for name in _COUNTERS})[counter] = int(value)
+    for counters in summary.values():
+        prompt = counters.get("prompt_tokens") or 0
+        counters["cached_ratio"] = round(counters.get("cached_tokens", 0) / prompt, 4) if prompt else 0.0
+    return summary
+
+
+def record_answer_cache(redis_client, *, bot_id: str, hit: bool, saved_ms: int = 0) -> None:
+    """Count one answer-cache lookup; hits add the generation time they saved."""
+    try:
+        pipe = redis_client.pipeline()
+        _answer_cache_writes(pipe, bot_id, hit, saved_ms)
+        pipe.execute()
+    except Exception as exc:
+        logger.warning("Could not record answer cache metrics: %s", exc)
+
+
+async def arecord_answer_cache(redis_client, *, bot_id: str, hit: bool, saved_ms: int = 0) -> None:
+    """Async :func:`record_answer_cache` for a redis.asyncio client."""
+    try:
+        pipe = redis_client.pipeline()
+        _answer_cache_writes(pipe, bot_id, hit, saved_ms)
+        await pipe.execute()
+    except Exception as exc:
+        logger.warning("Could not record answer cache metrics: %s", exc)
+
+
+def answer_cache_summary(redis_client, *, day: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+    """Lookups, hits, hit rate and saved milliseconds per bot for ``day`` (UTC, default today)."""
+    raw = redis_client.hgetall(_day_key(ANSWER_CACHE_KEY_PATTERN, day))
+    summary: Dict[str, Dict[str, Any]] = {}
+    for field, value in raw.items():
+        bot_id, _, counter = field.rpartition(":")
+        summary.setdefault(bot_id, {"lookups": 0, "hits": 0, "saved_ms": 0})[counter] = int(value)
+    for counters in summary.values():
+        lookups = counters["lookups"]
+        counters["hit_rate"] = round(counters["hits"] / lookups, 4) if lookups else 0.0
+    return summary
+
+
+def _answer_cache_writes(pipe, bot_id: str, hit: bool, saved_ms: int) -> None:
+    key = _day_key(ANSWER_CACHE_KEY_PATTERN)
+    pipe.hincrby(key, f"{bot_id}:lookups", 1)
+    if hit:
+        pipe.hincrby(key, f"{bot_id}:hits", 1)
+        pipe.hincrby(key, f"{bot_id}:saved_ms", int(saved_ms))
+    pipe.expire(key, USAGE_TTL_SECONDS)
+
+
+def _day_key(pattern: str, day: Optional[str] = None) -> str:
+    return pattern.format(day=day or datetime.now(timezone.utc).date().isoformat())
+
+
+def _usage_key(day: Optional[str] = None) -> str:
+    return _day_key(USAGE_KEY_PATTERN, day)
+
+
+def _field(obj: Any, *names: str) -> Any:
+    for name in names:
+        value = obj.get(name) if isinstance(obj, dict) else getattr(obj, name, None)
+        if value is not None:
+            return value
+    return None
+
+
+def _log_usage(source: str, counts: Dict[str, int]) -> None:
+    logger.info(
+        "📊 OpenAI usage [%s]: prompt=%s cached=%s completion=%s",
+        source, counts["prompt_tokens"], counts["cached_tokens"], counts["completion_tokens"],
+    )
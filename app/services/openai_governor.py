@@ -0,0 +1,586 @@
+"""Per-tenant and per-API-key rate and concurrency governor for OpenAI calls.
+
+All bots share one OpenAI key and the worker pool, so one tenant's campaign
+spike used to turn into 429s and queueing for everybody. The
+:class:`~app.services.openai_service.OpenAIAssistantService` talks to OpenAI
+through a governed client. Before each call that makes the model generate
+(run, response and completion creation, tool-output submission), it takes a
+permit from two Redis-backed scopes:
+
+* the tenant (``metadata.tenant_id``, else the bot id), with limits from the
+  bot's metadata (``openai_rpm``, ``openai_burst``,
+  ``openai_max_concurrency``) or the ``OPENAI_TENANT_*`` settings;
+* the API key, shared by every tenant (``OPENAI_KEY_*``).
+
+Limits are opt-in: a scope without any limit configured costs no Redis round
+trip, and polls, listings and thread/message bookkeeping never take a permit.
+
+Each scope is a token bucket (requests per minute with a burst) plus a set of
+in-flight leases (concurrency). Permits are taken with ``WATCH``/``MULTI``,
+like the conversation lock. While other tenants are waiting, a tenant already
+holding its fair share of the key's concurrency waits too, so a noisy tenant
+cannot take every slot the moment they free up. Waits are jittered; a turn
+with a deadline queues for as long as its budget allows (running out raises
+``DeadlineExceeded``, which the turn answers with its fallback), otherwise up to
+``OPENAI_GOVERNOR_MAX_WAIT_SECONDS``. Every call, governed or not, retries 429
+and 5xx answers with full-jitter exponential backoff (``Retry-After`` is
+honoured). Redis errors fail open: throttling must never drop a turn.
+"""
+from __future__ import annotations
+
+import asyncio
+import functools
+import hashlib
+import inspect
+import logging
+import math
+import random
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import redis
+
+from ..utils.deadline import current_deadline, raise_if_expired
+
+GOVERNOR_PREFIX = "oa:gov"
+
+# Waiting tenants older than this are gone (their wait ended or timed out).
+_WAITER_STALE_SECONDS = 2.0
+_POLL_SECONDS = 0.05
+_RETRY_BASE_SECONDS = 0.5
+_RETRY_CAP_SECONDS = 8.0
+
+# Only these calls make the model generate, so only they spend permits.
+_GENERATING_RESOURCES = frozenset({"runs", "responses", "completions"})
+_GENERATING_METHODS = frozenset({
+    "create", "create_and_poll", "create_and_stream", "stream", "parse",
+    "submit_tool_outputs", "submit_tool_outputs_and_poll", "submit_tool_outputs_stream",
+})
+
+logger = logging.getLogger(__name__)
+
+
+class OpenAIThrottled(RuntimeError):
+    """No permit could be taken within the allowed wait."""
+
+
+@dataclass(frozen=True)
+class GovernorLimits:
+    # Token-bucket refill in requests per minute; 0 disables the rate limit.
+    rpm: float
+    burst: int
+    # In-flight requests; 0 disables the concurrency limit.
+    max_concurrency: int
+
+    @property
+    def enabled(self) -> bool:
+        return self.rpm > 0 or self.max_concurrency > 0
+
+
+def tenant_id_for(bot: Optional[Dict[str, Any]]) -> str:
+    if not bot:
+        return "default"
+    metadata = bot.get("metadata") or {}
+    return str(metadata.get("tenant_id") or bot.get("id") or "default")
+
+
+def tenant_limits(bot: Optional[Dict[str, Any]], config: Dict[str, Any]) -> GovernorLimits:
+    metadata = (bot or {}).get("metadata") or {}
+
+    def _value(field: str, setting: str, default: float) -> float:
+        try:
+            return float(metadata[field])
+        except (KeyError, TypeError, ValueError):
+            return float(config.get(setting, default))
+
+    rpm = _value("openai_rpm", "OPENAI_TENANT_RPM", 0)
+    return GovernorLimits(
+        rpm=rpm,
+        burst=_burst(rpm, _value("openai_burst", "OPENAI_TENANT_BURST", 0)),
+        max_concurrency=int(_value("openai_max_concurrency", "OPENAI_TENANT_MAX_CONCURRENCY", 0)),
+    )
+
+
+def key_limits(config: Dict[str, Any]) -> GovernorLimits:
+    rpm = float(config.get("OPENAI_KEY_RPM", 0))
+    return GovernorLimits(
+        rpm=rpm,
+        burst=_burst(rpm, float(config.get("OPENAI_KEY_BURST", 0))),
+        max_concurrency=int(config.get("OPENAI_KEY_MAX_CONCURRENCY", 0)),
+    )
+
+
+def _burst(rpm: float, burst: float) -> int:
+    # Unset (0): six seconds' worth of requests.
+    return int(burst) if burst > 0 else max(int(rpm / 10), 1)
+
+
+def generates(path: Tuple[str, ...], method: str) -> bool:
+    """Whether ``client.<path>.<method>()`` makes the model generate (and so takes a permit)."""
+    if method.startswith("create_and_run"):  # threads.create_and_run*
+        return True
+    return bool(path) and path[-1] in _GENERATING_RESOURCES and method in _GENERATING_METHODS
+
+
+def key_id_for(client: Any) -> str:
+    """Stable id for the client's API key that never exposes the key itself."""
+    api_key = getattr(client, "api_key", None)
+    if not isinstance(api_key, str) or not api_key:
+        return "default"
+    return hashlib.sha1(api_key.encode("utf-8")).hexdigest()[:12]
+
+
+def retry_delay(exc: BaseException, attempt: int, max_attempts: int) -> Optional[float]:
+    """Seconds to wait before retrying a failed call, or None when it must not be retried."""
+    status = getattr(exc, "status_code", None)
+    if not isinstance(status, int) or not (status == 429 or status >= 500):
+        return None
+    if getattr(exc, "code", None) == "insufficient_quota":
+        return None  # billing, not load: retrying cannot help
+    if attempt + 1 >= max_attempts:
+        return None
+    delay = _retry_after(exc)
+    if delay is None:
+        delay = random.uniform(0, min(_RETRY_CAP_SECONDS, _RETRY_BASE_SECONDS * 2 ** attempt))
+    deadline = current_deadline()
+    if deadline is not None and delay >= deadline.remaining():
+        return None
+    return delay
+
+
+def _retry_after(exc: BaseException) -> Optional[float]:
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        value = headers.get("retry-after-ms")
+        if value is not None:
+            return min(float(value) / 1000, _RETRY_CAP_SECONDS)
+        value = headers.get("retry-after")
+        if value is not None:
+            return min(float(value), _RETRY_CAP_SECONDS)
+    except (TypeError, ValueError):
+        pass
+    return None
+
+
+class _GovernorBase:
+    def __init__(
+        self,
+        redis_client,
+        *,
+        tenant_id: str,
+        tenant: GovernorLimits,
+        key_id: str,
+        key: GovernorLimits,
+        lease_seconds: float = 120.0,
+        max_wait_seconds: float = 10.0,
+        max_attempts: int = 3,
+    ) -> None:
+        self._redis = redis_client
+        self.tenant_id = tenant_id
+        self.tenant = tenant
+        self.key = key
+        self.lease_seconds = lease_seconds
+        self.max_wait_seconds = max_wait_seconds
+        self.max_attempts = max(int(max_attempts), 1)
+        tenant_base = f"{GOVERNOR_PREFIX}:tenant:{tenant_id}"
+        key_base = f"{GOVERNOR_PREFIX}:key:{key_id}"
+        self.tenant_bucket_key = f"{tenant_base}:bucket"
+        self.tenant_leases_key = f"{tenant_base}:leases"
+        self.key_bucket_key = f"{key_base}:bucket"
+        self.key_leases_key = f"{key_base}:leases"
+        self.key_waiting_key = f"{key_base}:waiting"
+
+    @classmethod
+    def for_bot(cls, redis_client, *, client: Any, bot: Optional[Dict[str, Any]]):
+        from flask import current_app
+
+        config = current_app.config
+        return cls(
+            redis_client,
+            tenant_id=tenant_id_for(bot),
+            tenant=tenant_limits(bot, config),
+            key_id=key_id_for(client),
+            key=key_limits(config),
+            lease_seconds=float(config.get("OPENAI_GOVERNOR_LEASE_SECONDS", 120)),
+            max_wait_seconds=float(config.get("OPENAI_GOVERNOR_MAX_WAIT_SECONDS", 10)),
+            max_attempts=int(config.get("OPENAI_RETRY_MAX_ATTEMPTS", 3)),
+        )
+
+    @property
+    def metered(self) -> bool:
+        """False when neither scope has a limit: permits are then free and skip Redis."""
+        return self.tenant.enabled or self.key.enabled
+
+    def _new_lease(self) -> str:
+        return f"{self.tenant_id}|{uuid.uuid4().hex}"
+
+    @property
+    def _watched(self) -> Tuple[str, ...]:
+        # The waiting set is read but not watched: it changes on every wait and
+        # fairness only needs an approximate view of it.
+        return (self.tenant_bucket_key, self.tenant_leases_key, self.key_bucket_key, self.key_leases_key)
+
+    def _wait_for(self, state: List[Any], now: float) -> float:
+        """Seconds until a permit could be granted given ``state``; 0.0 grants it now."""
+        tenant_bucket, tenant_leases, key_bucket, key_leases, waiting = state
+        wait = max(
+            _bucket_wait(self.tenant, tenant_bucket, now),
+            _bucket_wait(self.key, key_bucket, now),
+        )
+        if self.tenant.max_concurrency and len(tenant_leases) >= self.tenant.max_concurrency:
+            wait = max(wait, _POLL_SECONDS)
+        if self.key.max_concurrency:
+            if len(key_leases) >= self.key.max_concurrency:
+                wait = max(wait, _POLL_SECONDS)
+            else:
+                others = {str(member) for member in waiting} - {self.tenant_id}
+                if others:
+                    active = {str(lease).split("|", 1)[0] for lease in key_leases} | others | {self.tenant_id}
+                    fair_share = math.ceil(self.key.max_concurrency / len(active))
+                    mine = sum(1 for lease in key_leases if str(lease).startswith(f"{self.tenant_id}|"))
+                    if mine >= fair_share:
+                        wait = max(wait, _POLL_SECONDS)
+        return wait
+
+    def _grant_writes(self, pipe, lease: str, state: List[Any], now: float) -> None:
+        tenant_bucket, _, key_bucket, _, _ = state
+        for limits, bucket_key, bucket in (
+            (self.tenant, self.tenant_bucket_key, tenant_bucket),
+            (self.key, self.key_bucket_key, key_bucket),
+        ):
+            if limits.rpm > 0:
+                pipe.hset(bucket_key, mapping={"tokens": _bucket_tokens(limits, bucket, now) - 1, "ts": now})
+                pipe.expire(bucket_key, int(60 * limits.burst / limits.rpm) + 60)
+        for leases_key in (self.tenant_leases_key, self.key_leases_key):
+            pipe.zremrangebyscore(leases_key, "-inf", now)
+            pipe.zadd(leases_key, {lease: now + self.lease_seconds})
+            pipe.expire(leases_key, int(self.lease_seconds) + 60)
+        pipe.zrem(self.key_waiting_key, self.tenant_id)
+
+    def _wait_writes(self, pipe, now: float) -> None:
+        pipe.zremrangebyscore(self.key_waiting_key, "-inf", now - _WAITER_STALE_SECONDS)
+        pipe.zadd(self.key_waiting_key, {self.tenant_id: now})
+        pipe.expire(self.key_waiting_key, int(_WAITER_STALE_SECONDS) + 60)
+
+    def _wait_stop(self) -> float:
+        """Monotonic time after which waiting for a permit gives up.
+
+        Within a turn that is the message deadline: a throttled turn queues
+        rather than failing early. Without one, ``max_wait_seconds``. A permit
+        that is free right away is still granted once the deadline has passed:
+        the caller decides what a late request is worth.
+        """
+        deadline = current_deadline()
+        budget = self.max_wait_seconds if deadline is None else deadline.remaining()
+        return time.monotonic() + budget
+
+    def _throttled(self) -> OpenAIThrottled:
+        raise_if_expired("OpenAI throttling wait")
+        logger.warning("🚦 OpenAI throttled for tenant %s: no permit in %.1fs", self.tenant_id, self.max_wait_seconds)
+        return OpenAIThrottled(f"no OpenAI permit for tenant {self.tenant_id}")
+
+
+class OpenAIGovernor(_GovernorBase):
+    def acquire(self) -> Optional[str]:
+        """Block until a permit is granted and return its lease (None when unmetered or Redis is unavailable)."""
+        if not self.metered:
+            return None
+        stop = self._wait_stop()
+        lease = self._new_lease()
+        while True:
+            try:
+                wait = self._try_acquire(lease)
+            except redis.RedisError as exc:
+                logger.warning("OpenAI governor unavailable, proceeding unthrottled: %s", exc)
+                return None
+            if not wait:
+                return lease
+            remaining = stop - time.monotonic()
+            if remaining <= 0:
+                raise self._throttled()
+            time.sleep(min(remaining, wait * random.uniform(1.0, 1.5)))
+
+    def release(self, lease: Optional[str]) -> None:
+        if lease is None:
+            return
+        try:
+            pipe = self._redis.pipeline()
+            pipe.zrem(self.tenant_leases_key, lease)
+            pipe.zrem(self.key_leases_key, lease)
+            pipe.execute()
+        except redis.RedisError as exc:
+            logger.warning("Could not release OpenAI permit %s: %s", lease, exc)
+
+    def call(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """``fn(*args, **kwargs)`` under a permit, retried on 429/5xx."""
+        return self._call(fn, args, kwargs, charge=True)
+
+    def call_free(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Same retries as :meth:`call`, without taking a permit (polls, reads)."""
+        return self._call(fn, args, kwargs, charge=False)
+
+    def _call(self, fn: Callable[..., Any], args: Tuple[Any, ...], kwargs: Dict[str, Any], *, charge: bool) -> Any:
+        attempt = 0
+        while True:
+            lease = self.acquire() if charge else None
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as exc:
+                self.release(lease)
+                delay = retry_delay(exc, attempt, self.max_attempts)
+                if delay is None:
+                    raise
+                logger.warning(
+                    "🔁 OpenAI %s (intento %s/%s), reintentando en %.2fs",
+                    getattr(exc, "status_code", "?"), attempt + 1, self.max_attempts, delay,
+                )
+                time.sleep(delay)
+                attempt += 1
+                continue
+            if hasattr(result, "__enter__") and hasattr(result, "__exit__"):
+                # Run streams do their request on __enter__: keep the slot until they close.
+                return _GovernedStream(result, self, lease)
+            self.release(lease)
+            return result
+
+    def _try_acquire(self, lease: str) -> float:
+        with self._redis.pipeline() as pipe:
+            try:
+                pipe.watch(*self._watched)
+                now = time.time()
+                state = [
+                    pipe.hgetall(self.tenant_bucket_key),
+                    pipe.zrangebyscore(self.tenant_leases_key, now, "+inf"),
+                    pipe.hgetall(self.key_bucket_key),
+                    pipe.zrangebyscore(self.key_leases_key, now, "+inf"),
+                    pipe.zrangebyscore(self.key_waiting_key, now - _WAITER_STALE_SECONDS, "+inf"),
+                ]
+                wait = self._wait_for(state, now)
+                pipe.multi()
+                if wait:
+                    self._wait_writes(pipe, now)
+                else:
+                    self._grant_writes(pipe, lease, state, now)
+                pipe.execute()
+                return wait
+            except redis.WatchError:
+                return _POLL_SECONDS
+
+
+class AsyncOpenAIGovernor(_GovernorBase):
+    """:class:`OpenAIGovernor` for ``redis.asyncio`` clients."""
+
+    async def acquire(self) -> Optional[str]:
+        if not self.metered:
+            return None
+        stop = self._wait_stop()
+        lease = self._new_lease()
+        while True:
+            try:
+                wait = await self._try_acquire(lease)
+            except redis.RedisError as exc:
+                logger.warning("OpenAI governor unavailable, proceeding unthrottled: %s", exc)
+                return None
+            if not wait:
+                return lease
+            remaining = stop - time.monotonic()
+            if remaining <= 0:
+                raise self._throttled()
+            await asyncio.sleep(min(remaining, wait * random.uniform(1.0, 1.5)))
+
+    async def release(self, lease: Optional[str]) -> None:
+        if lease is None:
+            return
+        try:
+            pipe = self._redis.pipeline()
+            pipe.zrem(self.tenant_leases_key, lease)
+            pipe.zrem(self.key_leases_key, lease)
+            await pipe.execute()
+        except redis.RedisError as exc:
+            logger.warning("Could not release OpenAI permit %s: %s", lease, exc)
+
+    async def call(self, make_call: Callable[[], Any], *, charge: bool = True) -> Any:
+        """Await ``make_call()`` under a permit (none with ``charge=False``); it is called again for each retry."""
+        attempt = 0
+        while True:
+            lease = await self.acquire() if charge else None
+            try:
+                return await make_call()
+            except Exception as exc:
+                delay = retry_delay(exc, attempt, self.max_attempts)
+                if delay is None:
+                    raise
+                logger.warning(
+                    "🔁 OpenAI %s (intento %s/%s), reintentando en %.2fs",
+                    getattr(exc, "status_code", "?"), attempt + 1, self.max_attempts, delay,
+                )
+            finally:
+                await self.release(lease)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def _try_acquire(self, lease: str) -> float:
+        async with self._redis.pipeline() as pipe:
+            try:
+                await pipe.watch(*self._watched)
+                now = time.time()
+                state = [
+                    await pipe.hgetall(self.tenant_bucket_key),
+                    await pipe.zrangebyscore(self.tenant_leases_key, now, "+inf"),
+                    await pipe.hgetall(self.key_bucket_key),
+                    await pipe.zrangebyscore(self.key_leases_key, now, "+inf"),
+                    await pipe.zrangebyscore(self.key_waiting_key, now - _WAITER_STALE_SECONDS, "+inf"),
+                ]
+                wait = self._wait_for(state, now)
+                pipe.multi()
+                if wait:
+                    self._wait_writes(pipe, now)
+                else:
+                    self._grant_writes(pipe, lease, state, now)
+                await pipe.execute()
+                return wait
+            except redis.WatchError:
+                return _POLL_SECONDS
+
+
+class GovernedClient:
+    """Proxy of an OpenAI client (or any resource under it) whose calls take a permit."""
+
+    def __init__(self, target: Any, governor: OpenAIGovernor, path: Tuple[str, ...] = ()) -> None:
+        self._target = target
+        self._governor = governor
+        self._path = path
+
+    @property
+    def ungoverned(self) -> Any:
+        return self._target
+
+    def __getattr__(self, name: str) -> Any:
+        value = getattr(self._target, name)
+        if name in ("with_options", "copy"):
+            return lambda *args, **kwargs: GovernedClient(value(*args, **kwargs), self._governor, self._path)
+        if callable(value) and not inspect.isclass(value):
+            call = self._governor.call if generates(self._path, name) else self._governor.call_free
+            return functools.partial(call, value)
+        if _is_resource(value):
+            return GovernedClient(value, self._governor, self._path + (name,))
+        return value
+
+
+class AsyncGovernedClient:
+    """:class:`GovernedClient` for ``AsyncOpenAI`` clients."""
+
+    def __init__(self, target: Any, governor: AsyncOpenAIGovernor, path: Tuple[str, ...] = ()) -> None:
+        self._target = target
+        self._governor = governor
+        self._path = path
+
+    @property
+    def ungoverned(self) -> Any:
+        return self._target
+
+    def __getattr__(self, name: str) -> Any:
+        value = getattr(self._target, name)
+        if name in ("with_options", "copy"):
+            return lambda *args, **kwargs: AsyncGovernedClient(value(*args, **kwargs), self._governor, self._path)
+        if callable(value) and not inspect.isclass(value):
+            return self._wrap(value, charge=generates(self._path, name))
+        if _is_resource(value):
+            return AsyncGovernedClient(value, self._governor, self._path + (name,))
+        return value
+
+    def _wrap(self, fn: Callable[..., Any], *, charge: bool) -> Callable[..., Any]:
+        governor = self._governor
+
+        def governed(*args: Any, **kwargs: Any) -> Any:
+            # Calling an SDK method sends nothing yet: coroutines and paginators
+            # send on await, run streams on ``async with``.
+            result = fn(*args, **kwargs)
+            if hasattr(result, "__aenter__"):
+                return _AsyncGovernedStream(result, governor) if charge else result
+            if inspect.isawaitable(result):
+                return _await_governed(governor, result, lambda: fn(*args, **kwargs), charge=charge)
+            return result
+
+        return governed
+
+
+async def _await_governed(governor: AsyncOpenAIGovernor, first: Any, again: Callable[[], Any], *, charge: bool) -> Any:
+    pending = [first]
+    try:
+        return await governor.call(lambda: pending.pop() if pending else again(), charge=charge)
+    finally:
+        for unsent in pending:  # throttled before the first attempt
+            close = getattr(unsent, "close", None)
+            if close is not None:
+                close()
+
+
+def ungoverned(client: Any) -> Any:
+    """The raw client behind a governed one (cancellations must never wait on limits)."""
+    if isinstance(client, (GovernedClient, AsyncGovernedClient)):
+        return client.ungoverned
+    return client
+
+
+class _GovernedStream:
+    def __init__(self, manager: Any, governor: OpenAIGovernor, lease: Optional[str]) -> None:
+        self._manager = manager
+        self._governor = governor
+        self._lease = lease
+
+    def __enter__(self) -> Any:
+        try:
+            return self._manager.__enter__()
+        except BaseException:
+            self._governor.release(self._lease)
+            raise
+
+    def __exit__(self, *exc_info: Any) -> Any:
+        try:
+            return self._manager.__exit__(*exc_info)
+        finally:
+            self._governor.release(self._lease)
+
+
+class _AsyncGovernedStream:
+    def __init__(self, manager: Any, governor: AsyncOpenAIGovernor) -> None:
+        self._manager = manager
+        self._governor = governor
+        self._lease: Optional[str] = None
+
+    async def __aenter__(self) -> Any:
+        self._lease = await self._governor.acquire()
+        try:
+            return await self._manager.__aenter__()
+        except BaseException:
+            await self._governor.release(self._lease)
+            raise
+
+    async def __aexit__(self, *exc_info: Any) -> Any:
+        try:
+            return await self._manager.__aexit__(*exc_info)
+        finally:
+            await self._governor.release(self._lease)
+
+
+def _is_resource(value: Any) -> bool:
+    # SDK resource namespaces (client.beta.threads.runs, ...) and test doubles.
+    return hasattr(value, "__dict__") and not isinstance(value, type)
+
+
+def _bucket_tokens(limits: GovernorLimits, bucket: Dict[str, Any], now: float) -> float:
+    if not bucket:
+        return float(limits.burst)
+    tokens = float(bucket.get("tokens", limits.burst))
+    elapsed = max(now - float(bucket.get("ts", now)), 0.0)
+    return min(float(limits.burst), tokens + elapsed * limits.rpm / 60)
+
+
+def _bucket_wait(limits: GovernorLimits, bucket: Dict[str, Any], now: float) -> float:
+    if limits.rpm <= 0:
+        return 0.0
+    tokens = _bucket_tokens(limits, bucket, now)
+    return 0.0 if tokens >= 1 else (1 - tokens) * 60 / limits.rpm
@@ -1,13 +1,50 @@
 """Business logic helpers for interacting with OpenAI assistants."""
 from __future__ import annotations
 
+import asyncio
 import json
+import logging
+import time
 from dataclasses import dataclass
-from typing import Any, Dict, Iterable, List, Optional
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
 
 from flask import current_app
+from openai import NotFoundError
 
-from ..extensions import OpenAIExtension
+from ..extensions import OpenAIExtension, redis_extension
+from ..utils.deadline import DeadlineExceeded, current_deadline
+from ..utils.unit_of_work import cached_read, deferred_write
+from .context_window import ContextWindow, fallback_summary
+from .metrics_service import arecord_usage, record_usage
+from .openai_governor import AsyncGovernedClient, AsyncOpenAIGovernor, GovernedClient, OpenAIGovernor, ungoverned
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on requires_action -> submit_tool_outputs rounds within one turn.
+MAX_TOOL_ROUNDS = 10
+
+# Polling fallback when run events cannot be streamed: start fast (most runs
+# finish in a few seconds) and back off so slow runs don't burn API requests.
+RUN_POLL_INITIAL_SECONDS = 0.25
+RUN_POLL_BACKOFF = 1.5
+RUN_POLL_MAX_INTERVAL_SECONDS = 2.0
+RUN_POLL_MAX_SECONDS = 60.0
+# Per-request timeout of the extension clients; a message deadline lowers it.
+OPENAI_REQUEST_TIMEOUT_SECONDS = 60.0
+
+_RUN_ACTIVE_STATUSES = ("queued", "in_progress")
+
+# Last completed Responses-API response per (bot, user): the next turn chains on it.
+RESPONSES_CHAIN_KEY = "oa:responses:{bot_id}:{user_phone}"
+# Run the previous turn left on a thread (cancelled by the next turn).
+ACTIVE_RUN_KEY = "oa:thread:{thread_id}:active_run"
+THREAD_KEY = "thread:{namespace}:{user_phone}"
+
+# Canned replies, shared by the sync and async paths.
+NO_REPLY_TEXT = "Lo siento, no pude completar tu solicitud."
+TOOL_ERROR_TEXT = "Lo siento, hubo un error al procesar las acciones."
+TURN_ERROR_TEXT = "Lo siento, hubo un error al procesar tu mensaje."
+RUN_FAILED_TEXT = "Lo siento, no pude procesar tu mensaje en este momento."
 
 
 @dataclass
@@ -23,6 +60,13 @@ class AssistantResponse:
     thread_id: Optional[str] = None
     run_id: Optional[str] = None
     tool_call_ids: Optional[List[str]] = None
+    # Responses backend: the response awaiting function_call_output items.
+    response_id: Optional[str] = None
+    # Chat-completions backend: the request's messages plus the assistant
+    # tool_calls message, to be continued with the matching tool results.
+    chat_messages: Optional[List[Dict[str, Any]]] = None
+    # Canned error/fallback text instead of a model answer (never cached).
+    failed: bool = False
 
 
 @dataclass
@@ -48,8 +92,9 @@ class OpenAIAssistantService:
         model: Optional[str] = None,
         tools: Optional[Iterable[Dict[str, Any]]] = None,
         metadata: Optional[Dict[str, Any]] = None,
+        bot: Optional[Dict[str, Any]] = None,
     ) -> Dict[str, Any]:
-        client = self._require_client()
+        client = _governed(self._require_client(bot), bot)
         assistant = client.beta.assistants.create(
             name=name,
             instructions=instructions,
@@ -59,8 +104,10 @@ class OpenAIAssistantService:
         )
         return _safe_to_dict(assistant)
 
-    def update_assistant(self, assistant_id: str, **updates: Any) -> Dict[str, Any]:
-        client = self._require_client()
+    def update_assistant(
+        self, assistant_id: str, *, bot: Optional[Dict[str, Any]] = None, **updates: Any
+    ) -> Dict[str, Any]:
+        client = _governed(self._require_client(bot), bot)
         assistant = client.beta.assistants.update(assistant_id, **updates)
         return _safe_to_dict(assistant)
 
@@ -74,20 +121,23 @@ class OpenAIAssistantService:
         conversation: List[Dict[str, str]],
         tool_definitions: Optional[Iterable[Dict[str, Any]]] = None,
         user_phone: Optional[str] = None,
+        history_summary: Optional[str] = None,
+        client_state: Optional[str] = None,
     ) -> AssistantResponse:
-        client = self._extension.client
+        client = _governed(_with_budget(self._client_for(bot)), bot)
         if client is None:
-            return AssistantResponse(
-                reply_text=self._fallback_reply(conversation),
-                function_calls=[],
-            )
+            return _failed_reply(self._fallback_reply(conversation))
 
-        instructions = bot.get("instructions") or current_app.config.get(
-            "OPENAI_DEFAULT_INSTRUCTIONS"
-        )
-        model = bot.get("openai_model") or bot.get("model") or current_app.config.get(
-            "OPENAI_DEFAULT_MODEL"
-        )
+        if uses_responses_backend(bot):
+            # One request per reply (or per tool round), state chained server-side
+            return self._generate_responses_reply(
+                client,
+                bot=bot,
+                conversation=conversation,
+                tool_definitions=tool_definitions,
+                user_phone=user_phone,
+                client_state=client_state,
+            )
 
         # Check if bot has assistant_id
         assistant_id = bot.get("assistant_id")
@@ -97,15 +147,10 @@ class OpenAIAssistantService:
             return self._generate_assistant_reply(client, assistant_id, conversation, user_phone)
         else:
             # Fall back to regular chat completion
-            input_messages = self._build_messages(instructions, conversation)
-            
-            response = client.chat.completions.create(
-                model=model,
-                messages=input_messages,
-                tools=list(tool_definitions or []) if tool_definitions else None,
-            )
-            
-            return self._parse_chat_response(response)
+            request = self._chat_request(bot, conversation, tool_definitions, history_summary, client_state)
+            response = client.chat.completions.create(**request)
+            record_usage(redis_extension.client, source="chat", usage=getattr(response, "usage", None))
+            return self._parse_chat_response(response, request["messages"])
 
     def summarize_tool_results(
         self,
@@ -113,57 +158,149 @@ class OpenAIAssistantService:
         bot: Dict[str, Any],
         conversation: List[Dict[str, str]],
         tool_results: List[ToolResult],
+        history_summary: Optional[str] = None,
+        client_state: Optional[str] = None,
     ) -> str:
-        client = self._extension.client
+        client = _governed(_with_budget(self._client_for(bot)), bot)
         if client is None:
-            summary_parts = [
-                "He ejecutado estas acciones:",
-                *[f"- {result.name}: {result.content}" for result in tool_results],
-            ]
-            return "\n".join(summary_parts)
-
-        instructions = bot.get("instructions") or current_app.config.get(
-            "OPENAI_DEFAULT_INSTRUCTIONS"
+            return _tool_actions_text(tool_results)
+
+        response = client.responses.create(
+            **self._summary_request(bot, conversation, tool_results, history_summary, client_state)
         )
+        record_usage(redis_extension.client, source="chat", usage=getattr(response, "usage", None))
+        assistant_response = self._parse_response(response)
+        return assistant_response.reply_text
+
+    def fold_history_summary(
+        self,
+        *,
+        bot: Dict[str, Any],
+        summary: Optional[str],
+        evicted: List[Dict[str, str]],
+    ) -> str:
+        """Fold turns evicted from the context window into the rolling summary."""
+        max_tokens = int(current_app.config.get("CONTEXT_SUMMARY_MAX_TOKENS", 300))
         model = bot.get("openai_model") or bot.get("model") or current_app.config.get(
             "OPENAI_DEFAULT_MODEL"
         )
+        client = self._client_for(bot)
+        if client is None:
+            return fallback_summary(summary, evicted, max_tokens=max_tokens, model=model)
 
-        input_messages = self._build_messages(instructions, conversation)
-        for result in tool_results:
-            input_messages.append(
-                {
-                    "role": "tool",
-                    "content": result.content,
-                    "name": result.name,
-                }
+        transcript = "\n".join(
+            f"{message['role']}: {message.get('content', '')}"
+            for message in evicted
+            if message.get("role") in ("user", "assistant") and message.get("content")
+        )
+        try:
+            response = _governed(_with_budget(client), bot).chat.completions.create(
+                model=model,
+                max_tokens=max_tokens,
+                messages=[
+                    {
+                        "role": "system",
+                        "content": (
+                            "Actualiza el resumen de una conversación de WhatsApp con los nuevos mensajes. "
+                            "Conserva datos del cliente, acuerdos, fechas y pendientes; omite saludos. "
+                            f"Responde solo con el resumen, en menos de {max_tokens} tokens."
+                        ),
+                    },
+                    {
+                        "role": "user",
+                        "content": f"Resumen actual:\n{summary or '(vacío)'}\n\nNuevos mensajes:\n{transcript}",
+                    },
+                ],
             )
-
-        response = client.responses.create(model=model, input=input_messages)
-        assistant_response = self._parse_response(response)
-        return assistant_response.reply_text
+            record_usage(redis_extension.client, source="summary", usage=getattr(response, "usage", None))
+            return (response.choices[0].message.content or "").strip() or (summary or "")
+        except Exception as exc:  # includes DeadlineExceeded: keep the turn's reply
+            logger.warning("⚠️ Could not summarize evicted history, using extractive summary: %s", exc)
+            return fallback_summary(summary, evicted, max_tokens=max_tokens, model=model)
 
     # ------------------------------------------------------------------
     # Internal helpers
     # ------------------------------------------------------------------
-    def _require_client(self):
-        client = self._extension.client
+    def _client_for(self, bot: Optional[Dict[str, Any]]):
+        """Client for the bot's own ``openai_api_key`` (pooled per key), else the default one."""
+        api_key = (bot or {}).get("openai_api_key")
+        if not api_key:
+            return self._extension.client
+        return self._extension.client_for(api_key)
+
+    def _require_client(self, bot: Optional[Dict[str, Any]] = None):
+        client = self._client_for(bot)
         if client is None:
             raise RuntimeError(
                 "OpenAI client not configured. Set OPENAI_API_KEY to enable assistant operations."
             )
         return client
 
+    def _chat_request(
+        self,
+        bot: Dict[str, Any],
+        conversation: List[Dict[str, str]],
+        tool_definitions: Optional[Iterable[Dict[str, Any]]],
+        history_summary: Optional[str],
+        client_state: Optional[str],
+    ) -> Dict[str, Any]:
+        """``chat.completions.create`` kwargs for a turn (history bounded by the model's token budget)."""
+        model = _model_for(bot)
+        return {
+            "model": model,
+            "messages": self._build_messages(
+                _instructions_for(bot), self._windowed(model, conversation), history_summary, client_state
+            ),
+            "tools": list(tool_definitions or []) if tool_definitions else None,
+        }
+
+    def _summary_request(
+        self,
+        bot: Dict[str, Any],
+        conversation: List[Dict[str, str]],
+        tool_results: List[ToolResult],
+        history_summary: Optional[str],
+        client_state: Optional[str],
+    ) -> Dict[str, Any]:
+        """``responses.create`` kwargs that turn tool results without continuation state into a reply."""
+        model = _model_for(bot)
+        input_messages = self._build_messages(_instructions_for(bot), self._windowed(model, conversation), history_summary)
+        input_messages.extend(
+            {"role": "tool", "content": result.content, "name": result.name}
+            for result in tool_results
+        )
+        if client_state:
+            input_messages.append({"role": "system", "content": client_state})
+        return {"model": model, "input": input_messages}
+
     @staticmethod
     def _build_messages(
-        instructions: str, conversation: List[Dict[str, str]]
+        instructions: str,
+        conversation: List[Dict[str, str]],
+        history_summary: Optional[str] = None,
+        client_state: Optional[str] = None,
     ) -> List[Dict[str, str]]:
+        """Stable prefix first (instructions, summary, history), per-turn state last.
+
+        Keeping the volatile client state after the history lets the provider
+        reuse the cached prompt prefix from the previous turn.
+        """
         messages: List[Dict[str, str]] = [
             {"role": "system", "content": instructions}
         ]
+        if history_summary:
+            messages.append({"role": "system", "content": f"RESUMEN DE LA CONVERSACIÓN PREVIA:\n{history_summary}"})
         messages.extend(conversation)
+        if client_state:
+            messages.append({"role": "system", "content": client_state})
         return messages
 
+    @staticmethod
+    def _windowed(model: Optional[str], conversation: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """Newest turns that fit the model's history budget (system state messages stay)."""
+        _, kept = ContextWindow.for_model(model, current_app.config).fit(conversation, pin_system=True)
+        return kept
+
     @staticmethod
     def _parse_response(response: Any) -> AssistantResponse:
         reply_segments: List[str] = []
@@ -211,185 +348,66 @@ class OpenAIAssistantService:
         try:
             # Get or create thread for this user
             thread_id = self._get_or_create_thread(client, user_phone, namespace=assistant_id)
-            # Concurrency guard: avoid adding messages while a run is active
+            # Turns are serialized per conversation by ConversationLock, so a run
+            # still marked active here was orphaned by a crashed/timed-out turn:
+            # cancel it once instead of polling, otherwise the thread rejects new messages.
             from ..extensions import redis_extension
             redis_client = redis_extension.client
-            active_run_key = f"oa:thread:{thread_id}:active_run"
+            active_run_key = ACTIVE_RUN_KEY.format(thread_id=thread_id)
             try:
                 existing_run_id = redis_client.get(active_run_key)
                 if existing_run_id:
-                    # Verify status with API and wait briefly
-                    try:
-                        run = client.beta.threads.runs.retrieve(thread_id=thread_id, run_id=existing_run_id if isinstance(existing_run_id, str) else existing_run_id.decode('utf-8'))
-                        import time
-                        max_wait_secs = 5
-                        waited = 0
-                        while run.status in ["queued", "in_progress", "requires_action"] and waited < max_wait_secs:
-                            time.sleep(0.5)
-                            waited += 0.5
-                            run = client.beta.threads.runs.retrieve(thread_id=thread_id, run_id=run.id)
-                        if run.status in ["queued", "in_progress", "requires_action"]:
-                            # Still active; return a soft notice
-                            return AssistantResponse(
-                                reply_text="Estoy finalizando la acción anterior, dame unos segundos y vuelve a intentarlo.",
-                                function_calls=[]
-                            )
-                        else:
-                            # Clear flag
-                            try:
-                                redis_client.delete(active_run_key)
-                            except Exception:
-                                pass
-                    except Exception:
-                        # If retrieve fails, clear flag and continue
-                        try:
-                            redis_client.delete(active_run_key)
-                        except Exception:
-                            pass
+                    if isinstance(existing_run_id, bytes):
+                        existing_run_id = existing_run_id.decode("utf-8")
+                    self._cancel_orphaned_run(client, thread_id=thread_id, run_id=existing_run_id)
+                    redis_client.delete(active_run_key)
             except Exception:
                 # If Redis not available, continue without guard
                 pass
-            
-            # Add the latest message to the thread
+
+            # Add the latest message to the thread (recreating it if OpenAI lost it)
             if conversation:
                 latest_message = conversation[-1]
                 if latest_message.get("role") == "user":
-                    client.beta.threads.messages.create(
-                        thread_id=thread_id,
-                        role="user",
-                        content=latest_message.get("content", "")
+                    thread_id = self._add_user_message(
+                        client,
+                        thread_id,
+                        latest_message.get("content", ""),
+                        user_phone=user_phone,
+                        namespace=assistant_id,
                     )
+                    active_run_key = ACTIVE_RUN_KEY.format(thread_id=thread_id)
             
-            # Get current date context for additional instructions
-            from datetime import datetime
-            from zoneinfo import ZoneInfo
+            additional_instructions = _build_date_instructions()
             
-            chile_tz = ZoneInfo("America/Santiago")
-            now = datetime.now(chile_tz)
-            
-            day_names = ['lunes', 'martes', 'miércoles', 'jueves', 'viernes', 'sábado', 'domingo']
-            month_names = ['enero', 'febrero', 'marzo', 'abril', 'mayo', 'junio', 
-                          'julio', 'agosto', 'septiembre', 'octubre', 'noviembre', 'diciembre']
-            
-            day_name = day_names[now.weekday()]
-            month_name = month_names[now.month - 1]
-            
-            current_date_str = f"{day_name}, {now.day} de {month_name} de {now.year}"
-            current_iso = now.isoformat()
-            
-            # Create additional instructions with current date
-            additional_instructions = f"""INFORMACIÓN TEMPORAL CRÍTICA:
-- Fecha actual: {current_date_str}
-- Año actual: {now.year}
-- Fecha ISO: {current_iso}
-- Día de la semana: {day_name}
-- Mes: {month_name}
-
-IMPORTANTE: Cuando calcules fechas o crees agendamientos, SIEMPRE usa el año {now.year}, NO años anteriores.
-Si el usuario menciona "jueves", "viernes", etc., calcula la fecha en base a HOY ({current_date_str}, {now.year}).
-Todos los timestamps en las funciones deben usar el año {now.year}."""
-            
-            import logging
-            logger = logging.getLogger(__name__)
             logger.info(f"📅 Additional instructions being sent: {additional_instructions}")
             
-            # Run the assistant with additional instructions
-            run = client.beta.threads.runs.create(
+            # Run the assistant: streamed events when enabled, adaptive polling otherwise
+            run, reply_text = self._start_run(
+                client,
                 thread_id=thread_id,
                 assistant_id=assistant_id,
-                additional_instructions=additional_instructions
-            )
-            # Mark run as active in Redis (with short TTL)
-            try:
-                redis_client.setex(active_run_key, 300, run.id)
-            except Exception:
-                pass
-            
-            # Wait for completion
-            import time
-            max_iterations = 60  # Prevent infinite loop
-            iterations = 0
-            
-            while run.status in ["queued", "in_progress", "requires_action"] and iterations < max_iterations:
-                iterations += 1
-                time.sleep(1)
-                run = client.beta.threads.runs.retrieve(
-                    thread_id=thread_id,
-                    run_id=run.id
-                )
-                
-                # Handle function calls
-                if run.status == "requires_action":
-                    required_action = run.required_action
-                    if required_action and required_action.type == "submit_tool_outputs":
-                        function_calls = []
-                        tool_calls = required_action.submit_tool_outputs.tool_calls
-                        
-                        for tool_call in tool_calls:
-                            if tool_call.type == "function":
-                                function_name = tool_call.function.name
-                                try:
-                                    arguments = json.loads(tool_call.function.arguments)
-                                except json.JSONDecodeError:
-                                    arguments = {"_raw": tool_call.function.arguments}
-                                
-                                function_calls.append(AssistantFunctionCall(
-                                    name=function_name,
-                                    arguments=arguments
-                                ))
-                        
-                        # Return function calls with thread and run info for submission
-                        return AssistantResponse(
-                            reply_text="",
-                            function_calls=function_calls,
-                            thread_id=thread_id,
-                            run_id=run.id,
-                            tool_call_ids=[tc.id for tc in tool_calls]
-                        )
-            
-            if run.status == "completed":
-                # Get messages
-                messages = client.beta.threads.messages.list(thread_id=thread_id)
-                if messages.data:
-                    latest_message = messages.data[0]
-                    if latest_message.role == "assistant":
-                        content = latest_message.content[0]
-                        if hasattr(content, 'text'):
-                            # Clear active run flag on completion
-                            try:
-                                redis_client.delete(active_run_key)
-                            except Exception:
-                                pass
-                            return AssistantResponse(
-                                reply_text=content.text.value,
-                                function_calls=[]
-                            )
-            
-            # Handle other statuses
-            if run.status == "failed":
-                error_msg = run.last_error.message if run.last_error else "Unknown error"
-                print(f"Assistant run failed: {error_msg}")
-            elif run.status == "cancelled":
-                print(f"Assistant run was cancelled")
-            elif run.status == "expired":
-                print(f"Assistant run expired")
-            # Clear flag on terminal state
-            try:
-                redis_client.delete(active_run_key)
-            except Exception:
-                pass
-            
-            return AssistantResponse(
-                reply_text="Lo siento, no pude procesar tu mensaje en este momento.",
-                function_calls=[]
+                additional_instructions=additional_instructions,
+                on_run=lambda started: _mark_active_run(redis_client, active_run_key, started.id),
             )
+
+            if run.status == "completed" and reply_text is None:
+                messages = client.beta.threads.messages.list(thread_id=thread_id, limit=1)
+                reply_text = _latest_assistant_text(messages)
+            outcome = _run_outcome(run, thread_id, reply_text)
+            if not outcome.function_calls:
+                # Clear the active run flag once the run settled
+                try:
+                    redis_client.delete(active_run_key)
+                except Exception:
+                    pass
+            return outcome
             
+        except DeadlineExceeded:
+            raise
         except Exception as e:
-            print(f"Error in assistant conversation: {e}")
-            return AssistantResponse(
-                reply_text="Lo siento, hubo un error al procesar tu mensaje.",
-                function_calls=[]
-            )
+            logger.error("Error in assistant conversation: %s", e)
+            return _failed_reply()
 
     def submit_tool_outputs_and_wait(
         self,
@@ -397,92 +415,881 @@ Todos los timestamps en las funciones deben usar el año {now.year}."""
         run_id: str,
         tool_outputs: List[Dict[str, str]],
         on_tool_calls: Optional[Any] = None,
+        bot: Optional[Dict[str, Any]] = None,
     ) -> str:
-        """Submit tool outputs to a run and wait for completion."""
+        """Submit tool outputs to a run and wait for completion (``bot`` picks the rate limits)."""
         try:
-            client = self._require_client()
+            client = self._require_client(bot)
+            if _deadline_expired():
+                # Budget spent running the tools: don't leave the run waiting on outputs.
+                _cancel_run_on_deadline(client, thread_id=thread_id, run_id=run_id)
+            client = _governed(_with_budget(client), bot)
             from ..extensions import redis_extension
             redis_client = redis_extension.client
-            active_run_key = f"oa:thread:{thread_id}:active_run"
+            active_run_key = ACTIVE_RUN_KEY.format(thread_id=thread_id)
             
-            # Submit tool outputs
-            run = client.beta.threads.runs.submit_tool_outputs(
-                thread_id=thread_id,
-                run_id=run_id,
-                tool_outputs=tool_outputs
+            # Submit tool outputs and follow the run until it settles
+            run, reply_text = self._submit_tool_outputs(
+                client, thread_id=thread_id, run_id=run_id, tool_outputs=tool_outputs
             )
-            
-            # Wait for completion
-            import time
-            max_iterations = 60
-            iterations = 0
-            
-            while run.status in ["queued", "in_progress", "requires_action"] and iterations < max_iterations:
-                iterations += 1
-                time.sleep(1)
-                run = client.beta.threads.runs.retrieve(
+
+            # Handle subsequent tool calls (bounded, a looping assistant must not pin the worker)
+            for _ in range(MAX_TOOL_ROUNDS):
+                if run.status != "requires_action" or on_tool_calls is None:
+                    break
+                calls, call_ids = _required_function_calls(run)
+                if not calls:
+                    break
+                try:
+                    results: List[ToolResult] = on_tool_calls(calls)
+                except DeadlineExceeded:
+                    _cancel_run_on_deadline(client, thread_id=thread_id, run_id=run.id)
+                except Exception as exc:
+                    logger.warning("Tool round failed for run %s: %s", run.id, exc)
+                    break
+                run, reply_text = self._submit_tool_outputs(
+                    client,
                     thread_id=thread_id,
-                    run_id=run_id
+                    run_id=run.id,
+                    tool_outputs=_aligned_tool_outputs(call_ids, results),
                 )
-                # Handle subsequent tool calls
-                if run.status == "requires_action" and on_tool_calls is not None:
-                    required_action = run.required_action
-                    tool_calls = required_action.submit_tool_outputs.tool_calls if required_action else []
-                    calls: List[AssistantFunctionCall] = []
-                    call_ids: List[str] = []
-                    for tc in tool_calls:
-                        if tc.type == "function":
-                            call_ids.append(tc.id)
-                            try:
-                                args = json.loads(tc.function.arguments)
-                            except json.JSONDecodeError:
-                                args = {"_raw": tc.function.arguments}
-                            calls.append(AssistantFunctionCall(name=tc.function.name, arguments=args))
-                    if calls:
-                        try:
-                            results: List[ToolResult] = on_tool_calls(calls)
-                            # Align outputs by index
-                            outputs_payload = []
-                            for i, cid in enumerate(call_ids):
-                                output_str = results[i].content if i < len(results) else "{}"
-                                outputs_payload.append({"tool_call_id": cid, "output": output_str})
-                            run = client.beta.threads.runs.submit_tool_outputs(
-                                thread_id=thread_id,
-                                run_id=run_id,
-                                tool_outputs=outputs_payload,
-                            )
-                            continue
-                        except Exception:
-                            pass
-            
+
             if run.status == "completed":
-                # Get latest assistant message
-                messages = client.beta.threads.messages.list(thread_id=thread_id, limit=1)
-                if messages.data:
-                    latest_message = messages.data[0]
-                    if latest_message.role == "assistant":
-                        content = latest_message.content[0]
-                        if hasattr(content, 'text'):
-                            try:
-                                redis_client.delete(active_run_key)
-                            except Exception:
-                                pass
-                            return content.text.value
+                if reply_text is None:
+                    # Get latest assistant message
+                    messages = client.beta.threads.messages.list(thread_id=thread_id, limit=1)
+                    reply_text = _latest_assistant_text(messages)
+                if reply_text:
+                    try:
+                        redis_client.delete(active_run_key)
+                    except Exception:
+                        pass
+                    return reply_text
             
             # Clear flag on terminal states as safety
             try:
                 redis_client.delete(active_run_key)
             except Exception:
                 pass
-            return "Lo siento, no pude completar tu solicitud."
+            return NO_REPLY_TEXT
             
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             print(f"Error submitting tool outputs: {e}")
-            return "Lo siento, hubo un error al procesar las acciones."
+            return TOOL_ERROR_TEXT
+
+    def cancel_run(self, thread_id: str, run_id: str, bot: Optional[Dict[str, Any]] = None) -> None:
+        """Cancel a run waiting on tool outputs the turn can no longer provide (deadline hit)."""
+        client = self._client_for(bot)
+        if client is None:
+            return
+        try:
+            _cancel_run_on_deadline(client, thread_id=thread_id, run_id=run_id)
+        except DeadlineExceeded:
+            pass
+
+    def append_exchange(
+        self, *, bot: Dict[str, Any], user_phone: Optional[str], question: str, answer: str
+    ) -> None:
+        """Make a turn answered without the model (answer cache) visible to the next one.
+
+        Assistant threads hold their own history, so the exchange is posted to
+        the thread; Responses bots drop their chain and reseed it from the
+        session. Chat-completions bots already read the session.
+        """
+        client = self._client_for(bot)
+        try:
+            if uses_responses_backend(bot):
+                chain_key = _responses_chain_key(bot, user_phone)
+                if chain_key:
+                    redis_extension.client.delete(chain_key)
+                return
+            assistant_id = bot.get("assistant_id")
+            if client is None or not assistant_id:
+                return
+            client = _governed(_with_budget(client), bot)
+            thread_id = self._get_or_create_thread(client, user_phone, namespace=assistant_id)
+            thread_id = self._add_user_message(
+                client, thread_id, question, user_phone=user_phone, namespace=assistant_id
+            )
+            client.beta.threads.messages.create(thread_id=thread_id, role="assistant", content=answer)
+        except Exception as exc:
+            logger.warning("Could not record cached exchange for %s: %s", user_phone, exc)
+
+    def _start_run(
+        self,
+        client,
+        *,
+        thread_id: str,
+        assistant_id: str,
+        additional_instructions: str,
+        on_run: Callable[[Any], None],
+    ) -> Tuple[Any, Optional[str]]:
+        """Start a run and follow it until it stops (completed, requires_action, failed...).
+
+        Returns ``(run, reply_text)``; ``reply_text`` is only set when the
+        streamed events already carried the assistant message.
+        """
+        run, reply_text = None, None
+        if _streaming_enabled():
+            try:
+                run, reply_text = _consume_run_stream(
+                    client.beta.threads.runs.stream(
+                        thread_id=thread_id,
+                        assistant_id=assistant_id,
+                        additional_instructions=additional_instructions,
+                    ),
+                    on_run=on_run,
+                )
+            except DeadlineExceeded:
+                raise
+            except Exception as exc:
+                logger.warning("⚠️ Streaming de run no disponible, usando polling: %s", exc)
+        if run is None:
+            run = client.beta.threads.runs.create(
+                thread_id=thread_id,
+                assistant_id=assistant_id,
+                additional_instructions=additional_instructions,
+            )
+            on_run(run)
+        run = _poll_run(client, thread_id=thread_id, run=run)
+        record_usage(redis_extension.client, source="assistant", usage=getattr(run, "usage", None))
+        return run, reply_text
+
+    def _submit_tool_outputs(
+        self,
+        client,
+        *,
+        thread_id: str,
+        run_id: str,
+        tool_outputs: List[Dict[str, str]],
+    ) -> Tuple[Any, Optional[str]]:
+        """Submit tool outputs and follow the run, streamed when enabled (see :meth:`_start_run`)."""
+        run, reply_text = None, None
+        if _streaming_enabled():
+            try:
+                run, reply_text = _consume_run_stream(
+                    client.beta.threads.runs.submit_tool_outputs_stream(
+                        thread_id=thread_id,
+                        run_id=run_id,
+                        tool_outputs=tool_outputs,
+                    )
+                )
+            except DeadlineExceeded:
+                raise
+            except Exception as exc:
+                logger.warning("⚠️ Streaming de tool outputs no disponible, usando polling: %s", exc)
+        if run is None:
+            run = client.beta.threads.runs.submit_tool_outputs(
+                thread_id=thread_id,
+                run_id=run_id,
+                tool_outputs=tool_outputs,
+            )
+        run = _poll_run(client, thread_id=thread_id, run=run)
+        record_usage(redis_extension.client, source="assistant", usage=getattr(run, "usage", None))
+        return run, reply_text
+
+    def submit_response_tool_outputs(
+        self,
+        *,
+        bot: Dict[str, Any],
+        user_phone: Optional[str],
+        response_id: str,
+        tool_outputs: List[Dict[str, str]],
+        on_tool_calls: Optional[Callable[[List[AssistantFunctionCall]], List[ToolResult]]] = None,
+    ) -> str:
+        """Responses backend counterpart of :meth:`submit_tool_outputs_and_wait`."""
+        try:
+            client = _governed(_with_budget(self._require_client(bot)), bot)
+            response = self._create_response(
+                client, bot=bot, input_items=_function_call_outputs(tool_outputs), previous_response_id=response_id
+            )
+            for _ in range(MAX_TOOL_ROUNDS):
+                calls, call_ids = _response_function_calls(response)
+                if not calls or on_tool_calls is None:
+                    break
+                results = on_tool_calls(calls)
+                response = self._create_response(
+                    client,
+                    bot=bot,
+                    input_items=_function_call_outputs(_aligned_tool_outputs(call_ids, results)),
+                    previous_response_id=response.id,
+                )
+            if _response_function_calls(response)[0]:
+                # Never chain the next turn on a response still waiting for tool outputs.
+                return NO_REPLY_TEXT
+            _remember_response(redis_extension.client, bot, user_phone, response.id)
+            return _response_text(response) or NO_REPLY_TEXT
+        except DeadlineExceeded:
+            raise
+        except Exception as exc:
+            logger.error("Error submitting tool outputs to the Responses API: %s", exc)
+            return TOOL_ERROR_TEXT
+
+    def submit_chat_tool_outputs(
+        self,
+        *,
+        bot: Dict[str, Any],
+        messages: List[Dict[str, Any]],
+        tool_outputs: List[Dict[str, str]],
+        tool_definitions: Optional[Iterable[Dict[str, Any]]] = None,
+        on_tool_calls: Optional[Callable[[List[AssistantFunctionCall]], List[ToolResult]]] = None,
+    ) -> str:
+        """Chat-completions counterpart of :meth:`submit_tool_outputs_and_wait`.
+
+        ``messages`` (:attr:`AssistantResponse.chat_messages`) end with the
+        assistant's tool_calls; the tool results are appended with their
+        ``tool_call_id`` and the same completion continues, one request per
+        tool round. The last allowed round forbids further tool calls.
+        """
+        try:
+            client = _governed(_with_budget(self._require_client(bot)), bot)
+            tools = list(tool_definitions or []) or None
+            messages = [*messages, *_chat_tool_messages(tool_outputs)]
+            for round_number in range(MAX_TOOL_ROUNDS):
+                response = client.chat.completions.create(
+                    **_chat_tool_round(bot, messages, tools, final=round_number == MAX_TOOL_ROUNDS - 1)
+                )
+                record_usage(redis_extension.client, source="chat", usage=getattr(response, "usage", None))
+                parsed = self._parse_chat_response(response, messages)
+                if not parsed.function_calls or on_tool_calls is None:
+                    return parsed.reply_text
+                results = on_tool_calls(parsed.function_calls)
+                messages = [
+                    *parsed.chat_messages,
+                    *_chat_tool_messages(_aligned_tool_outputs(parsed.tool_call_ids, results)),
+                ]
+            return NO_REPLY_TEXT
+        except DeadlineExceeded:
+            raise
+        except Exception as exc:
+            logger.error("Error continuing the chat completion with tool results: %s", exc)
+            return TOOL_ERROR_TEXT
+
+    def _generate_responses_reply(
+        self,
+        client,
+        *,
+        bot: Dict[str, Any],
+        conversation: List[Dict[str, str]],
+        tool_definitions: Optional[Iterable[Dict[str, Any]]],
+        user_phone: Optional[str],
+        client_state: Optional[str],
+    ) -> AssistantResponse:
+        redis_client = redis_extension.client
+        chain_key = _responses_chain_key(bot, user_phone)
+        try:
+            previous_id = redis_client.get(chain_key) if chain_key else None
+        except Exception:
+            previous_id = None
+        try:
+            try:
+                response = self._create_response(
+                    client,
+                    bot=bot,
+                    tool_definitions=tool_definitions,
+                    input_items=self._responses_turn_input(bot, conversation, client_state, chained=bool(previous_id)),
+                    previous_response_id=previous_id,
+                )
+            except NotFoundError:
+                if not previous_id:
+                    raise
+                # Stored responses expire server-side: restart the chain from the session log.
+                logger.warning("🧵 Response %s ya no existe en OpenAI, iniciando nueva cadena", previous_id)
+                response = self._create_response(
+                    client,
+                    bot=bot,
+                    tool_definitions=tool_definitions,
+                    input_items=self._responses_turn_input(bot, conversation, client_state, chained=False),
+                )
+            outcome = _responses_outcome(response)
+            if not outcome.function_calls:
+                _remember_response(redis_client, bot, user_phone, response.id)
+            return outcome
+        except DeadlineExceeded:
+            raise
+        except Exception as exc:
+            logger.error("Error in Responses API conversation: %s", exc)
+            return _failed_reply()
+
+    def _create_response(
+        self,
+        client,
+        *,
+        bot: Dict[str, Any],
+        input_items: List[Dict[str, Any]],
+        tool_definitions: Optional[Iterable[Dict[str, Any]]] = None,
+        previous_response_id: Optional[str] = None,
+    ) -> Any:
+        response = client.responses.create(
+            **_responses_request(bot, input_items, tool_definitions, previous_response_id)
+        )
+        record_usage(redis_extension.client, source="responses", usage=getattr(response, "usage", None))
+        return response
+
+    def _responses_turn_input(
+        self,
+        bot: Dict[str, Any],
+        conversation: List[Dict[str, str]],
+        client_state: Optional[str],
+        *,
+        chained: bool,
+    ) -> List[Dict[str, Any]]:
+        """Input items for a new turn; a fresh chain is seeded with the session history."""
+        items: List[Dict[str, Any]] = []
+        if not chained and len(conversation) > 1:
+            history = [m for m in conversation[:-1] if m.get("role") in ("user", "assistant") and m.get("content")]
+            items.extend(
+                {"role": m["role"], "content": m["content"]}
+                for m in self._windowed(_model_for(bot), history)
+            )
+        if client_state:
+            items.append({"role": "system", "content": client_state})
+        if conversation and conversation[-1].get("role") == "user":
+            items.append({"role": "user", "content": conversation[-1].get("content", "")})
+        return items
+
+    # ------------------------------------------------------------------
+    # asyncio counterparts (asyncio stream worker). ``client`` is an
+    # AsyncOpenAI instance and ``redis_client`` a redis.asyncio client, both
+    # owned by the caller's event loop.
+    # ------------------------------------------------------------------
+    async def agenerate_reply(
+        self,
+        *,
+        client,
+        redis_client,
+        bot: Dict[str, Any],
+        conversation: List[Dict[str, str]],
+        tool_definitions: Optional[Iterable[Dict[str, Any]]] = None,
+        user_phone: Optional[str] = None,
+        history_summary: Optional[str] = None,
+        client_state: Optional[str] = None,
+    ) -> AssistantResponse:
+        client = _agoverned(_with_budget(client), redis_client, bot)
+        if client is None:
+            return _failed_reply(self._fallback_reply(conversation))
+
+        if uses_responses_backend(bot):
+            return await self._agenerate_responses_reply(
+                client,
+                redis_client,
+                bot=bot,
+                conversation=conversation,
+                tool_definitions=tool_definitions,
+                user_phone=user_phone,
+                client_state=client_state,
+            )
+
+        assistant_id = bot.get("assistant_id")
+        if assistant_id:
+            return await self._agenerate_assistant_reply(
+                client, redis_client, assistant_id, conversation, user_phone
+            )
+
+        request = self._chat_request(bot, conversation, tool_definitions, history_summary, client_state)
+        response = await client.chat.completions.create(**request)
+        await arecord_usage(redis_client, source="chat", usage=getattr(response, "usage", None))
+        return self._parse_chat_response(response, request["messages"])
+
+    async def asummarize_tool_results(
+        self,
+        *,
+        client,
+        bot: Dict[str, Any],
+        conversation: List[Dict[str, str]],
+        tool_results: List[ToolResult],
+        history_summary: Optional[str] = None,
+        client_state: Optional[str] = None,
+        redis_client=None,
+    ) -> str:
+        client = _agoverned(_with_budget(client), redis_client, bot)
+        if client is None:
+            return _tool_actions_text(tool_results)
+
+        response = await client.responses.create(
+            **self._summary_request(bot, conversation, tool_results, history_summary, client_state)
+        )
+        if redis_client is not None:
+            await arecord_usage(redis_client, source="chat", usage=getattr(response, "usage", None))
+        return self._parse_response(response).reply_text
+
+    async def asubmit_tool_outputs_and_wait(
+        self,
+        *,
+        client,
+        redis_client,
+        thread_id: str,
+        run_id: str,
+        tool_outputs: List[Dict[str, str]],
+        on_tool_calls: Optional[Callable[[List[AssistantFunctionCall]], Awaitable[List[ToolResult]]]] = None,
+        bot: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        """Async :meth:`submit_tool_outputs_and_wait`; ``on_tool_calls`` is awaited."""
+        active_run_key = ACTIVE_RUN_KEY.format(thread_id=thread_id)
+        try:
+            if _deadline_expired():
+                await _acancel_run_on_deadline(client, thread_id=thread_id, run_id=run_id)
+            client = _agoverned(_with_budget(client), redis_client, bot)
+            run, reply_text = await self._asubmit_tool_outputs(
+                client, redis_client, thread_id=thread_id, run_id=run_id, tool_outputs=tool_outputs
+            )
+            for _ in range(MAX_TOOL_ROUNDS):
+                if run.status != "requires_action" or on_tool_calls is None:
+                    break
+                calls, call_ids = _required_function_calls(run)
+                if not calls:
+                    break
+                try:
+                    results = await on_tool_calls(calls)
+                except DeadlineExceeded:
+                    await _acancel_run_on_deadline(client, thread_id=thread_id, run_id=run.id)
+                except Exception as exc:
+                    logger.warning("Tool round failed for run %s: %s", run.id, exc)
+                    break
+                run, reply_text = await self._asubmit_tool_outputs(
+                    client,
+                    redis_client,
+                    thread_id=thread_id,
+                    run_id=run.id,
+                    tool_outputs=_aligned_tool_outputs(call_ids, results),
+                )
+
+            if run.status == "completed" and reply_text is None:
+                messages = await client.beta.threads.messages.list(thread_id=thread_id, limit=1)
+                reply_text = _latest_assistant_text(messages)
+            await self._aclear_active_run(redis_client, active_run_key)
+            return reply_text or NO_REPLY_TEXT
+        except DeadlineExceeded:
+            raise
+        except Exception as exc:
+            logger.error("Error submitting tool outputs: %s", exc)
+            return TOOL_ERROR_TEXT
+
+    async def asubmit_response_tool_outputs(
+        self,
+        *,
+        client,
+        redis_client,
+        bot: Dict[str, Any],
+        user_phone: Optional[str],
+        response_id: str,
+        tool_outputs: List[Dict[str, str]],
+        on_tool_calls: Optional[Callable[[List[AssistantFunctionCall]], Awaitable[List[ToolResult]]]] = None,
+    ) -> str:
+        """Async :meth:`submit_response_tool_outputs`; ``on_tool_calls`` is awaited."""
+        try:
+            client = _agoverned(_with_budget(client), redis_client, bot)
+            response = await self._acreate_response(
+                client, redis_client, bot=bot,
+                input_items=_function_call_outputs(tool_outputs), previous_response_id=response_id,
+            )
+            for _ in range(MAX_TOOL_ROUNDS):
+                calls, call_ids = _response_function_calls(response)
+                if not calls or on_tool_calls is None:
+                    break
+                results = await on_tool_calls(calls)
+                response = await self._acreate_response(
+                    client, redis_client, bot=bot,
+                    input_items=_function_call_outputs(_aligned_tool_outputs(call_ids, results)),
+                    previous_response_id=response.id,
+                )
+            if _response_function_calls(response)[0]:
+                return NO_REPLY_TEXT
+            await _aremember_response(redis_client, bot, user_phone, response.id)
+            return _response_text(response) or NO_REPLY_TEXT
+        except DeadlineExceeded:
+            raise
+        except Exception as exc:
+            logger.error("Error submitting tool outputs to the Responses API: %s", exc)
+            return TOOL_ERROR_TEXT
+
+    async def asubmit_chat_tool_outputs(
+        self,
+        *,
+        client,
+        redis_client,
+        bot: Dict[str, Any],
+        messages: List[Dict[str, Any]],
+        tool_outputs: List[Dict[str, str]],
+        tool_definitions: Optional[Iterable[Dict[str, Any]]] = None,
+        on_tool_calls: Optional[Callable[[List[AssistantFunctionCall]], Awaitable[List[ToolResult]]]] = None,
+    ) -> str:
+        """Async :meth:`submit_chat_tool_outputs`; ``on_tool_calls`` is awaited."""
+        try:
+            client = _agoverned(_with_budget(client), redis_client, bot)
+            tools = list(tool_definitions or []) or None
+            messages = [*messages, *_chat_tool_messages(tool_outputs)]
+            for round_number in range(MAX_TOOL_ROUNDS):
+                response = await client.chat.completions.create(
+                    **_chat_tool_round(bot, messages, tools, final=round_number == MAX_TOOL_ROUNDS - 1)
+                )
+                await arecord_usage(redis_client, source="chat", usage=getattr(response, "usage", None))
+                parsed = self._parse_chat_response(response, messages)
+                if not parsed.function_calls or on_tool_calls is None:
+                    return parsed.reply_text
+                results = await on_tool_calls(parsed.function_calls)
+                messages = [
+                    *parsed.chat_messages,
+                    *_chat_tool_messages(_aligned_tool_outputs(parsed.tool_call_ids, results)),
+                ]
+            return NO_REPLY_TEXT
+        except DeadlineExceeded:
+            raise
+        except Exception as exc:
+            logger.error("Error continuing the chat completion with tool results: %s", exc)
+            return TOOL_ERROR_TEXT
+
+    async def _agenerate_responses_reply(
+        self,
+        client,
+        redis_client,
+        *,
+        bot: Dict[str, Any],
+        conversation: List[Dict[str, str]],
+        tool_definitions: Optional[Iterable[Dict[str, Any]]],
+        user_phone: Optional[str],
+        client_state: Optional[str],
+    ) -> AssistantResponse:
+        chain_key = _responses_chain_key(bot, user_phone)
+        try:
+            previous_id = await redis_client.get(chain_key) if chain_key else None
+        except Exception:
+            previous_id = None
+        try:
+            try:
+                response = await self._acreate_response(
+                    client, redis_client, bot=bot, tool_definitions=tool_definitions,
+                    input_items=self._responses_turn_input(bot, conversation, client_state, chained=bool(previous_id)),
+                    previous_response_id=previous_id,
+                )
+            except NotFoundError:
+                if not previous_id:
+                    raise
+                logger.warning("🧵 Response %s ya no existe en OpenAI, iniciando nueva cadena", previous_id)
+                response = await self._acreate_response(
+                    client, redis_client, bot=bot, tool_definitions=tool_definitions,
+                    input_items=self._responses_turn_input(bot, conversation, client_state, chained=False),
+                )
+            outcome = _responses_outcome(response)
+            if not outcome.function_calls:
+                await _aremember_response(redis_client, bot, user_phone, response.id)
+            return outcome
+        except DeadlineExceeded:
+            raise
+        except Exception as exc:
+            logger.error("Error in Responses API conversation: %s", exc)
+            return _failed_reply()
+
+    @staticmethod
+    async def _acreate_response(
+        client,
+        redis_client,
+        *,
+        bot: Dict[str, Any],
+        input_items: List[Dict[str, Any]],
+        tool_definitions: Optional[Iterable[Dict[str, Any]]] = None,
+        previous_response_id: Optional[str] = None,
+    ) -> Any:
+        response = await client.responses.create(
+            **_responses_request(bot, input_items, tool_definitions, previous_response_id)
+        )
+        await arecord_usage(redis_client, source="responses", usage=getattr(response, "usage", None))
+        return response
+
+    async def _agenerate_assistant_reply(
+        self,
+        client,
+        redis_client,
+        assistant_id: str,
+        conversation: List[Dict[str, str]],
+        user_phone: Optional[str] = None,
+    ) -> AssistantResponse:
+        try:
+            thread_id = await self._aget_or_create_thread(client, redis_client, user_phone, namespace=assistant_id)
+            active_run_key = ACTIVE_RUN_KEY.format(thread_id=thread_id)
+            try:
+                existing_run_id = await redis_client.get(active_run_key)
+                if existing_run_id:
+                    await self._acancel_orphaned_run(client, thread_id=thread_id, run_id=existing_run_id)
+                    await redis_client.delete(active_run_key)
+            except Exception:
+                pass
+
+            if conversation and conversation[-1].get("role") == "user":
+                thread_id = await self._aadd_user_message(
+                    client,
+                    redis_client,
+                    thread_id,
+                    conversation[-1].get("content", ""),
+                    user_phone=user_phone,
+                    namespace=assistant_id,
+                )
+                active_run_key = ACTIVE_RUN_KEY.format(thread_id=thread_id)
+
+            async def _mark_started(started: Any) -> None:
+                try:
+                    await redis_client.setex(active_run_key, 300, started.id)
+                except Exception:
+                    pass
+
+            run, reply_text = await self._astart_run(
+                client,
+                redis_client,
+                thread_id=thread_id,
+                assistant_id=assistant_id,
+                additional_instructions=_build_date_instructions(),
+                on_run=_mark_started,
+            )
+            if run.status == "completed" and reply_text is None:
+                messages = await client.beta.threads.messages.list(thread_id=thread_id, limit=1)
+                reply_text = _latest_assistant_text(messages)
+            outcome = _run_outcome(run, thread_id, reply_text)
+            if not outcome.function_calls:
+                await self._aclear_active_run(redis_client, active_run_key)
+            return outcome
+        except DeadlineExceeded:
+            raise
+        except Exception as exc:
+            logger.error("Error in assistant conversation: %s", exc)
+            return _failed_reply()
+
+    async def acancel_run(self, *, client, thread_id: str, run_id: str) -> None:
+        """Async :meth:`cancel_run`."""
+        if client is None:
+            return
+        try:
+            await _acancel_run_on_deadline(client, thread_id=thread_id, run_id=run_id)
+        except DeadlineExceeded:
+            pass
+
+    async def aappend_exchange(
+        self, *, client, redis_client, bot: Dict[str, Any], user_phone: Optional[str], question: str, answer: str
+    ) -> None:
+        """Async :meth:`append_exchange`."""
+        try:
+            if uses_responses_backend(bot):
+                chain_key = _responses_chain_key(bot, user_phone)
+                if chain_key:
+                    await redis_client.delete(chain_key)
+                return
+            assistant_id = bot.get("assistant_id")
+            if client is None or not assistant_id:
+                return
+            client = _agoverned(_with_budget(client), redis_client, bot)
+            thread_id = await self._aget_or_create_thread(client, redis_client, user_phone, namespace=assistant_id)
+            thread_id = await self._aadd_user_message(
+                client, redis_client, thread_id, question, user_phone=user_phone, namespace=assistant_id
+            )
+            await client.beta.threads.messages.create(thread_id=thread_id, role="assistant", content=answer)
+        except Exception as exc:
+            logger.warning("Could not record cached exchange for %s: %s", user_phone, exc)
+
+    async def _astart_run(
+        self,
+        client,
+        redis_client,
+        *,
+        thread_id: str,
+        assistant_id: str,
+        additional_instructions: str,
+        on_run: Callable[[Any], Awaitable[None]],
+    ) -> Tuple[Any, Optional[str]]:
+        """Async :meth:`_start_run`; ``on_run`` is awaited."""
+        run, reply_text = None, None
+        if _streaming_enabled():
+            try:
+                run, reply_text = await _aconsume_run_stream(
+                    client.beta.threads.runs.stream(
+                        thread_id=thread_id,
+                        assistant_id=assistant_id,
+                        additional_instructions=additional_instructions,
+                    ),
+                    on_run=on_run,
+                )
+            except DeadlineExceeded:
+                raise
+            except Exception as exc:
+                logger.warning("⚠️ Streaming de run no disponible, usando polling: %s", exc)
+        if run is None:
+            run = await client.beta.threads.runs.create(
+                thread_id=thread_id,
+                assistant_id=assistant_id,
+                additional_instructions=additional_instructions,
+            )
+            await on_run(run)
+        run = await self._await_run(client, thread_id=thread_id, run=run)
+        await arecord_usage(redis_client, source="assistant", usage=getattr(run, "usage", None))
+        return run, reply_text
+
+    async def _asubmit_tool_outputs(
+        self,
+        client,
+        redis_client,
+        *,
+        thread_id: str,
+        run_id: str,
+        tool_outputs: List[Dict[str, str]],
+    ) -> Tuple[Any, Optional[str]]:
+        """Async :meth:`_submit_tool_outputs`."""
+        run, reply_text = None, None
+        if _streaming_enabled():
+            try:
+                run, reply_text = await _aconsume_run_stream(
+                    client.beta.threads.runs.submit_tool_outputs_stream(
+                        thread_id=thread_id,
+                        run_id=run_id,
+                        tool_outputs=tool_outputs,
+                    )
+                )
+            except DeadlineExceeded:
+                raise
+            except Exception as exc:
+                logger.warning("⚠️ Streaming de tool outputs no disponible, usando polling: %s", exc)
+        if run is None:
+            run = await client.beta.threads.runs.submit_tool_outputs(
+                thread_id=thread_id,
+                run_id=run_id,
+                tool_outputs=tool_outputs,
+            )
+        run = await self._await_run(client, thread_id=thread_id, run=run)
+        await arecord_usage(redis_client, source="assistant", usage=getattr(run, "usage", None))
+        return run, reply_text
+
+    @staticmethod
+    async def _await_run(client, *, thread_id: str, run: Any, max_seconds: float = RUN_POLL_MAX_SECONDS) -> Any:
+        """Poll with adaptive backoff until the run leaves queued/in_progress; sleeping yields the event loop.
+
+        Like :func:`_poll_run`, a run still active when the message deadline
+        passes is cancelled and :class:`DeadlineExceeded` raised.
+        """
+        stop = _poll_stop(max_seconds)
+        delay = RUN_POLL_INITIAL_SECONDS
+        while run.status in _RUN_ACTIVE_STATUSES and time.monotonic() < stop:
+            await asyncio.sleep(min(delay, max(stop - time.monotonic(), 0.0)))
+            delay = min(delay * RUN_POLL_BACKOFF, RUN_POLL_MAX_INTERVAL_SECONDS)
+            run = await client.beta.threads.runs.retrieve(thread_id=thread_id, run_id=run.id)
+        if run.status in _RUN_ACTIVE_STATUSES and _deadline_expired():
+            await _acancel_run_on_deadline(client, thread_id=thread_id, run_id=run.id)
+        return run
+
+    @staticmethod
+    async def _aclear_active_run(redis_client, active_run_key: str) -> None:
+        try:
+            await redis_client.delete(active_run_key)
+        except Exception:
+            pass
+
+    @staticmethod
+    async def _acancel_orphaned_run(client, *, thread_id: str, run_id: str) -> None:
+        try:
+            run = await client.beta.threads.runs.retrieve(thread_id=thread_id, run_id=run_id)
+            if run.status not in ["queued", "in_progress", "requires_action"]:
+                return
+            logger.warning("🧹 Cancelling orphaned run %s on thread %s", run_id, thread_id)
+            await client.beta.threads.runs.cancel(thread_id=thread_id, run_id=run_id)
+        except Exception as exc:
+            logger.warning("Could not cancel orphaned run %s: %s", run_id, exc)
+
+    @staticmethod
+    async def _aget_or_create_thread(
+        client, redis_client, user_phone: Optional[str], namespace: Optional[str], *, force_new: bool = False
+    ) -> str:
+        if not user_phone:
+            thread = await client.beta.threads.create()
+            return thread.id
+        thread_key = THREAD_KEY.format(namespace=namespace or "default", user_phone=user_phone)
+        verified_key = f"{thread_key}:verified"
+        try:
+            thread_id = None if force_new else await redis_client.get(thread_key)
+            if thread_id:
+                if await redis_client.get(verified_key) == thread_id:
+                    return thread_id
+                try:
+                    await client.beta.threads.retrieve(thread_id)
+                    await _amark_thread_verified(redis_client, verified_key, thread_id)
+                    return thread_id
+                except Exception:
+                    pass
+            thread = await client.beta.threads.create()
+            await redis_client.setex(thread_key, 604800, thread.id)  # 7 days
+            await _amark_thread_verified(redis_client, verified_key, thread.id)
+            return thread.id
+        except Exception as exc:
+            logger.warning("Redis error managing thread for %s: %s", user_phone, exc)
+            thread = await client.beta.threads.create()
+            return thread.id
 
-    def _get_or_create_thread(self, client, user_phone: str = None, namespace: str | None = None) -> str:
+    async def _aadd_user_message(
+        self,
+        client,
+        redis_client,
+        thread_id: str,
+        content: str,
+        *,
+        user_phone: Optional[str],
+        namespace: Optional[str],
+    ) -> str:
+        """Async :meth:`_add_user_message`."""
+        try:
+            await client.beta.threads.messages.create(thread_id=thread_id, role="user", content=content)
+            return thread_id
+        except NotFoundError:
+            logger.warning("🧵 Thread %s ya no existe en OpenAI, creando uno nuevo", thread_id)
+        thread_id = await self._aget_or_create_thread(client, redis_client, user_phone, namespace, force_new=True)
+        await client.beta.threads.messages.create(thread_id=thread_id, role="user", content=content)
+        return thread_id
+
+    @staticmethod
+    def _cancel_orphaned_run(client, *, thread_id: str, run_id: str) -> None:
+        """Cancel a run left active by a previous turn that never finished it."""
+        try:
+            run = client.beta.threads.runs.retrieve(thread_id=thread_id, run_id=run_id)
+            if run.status not in ["queued", "in_progress", "requires_action"]:
+                return
+            logger.warning("🧹 Cancelling orphaned run %s on thread %s", run_id, thread_id)
+            run = client.beta.threads.runs.cancel(thread_id=thread_id, run_id=run_id)
+            # Cancellation is asynchronous; give it a brief, bounded moment to settle.
+            for _ in range(3):
+                if run.status not in ["queued", "in_progress", "requires_action", "cancelling"]:
+                    break
+                time.sleep(0.5)
+                run = client.beta.threads.runs.retrieve(thread_id=thread_id, run_id=run_id)
+        except Exception as exc:
+            logger.warning("Could not cancel orphaned run %s: %s", run_id, exc)
+
+    def _add_user_message(
+        self,
+        client,
+        thread_id: str,
+        content: str,
+        *,
+        user_phone: Optional[str],
+        namespace: Optional[str],
+    ) -> str:
+        """Add the user's message, recreating the thread if OpenAI no longer has it.
+
+        Cached threads are trusted without a ``threads.retrieve`` round trip
+        (see :meth:`_get_or_create_thread`), so a deleted/expired thread is
+        only discovered here. Returns the thread id actually used.
+        """
+        try:
+            client.beta.threads.messages.create(thread_id=thread_id, role="user", content=content)
+            return thread_id
+        except NotFoundError:
+            logger.warning("🧵 Thread %s ya no existe en OpenAI, creando uno nuevo", thread_id)
+        thread_id = self._get_or_create_thread(client, user_phone, namespace=namespace, force_new=True)
+        client.beta.threads.messages.create(thread_id=thread_id, role="user", content=content)
+        return thread_id
+
+    def _get_or_create_thread(
+        self, client, user_phone: str = None, namespace: str | None = None, *, force_new: bool = False
+    ) -> str:
         """Get existing thread for user or create a new one.
         Namespace isolates threads per assistant/bot when provided.
+        A cached thread confirmed within THREAD_VERIFY_TTL_SECONDS is returned
+        without calling OpenAI; ``force_new`` replaces it unconditionally.
         """
         try:
             # Usar redis_extension.client en vez de redis_client
@@ -496,20 +1303,30 @@ Todos los timestamps en las funciones deben usar el año {now.year}."""
 
             # Use Redis to store thread_id per user (and namespace if provided)
             ns = namespace or "default"
-            thread_key = f"thread:{ns}:{user_phone}"
+            thread_key = THREAD_KEY.format(namespace=ns, user_phone=user_phone)
+
+            verified_key = f"{thread_key}:verified"
 
             try:
                 # Try to get existing thread
-                thread_id = redis_client.get(thread_key)
+                thread_id = None if force_new else cached_read(redis_client, "get", thread_key)
                 if thread_id:
                     # Handle both string and bytes from Redis
                     if isinstance(thread_id, bytes):
                         thread_id = thread_id.decode('utf-8')
                     # else: thread_id is already a string
 
+                    # Recently confirmed: trust it, a lost thread is caught by _add_user_message
+                    verified = cached_read(redis_client, "get", verified_key)
+                    if isinstance(verified, bytes):
+                        verified = verified.decode('utf-8')
+                    if verified == thread_id:
+                        return thread_id
+
                     # Verify thread still exists in OpenAI
                     try:
                         client.beta.threads.retrieve(thread_id)
+                        _mark_thread_verified(redis_client, verified_key, thread_id)
                         return thread_id
                     except:
                         # Thread doesn't exist anymore, create new one
@@ -520,7 +1337,8 @@ Todos los timestamps en las funciones deben usar el año {now.year}."""
                 thread_id = thread.id
 
                 # Store in Redis with 7 days expiration
-                redis_client.setex(thread_key, 604800, thread_id)  # 7 days
+                deferred_write(redis_client, "setex", thread_key, 604800, thread_id)  # 7 days
+                _mark_thread_verified(redis_client, verified_key, thread_id)
 
                 return thread_id
 
@@ -536,30 +1354,44 @@ Todos los timestamps en las funciones deben usar el año {now.year}."""
             thread = client.beta.threads.create()
             return thread.id
     
-    def _parse_chat_response(self, response) -> AssistantResponse:
-        """Parse regular chat completion response."""
+    def _parse_chat_response(
+        self, response, input_messages: Optional[List[Dict[str, Any]]] = None
+    ) -> AssistantResponse:
+        """Parse regular chat completion response.
+
+        With ``input_messages`` a tool-calling answer carries the messages to
+        continue the completion with (see :meth:`submit_chat_tool_outputs`).
+        """
         try:
             message = response.choices[0].message
             reply_text = message.content or "No pude generar una respuesta."
             
             function_calls = []
-            if hasattr(message, 'tool_calls') and message.tool_calls:
-                for tool_call in message.tool_calls:
-                    if tool_call.type == "function":
-                        function_calls.append(AssistantFunctionCall(
-                            name=tool_call.function.name,
-                            arguments=json.loads(tool_call.function.arguments)
-                        ))
+            call_ids = []
+            for tool_call in _function_tool_calls(message):
+                function_calls.append(AssistantFunctionCall(
+                    name=tool_call.function.name,
+                    arguments=json.loads(tool_call.function.arguments)
+                ))
+                call_ids.append(tool_call.id)
             
             return AssistantResponse(
                 reply_text=reply_text,
-                function_calls=function_calls
+                function_calls=function_calls,
+                tool_call_ids=call_ids or None,
+                chat_messages=(
+                    [*input_messages, _assistant_tool_message(message)]
+                    if function_calls and input_messages is not None
+                    else None
+                ),
+                failed=not message.content and not function_calls,
             )
         except Exception as e:
             print(f"Error parsing chat response: {e}")
             return AssistantResponse(
                 reply_text="Error al procesar la respuesta.",
-                function_calls=[]
+                function_calls=[],
+                failed=True,
             )
 
 
@@ -567,6 +1399,468 @@ Todos los timestamps en las funciones deben usar el año {now.year}."""
 # Helper utilities
 # ----------------------------------------------------------------------
 
+def _build_date_instructions() -> str:
+    """Per-run additional instructions with the current date in Chile."""
+    from datetime import datetime
+    from zoneinfo import ZoneInfo
+
+    chile_tz = ZoneInfo("America/Santiago")
+    now = datetime.now(chile_tz)
+
+    day_names = ['lunes', 'martes', 'miércoles', 'jueves', 'viernes', 'sábado', 'domingo']
+    month_names = ['enero', 'febrero', 'marzo', 'abril', 'mayo', 'junio',
+                  'julio', 'agosto', 'septiembre', 'octubre', 'noviembre', 'diciembre']
+
+    day_name = day_names[now.weekday()]
+    month_name = month_names[now.month - 1]
+
+    current_date_str = f"{day_name}, {now.day} de {month_name} de {now.year}"
+    # Day precision only: this block prefixes the thread, so it must stay
+    # byte-identical all day for the provider's prompt cache to hit.
+    current_iso = now.date().isoformat()
+
+    return f"""INFORMACIÓN TEMPORAL CRÍTICA:
+- Fecha actual: {current_date_str}
+- Año actual: {now.year}
+- Fecha ISO: {current_iso}
+- Día de la semana: {day_name}
+- Mes: {month_name}
+
+IMPORTANTE: Cuando calcules fechas o crees agendamientos, SIEMPRE usa el año {now.year}, NO años anteriores.
+Si el usuario menciona "jueves", "viernes", etc., calcula la fecha en base a HOY ({current_date_str}, {now.year}).
+Todos los timestamps en las funciones deben usar el año {now.year}."""
+
+
+def _streaming_enabled() -> bool:
+    return bool(current_app.config.get("OPENAI_RUN_STREAMING", True))
+
+
+def _mark_active_run(redis_client, active_run_key: str, run_id: str) -> None:
+    # Mark run as active in Redis (with short TTL)
+    try:
+        redis_client.setex(active_run_key, 300, run_id)
+    except Exception:
+        pass
+
+
+def _thread_verify_ttl() -> int:
+    return int(current_app.config.get("THREAD_VERIFY_TTL_SECONDS", 0) or 0)
+
+
+def _mark_thread_verified(redis_client, verified_key: str, thread_id: str) -> None:
+    ttl = _thread_verify_ttl()
+    if ttl > 0:
+        deferred_write(redis_client, "setex", verified_key, ttl, thread_id)
+
+
+async def _amark_thread_verified(redis_client, verified_key: str, thread_id: str) -> None:
+    ttl = _thread_verify_ttl()
+    if ttl > 0:
+        await redis_client.setex(verified_key, ttl, thread_id)
+
+
+def _with_budget(client):
+    """``client`` with its request timeout capped by the current message deadline.
+
+    Retries are disabled under a deadline: each one would get the full
+    remaining budget again. Raises :class:`DeadlineExceeded` once it has run out.
+    """
+    deadline = current_deadline()
+    if client is None or deadline is None:
+        return client
+    timeout = deadline.timeout(OPENAI_REQUEST_TIMEOUT_SECONDS)
+    if not hasattr(client, "with_options"):
+        return client
+    return client.with_options(timeout=timeout, max_retries=0)
+
+
+def _governed(client, bot: Optional[Dict[str, Any]] = None):
+    """``client`` whose calls take a permit from the bot's tenant and the API key (see :mod:`openai_governor`)."""
+    if client is None or not current_app.config.get("OPENAI_GOVERNOR_ENABLED", True):
+        return client
+    return GovernedClient(_without_sdk_retries(client), OpenAIGovernor.for_bot(redis_extension.client, client=client, bot=bot))
+
+
+def _agoverned(client, redis_client, bot: Optional[Dict[str, Any]] = None):
+    """Async :func:`_governed` over the caller's ``redis.asyncio`` client."""
+    if client is None or redis_client is None or not current_app.config.get("OPENAI_GOVERNOR_ENABLED", True):
+        return client
+    return AsyncGovernedClient(_without_sdk_retries(client), AsyncOpenAIGovernor.for_bot(redis_client, client=client, bot=bot))
+
+
+def _without_sdk_retries(client):
+    # The governor retries 429/5xx itself, each attempt under a fresh permit.
+    return client.with_options(max_retries=0) if hasattr(client, "with_options") else client
+
+
+def _deadline_expired() -> bool:
+    deadline = current_deadline()
+    return deadline is not None and deadline.expired
+
+
+def _poll_stop(max_seconds: float) -> float:
+    """Monotonic time at which polling gives up: ``max_seconds`` or the deadline, whichever is first."""
+    stop = time.monotonic() + max_seconds
+    deadline = current_deadline()
+    return stop if deadline is None else min(stop, deadline.expires_at)
+
+
+def _cancel_run_on_deadline(client, *, thread_id: str, run_id: str) -> None:
+    """Cancel a run the message deadline caught mid-flight, then raise :class:`DeadlineExceeded`.
+
+    The active-run marker is left in place, so the next turn waits for the
+    cancellation to settle (see ``_cancel_orphaned_run``) before posting.
+    """
+    logger.warning("⏱️ Deadline agotado: cancelando run %s en thread %s", run_id, thread_id)
+    try:
+        # Straight to the API: a cancellation must not queue behind rate limits.
+        ungoverned(client).beta.threads.runs.cancel(thread_id=thread_id, run_id=run_id)
+    except Exception as exc:
+        logger.warning("Could not cancel run %s at deadline: %s", run_id, exc)
+    raise DeadlineExceeded(f"run {run_id} cancelled at the message deadline")
+
+
+async def _acancel_run_on_deadline(client, *, thread_id: str, run_id: str) -> None:
+    """Async :func:`_cancel_run_on_deadline`."""
+    logger.warning("⏱️ Deadline agotado: cancelando run %s en thread %s", run_id, thread_id)
+    try:
+        await ungoverned(client).beta.threads.runs.cancel(thread_id=thread_id, run_id=run_id)
+    except Exception as exc:
+        logger.warning("Could not cancel run %s at deadline: %s", run_id, exc)
+    raise DeadlineExceeded(f"run {run_id} cancelled at the message deadline")
+
+
+def _poll_run(client, *, thread_id: str, run: Any, max_seconds: float = RUN_POLL_MAX_SECONDS) -> Any:
+    """Poll with adaptive backoff until the run leaves queued/in_progress.
+
+    Polling stops at the message deadline too; a run still active then is
+    cancelled and :class:`DeadlineExceeded` raised, so no worker waits past it.
+    """
+    stop = _poll_stop(max_seconds)
+    delay = RUN_POLL_INITIAL_SECONDS
+    while run.status in _RUN_ACTIVE_STATUSES and time.monotonic() < stop:
+        time.sleep(min(delay, max(stop - time.monotonic(), 0.0)))
+        delay = min(delay * RUN_POLL_BACKOFF, RUN_POLL_MAX_INTERVAL_SECONDS)
+        run = client.beta.threads.runs.retrieve(thread_id=thread_id, run_id=run.id)
+    if run.status in _RUN_ACTIVE_STATUSES and _deadline_expired():
+        _cancel_run_on_deadline(client, thread_id=thread_id, run_id=run.id)
+    return run
+
+
+def _apply_run_event(event: Any, run: Any, reply_text: Optional[str]) -> Tuple[Any, Optional[str]]:
+    """Fold one assistant stream event into ``(latest run, assistant text)``."""
+    name = getattr(event, "event", "") or ""
+    if name == "error":
+        raise RuntimeError(f"Assistant stream error: {getattr(event, 'data', None)}")
+    if name.startswith("thread.run.") and not name.startswith("thread.run.step."):
+        return event.data, reply_text
+    if name == "thread.message.completed" and getattr(event.data, "role", None) == "assistant":
+        return run, _message_text(event.data) or reply_text
+    return run, reply_text
+
+
+def _consume_run_stream(
+    manager: Any, on_run: Optional[Callable[[Any], None]] = None
+) -> Tuple[Any, Optional[str]]:
+    """Follow a run's server-sent events until the server closes the stream.
+
+    The stream ends on completed/requires_action/failed, so the returned run
+    reflects the state change as soon as it happens. A stream that breaks
+    after the run exists returns the last seen run for the caller to poll;
+    one that breaks before re-raises so the caller can fall back entirely.
+    """
+    run, reply_text = None, None
+    try:
+        with manager as stream:
+            for event in stream:
+                seen_before = run is not None
+                run, reply_text = _apply_run_event(event, run, reply_text)
+                if run is not None and not seen_before and on_run is not None:
+                    on_run(run)
+                if _deadline_expired():
+                    break  # the caller's poll cancels the run
+    except Exception as exc:
+        if run is None:
+            raise
+        logger.warning("⚠️ Stream del run %s interrumpido, continuando con polling: %s", run.id, exc)
+    if run is None and _deadline_expired():
+        raise DeadlineExceeded("deadline reached before the run started")
+    return run, reply_text
+
+
+async def _aconsume_run_stream(
+    manager: Any, on_run: Optional[Callable[[Any], Awaitable[None]]] = None
+) -> Tuple[Any, Optional[str]]:
+    """Async :func:`_consume_run_stream`; ``on_run`` is awaited."""
+    run, reply_text = None, None
+    try:
+        async with manager as stream:
+            async for event in stream:
+                seen_before = run is not None
+                run, reply_text = _apply_run_event(event, run, reply_text)
+                if run is not None and not seen_before and on_run is not None:
+                    await on_run(run)
+                if _deadline_expired():
+                    break
+    except Exception as exc:
+        if run is None:
+            raise
+        logger.warning("⚠️ Stream del run %s interrumpido, continuando con polling: %s", run.id, exc)
+    if run is None and _deadline_expired():
+        raise DeadlineExceeded("deadline reached before the run started")
+    return run, reply_text
+
+
+def uses_responses_backend(bot: Dict[str, Any]) -> bool:
+    """Bots opt in with ``openai_backend: "responses"`` (top level or in metadata)."""
+    metadata = bot.get("metadata") if isinstance(bot.get("metadata"), dict) else {}
+    backend = bot.get("openai_backend") or metadata.get("openai_backend") or ""
+    return str(backend).lower() == "responses"
+
+
+def _model_for(bot: Dict[str, Any]) -> Optional[str]:
+    return bot.get("openai_model") or bot.get("model") or current_app.config.get("OPENAI_DEFAULT_MODEL")
+
+
+def _instructions_for(bot: Dict[str, Any]) -> Optional[str]:
+    return bot.get("instructions") or current_app.config.get("OPENAI_DEFAULT_INSTRUCTIONS")
+
+
+def _tool_actions_text(tool_results: List[ToolResult]) -> str:
+    """Reply listing the tool results when there is no model to phrase them."""
+    return "\n".join(["He ejecutado estas acciones:", *[f"- {result.name}: {result.content}" for result in tool_results]])
+
+
+def _responses_chain_key(bot: Dict[str, Any], user_phone: Optional[str]) -> Optional[str]:
+    if not user_phone:
+        return None
+    return RESPONSES_CHAIN_KEY.format(bot_id=bot.get("id"), user_phone=user_phone)
+
+
+def _remember_response(redis_client, bot: Dict[str, Any], user_phone: Optional[str], response_id: str) -> None:
+    chain_key = _responses_chain_key(bot, user_phone)
+    if not chain_key:
+        return
+    try:
+        ttl = int(current_app.config.get("OPENAI_RESPONSES_CHAIN_TTL_SECONDS", 604800))
+        redis_client.setex(chain_key, ttl, response_id)
+    except Exception as exc:
+        logger.warning("Could not store response chain for %s: %s", user_phone, exc)
+
+
+async def _aremember_response(redis_client, bot: Dict[str, Any], user_phone: Optional[str], response_id: str) -> None:
+    chain_key = _responses_chain_key(bot, user_phone)
+    if not chain_key:
+        return
+    try:
+        ttl = int(current_app.config.get("OPENAI_RESPONSES_CHAIN_TTL_SECONDS", 604800))
+        await redis_client.setex(chain_key, ttl, response_id)
+    except Exception as exc:
+        logger.warning("Could not store response chain for %s: %s", user_phone, exc)
+
+
+def _responses_request(
+    bot: Dict[str, Any],
+    input_items: List[Dict[str, Any]],
+    tool_definitions: Optional[Iterable[Dict[str, Any]]],
+    previous_response_id: Optional[str],
+) -> Dict[str, Any]:
+    """``responses.create`` kwargs. Instructions and tools are not inherited
+    through ``previous_response_id``, so they are sent on every request; both
+    are stable for the day, which keeps the prompt prefix cacheable.
+    """
+    instructions = _instructions_for(bot)
+    request: Dict[str, Any] = {
+        "model": _model_for(bot),
+        "instructions": f"{instructions}\n\n{_build_date_instructions()}",
+        "input": input_items,
+    }
+    tools = _responses_tools(tool_definitions if tool_definitions is not None else bot.get("assistant_functions"))
+    if tools:
+        request["tools"] = tools
+    if previous_response_id:
+        request["previous_response_id"] = previous_response_id
+    return request
+
+
+def _responses_tools(tool_definitions: Optional[Iterable[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """Chat/assistant tool schemas (``{"type": "function", "function": {...}}``) in Responses' flat shape."""
+    tools: List[Dict[str, Any]] = []
+    for tool in tool_definitions or []:
+        function = tool.get("function") if isinstance(tool.get("function"), dict) else None
+        if function and function.get("name"):
+            tools.append({
+                "type": "function",
+                "name": function["name"],
+                "description": function.get("description", ""),
+                "parameters": function.get("parameters") or {"type": "object", "properties": {}},
+            })
+        elif tool.get("type") == "function" and tool.get("name"):
+            tools.append(tool)
+    return tools
+
+
+def _function_call_outputs(tool_outputs: List[Dict[str, str]]) -> List[Dict[str, Any]]:
+    return [
+        {"type": "function_call_output", "call_id": output["tool_call_id"], "output": output["output"]}
+        for output in tool_outputs
+    ]
+
+
+def _aligned_tool_outputs(call_ids: List[str], results: List[ToolResult]) -> List[Dict[str, str]]:
+    # Align outputs by index
+    return [
+        {"tool_call_id": cid, "output": results[i].content if i < len(results) else "{}"}
+        for i, cid in enumerate(call_ids)
+    ]
+
+
+def _function_tool_calls(message: Any) -> List[Any]:
+    return [call for call in (getattr(message, "tool_calls", None) or []) if call.type == "function"]
+
+
+def _assistant_tool_message(message: Any) -> Dict[str, Any]:
+    """The assistant turn that requested tools, as sent back in the next request."""
+    return {
+        "role": "assistant",
+        "content": message.content,
+        "tool_calls": [
+            {
+                "id": call.id,
+                "type": "function",
+                "function": {"name": call.function.name, "arguments": call.function.arguments},
+            }
+            for call in _function_tool_calls(message)
+        ],
+    }
+
+
+def _chat_tool_messages(tool_outputs: List[Dict[str, str]]) -> List[Dict[str, Any]]:
+    return [
+        {"role": "tool", "tool_call_id": output["tool_call_id"], "content": output["output"]}
+        for output in tool_outputs
+    ]
+
+
+def _chat_tool_round(
+    bot: Dict[str, Any], messages: List[Dict[str, Any]], tools: Optional[List[Dict[str, Any]]], *, final: bool
+) -> Dict[str, Any]:
+    """``chat.completions.create`` arguments for one tool round."""
+    request: Dict[str, Any] = {"model": _model_for(bot), "messages": messages, "tools": tools}
+    if tools and final:
+        request["tool_choice"] = "none"  # round cap reached: answer with what the tools returned
+    return request
+
+
+def _response_function_calls(response: Any) -> Tuple[List[AssistantFunctionCall], List[str]]:
+    calls: List[AssistantFunctionCall] = []
+    call_ids: List[str] = []
+    for item in getattr(response, "output", None) or []:
+        item = _safe_to_dict(item)
+        if item.get("type") != "function_call":
+            continue
+        raw_args = item.get("arguments") or "{}"
+        try:
+            arguments = json.loads(raw_args) if isinstance(raw_args, str) else raw_args
+        except json.JSONDecodeError:
+            arguments = {"_raw": raw_args}
+        calls.append(AssistantFunctionCall(name=item.get("name"), arguments=arguments))
+        call_ids.append(item.get("call_id"))
+    return calls, call_ids
+
+
+def _response_text(response: Any) -> Optional[str]:
+    text = getattr(response, "output_text", None)
+    if text:
+        return text
+    parts: List[str] = []
+    for item in getattr(response, "output", None) or []:
+        item = _safe_to_dict(item)
+        if item.get("type") == "message":
+            parts.extend(
+                content.get("text", "")
+                for content in item.get("content") or []
+                if isinstance(content, dict) and content.get("type") == "output_text"
+            )
+    return "".join(parts) or None
+
+
+def _responses_outcome(response: Any) -> AssistantResponse:
+    function_calls, call_ids = _response_function_calls(response)
+    if function_calls:
+        return AssistantResponse(
+            reply_text="",
+            function_calls=function_calls,
+            response_id=response.id,
+            tool_call_ids=call_ids,
+        )
+    text = _response_text(response)
+    return AssistantResponse(
+        reply_text=text or RUN_FAILED_TEXT,
+        function_calls=[],
+        failed=not text,
+    )
+
+
+def _run_outcome(run: Any, thread_id: str, reply_text: Optional[str]) -> AssistantResponse:
+    """What a run that stopped means for the turn: tool calls to run, the reply, or a failure."""
+    if run.status == "requires_action":
+        function_calls, call_ids = _required_function_calls(run)
+        return AssistantResponse(
+            reply_text="",
+            function_calls=function_calls,
+            thread_id=thread_id,
+            run_id=run.id,
+            tool_call_ids=call_ids,
+        )
+    if run.status != "completed":
+        last_error = getattr(run, "last_error", None)
+        logger.warning(
+            "Assistant run %s ended with status %s%s",
+            run.id, run.status, f": {last_error.message}" if last_error else "",
+        )
+    return AssistantResponse(reply_text=reply_text or RUN_FAILED_TEXT, function_calls=[], failed=not reply_text)
+
+
+def _failed_reply(text: str = TURN_ERROR_TEXT) -> AssistantResponse:
+    return AssistantResponse(reply_text=text, function_calls=[], failed=True)
+
+
+def _required_function_calls(run: Any) -> Tuple[List[AssistantFunctionCall], List[str]]:
+    """Function calls (and their tool_call ids) a ``requires_action`` run is waiting on."""
+    required_action = getattr(run, "required_action", None)
+    if not required_action or required_action.type != "submit_tool_outputs":
+        return [], []
+    calls: List[AssistantFunctionCall] = []
+    call_ids: List[str] = []
+    for tool_call in required_action.submit_tool_outputs.tool_calls:
+        if tool_call.type != "function":
+            continue
+        try:
+            arguments = json.loads(tool_call.function.arguments)
+        except json.JSONDecodeError:
+            arguments = {"_raw": tool_call.function.arguments}
+        calls.append(AssistantFunctionCall(name=tool_call.function.name, arguments=arguments))
+        call_ids.append(tool_call.id)
+    return calls, call_ids
+
+
+def _latest_assistant_text(messages: Any) -> Optional[str]:
+    if not messages.data:
+        return None
+    latest_message = messages.data[0]
+    if latest_message.role != "assistant":
+        return None
+    return _message_text(latest_message)
+
+
+def _message_text(message: Any) -> Optional[str]:
+    if not message.content:
+        return None
+    content = message.content[0]
+    return content.text.value if hasattr(content, "text") else None
+
+
 def _safe_get_outputs(response: Any) -> List[Dict[str, Any]]:
     candidate = getattr(response, "output", None)
     if candidate is None and hasattr(response, "model_dump"):
@@ -7,6 +7,9 @@ from datetime import UTC, datetime, timedelta
 from hashlib import sha256
 from typing import Any, Dict, Optional
 
+from ..utils import codec
+from ..utils.unit_of_work import deferred_write
+
 try:
     from twilio.base.exceptions import TwilioRestException  # type: ignore
     from twilio.rest import Client as TwilioClient  # type: ignore
@@ -70,7 +73,7 @@ class OutboundWhatsAppService:
             tenant_id=tenant_id,
             to_e164=self.normalize_e164(to_e164),
         )
-        self._redis.set(key, str(int(now.timestamp())))
+        deferred_write(self._redis, "set", key, str(int(now.timestamp())))
 
     def get_window_state(self, *, tenant_id: str, to_e164: str) -> tuple[bool, Optional[str]]:
         key = LAST_INBOUND_KEY.format(
@@ -95,8 +98,8 @@ class OutboundWhatsAppService:
         if not payload:
             return None
         try:
-            return json.loads(payload)
-        except json.JSONDecodeError:
+            return codec.loads(payload)
+        except ValueError:
             return None
 
     def save_idempotency_record(
@@ -115,7 +118,7 @@ class OutboundWhatsAppService:
             "response": response,
             "status_code": status_code,
         }
-        self._redis.setex(key, ttl_seconds, json.dumps(record))
+        self._redis.setex(key, ttl_seconds, codec.dumps(record))
 
     @staticmethod
     def request_hash(raw_body: bytes) -> str:
@@ -254,14 +257,14 @@ class OutboundWhatsAppService:
             raw = self._redis.get(OUTBOUND_MESSAGE_KEY.format(message_sid=message_sid))
             if raw:
                 try:
-                    correlation = json.loads(raw)
-                except json.JSONDecodeError:
+                    correlation = codec.loads(raw)
+                except ValueError:
                     correlation = {}
 
             self._redis.setex(
                 OUTBOUND_STATUS_KEY.format(message_sid=message_sid),
                 172800,
-                json.dumps(
+                codec.dumps(
                     {
                         "message_sid": message_sid,
                         "provider_status": provider_status,
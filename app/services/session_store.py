@@ -0,0 +1,188 @@
+"""Conversation sessions stored as append-only Redis lists.
+
+``session:{bot_id}:{user_number}`` holds one message per list element (JSON
+through :mod:`app.utils.codec`), oldest first:
+
+* A turn ``RPUSH``-es only the messages it added, ``LTRIM``-s the list to the
+  window it keeps and refreshes the TTL, all queued on the same pipeline (the
+  conversation lock's fenced MULTI). A write costs O(new messages) and
+  concurrent appends never overwrite each other.
+* Reads are a single ``LRANGE`` over the whole list or its newest window.
+* Sessions written by older releases as one JSON blob are migrated in place
+  (under ``WATCH``, keeping their TTL) the first time they are read.
+"""
+from __future__ import annotations
+
+import logging
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import redis
+
+from ..utils import codec
+from ..utils.unit_of_work import cached_read
+
+SESSION_KEY_PATTERN = "session:{bot_id}:{user_number}"
+MAX_HISTORY_MESSAGES = 20
+
+logger = logging.getLogger(__name__)
+
+
+def _is_wrong_type(exc: redis.ResponseError) -> bool:
+    return str(exc).startswith("WRONGTYPE")
+
+
+def _decode_messages(items: Iterable[Any]) -> List[Dict[str, Any]]:
+    messages = []
+    for item in items:
+        try:
+            message = codec.loads(item)
+        except (TypeError, ValueError):
+            logger.warning("⚠️ Skipping undecodable session entry: %r", item)
+            continue
+        if isinstance(message, dict):
+            messages.append(message)
+    return messages
+
+
+def _legacy_messages(payload: Any) -> List[Dict[str, Any]]:
+    try:
+        messages = codec.loads(payload) if payload else []
+    except (TypeError, ValueError):
+        return []
+    return [m for m in messages if isinstance(m, dict)] if isinstance(messages, list) else []
+
+
+class _SessionStoreBase:
+    def __init__(
+        self,
+        redis_client,
+        *,
+        bot_id: str,
+        user_number: str,
+        ttl_seconds: Optional[int] = None,
+        migrate: Optional[Callable[[List[Dict[str, Any]]], List[Dict[str, Any]]]] = None,
+    ) -> None:
+        self._redis = redis_client
+        self.key = SESSION_KEY_PATTERN.format(bot_id=bot_id, user_number=user_number)
+        self.ttl_seconds = ttl_seconds
+        # Clean-up applied to legacy blobs before they become list entries.
+        self._migrate_messages = migrate or (lambda messages: messages)
+
+    @classmethod
+    def for_conversation(cls, redis_client, *, bot_id: str, user_number: str, **kwargs):
+        from flask import current_app
+
+        ttl = current_app.config.get("REDIS_SESSION_TTL_SECONDS")
+        return cls(redis_client, bot_id=bot_id, user_number=user_number, ttl_seconds=ttl, **kwargs)
+
+    def _range(self, window: Optional[int]) -> tuple:
+        return (-window if window else 0, -1)
+
+    def writer(
+        self,
+        conversation: Iterable[Dict[str, Any]],
+        *,
+        appended: Optional[int] = None,
+        max_messages: Optional[int] = MAX_HISTORY_MESSAGES,
+    ) -> Callable[[Any], None]:
+        """Return ``write(pipe)`` that stores ``conversation`` (trimmed to ``max_messages``).
+
+        ``appended`` is how many trailing messages are new since the session
+        was loaded: only those are pushed and the list is trimmed to the kept
+        window. Without it, or when the kept window is shorter than the new
+        messages, the list is rewritten.
+        """
+        history = list(conversation)
+        if max_messages:
+            history = history[-max_messages:]
+        rewrite = appended is None or appended > len(history)
+        pushed = history if rewrite else history[len(history) - appended:]
+        encoded = [codec.dumps(message) for message in pushed]
+        key, ttl, keep = self.key, self.ttl_seconds, len(history)
+
+        def _write(pipe) -> None:
+            if rewrite or not keep:
+                pipe.delete(key)
+            if not keep:
+                return
+            if encoded:
+                pipe.rpush(key, *encoded)
+            pipe.ltrim(key, -keep, -1)
+            if ttl:
+                pipe.expire(key, ttl)
+
+        return _write
+
+    def _migration_writes(self, pipe, messages: List[Dict[str, Any]], ttl: int) -> None:
+        pipe.multi()
+        pipe.delete(self.key)
+        if messages:
+            pipe.rpush(self.key, *(codec.dumps(m) for m in messages))
+            if ttl and ttl > 0:
+                pipe.expire(self.key, ttl)
+
+
+class SessionStore(_SessionStoreBase):
+    def load(self, window: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Messages oldest first; only the newest ``window`` when given."""
+        try:
+            return _decode_messages(cached_read(self._redis, "lrange", self.key, *self._range(window)))
+        except redis.ResponseError as exc:
+            if not _is_wrong_type(exc):
+                raise
+        messages = self._migrate()
+        return messages[-window:] if window else messages
+
+    def save(self, write: Callable[[Any], None]) -> None:
+        """Apply a :meth:`writer` outside the conversation lock (still one MULTI)."""
+        with self._redis.pipeline(transaction=True) as pipe:
+            write(pipe)
+            pipe.execute()
+
+    def _migrate(self) -> List[Dict[str, Any]]:
+        with self._redis.pipeline() as pipe:
+            try:
+                pipe.watch(self.key)
+                if pipe.type(self.key) in ("list", b"list"):
+                    pipe.unwatch()
+                    return _decode_messages(self._redis.lrange(self.key, 0, -1))
+                messages = self._migrate_messages(_legacy_messages(pipe.get(self.key)))
+                self._migration_writes(pipe, messages, pipe.ttl(self.key))
+                pipe.execute()
+                logger.info("📦 Migrated legacy session %s to a list (%s messages)", self.key, len(messages))
+            except redis.WatchError:
+                # Someone rewrote it meanwhile: that writer's version wins.
+                return self.load()
+        return messages
+
+
+class AsyncSessionStore(_SessionStoreBase):
+    async def load(self, window: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Async :meth:`SessionStore.load`."""
+        try:
+            return _decode_messages(await self._redis.lrange(self.key, *self._range(window)))
+        except redis.ResponseError as exc:
+            if not _is_wrong_type(exc):
+                raise
+        messages = await self._migrate()
+        return messages[-window:] if window else messages
+
+    async def save(self, write: Callable[[Any], None]) -> None:
+        async with self._redis.pipeline(transaction=True) as pipe:
+            write(pipe)
+            await pipe.execute()
+
+    async def _migrate(self) -> List[Dict[str, Any]]:
+        async with self._redis.pipeline() as pipe:
+            try:
+                await pipe.watch(self.key)
+                if await pipe.type(self.key) in ("list", b"list"):
+                    await pipe.unwatch()
+                    return _decode_messages(await self._redis.lrange(self.key, 0, -1))
+                messages = self._migrate_messages(_legacy_messages(await pipe.get(self.key)))
+                self._migration_writes(pipe, messages, await pipe.ttl(self.key))
+                await pipe.execute()
+                logger.info("📦 Migrated legacy session %s to a list (%s messages)", self.key, len(messages))
+            except redis.WatchError:
+                return await self.load()
+        return messages
@@ -10,7 +10,7 @@ try:
 except Exception:  # pragma: no cover
     TwilioClient = None  # type: ignore
 
-from ..extensions import TwilioExtension
+from ..extensions import TwilioExtension, build_twilio_client
 
 
 class TwilioMessagingService:
@@ -123,7 +123,7 @@ class TwilioMessagingService:
         if twilio_account_sid and twilio_auth_token:
             if TwilioClient is None:
                 raise RuntimeError("twilio package is not available in runtime")
-            return TwilioClient(twilio_account_sid, twilio_auth_token)
+            return build_twilio_client(twilio_account_sid, twilio_auth_token, current_app.config)
 
         client = self._extension.client
         if client is None:
@@ -0,0 +1,214 @@
+"""Compact encoding for the JSON-shaped payloads kept in Redis.
+
+Bots, sessions, client data, the Horizon config cache, outbound idempotency
+records and correlations all go through :func:`dumps` / :func:`loads`:
+
+* Serialization uses ``orjson`` when installed (same JSON text, several
+  times faster than the stdlib), else :mod:`json`.
+* Payloads of at least ``CODEC_COMPRESS_MIN_BYTES`` are compressed with
+  ``zstandard`` when installed, else :mod:`zlib`, optionally with a shared
+  dictionary trained on our own data (``train_codec_dictionary.py``). The
+  result is stored as ``~z<algo><dict id>:<base64>``: the shared Redis
+  client decodes replies as UTF-8, so values have to stay text.
+* :func:`loads` detects the format from the payload itself, so keys written
+  as plain JSON (before the rollout, or by a node with compression off) stay
+  readable.
+
+msgpack was not adopted: binary values would need base64 on a text client,
+which cancels most of its size advantage over compressed JSON.
+"""
+from __future__ import annotations
+
+import base64
+import hashlib
+import json
+import logging
+import threading
+import zlib
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Mapping, Optional
+
+try:  # optional: faster (de)serialization, byte-identical JSON
+    import orjson
+except ImportError:  # pragma: no cover - depends on the deployment image
+    orjson = None
+
+try:  # optional: better ratio/speed than zlib, native dictionary support
+    import zstandard
+except ImportError:  # pragma: no cover - depends on the deployment image
+    zstandard = None
+
+ENVELOPE_PREFIX = "~z"
+_ALGO_ZSTD = "s"
+_ALGO_ZLIB = "l"
+_NO_DICT = "-"
+
+logger = logging.getLogger(__name__)
+
+
+class CodecError(ValueError):
+    """A compressed payload could not be decoded (unknown algorithm or dictionary)."""
+
+
+def dictionary_id(dictionary: bytes) -> str:
+    return hashlib.sha1(dictionary).hexdigest()[:8]
+
+
+@dataclass
+class Codec:
+    serializer: str = "auto"  # "auto" | "orjson" | "json"
+    compression: str = "none"  # "none" | "auto" | "zstd" | "zlib"
+    min_compress_bytes: int = 1024
+    level: int = 3
+    # First dictionary compresses; all of them can decompress (rotation).
+    dictionaries: list = field(default_factory=list)
+
+    def __post_init__(self) -> None:
+        self._dictionaries: Dict[str, bytes] = {dictionary_id(d): d for d in self.dictionaries}
+        self._write_dict_id = dictionary_id(self.dictionaries[0]) if self.dictionaries else _NO_DICT
+        self._local = threading.local()  # zstd (de)compressors are not thread-safe
+        self.compression = self._resolve_compression(self.compression)
+        self._use_orjson = orjson is not None and self.serializer in ("auto", "orjson")
+
+    @staticmethod
+    def _resolve_compression(name: str) -> str:
+        name = (name or "none").lower()
+        if name == "auto":
+            return "zstd" if zstandard is not None else "zlib"
+        if name == "zstd" and zstandard is None:
+            logger.warning("⚠️ CODEC_COMPRESSION=zstd but zstandard is not installed; using zlib")
+            return "zlib"
+        return name if name in ("zstd", "zlib") else "none"
+
+    @property
+    def backend(self) -> str:
+        """What this codec really uses once fallbacks applied, e.g. ``orjson+zstd(dict 1a2b3c4d)``."""
+        backend = "orjson" if self._use_orjson else "json"
+        if self.compression != "none":
+            backend += f"+{self.compression}"
+            if self._write_dict_id != _NO_DICT:
+                backend += f"(dict {self._write_dict_id})"
+        return backend
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+    def dumps(self, value: Any) -> str:
+        text = self._serialize(value)
+        if self.compression == "none" or len(text) < self.min_compress_bytes:
+            return text
+        raw = text.encode("utf-8")
+        algo = _ALGO_ZSTD if self.compression == "zstd" else _ALGO_ZLIB
+        packed = self._compress(algo, raw)
+        envelope = f"{ENVELOPE_PREFIX}{algo}{self._write_dict_id}:{base64.b64encode(packed).decode('ascii')}"
+        return envelope if len(envelope) < len(text) else text
+
+    def loads(self, payload: Any) -> Any:
+        if isinstance(payload, (bytes, bytearray, memoryview)):
+            payload = bytes(payload).decode("utf-8")
+        if isinstance(payload, str) and payload.startswith(ENVELOPE_PREFIX):
+            payload = self._unwrap(payload)
+        if self._use_orjson:
+            return orjson.loads(payload)
+        return json.loads(payload)
+
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+    def _serialize(self, value: Any) -> str:
+        if self._use_orjson:
+            try:
+                return orjson.dumps(value).decode("utf-8")
+            except TypeError:
+                pass  # e.g. ints over 64 bits or non-str keys: the stdlib copes
+        return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+    def _unwrap(self, payload: str) -> str:
+        header, _, body = payload.partition(":")
+        algo, dict_id = header[len(ENVELOPE_PREFIX)], header[len(ENVELOPE_PREFIX) + 1:]
+        dictionary = None
+        if dict_id != _NO_DICT:
+            dictionary = self._dictionaries.get(dict_id)
+            if dictionary is None:
+                raise CodecError(f"payload needs codec dictionary {dict_id}, which is not loaded")
+        packed = base64.b64decode(body)
+        if algo == _ALGO_ZLIB:
+            inflater = zlib.decompressobj(zdict=dictionary) if dictionary else zlib.decompressobj()
+            try:
+                return (inflater.decompress(packed) + inflater.flush()).decode("utf-8")
+            except zlib.error as exc:
+                raise CodecError(f"corrupt zlib payload: {exc}") from exc
+        if algo == _ALGO_ZSTD:
+            if zstandard is None:
+                raise CodecError("payload is zstd-compressed but zstandard is not installed")
+            return self._zstd("decompressor", dict_id, dictionary).decompress(packed).decode("utf-8")
+        raise CodecError(f"unknown codec algorithm {algo!r}")
+
+    def _compress(self, algo: str, raw: bytes) -> bytes:
+        dictionary = self._dictionaries.get(self._write_dict_id)
+        if algo == _ALGO_ZSTD:
+            return self._zstd("compressor", self._write_dict_id, dictionary).compress(raw)
+        deflater = (
+            zlib.compressobj(min(self.level * 2, 9), zlib.DEFLATED, 15, 9, zlib.Z_DEFAULT_STRATEGY, dictionary)
+            if dictionary
+            else zlib.compressobj(min(self.level * 2, 9))
+        )
+        return deflater.compress(raw) + deflater.flush()
+
+    def _zstd(self, kind: str, dict_id: str, dictionary: Optional[bytes]):
+        cache = self._local.__dict__.setdefault("zstd", {})
+        key = (kind, dict_id)
+        if key not in cache:
+            dict_data = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+            if kind == "compressor":
+                cache[key] = zstandard.ZstdCompressor(level=self.level, dict_data=dict_data)
+            else:
+                cache[key] = zstandard.ZstdDecompressor(dict_data=dict_data)
+        return cache[key]
+
+
+def load_dictionaries(paths: Iterable[str]) -> list:
+    dictionaries = []
+    for path in paths:
+        path = path.strip()
+        if not path:
+            continue
+        try:
+            with open(path, "rb") as handle:
+                dictionaries.append(handle.read())
+        except OSError as exc:
+            logger.error("❌ Could not read codec dictionary %s: %s", path, exc)
+    return dictionaries
+
+
+_codec = Codec()
+_codec_lock = threading.Lock()
+
+
+def configure_codec(config: Mapping[str, Any]) -> Codec:
+    """Install the process-wide codec from the app config (called by ``create_app``)."""
+    global _codec
+    paths = str(config.get("CODEC_DICTIONARY_PATHS") or "").split(",")
+    codec = Codec(
+        serializer=str(config.get("CODEC_SERIALIZER") or "auto"),
+        compression=str(config.get("CODEC_COMPRESSION") or "none"),
+        min_compress_bytes=int(config.get("CODEC_COMPRESS_MIN_BYTES", 1024)),
+        level=int(config.get("CODEC_COMPRESSION_LEVEL", 3)),
+        dictionaries=load_dictionaries(paths),
+    )
+    with _codec_lock:
+        _codec = codec
+    logger.info("🗜️ Redis codec: %s", codec.backend)
+    return codec
+
+
+def get_codec() -> Codec:
+    return _codec
+
+
+def dumps(value: Any) -> str:
+    return _codec.dumps(value)
+
+
+def loads(payload: Any) -> Any:
+    return _codec.loads(payload)
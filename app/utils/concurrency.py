@@ -0,0 +1,118 @@
+"""Bounded thread-pool helpers for fanning out independent I/O.
+
+Work is submitted through :func:`contextvars.copy_context`, so the Flask app
+(and request) context of the caller is visible inside the pool threads.
+"""
+from __future__ import annotations
+
+import contextvars
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+_THREAD_PREFIX = "io-fanout"
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            max_workers = int(os.getenv("IO_FANOUT_MAX_WORKERS", "16"))
+            _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=_THREAD_PREFIX)
+        return _executor
+
+
+def submit(fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Future:
+    """Run ``fn`` on the shared pool with the caller's context vars."""
+    if _in_pool_thread():
+        # Never wait on the pool from inside it (bounded pool => possible deadlock).
+        future: Future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as exc:  # noqa: BLE001 - re-raised by future.result()
+            future.set_exception(exc)
+        return future
+    ctx = contextvars.copy_context()
+    return get_executor().submit(ctx.run, fn, *args, **kwargs)
+
+
+def submit_detached(fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Future:
+    """Run ``fn`` on the shared pool in an empty context: work that outlives the caller's turn.
+
+    Nothing of the caller (deadline, unit of work, Flask context) follows it;
+    ``fn`` opens its own.
+    """
+    return get_executor().submit(contextvars.Context().run, fn, *args, **kwargs)
+
+
+class TaskGraph:
+    """Tiny dependency graph: each task starts as soon as its dependencies finish.
+
+    Task callables receive the dict of results computed so far (at least their
+    dependencies). :meth:`run` returns all results, or re-raises the first
+    failure once in-flight tasks have settled.
+    """
+
+    def __init__(self) -> None:
+        self._tasks: Dict[str, Tuple[Callable[[Dict[str, Any]], Any], Tuple[str, ...], bool]] = {}
+
+    def add(
+        self,
+        name: str,
+        fn: Callable[[Dict[str, Any]], Any],
+        *,
+        after: Iterable[str] = (),
+        inline: bool = False,
+    ) -> "TaskGraph":
+        """Register ``fn``; ``inline`` tasks run on the calling thread (e.g. long blocking waits)."""
+        deps = tuple(after)
+        missing = [dep for dep in deps if dep not in self._tasks]
+        if missing:
+            raise ValueError(f"Task '{name}' depends on unknown tasks: {missing}")
+        self._tasks[name] = (fn, deps, inline)
+        return self
+
+    def run(self) -> Dict[str, Any]:
+        results: Dict[str, Any] = {}
+        pending = dict(self._tasks)
+        running: Dict[Future, str] = {}
+        error: Optional[BaseException] = None
+
+        while pending or running:
+            if error is None:
+                inline_ready = []
+                for name, (fn, deps, inline) in list(pending.items()):
+                    if all(dep in results for dep in deps):
+                        del pending[name]
+                        if inline:
+                            inline_ready.append((name, fn))
+                        else:
+                            running[submit(fn, dict(results))] = name
+                # Pool tasks are already in flight while the inline ones block here.
+                for name, fn in inline_ready:
+                    try:
+                        results[name] = fn(dict(results))
+                    except BaseException as exc:  # noqa: BLE001
+                        error = error or exc
+                if inline_ready and not running:
+                    continue
+            if not running:
+                break
+            done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    results[name] = future.result()
+                except BaseException as exc:  # noqa: BLE001
+                    error = error or exc
+        if error is not None:
+            raise error
+        return results
+
+
+def _in_pool_thread() -> bool:
+    return threading.current_thread().name.startswith(_THREAD_PREFIX)
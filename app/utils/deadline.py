@@ -0,0 +1,95 @@
+"""Per-message time budget shared by every hop of a turn.
+
+The webhook (or the queue worker) opens a :class:`Deadline` for each inbound
+message and makes it current with :func:`deadline_scope`. Downstream calls —
+OpenAI, tool handlers, Horizon/CRM requests, Twilio sends — derive their
+timeouts from what is left with :func:`budget_timeout` instead of using fixed
+values that add up past the SLA. The deadline lives in a context var, so it
+follows the turn into TaskGraph pool threads and asyncio tasks.
+"""
+from __future__ import annotations
+
+import contextvars
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import UTC, datetime
+from typing import Iterator, Optional
+
+
+class DeadlineExceeded(Exception):
+    """The message's time budget ran out before the hop could start or finish."""
+
+
+@dataclass(frozen=True)
+class Deadline:
+    # time.monotonic() value at which the budget runs out.
+    expires_at: float
+
+    @classmethod
+    def after(cls, seconds: float) -> "Deadline":
+        return cls(expires_at=time.monotonic() + float(seconds))
+
+    @classmethod
+    def since(cls, started_at: Optional[str], seconds: float) -> "Deadline":
+        """Budget counted from an ISO timestamp (e.g. when the webhook queued the message)."""
+        try:
+            started = datetime.fromisoformat(started_at) if started_at else None
+        except ValueError:
+            started = None
+        if started is None or started.tzinfo is None:
+            return cls.after(seconds)
+        elapsed = max((datetime.now(UTC) - started).total_seconds(), 0.0)
+        return cls.after(float(seconds) - elapsed)
+
+    def remaining(self) -> float:
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    def timeout(self, cap: float, *, floor: float = 0.0) -> float:
+        """Timeout for the next hop: what is left (at least ``floor``), never above ``cap``.
+
+        Raises :class:`DeadlineExceeded` when nothing is left and no ``floor``
+        was granted (a floor lets must-happen hops like the fallback send run).
+        """
+        remaining = self.remaining()
+        if remaining <= 0 and floor <= 0:
+            raise DeadlineExceeded(f"deadline exceeded by {time.monotonic() - self.expires_at:.2f}s")
+        return min(float(cap), max(remaining, float(floor)))
+
+
+_current: contextvars.ContextVar[Optional[Deadline]] = contextvars.ContextVar("message_deadline", default=None)
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _current.get()
+
+
+@contextmanager
+def deadline_scope(deadline: Optional[Deadline]) -> Iterator[Optional[Deadline]]:
+    """Make ``deadline`` current for the block; ``None`` keeps the enclosing one."""
+    if deadline is None:
+        yield current_deadline()
+        return
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
+
+
+def budget_timeout(default: float, *, floor: float = 0.0) -> float:
+    """``default`` without a current deadline, else the remaining budget capped at it."""
+    deadline = current_deadline()
+    if deadline is None:
+        return default
+    return deadline.timeout(default, floor=floor)
+
+
+def raise_if_expired(what: str = "operation") -> None:
+    deadline = current_deadline()
+    if deadline is not None and deadline.expired:
+        raise DeadlineExceeded(f"deadline exceeded during {what}")
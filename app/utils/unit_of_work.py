@@ -0,0 +1,221 @@
+"""Per-message Redis unit of work: one pipelined read, one pipelined write.
+
+The webhook (or the queue worker) opens a :class:`RedisUnitOfWork` for each
+inbound message with :func:`redis_unit_of_work`. The code that owns the
+turn's data opts in explicitly:
+
+* Once the conversation lock is held, the turn calls
+  :meth:`RedisUnitOfWork.prefetch` with the keys it is known to need
+  (session, summary, client data, lead ids, tenant credentials, thread ids);
+  they are read in one non-transactional pipeline and the owners read them
+  back with :func:`cached_read`.
+* Plain ``SET``/``SETEX``/``DEL`` writes go through :func:`deferred_write`:
+  they are buffered, visible to :func:`cached_read`, and applied in one
+  ``MULTI`` by :meth:`RedisUnitOfWork.flush` before the lock is released.
+  Code that writes one of these keys some other way (a pipeline, ``HSET``)
+  calls :func:`forget` first.
+* Locks, queues, the governor and the session's fenced write use the client
+  directly; they are neither batched nor counted.
+
+``round_trips`` counts the Redis calls made for the turn's data: the
+prefetch, the flush, and any read or write that could not be served or
+buffered. With the unit disabled each :func:`cached_read` and
+:func:`deferred_write` is one round trip, which gives the baseline.
+"""
+from __future__ import annotations
+
+import contextvars
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import redis
+
+_MISSING = object()
+
+logger = logging.getLogger(__name__)
+
+_current_unit: contextvars.ContextVar[Optional["RedisUnitOfWork"]] = contextvars.ContextVar(
+    "redis_unit_of_work", default=None
+)
+
+
+def current_unit_of_work() -> Optional["RedisUnitOfWork"]:
+    return _current_unit.get()
+
+
+@contextmanager
+def redis_unit_of_work(redis_client, *, enabled: bool = True, label: str = "") -> Iterator["RedisUnitOfWork"]:
+    """Make a unit current for the block (joining the current one if any) and flush it on exit.
+
+    With ``enabled=False`` the unit only counts round trips.
+    """
+    unit = _current_unit.get()
+    if unit is not None:
+        yield unit
+        return
+    unit = RedisUnitOfWork(redis_client, enabled=enabled)
+    token = _current_unit.set(unit)
+    try:
+        yield unit
+    finally:
+        _current_unit.reset(token)
+        unit.flush()
+        unit.close()
+        logger.info("🔁 Redis round trips %s: %s", label or "del mensaje", unit.round_trips)
+
+
+def unit_for(redis_client) -> Optional["RedisUnitOfWork"]:
+    """The current unit when it batches ``redis_client``."""
+    unit = _current_unit.get()
+    return unit if unit is not None and unit.client is redis_client else None
+
+
+def cached_read(redis_client, command: str, key: str, *args: Any) -> Any:
+    """``redis_client.<command>(key, *args)``, answered from the current unit when it can."""
+    unit = unit_for(redis_client)
+    if unit is None:
+        return getattr(redis_client, command)(key, *args)
+    return unit.read(command, key, *args)
+
+
+def deferred_write(redis_client, command: str, *args: Any, **kwargs: Any) -> Any:
+    """``SET``/``SETEX``/``DEL`` buffered until the current unit flushes (run now without one)."""
+    unit = unit_for(redis_client)
+    if unit is None:
+        return getattr(redis_client, command)(*args, **kwargs)
+    return unit.write(command, *args, **kwargs)
+
+
+def forget(redis_client, *keys: str) -> None:
+    """Call before writing ``keys`` directly: drops what the current unit knows about them."""
+    unit = unit_for(redis_client)
+    if unit is not None:
+        unit.forget(keys)
+
+
+class RedisUnitOfWork:
+    def __init__(self, redis_client, *, enabled: bool = True) -> None:
+        self.client = redis_client
+        self.enabled = enabled
+        self.round_trips = 0
+        self._lock = threading.RLock()
+        # key -> {(command, *args): value}; a stored exception is re-raised on read.
+        self._cache: Dict[str, Dict[Tuple[Any, ...], Any]] = {}
+        self._pending: List[Tuple[str, Tuple[Any, ...], Dict[str, Any]]] = []
+        self._pending_keys: set = set()
+
+    def _count(self) -> None:
+        with self._lock:
+            self.round_trips += 1
+
+    def _cached(self, key: str, entry: Tuple[Any, ...]) -> Any:
+        with self._lock:
+            value = self._cache.get(key, {}).get(entry, _MISSING)
+        if isinstance(value, Exception):
+            raise value
+        return value
+
+    def prefetch(
+        self,
+        *,
+        get: Iterable[str] = (),
+        hgetall: Iterable[str] = (),
+        lrange: Iterable[Tuple[str, int, int]] = (),
+    ) -> None:
+        """Read every not-yet-known key in one pipeline."""
+        if not self.enabled:
+            return
+        requests: List[Tuple[str, Tuple[Any, ...]]] = []
+        for key in dict.fromkeys(get):
+            requests.append((key, ("get",)))
+        for key in dict.fromkeys(hgetall):
+            requests.append((key, ("hgetall",)))
+        for key, start, end in dict.fromkeys(lrange):
+            requests.append((key, ("lrange", start, end)))
+        requests = [(key, entry) for key, entry in requests if self._cached(key, entry) is _MISSING]
+        if not requests:
+            return
+        pipe = self.client.pipeline(transaction=False)
+        for key, entry in requests:
+            getattr(pipe, entry[0])(key, *entry[1:])
+        self._count()
+        try:
+            values = pipe.execute(raise_on_error=False)
+        except redis.RedisError as exc:
+            logger.warning("⚠️ Redis prefetch failed, reading keys one by one: %s", exc)
+            return
+        with self._lock:
+            for (key, entry), value in zip(requests, values):
+                # WRONGTYPE & co. are kept so the owner's migration path still runs.
+                if isinstance(value, redis.ResponseError) or not isinstance(value, Exception):
+                    self._cache.setdefault(key, {})[entry] = value
+
+    def read(self, command: str, key: str, *args: Any) -> Any:
+        if command in ("hget", "hmget"):
+            values = self._cached(key, ("hgetall",))
+            if values is not _MISSING:
+                return values.get(args[0]) if command == "hget" else [values.get(field) for field in args[0]]
+        else:
+            value = self._cached(key, (command, *args))
+            if value is not _MISSING:
+                return value.copy() if isinstance(value, (dict, list)) else value
+        if key in self._pending_keys:
+            self._apply()
+        self._count()
+        return getattr(self.client, command)(key, *args)
+
+    def write(self, command: str, *args: Any, **kwargs: Any) -> Any:
+        if not self.enabled:
+            self._count()
+            return getattr(self.client, command)(*args, **kwargs)
+        keys = list(args) if command == "delete" else [args[0]]
+        value = None if command == "delete" else args[-1]
+        with self._lock:
+            self._pending.append((command, args, kwargs))
+            self._pending_keys.update(keys)
+            for key in keys:
+                self._cache[key] = {("get",): value}
+        return len(keys) if command == "delete" else True
+
+    def forget(self, keys: Iterable[str]) -> None:
+        keys = set(keys)
+        with self._lock:
+            for key in keys:
+                self._cache.pop(key, None)
+            must_apply = bool(keys & self._pending_keys)
+        if must_apply:
+            self._apply()
+
+    def _apply(self) -> bool:
+        with self._lock:
+            pending, self._pending = self._pending, []
+            self._pending_keys = set()
+        if not pending:
+            return True
+        pipe = self.client.pipeline(transaction=True)
+        for command, args, kwargs in pending:
+            getattr(pipe, command)(*args, **kwargs)
+        self._count()
+        try:
+            pipe.execute()
+            return True
+        except redis.RedisError as exc:
+            logger.error("❌ Could not flush %s buffered Redis writes: %s", len(pending), exc)
+            return False
+
+    def flush(self) -> bool:
+        """Apply the buffered writes in one MULTI and drop the prefetched values.
+
+        Prefetched values are only trusted while the conversation lock is held.
+        Returns False when Redis refused the writes.
+        """
+        applied = self._apply()
+        with self._lock:
+            self._cache.clear()
+        return applied
+
+    def close(self) -> None:
+        """Late writes (a straggling pool task) go straight to Redis."""
+        self.enabled = False
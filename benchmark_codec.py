@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Compara el codec de Redis contra el ``json`` de la stdlib: bytes guardados y
+µs por operación (dumps/loads) para payloads típicos.
+
+    python benchmark_codec.py
+    python benchmark_codec.py --dictionary codec.dict --iterations 5000
+"""
+
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.utils import codec  # noqa: E402
+from train_codec_dictionary import train_dictionary  # noqa: E402
+
+INSTRUCCIONES = (
+    "Eres un asesor de ventas de repuestos automotrices en Santiago de Chile. "
+    "Saluda con cordialidad, pregunta la marca, el modelo, el año y la patente del vehículo "
+    "antes de cotizar. Nunca inventes precios ni stock: usa siempre la función de búsqueda. "
+    "Si el cliente pide despacho, confirma la comuna y ofrece retiro en sucursal como alternativa. "
+) * 12
+
+
+def _tool(name, description, fields):
+    return {
+        "type": "function",
+        "function": {
+            "name": name,
+            "description": description,
+            "parameters": {
+                "type": "object",
+                "properties": {field: {"type": "string", "description": f"{field} del cliente"} for field in fields},
+                "required": list(fields),
+            },
+        },
+    }
+
+
+def sample_payloads():
+    bot = {
+        "id": "cc6b403d499043da9f68e9604db5ab65",
+        "name": "Repuestos Santiago",
+        "instructions": INSTRUCCIONES,
+        "twilio_phone_number": "+56949472881",
+        "metadata": {
+            "tenant_id": "t-42",
+            "tools": [
+                _tool("buscar_repuesto", "Busca stock y precio de un repuesto", ["marca", "modelo", "año", "repuesto"]),
+                _tool("crear_lead", "Registra al cliente en el CRM", ["nombre", "telefono", "comuna", "patente"]),
+                _tool("agendar_instalacion", "Agenda la instalación en sucursal", ["sucursal", "fecha", "hora"]),
+            ],
+            "sucursal_phone_map": {"santiago": "+56949472881", "providencia": "+56949472881", "la florida": "+56949472881"},
+        },
+    }
+    message = {"role": "user", "content": "Hola, ¿tienen batería para un Toyota Yaris 2015? Estoy en Maipú."}
+    history = [
+        {"role": "user" if i % 2 == 0 else "assistant",
+         "content": "Necesito cotizar pastillas de freno para mi Kia Rio" if i % 2 == 0
+         else "¡Claro! ¿Me confirmas el año y la patente para buscar el repuesto correcto?"}
+        for i in range(20)
+    ]
+    client = {"nombre": "Ana Pérez", "marca": "Toyota", "modelo": "Yaris", "año": 2015, "comuna": "Maipú",
+              "patente": "ABCD12", "created_at": "2026-01-01T10:00:00", "notification_sent": True}
+    return {"bot": bot, "mensaje": message, "historial (20)": history, "cliente": client}
+
+
+def _stdlib():
+    return json.dumps, json.loads
+
+
+def configurations(dictionary):
+    configs = [("json stdlib (antes)", _stdlib())]
+    base = [("codec json", dict(serializer="json"))]
+    if codec.orjson is not None:
+        base.append(("codec orjson", dict(serializer="orjson")))
+    for label, options in base:
+        configs.append((label, codec.Codec(**options)))
+    serializer = base[-1][1]["serializer"]
+    algorithms = ["zlib"] + (["zstd"] if codec.zstandard is not None else [])
+    for algorithm in algorithms:
+        configs.append((f"{serializer} + {algorithm}", codec.Codec(serializer=serializer, compression=algorithm, min_compress_bytes=0)))
+        if dictionary:
+            configs.append((
+                f"{serializer} + {algorithm} + dict",
+                codec.Codec(serializer=serializer, compression=algorithm, min_compress_bytes=0, dictionaries=[dictionary]),
+            ))
+    return configs
+
+
+def backend_of(encoder):
+    """Backend really used (orjson/zstd fall back silently when not installed)."""
+    return "json" if isinstance(encoder, tuple) else encoder.backend
+
+
+def installed(module):
+    return getattr(module, "__version__", "instalado") if module is not None else "NO instalado"
+
+
+def measure(encoder, value, iterations):
+    if isinstance(encoder, tuple):
+        dumps, loads = encoder
+    else:
+        dumps, loads = encoder.dumps, encoder.loads
+    encoded = dumps(value)
+    assert loads(encoded) == value
+    dumps_us = timeit.timeit(lambda: dumps(value), number=iterations) / iterations * 1e6
+    loads_us = timeit.timeit(lambda: loads(encoded), number=iterations) / iterations * 1e6
+    return len(encoded.encode("utf-8")), dumps_us, loads_us
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dictionary", help="Diccionario entrenado (por defecto se entrena uno con los payloads de ejemplo)")
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    payloads = sample_payloads()
+    if args.dictionary:
+        with open(args.dictionary, "rb") as handle:
+            dictionary = handle.read()
+    else:
+        samples = [json.dumps(value, ensure_ascii=False).encode("utf-8") for value in payloads.values()] * 5
+        dictionary, _ = train_dictionary(samples, 8 * 1024)
+
+    print(f"orjson: {installed(codec.orjson)} · zstandard: {installed(codec.zstandard)}")
+    print(f"codec por defecto (CODEC_SERIALIZER=auto, CODEC_COMPRESSION=auto): {codec.Codec(compression='auto').backend}")
+    print()
+    print(f"{'payload':<16} {'codec':<26} {'backend':<28} {'bytes':>8} {'dumps µs':>10} {'loads µs':>10}")
+    for name, value in payloads.items():
+        for label, encoder in configurations(dictionary):
+            size, dumps_us, loads_us = measure(encoder, value, args.iterations)
+            print(f"{name:<16} {label:<26} {backend_of(encoder):<28} {size:>8} {dumps_us:>10.1f} {loads_us:>10.1f}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
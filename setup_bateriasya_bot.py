@@ -14,6 +14,9 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 def setup_with_redis():
     """Configurar bot usando Redis."""
     import redis
+    from app.utils import codec
+    
+    codec.configure_codec(os.environ)
     
     redis_url = os.getenv("REDIS_URL", "redis://localhost:6379/0")
     print(f"Conectando a Redis: {redis_url}")
@@ -34,7 +37,7 @@ def setup_with_redis():
         return
     
     for bot_id, bot_json in bots_data.items():
-        bot = json.loads(bot_json)
+        bot = codec.loads(bot_json)
         print(f"\n📋 Bot ID: {bot_id}")
         print(f"   Nombre: {bot.get('name', 'N/A')}")
         print(f"   Assistant ID: {bot.get('assistant_id', 'N/A')}")
@@ -64,7 +67,7 @@ def setup_with_redis():
             bot['metadata'] = metadata
             
             # Guardar de vuelta a Redis
-            r.hset("bots:registry", bot_id, json.dumps(bot))
+            r.hset("bots:registry", bot_id, codec.dumps(bot))
             
             print("\n✅ Metadata actualizado en Redis!")
             print("\n📋 Nueva configuración:")
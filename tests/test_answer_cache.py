@@ -0,0 +1,84 @@
+"""Tests for the per-bot cache of first-turn FAQ answers."""
+from __future__ import annotations
+
+from types import SimpleNamespace
+
+import pytest
+
+from app import create_app
+from app.extensions import redis_extension
+from app.repositories import BotRepository
+from app.services.answer_cache import minhash_signature, normalize_question, similarity
+from app.services.conversation_service import handle_incoming_message
+from app.services.openai_service import OpenAIAssistantService
+
+
+class _ChatCompletions:
+    def __init__(self) -> None:
+        self.calls = 0
+
+    def create(self, *, messages, **kwargs):
+        self.calls += 1
+        message = SimpleNamespace(content=f"respuesta {self.calls}", tool_calls=None)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+@pytest.fixture()
+def app():
+    app = create_app("testing")
+    yield app
+    redis_extension.client.flushdb()
+
+
+@pytest.fixture()
+def setup(app):
+    completions = _ChatCompletions()
+    service = OpenAIAssistantService(SimpleNamespace(client=SimpleNamespace(chat=SimpleNamespace(completions=completions))))
+    repository = BotRepository(redis_extension.client)
+    bot = repository.create_bot({
+        "name": "FAQ",
+        "instructions": "Eres un asesor.",
+        "metadata": {"answer_cache_enabled": True},
+    })
+
+    def ask(user_number: str, message: str) -> str:
+        with app.app_context():
+            return handle_incoming_message(
+                bot_id=bot["id"], user_number=user_number, message=message,
+                repository=repository, openai_service=service,
+            )
+
+    return SimpleNamespace(ask=ask, bot=bot, completions=completions, repository=repository)
+
+
+def test_similar_questions_share_a_signature():
+    assert normalize_question("¿Cuál es el HORARIO?") == "cual horario"
+    same = similarity(minhash_signature(normalize_question("¿Cuál es el horario?")),
+                      minhash_signature(normalize_question("cual es el horario")))
+    other = similarity(minhash_signature(normalize_question("¿Cuál es el horario?")),
+                       minhash_signature(normalize_question("precio de la bateria")))
+    assert same == 1.0 and other < 0.5
+
+
+def test_first_turn_hit_skips_the_model(app, setup):
+    assert setup.ask("+56911111111", "¿A qué hora abren?") == "respuesta 1"
+    assert setup.ask("+56922222222", "hola, a que hora abren") == "respuesta 1"
+    assert setup.completions.calls == 1
+
+    stats = app.test_client().get("/bots/metrics/answer-cache").get_json()["data"][setup.bot["id"]]
+    assert stats["lookups"] == 2 and stats["hits"] == 1 and stats["hit_rate"] == 0.5
+
+
+def test_later_turns_are_not_served_from_cache(setup):
+    setup.ask("+56911111111", "¿A qué hora abren?")
+    setup.ask("+56922222222", "tengo un yaris")
+
+    assert setup.ask("+56922222222", "¿A qué hora abren?") == "respuesta 3"
+    assert setup.completions.calls == 3
+
+
+def test_editing_the_bot_invalidates_its_answers(setup):
+    setup.ask("+56911111111", "¿A qué hora abren?")
+    setup.repository.update_bot(setup.bot["id"], {"instructions": "Eres un asesor de repuestos."})
+
+    assert setup.ask("+56922222222", "¿A qué hora abren?") == "respuesta 2"
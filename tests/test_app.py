@@ -29,6 +29,7 @@ class DummyOpenAIService:
             reply_text="Hola, ¿en qué puedo ayudarte?", function_calls=[]
         )
         self.summary_text = "He completado la acción"
+        self.reply_calls = 0
 
     def create_assistant(self, **payload):
         payload.setdefault("id", "asst_dummy")
@@ -43,6 +44,7 @@ class DummyOpenAIService:
         return payload
 
     def generate_reply(self, **kwargs):
+        self.reply_calls += 1
         return self.reply
 
     def summarize_tool_results(self, **kwargs):
@@ -99,6 +101,21 @@ def test_webhook_returns_twiml(client, app):
     assert "Hola" in response.get_data(as_text=True)
 
 
+def test_webhook_retry_with_same_message_sid_reuses_reply(client, app):
+    repository = BotRepository(redis_extension.client)
+    bot = repository.create_bot(
+        {"name": "Ventas", "assistant_id": "asst_dummy", "twilio_phone_number": "whatsapp:+222222222"}
+    )
+    data = {"From": "whatsapp:+549111111", "To": bot["twilio_phone_number"], "Body": "Hola", "MessageSid": "SM-retry"}
+
+    first = client.post("/webhook/whatsapp", data=data)
+    retry = client.post("/webhook/whatsapp", data=data)
+
+    assert "Hola, ¿en qué puedo ayudarte?" in first.get_data(as_text=True)
+    assert retry.get_data(as_text=True) == first.get_data(as_text=True)
+    assert app.extensions["openai_service"].reply_calls == 1
+
+
 def test_horizon_function_invocation(client, app):
     repository = BotRepository(redis_extension.client)
     bot = repository.create_bot(
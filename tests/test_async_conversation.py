@@ -0,0 +1,100 @@
+"""Tests for the asyncio conversation path used by the async stream worker."""
+from __future__ import annotations
+
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app import create_app
+from app.extensions import redis_extension
+from app.repositories import BotRepository
+from app.services.async_conversation_service import AsyncConversationService
+from app.services.inbound_queue_service import InboundMessage
+from app.services.openai_service import AssistantResponse
+
+
+class _AsyncOpenAIService:
+    def __init__(self) -> None:
+        self.seen: list[list[dict]] = []
+
+    async def agenerate_reply(self, *, conversation, **kwargs):
+        self.seen.append(list(conversation))
+        await asyncio.sleep(0.05)
+        return AssistantResponse(reply_text=f"eco: {conversation[-1]['content']}", function_calls=[])
+
+
+class _RecordingTwilioService:
+    def __init__(self) -> None:
+        self.sent: list[dict] = []
+
+    def send_whatsapp_message(self, **kwargs):
+        self.sent.append(kwargs)
+        return "SM-async"
+
+
+@pytest.fixture()
+def app():
+    app = create_app("testing")
+    app.config["HORIZON_CONTROL_BASE_URL"] = None
+    app.extensions["openai_service"] = _AsyncOpenAIService()
+    app.extensions["twilio_service"] = _RecordingTwilioService()
+    yield app
+    redis_extension.client.flushdb()
+
+
+def _service(app) -> AsyncConversationService:
+    return AsyncConversationService(
+        app,
+        redis_client=redis_extension.create_async_client(),
+        openai_client=None,
+        http_client=httpx.AsyncClient(),
+    )
+
+
+def test_concurrent_conversations_share_one_loop_and_reply(app):
+    repository = BotRepository(redis_extension.client)
+    bot = repository.create_bot({"name": "Async", "twilio_phone_number": "whatsapp:+444444444"})
+    numbers = [f"+5691111{i:04d}" for i in range(20)]
+
+    async def _run():
+        service = _service(app)
+        try:
+            return await asyncio.gather(*(
+                service.process_queued_message(InboundMessage(bot_id=bot["id"], user_number=n, body=f"hola {n}"))
+                for n in numbers
+            ))
+        finally:
+            await service.aclose()
+
+    replies = asyncio.run(_run())
+
+    assert replies == [f"eco: hola {n}" for n in numbers]
+    assert len(app.extensions["twilio_service"].sent) == len(numbers)
+    session = [json.loads(m) for m in redis_extension.client.lrange(f"session:{bot['id']}:{numbers[0]}", 0, -1)]
+    assert session[-1] == {"role": "assistant", "content": f"eco: hola {numbers[0]}"}
+
+
+def test_same_user_turns_are_serialized_in_order(app):
+    bot = BotRepository(redis_extension.client).create_bot({"name": "Async"})
+
+    async def _run():
+        service = _service(app)
+        try:
+            with app.app_context():
+                first = asyncio.create_task(
+                    service.handle_incoming_message(bot_id=bot["id"], user_number="+56900000001", message="uno")
+                )
+                await asyncio.sleep(0.01)
+                second = asyncio.create_task(
+                    service.handle_incoming_message(bot_id=bot["id"], user_number="+56900000001", message="dos")
+                )
+                return await asyncio.gather(first, second)
+        finally:
+            await service.aclose()
+
+    assert asyncio.run(_run()) == ["eco: uno", "eco: dos"]
+    # The second turn saw the first one's full exchange in its history.
+    second_turn_history = app.extensions["openai_service"].seen[1]
+    assert [m["content"] for m in second_turn_history] == ["uno", "eco: uno", "dos"]
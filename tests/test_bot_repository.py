@@ -0,0 +1,89 @@
+"""Tests for the Redis bot registry and its Twilio number index."""
+from __future__ import annotations
+
+import json
+
+import fakeredis
+
+from app.repositories import BotConfigCache, BotRepository
+from app.repositories.bot_repository import (
+    BOT_COLLECTION_KEY,
+    BOT_INVALIDATION_CHANNEL,
+    BOT_NUMBER_INDEX_KEY,
+)
+
+
+def _repository(redis_client=None) -> BotRepository:
+    # Each test gets its own process-local cache so fakeredis instances don't leak into each other.
+    return BotRepository(redis_client or fakeredis.FakeRedis(decode_responses=True), cache=BotConfigCache())
+
+
+def test_find_bot_by_number_uses_index():
+    repository = _repository()
+    bot = repository.create_bot({"name": "Ventas", "twilio_phone_number": "whatsapp:+56911111111"})
+
+    assert repository.find_bot_by_number("+56911111111")["id"] == bot["id"]
+    assert repository.find_bot_by_number("whatsapp:+56911111111")["id"] == bot["id"]
+    assert repository.find_bot_by_number("+56900000000") is None
+
+
+def test_index_follows_number_changes_and_deletes():
+    repository = _repository()
+    bot = repository.create_bot({"name": "Ventas", "twilio_phone_number": "+56911111111"})
+
+    repository.update_bot(bot["id"], {"twilio_phone_number": "+56922222222"})
+    assert repository.find_bot_by_number("+56911111111") is None
+    assert repository.find_bot_by_number("+56922222222")["id"] == bot["id"]
+
+    assert repository.delete_bot(bot["id"]) is True
+    assert repository.find_bot_by_number("+56922222222") is None
+
+
+def test_legacy_registry_is_indexed_on_first_lookup():
+    redis_client = fakeredis.FakeRedis(decode_responses=True)
+    redis_client.hset(
+        BOT_COLLECTION_KEY,
+        "legacy",
+        json.dumps({"id": "legacy", "twilio_phone_number": "whatsapp:+56933333333"}),
+    )
+    repository = _repository(redis_client)
+
+    assert repository.find_bot_by_number("+56933333333")["id"] == "legacy"
+    assert redis_client.hget(BOT_NUMBER_INDEX_KEY, "+56933333333") == "legacy"
+    assert repository.rebuild_number_index() == 1
+
+
+def test_index_fallback_scans_the_registry_at_most_once():
+    redis_client = fakeredis.FakeRedis(decode_responses=True)
+    repository = _repository(redis_client)
+    repository.create_bot({"name": "Sin número"})  # no bot has a number: the index key never exists
+    rebuilds = []
+    original = repository.rebuild_number_index
+    repository.rebuild_number_index = lambda: rebuilds.append(1) or original()
+
+    for _ in range(3):
+        assert repository.find_bot_by_number("+56944444444") is None
+    assert len(rebuilds) == 1
+    assert not redis_client.exists(BOT_NUMBER_INDEX_KEY)
+
+
+def test_cached_bot_is_evicted_by_write_on_another_worker():
+    redis_client = fakeredis.FakeRedis(decode_responses=True)
+    worker_a = _repository(redis_client)
+    worker_b = _repository(redis_client)
+    bot = worker_a.create_bot({"name": "Ventas", "instructions": "v1"})
+    assert worker_a.get_bot(bot["id"])["instructions"] == "v1"
+
+    pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(BOT_INVALIDATION_CHANNEL)
+    redis_client.hset(BOT_COLLECTION_KEY, bot["id"], '{"id": "%s", "instructions": "raw"}' % bot["id"])
+    # Warm read is served from the process cache, without touching Redis.
+    assert worker_a.get_bot(bot["id"])["instructions"] == "v1"
+
+    worker_b.update_bot(bot["id"], {"instructions": "v2"})
+    message = None
+    for _ in range(5):  # first poll only consumes the subscribe confirmation
+        message = message or pubsub.get_message(timeout=1.0)
+    worker_a._cache.apply_invalidation(message["data"])
+
+    assert worker_a.get_bot(bot["id"])["instructions"] == "v2"
@@ -0,0 +1,33 @@
+"""Tests for per-conversation burst coalescing."""
+from __future__ import annotations
+
+import fakeredis
+
+from app.services.burst_coalescer import BurstCoalescer, resolve_debounce_ms
+
+
+def test_disabled_window_passes_message_through():
+    coalescer = BurstCoalescer(fakeredis.FakeRedis(decode_responses=True))
+    assert coalescer.collect(bot_id="b1", user_number="+569", message="hola", window_ms=0) == "hola"
+
+
+def test_burst_is_answered_once_by_latest_message():
+    redis_client = fakeredis.FakeRedis(decode_responses=True)
+    answers = {}
+
+    def _sleep_while_user_keeps_typing(_seconds):
+        # While the first message waits, two more arrive from the same user.
+        follow_up = BurstCoalescer(redis_client, sleep=lambda _s: None)
+        answers["second"] = follow_up.collect(bot_id="b1", user_number="+569", message="tengo un gol", window_ms=800)
+
+    first = BurstCoalescer(redis_client, sleep=_sleep_while_user_keeps_typing)
+    answers["first"] = first.collect(bot_id="b1", user_number="+569", message="hola", window_ms=800)
+
+    assert answers["first"] is None
+    assert answers["second"] == "hola\ntengo un gol"
+
+
+def test_debounce_window_comes_from_bot_metadata():
+    assert resolve_debounce_ms({"metadata": {"message_debounce_ms": "1500"}}) == 1500
+    assert resolve_debounce_ms({"metadata": {}}) == 0
+    assert resolve_debounce_ms({}) == 0
@@ -0,0 +1,91 @@
+"""Tests for the single-pass tool loop of chat-completions bots."""
+from __future__ import annotations
+
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from app import create_app
+from app.extensions import redis_extension
+from app.repositories import BotRepository
+from app.services.conversation_service import handle_incoming_message
+from app.services.openai_service import MAX_TOOL_ROUNDS, OpenAIAssistantService
+
+
+def _tool_call(call_id: str, name: str, arguments: dict):
+    function = SimpleNamespace(name=name, arguments=json.dumps(arguments))
+    return SimpleNamespace(id=call_id, type="function", function=function)
+
+
+class _ChatCompletions:
+    """Answers with the scripted tool calls, then with text."""
+
+    def __init__(self, rounds) -> None:
+        self.rounds = list(rounds)
+        self.requests: list[dict] = []
+
+    def create(self, **kwargs):
+        self.requests.append(kwargs)
+        tool_calls = self.rounds.pop(0) if self.rounds and kwargs.get("tool_choice") != "none" else None
+        content = None if tool_calls else "Tenemos stock, cuesta $50.000"
+        message = SimpleNamespace(content=content, tool_calls=tool_calls)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+class _Horizon:
+    def execute_action(self, *, action_name, defined_actions, arguments):
+        return {"action": action_name, **arguments}
+
+
+@pytest.fixture()
+def app():
+    app = create_app("testing")
+    yield app
+    redis_extension.client.flushdb()
+
+
+def _ask(app, completions, message="¿tienen batería para yaris?"):
+    service = OpenAIAssistantService(SimpleNamespace(client=SimpleNamespace(chat=SimpleNamespace(completions=completions))))
+    repository = BotRepository(redis_extension.client)
+    bot = repository.create_bot({
+        "name": "Chat",
+        "instructions": "Eres un asesor.",
+        "assistant_functions": [{"type": "function", "function": {"name": "consultar_stock"}}],
+    })
+    with app.app_context():
+        reply = handle_incoming_message(
+            bot_id=bot["id"], user_number="+56955555555", message=message,
+            repository=repository, openai_service=service, horizon_service=_Horizon(),
+        )
+    return bot, reply
+
+
+def test_tool_rounds_continue_the_same_completion(app):
+    completions = _ChatCompletions([
+        [_tool_call("call_a", "consultar_stock", {"sku": "A"}), _tool_call("call_b", "cotizar_repuesto", {"sku": "B"})],
+        [_tool_call("call_c", "consultar_stock", {"sku": "C"})],
+    ])
+
+    bot, reply = _ask(app, completions)
+
+    assert reply == "Tenemos stock, cuesta $50.000"
+    assert len(completions.requests) == 3  # one request per tool round, no summarizing call
+    second = completions.requests[1]["messages"]
+    assert [call["id"] for call in second[-3]["tool_calls"]] == ["call_a", "call_b"]
+    assert [(m["tool_call_id"], json.loads(m["content"])["sku"]) for m in second[-2:]] == [("call_a", "A"), ("call_b", "B")]
+    third = completions.requests[2]["messages"]
+    assert third[: len(second)] == second and third[-1]["tool_call_id"] == "call_c"
+
+    session = [json.loads(m) for m in redis_extension.client.lrange(f"session:{bot['id']}:+56955555555", 0, -1)]
+    assert [m["role"] for m in session] == ["user", "assistant"]
+
+
+def test_round_cap_forces_a_text_answer(app):
+    completions = _ChatCompletions([[_tool_call(f"call_{i}", "consultar_stock", {"sku": i})] for i in range(20)])
+
+    _, reply = _ask(app, completions)
+
+    assert reply == "Tenemos stock, cuesta $50.000"
+    assert len(completions.requests) == MAX_TOOL_ROUNDS + 1
+    assert completions.requests[-1]["tool_choice"] == "none"
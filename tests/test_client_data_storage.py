@@ -0,0 +1,112 @@
+"""Tests for the hash storage mode of ClientDataManager."""
+from __future__ import annotations
+
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app import create_app
+from app.extensions import redis_extension
+from app.repositories import BotRepository
+from app.services.client_data_service import ClientDataManager
+from app.services import conversation_service
+from app.services.conversation_service import _try_auto_dispatch_lead_notification, handle_incoming_message
+from app.services.openai_service import OpenAIAssistantService
+
+
+@pytest.fixture()
+def app():
+    app = create_app("testing")
+    yield app
+    redis_extension.client.flushdb()
+
+
+def test_field_updates_do_not_overwrite_each_other(app):
+    first = ClientDataManager(redis_extension.client, namespace="b1", storage="hash")
+    second = ClientDataManager(redis_extension.client, namespace="b1", storage="hash")
+
+    first.update_client_fields("+56911111111", {"marca": "Toyota", "año": "2015"})
+    second.update_client_data("+56911111111", "comuna", "Maipu")
+    first.update_client_data("+56911111111", "año", 2016)
+
+    data = first.get_client_data("+56911111111")
+    assert (data["marca"], data["año"], data["comuna"]) == ("Toyota", 2016, "Maipu")
+    assert redis_extension.client.type("client_data:b1:56911111111") == "hash"
+    assert 0 < redis_extension.client.ttl("client_data:b1:56911111111") <= first.expiration_seconds
+
+    assert first.has_required_info("+56911111111", ["marca", "comuna"])
+    assert first.get_missing_fields("+56911111111", ["marca", "telefono"]) == ["telefono"]
+    assert first.set_flag_once("+56911111111", "notification_sent") is True
+    assert second.set_flag_once("+56911111111", "notification_sent") is False
+    assert first.get_client_data("+56911111111")["notification_sent"] is True
+
+
+def test_json_documents_are_migrated_on_read(app):
+    key = "client_data:b1:56922222222"
+    redis_extension.client.setex(key, 900, json.dumps({"marca": "Kia", "notification_sent": True}))
+    manager = ClientDataManager(redis_extension.client, namespace="b1", storage="hash")
+
+    assert manager.get_missing_fields("+56922222222", ["marca", "modelo"]) == ["modelo"]
+    assert redis_extension.client.type(key) == "hash"
+    assert 0 < redis_extension.client.ttl(key) <= 900
+    assert manager.get_client_data("+56922222222") == {"marca": "Kia", "notification_sent": True}
+
+
+def test_turn_updates_extracted_fields_in_hash_mode(app):
+    app.config["CLIENT_DATA_STORAGE"] = "hash"
+    completions = SimpleNamespace(create=lambda **kwargs: SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content="Anotado", tool_calls=None))], usage=None
+    ))
+    service = OpenAIAssistantService(SimpleNamespace(client=SimpleNamespace(chat=SimpleNamespace(completions=completions))))
+    repository = BotRepository(redis_extension.client)
+    bot = repository.create_bot({"name": "Repuestos", "instructions": "Eres un asesor."})
+    redis_extension.client.set(f"client_data:{bot['id']}:56933333333", json.dumps({"nombre": "Ana"}))
+
+    with app.app_context():
+        handle_incoming_message(
+            bot_id=bot["id"], user_number="+56933333333", message="tengo un toyota corolla",
+            repository=repository, openai_service=service,
+        )
+        data = ClientDataManager(redis_extension.client, namespace=bot["id"]).get_client_data("+56933333333")
+
+    assert (data["nombre"], data["marca"], data["modelo"]) == ("Ana", "Toyota", "Corolla")
+
+
+@pytest.mark.parametrize("storage", ["json", "hash"])
+def test_concurrent_turns_dispatch_the_lead_once_and_a_failure_releases_the_claim(app, monkeypatch, storage):
+    bot = {"id": "b1", "name": "Baterías", "metadata": {
+        "auto_dispatch_enabled": True, "auto_dispatch_required_fields": ["marca", "telefono"],
+    }}
+    outcomes = [{"success": False}, {"success": True}]
+    calls: list = []
+
+    def slow_dispatch(self, **kwargs):
+        calls.append(kwargs["function_name"])
+        time.sleep(0.2)
+        return outcomes[min(len(calls), 2) - 1]
+
+    monkeypatch.setattr(conversation_service.CustomFunctionsService, "execute_custom_function", slow_dispatch)
+    manager = ClientDataManager(redis_extension.client, namespace="b1", storage=storage)
+    manager.update_client_fields("+56944444444", {"marca": "Kia", "telefono": "+56944444444"})
+
+    def _turn() -> None:
+        with app.app_context():
+            _try_auto_dispatch_lead_notification(
+                bot=bot, user_number="+56944444444", client_data_manager=manager,
+                client_data=manager.get_client_data("+56944444444"),
+            )
+
+    turns = [threading.Thread(target=_turn) for _ in range(2)]
+    for turn in turns:
+        turn.start()
+    for turn in turns:
+        turn.join(timeout=5)
+    assert len(calls) == 1  # the other turn found the flag claimed
+    assert not manager.get_client_data("+56944444444").get("notification_sent")  # failed: claim released
+
+    _turn()
+    assert len(calls) == 2
+    assert manager.get_client_data("+56944444444")["notification_sent"] is True
@@ -0,0 +1,66 @@
+"""Tests for the Redis payload codec."""
+from __future__ import annotations
+
+import json
+
+import pytest
+
+from app import create_app
+from app.extensions import redis_extension
+from app.repositories import BotRepository
+from app.services.session_store import SessionStore
+from app.utils import codec
+
+
+@pytest.fixture()
+def app(monkeypatch):
+    app = create_app("testing")
+    monkeypatch.setattr(codec, "_codec", codec.get_codec())  # restored after the test
+    yield app
+    redis_extension.client.flushdb()
+
+
+def _bot_payload() -> dict:
+    return {
+        "name": "Repuestos",
+        "instructions": "Eres un asesor de repuestos. Pregunta marca, modelo y año antes de cotizar. " * 40,
+        "metadata": {"tenant_id": "t1", "comuna": "Maipú"},
+    }
+
+
+def test_compressed_payloads_round_trip_and_legacy_json_stays_readable(tmp_path):
+    legacy = json.dumps({"marca": "Toyota", "año": 2015})
+    dictionary = tmp_path / "codec.dict"
+    dictionary.write_bytes(b'"instructions":"Eres un asesor de repuestos. Pregunta marca, modelo y a\xc3\xb1o')
+
+    writer = codec.Codec(compression="zlib", min_compress_bytes=256, dictionaries=codec.load_dictionaries([str(dictionary)]))
+    value = _bot_payload()
+    encoded = writer.dumps(value)
+    assert encoded.startswith("~zl") and len(encoded) < len(json.dumps(value)) / 4
+    assert writer.loads(encoded) == value
+    assert writer.loads(legacy) == {"marca": "Toyota", "año": 2015}
+    assert writer.dumps({"marca": "Kia"}) == '{"marca":"Kia"}'  # under the threshold: plain JSON
+
+    # A reader with compression off still decodes it, as long as it has the dictionary.
+    assert codec.Codec(dictionaries=[dictionary.read_bytes()]).loads(encoded) == value
+    with pytest.raises(codec.CodecError):
+        codec.Codec().loads(encoded)
+
+
+def test_stores_read_old_keys_and_write_through_the_configured_codec(app):
+    repository = BotRepository(redis_extension.client)
+    bot = repository.create_bot(_bot_payload())
+    legacy_key = "session:b1:+569"
+    redis_extension.client.rpush(legacy_key, json.dumps({"role": "user", "content": "hola"}))
+
+    app.config.update(CODEC_COMPRESSION="zlib", CODEC_COMPRESS_MIN_BYTES=256)
+    codec.configure_codec(app.config)
+    repository.update_bot(bot["id"], {"name": "Repuestos Maipú"})
+
+    raw = redis_extension.client.hget("bots:registry", bot["id"])
+    assert raw.startswith(codec.ENVELOPE_PREFIX)
+    reloaded = BotRepository(redis_extension.client).get_bot(bot["id"])
+    assert reloaded["name"] == "Repuestos Maipú" and reloaded["instructions"] == bot["instructions"]
+
+    store = SessionStore(redis_extension.client, bot_id="b1", user_number="+569")
+    assert store.load() == [{"role": "user", "content": "hola"}]
@@ -0,0 +1,37 @@
+"""Tests for the bounded fan-out helpers."""
+from __future__ import annotations
+
+import time
+
+import pytest
+from flask import current_app
+
+from app import create_app
+from app.utils.concurrency import TaskGraph
+
+
+def test_independent_tasks_overlap_and_dependents_wait():
+    graph = TaskGraph()
+    graph.add("a", lambda _r: (time.sleep(0.2), "a")[1])
+    graph.add("b", lambda _r: (time.sleep(0.2), "b")[1])
+    graph.add("ab", lambda r: r["a"] + r["b"], after=("a", "b"))
+    graph.add("inline", lambda _r: (time.sleep(0.2), "inline")[1], inline=True)
+
+    started = time.monotonic()
+    results = graph.run()
+
+    assert results == {"a": "a", "b": "b", "ab": "ab", "inline": "inline"}
+    assert time.monotonic() - started < 0.5
+
+
+def test_tasks_see_app_context_and_errors_propagate():
+    app = create_app("testing")
+    graph = TaskGraph()
+    graph.add("name", lambda _r: current_app.name)
+    graph.add("boom", lambda _r: (_ for _ in ()).throw(LookupError("missing")))
+    graph.add("never", lambda _r: "unreachable", after=("boom",))
+
+    with app.app_context():
+        with pytest.raises(LookupError):
+            graph.run()
+        assert TaskGraph().add("name", lambda _r: current_app.name).run() == {"name": app.name}
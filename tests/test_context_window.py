@@ -0,0 +1,120 @@
+"""Tests for the token-budgeted history of chat-completions bots."""
+from __future__ import annotations
+
+import json
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app import create_app
+from app.extensions import redis_extension
+from app.repositories import BotRepository
+from app.services.context_window import ContextWindow, history_token_budget, message_tokens
+from app.services import conversation_service
+from app.services.conversation_service import handle_incoming_message
+from app.services.openai_service import OpenAIAssistantService
+
+
+class _ChatCompletions:
+    def __init__(self, summary_delay: float = 0) -> None:
+        self.prompts: list[list[dict]] = []
+        self.summaries = 0
+        self.summary_delay = summary_delay
+
+    def create(self, *, messages, **kwargs):
+        if "max_tokens" in kwargs:  # rolling-summary request
+            time.sleep(self.summary_delay)
+            self.summaries += 1
+            content = f"resumen #{self.summaries}"
+        else:
+            self.prompts.append(messages)
+            content = "respuesta " + "x" * 120
+        message = SimpleNamespace(content=content, tool_calls=None)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+@pytest.fixture()
+def app():
+    app = create_app("testing")
+    app.config["CONTEXT_HISTORY_TOKEN_BUDGET"] = 200
+    yield app
+    redis_extension.client.flushdb()
+
+
+def test_fit_keeps_newest_turns_within_budget():
+    messages = [
+        {"role": "system", "content": "ESTADO ACTUAL DEL CLIENTE"},
+        {"role": "user", "content": "a" * 300},
+        {"role": "tool", "content": "{}"},
+        {"role": "assistant", "content": "b" * 60},
+        {"role": "user", "content": "c" * 60},
+    ]
+    window = ContextWindow(model=None, budget_tokens=sum(message_tokens(m) for m in messages[:1] + messages[2:]))
+
+    evicted, kept = window.fit(messages, pin_system=True)
+
+    assert [m["content"] for m in evicted] == ["a" * 300, "{}"]  # no orphaned tool message at the start
+    assert kept == [messages[0], messages[3], messages[4]]
+    assert history_token_budget("gpt-4.1-mini", {"CONTEXT_HISTORY_TOKEN_BUDGETS": {"gpt-4.1": 10, "gpt-4.1-mini": 5}}) == 5
+    assert history_token_budget("other", {"CONTEXT_HISTORY_TOKEN_BUDGET": 7}) == 7
+
+
+@pytest.fixture()
+def folds(monkeypatch):
+    """Background summary folds started by the turns, so a test can wait for them."""
+    started: list = []
+    fold_summary_later = conversation_service.fold_summary_later
+    monkeypatch.setattr(conversation_service, "fold_summary_later", lambda **kwargs: started.append(fold_summary_later(**kwargs)))
+    return started
+
+
+def test_chat_bot_history_is_bounded_and_summarized(app, folds):
+    completions = _ChatCompletions()
+    client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    service = OpenAIAssistantService(SimpleNamespace(client=client))
+    repository = BotRepository(redis_extension.client)
+    bot = repository.create_bot({"name": "Chat", "openai_model": "gpt-4.1-mini"})
+
+    with app.app_context():
+        for turn in range(8):
+            handle_incoming_message(
+                bot_id=bot["id"],
+                user_number="+56922222222",
+                message=f"mensaje {turn} " + "y" * 150,
+                repository=repository,
+                openai_service=service,
+            )
+            for fold in folds:
+                fold.result(timeout=5)
+
+    summary = redis_extension.client.get(f"session:{bot['id']}:+56922222222:summary")
+    session = [json.loads(m) for m in redis_extension.client.lrange(f"session:{bot['id']}:+56922222222", 0, -1)]
+    assert summary == f"resumen #{completions.summaries}" and completions.summaries >= 1
+    assert sum(message_tokens(m) for m in session) <= 200
+    last_prompt = completions.prompts[-1]
+    assert last_prompt[1]["content"].startswith("RESUMEN DE LA CONVERSACIÓN PREVIA:\nresumen #")
+    assert sum(message_tokens(m) for m in last_prompt[1:]) <= 200 + message_tokens(last_prompt[1])
+
+
+def test_the_model_fold_runs_after_the_turn_and_replaces_the_extractive_summary(app, folds):
+    completions = _ChatCompletions(summary_delay=0.5)
+    service = OpenAIAssistantService(SimpleNamespace(client=SimpleNamespace(chat=SimpleNamespace(completions=completions))))
+    repository = BotRepository(redis_extension.client)
+    bot = repository.create_bot({"name": "Chat", "openai_model": "gpt-4.1-mini"})
+    summary_key = f"session:{bot['id']}:+56933333333:summary"
+
+    with app.app_context():
+        turn = 0
+        while not folds:
+            started = time.monotonic()
+            handle_incoming_message(
+                bot_id=bot["id"], user_number="+56933333333", message=f"mensaje {turn} " + "y" * 150,
+                repository=repository, openai_service=service,
+            )
+            assert time.monotonic() - started < 0.4  # never waits for the summary call
+            turn += 1
+        assert redis_extension.client.get(summary_key).startswith("- Cliente: mensaje 0")  # extractive for now
+        folds[0].result(timeout=5)
+
+    assert redis_extension.client.get(summary_key) == "resumen #1"
@@ -1,10 +1,19 @@
 """Tests for the CRM human-handoff check (control-status)."""
 from __future__ import annotations
 
+import hashlib
+import hmac
+import json
+import time
+from datetime import UTC, datetime
+
 import pytest
 
 from app import create_app
+from app.extensions import redis_extension
+from app.repositories import BotRepository
 from app.services import conversation_service as cs
+from app.services.inbound_queue_service import InboundMessage
 
 
 @pytest.fixture()
@@ -12,7 +21,10 @@ def app():
     app = create_app("testing")
     app.config["HORIZON_CONTROL_BASE_URL"] = "https://crm.test"
     app.config["HORIZON_API_KEY"] = "test-token"
+    app.config["OUTBOUND_API_KEY"] = "svc-key"
+    app.config["OUTBOUND_HMAC_SECRET"] = "svc-secret"
     yield app
+    redis_extension.client.flushdb()
 
 
 BOT = {"id": "b1", "metadata": {"horizon_api_token": "test-token"}}
@@ -69,3 +81,83 @@ def test_http_error_fails_open(app, monkeypatch):
     monkeypatch.setattr(cs.requests, "get", lambda *a, **k: _Resp(500, None))
     with app.app_context():
         assert cs.human_agent_has_control(BOT, "+56912345678") is False
+
+
+def test_polled_mode_is_cached(app, monkeypatch):
+    calls = {"n": 0}
+
+    def fake_get(*a, **k):
+        calls["n"] += 1
+        return _Resp(200, {"control_mode": "bot"})
+
+    monkeypatch.setattr(cs.requests, "get", fake_get)
+    with app.app_context():
+        assert cs.human_agent_has_control(BOT, "+56912345678") is False
+        assert cs.human_agent_has_control(BOT, "+56912345678") is False
+    assert calls["n"] == 1
+
+
+def test_crm_push_overrides_cached_mode(app, monkeypatch):
+    monkeypatch.setattr(cs.requests, "get", lambda *a, **k: _Resp(200, {"control_mode": "bot"}))
+    with app.app_context():
+        assert cs.human_agent_has_control(BOT, "+56912345678") is False
+
+    raw = json.dumps({"tenant_id": "b1", "telefono": "+56912345678", "control_mode": "human"})
+    timestamp = datetime.now(UTC).isoformat()
+    signature = hmac.new(b"svc-secret", f"{timestamp}.{raw}".encode("utf-8"), hashlib.sha256).hexdigest()
+    response = app.test_client().post(
+        "/handoff/control-status",
+        data=raw,
+        content_type="application/json",
+        headers={"X-Api-Key": "svc-key", "X-Timestamp": timestamp, "X-Signature": signature},
+    )
+    assert response.status_code == 200
+
+    monkeypatch.setattr(cs.requests, "get", lambda *a, **k: pytest.fail("CRM must not be polled"))
+    with app.app_context():
+        assert cs.human_agent_has_control(BOT, "+56912345678") is True
+
+
+def test_unsigned_push_is_rejected(app):
+    response = app.test_client().post(
+        "/handoff/control-status",
+        json={"tenant_id": "b1", "telefono": "+56912345678", "control_mode": "human"},
+    )
+    assert response.status_code == 401
+
+
+def test_handoff_check_overlaps_the_burst_window_and_drops_the_reply(app, monkeypatch):
+    def slow_get(*a, **k):
+        time.sleep(0.3)
+        return _Resp(200, {"control_mode": "human"})
+
+    monkeypatch.setattr(cs.requests, "get", slow_get)
+    monkeypatch.setattr(cs, "_generate_turn_reply", lambda **kwargs: pytest.fail("human has control: no reply"))
+    bot = BotRepository(redis_extension.client).create_bot(
+        {"name": "Repuestos", "metadata": {"horizon_api_token": "test-token", "message_debounce_ms": 300}}
+    )
+
+    with app.app_context():
+        started = time.monotonic()
+        reply = cs.process_queued_message(InboundMessage(bot_id=bot["id"], user_number="+56912345678", body="hola"))
+        elapsed = time.monotonic() - started
+
+    assert reply is None
+    assert elapsed < 0.55  # CRM call and burst window ran side by side, not back to back
+    session = [json.loads(m) for m in redis_extension.client.lrange(f"session:{bot['id']}:+56912345678", 0, -1)]
+    assert session == [{"role": "user", "content": "hola"}]  # still recorded for the agent
+
+
+def test_no_client_data_is_extracted_while_a_human_has_control(app, monkeypatch):
+    monkeypatch.setattr(cs.requests, "get", lambda *a, **k: _Resp(200, {"control_mode": "human"}))
+    bot = BotRepository(redis_extension.client).create_bot(
+        {"name": "Repuestos", "metadata": {"horizon_api_token": "test-token"}}
+    )
+
+    with app.app_context():
+        reply = cs.process_queued_message(
+            InboundMessage(bot_id=bot["id"], user_number="+56912345678", body="tengo un toyota corolla 2015")
+        )
+
+    assert reply is None
+    assert redis_extension.client.keys("client_data:*") == []
@@ -0,0 +1,78 @@
+"""Tests for the per-conversation lock (FIFO hand-off and fenced writes)."""
+from __future__ import annotations
+
+import threading
+import time
+
+import asyncio
+
+import fakeredis
+import fakeredis.aioredis
+import pytest
+
+from app.services.conversation_lock import AsyncConversationLock, ConversationLock
+from app.utils.deadline import Deadline, DeadlineExceeded, deadline_scope
+
+
+def _lock(redis_client, **kwargs) -> ConversationLock:
+    return ConversationLock(redis_client, bot_id="bot", user_number="+56911111111", **kwargs)
+
+
+def test_second_turn_waits_for_release_instead_of_failing():
+    redis_client = fakeredis.FakeRedis(decode_responses=True)
+    order: list[str] = []
+
+    first = _lock(redis_client, ttl_seconds=30, wait_seconds=5)
+    assert first.acquire()
+
+    def _second_turn() -> None:
+        with _lock(redis_client, ttl_seconds=30, wait_seconds=5) as lock:
+            order.append("second" if lock.is_held() else "second-unlocked")
+
+    worker = threading.Thread(target=_second_turn)
+    worker.start()
+    time.sleep(0.2)
+    order.append("first")
+    first.release()
+    worker.join(timeout=5)
+
+    assert order == ["first", "second"]
+
+
+def test_fenced_write_is_refused_after_lock_expiry_and_takeover():
+    redis_client = fakeredis.FakeRedis(decode_responses=True)
+    stale = _lock(redis_client, ttl_seconds=30, wait_seconds=1)
+    assert stale.acquire()
+
+    # Simulate the TTL running out while the stale turn was still busy.
+    redis_client.delete(stale.lock_key)
+    fresh = _lock(redis_client, ttl_seconds=30, wait_seconds=1)
+    assert fresh.acquire()
+
+    assert stale.fenced_write(lambda pipe: pipe.set("session", "stale")) is False
+    assert fresh.fenced_write(lambda pipe: pipe.set("session", "fresh")) is True
+    assert redis_client.get("session") == "fresh"
+
+
+def test_waiter_gives_up_when_the_message_deadline_runs_out():
+    server = fakeredis.FakeServer()
+    redis_client = fakeredis.FakeRedis(server=server, decode_responses=True)
+    holder = _lock(redis_client, ttl_seconds=30, wait_seconds=60)
+    assert holder.acquire()
+
+    waiter = _lock(redis_client, ttl_seconds=30, wait_seconds=60)
+    started = time.monotonic()
+    with deadline_scope(Deadline.after(0.3)), pytest.raises(DeadlineExceeded):
+        waiter.acquire_or_proceed()  # raises instead of running unserialized
+    assert time.monotonic() - started < 2
+    assert waiter.token is None and redis_client.zcard(waiter.queue_key) == 0
+
+    async def _async_waiter() -> None:
+        async_client = fakeredis.aioredis.FakeRedis(server=server, decode_responses=True)
+        lock = AsyncConversationLock(async_client, bot_id="bot", user_number="+56911111111", wait_seconds=60)
+        with deadline_scope(Deadline.after(0.3)):
+            await lock.acquire_or_proceed()
+
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(_async_waiter())
+    assert holder.is_held()
@@ -0,0 +1,161 @@
+"""Tests for the per-message deadline and run cancellation when it runs out."""
+from __future__ import annotations
+
+import json
+import threading
+import time
+from datetime import UTC, datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from twilio.http.http_client import TwilioHttpClient
+
+from app import create_app
+from app.extensions import DeadlineTwilioHttpClient, redis_extension
+from app.repositories import BotRepository
+from app.services.conversation_service import DEADLINE_FALLBACK_REPLY, handle_incoming_message
+from app.services.openai_service import OpenAIAssistantService
+from app.utils.deadline import Deadline, DeadlineExceeded, budget_timeout, deadline_scope
+
+
+class _StuckRuns:
+    """Runs that never leave in_progress until cancelled."""
+
+    def __init__(self) -> None:
+        self.cancelled: list[str] = []
+
+    def create(self, **kwargs):
+        return SimpleNamespace(id="run_slow", status="queued")
+
+    def retrieve(self, *, thread_id, run_id):
+        return SimpleNamespace(id=run_id, status="in_progress")
+
+    def cancel(self, *, thread_id, run_id):
+        self.cancelled.append(run_id)
+        return SimpleNamespace(id=run_id, status="cancelling")
+
+
+class _SlowChat:
+    """Chat completions that echo the last user message after ``delay`` seconds."""
+
+    def __init__(self, delay: float) -> None:
+        self.delay = delay
+
+    def create(self, *, messages, **kwargs):
+        time.sleep(self.delay)
+        message = SimpleNamespace(content=f"eco: {messages[-1]['content']}", tool_calls=None)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+class _RecordingTwilioService:
+    def __init__(self) -> None:
+        self.sent: list[dict] = []
+
+    def send_whatsapp_message(self, **kwargs):
+        self.sent.append(kwargs)
+        return "SM-deferred"
+
+
+@pytest.fixture()
+def app():
+    app = create_app("testing")
+    app.config["OPENAI_RUN_STREAMING"] = False
+    yield app
+    redis_extension.client.flushdb()
+
+
+def test_budget_timeouts_follow_the_remaining_time():
+    assert budget_timeout(15) == 15  # no deadline: fixed timeouts as before
+
+    with deadline_scope(Deadline.after(5)):
+        assert 4 < budget_timeout(15) <= 5
+        assert budget_timeout(2) == 2
+
+    spent = Deadline.after(-1)
+    assert spent.expired and spent.remaining() == 0
+    with pytest.raises(DeadlineExceeded):
+        spent.timeout(10)
+    assert spent.timeout(10, floor=3) == 3  # must-happen hops keep a floor
+
+    queued_long_ago = (datetime.now(UTC) - timedelta(seconds=50)).isoformat()
+    assert Deadline.since(queued_long_ago, 45).expired
+    assert not Deadline.since(None, 45).expired
+
+
+def test_twilio_sends_keep_a_floor_past_the_deadline(monkeypatch):
+    seen: list[float] = []
+    monkeypatch.setattr(TwilioHttpClient, "request", lambda self, *args, **kwargs: seen.append(kwargs["timeout"]))
+    http_client = DeadlineTwilioHttpClient(timeout=10, min_timeout=3)
+
+    http_client.request("POST", "https://api.twilio.test")
+    with deadline_scope(Deadline.after(-1)):
+        http_client.request("POST", "https://api.twilio.test")
+
+    assert seen == [10, 3]
+
+
+def test_run_is_cancelled_and_fallback_sent_when_the_budget_runs_out(app):
+    runs = _StuckRuns()
+    threads = SimpleNamespace(
+        create=lambda: SimpleNamespace(id="thread_1"),
+        retrieve=lambda thread_id: SimpleNamespace(id=thread_id),
+        messages=SimpleNamespace(create=lambda **kwargs: None),
+        runs=runs,
+    )
+    service = OpenAIAssistantService(SimpleNamespace(client=SimpleNamespace(beta=SimpleNamespace(threads=threads))))
+    repository = BotRepository(redis_extension.client)
+    bot = repository.create_bot({"name": "Lento", "assistant_id": "asst_slow"})
+
+    with app.app_context():
+        reply = handle_incoming_message(
+            bot_id=bot["id"],
+            user_number="+56933333333",
+            message="hola",
+            repository=repository,
+            openai_service=service,
+            deadline=Deadline.after(0.3),
+        )
+
+    assert reply == DEADLINE_FALLBACK_REPLY
+    assert runs.cancelled == ["run_slow"]
+    # The next turn still sees the cancelled run and waits for it to settle.
+    assert redis_extension.client.get("oa:thread:thread_1:active_run") == "run_slow"
+    session = [json.loads(m) for m in redis_extension.client.lrange(f"session:{bot['id']}:+56933333333", 0, -1)]
+    assert session[-2:] == [
+        {"role": "user", "content": "hola"},
+        {"role": "assistant", "content": DEADLINE_FALLBACK_REPLY},
+    ]
+
+
+def test_message_whose_lock_wait_runs_out_is_answered_after_the_running_turn(app):
+    completions = _SlowChat(delay=0.5)
+    service = OpenAIAssistantService(SimpleNamespace(client=SimpleNamespace(chat=SimpleNamespace(completions=completions))))
+    app.config["HORIZON_CONTROL_BASE_URL"] = None
+    app.extensions["openai_service"] = service
+    app.extensions["twilio_service"] = twilio = _RecordingTwilioService()
+    repository = BotRepository(redis_extension.client)
+    bot = repository.create_bot({"name": "Lento", "instructions": "Eres un asesor."})
+    session_key = f"session:{bot['id']}:+56944444444"
+    replies: dict = {}
+
+    def _turn(name: str, message: str, budget: float) -> None:
+        with app.app_context():
+            replies[name] = handle_incoming_message(
+                bot_id=bot["id"], user_number="+56944444444", message=message,
+                repository=repository, deadline=Deadline.after(budget),
+            )
+
+    first = threading.Thread(target=_turn, args=("first", "uno", 5))
+    first.start()
+    time.sleep(0.1)
+    _turn("second", "dos", 0.2)  # queued behind "uno"; its budget runs out while waiting
+    first.join(timeout=5)
+
+    assert replies == {"first": "eco: uno", "second": ""}  # empty ack, not the fallback
+    for _ in range(50):
+        if twilio.sent:  # sent after the deferred turn saved its session
+            break
+        time.sleep(0.1)
+    session = [json.loads(m)["content"] for m in redis_extension.client.lrange(session_key, 0, -1)]
+    assert session == ["uno", "eco: uno", "dos", "eco: dos"]
+    assert [sent["body"] for sent in twilio.sent] == ["eco: dos"]
@@ -0,0 +1,85 @@
+"""Tests for async webhook ingestion through the Redis Streams queue."""
+from __future__ import annotations
+
+import pytest
+
+from app import create_app
+from app.extensions import redis_extension
+from app.repositories import BotRepository
+from app.services.conversation_service import process_queued_message
+from app.services.inbound_queue_service import InboundQueueService
+from app.services.openai_service import AssistantResponse
+
+
+class _DummyOpenAIService:
+    def generate_reply(self, **kwargs):
+        return AssistantResponse(reply_text="Respuesta en segundo plano", function_calls=[])
+
+
+class _RecordingTwilioService:
+    def __init__(self) -> None:
+        self.sent: list[dict] = []
+
+    def send_whatsapp_message(self, **kwargs):
+        self.sent.append(kwargs)
+        return "SM-queued"
+
+
+@pytest.fixture()
+def app():
+    app = create_app("testing")
+    app.config["WEBHOOK_ASYNC_MODE"] = True
+    app.extensions["openai_service"] = _DummyOpenAIService()
+    app.extensions["twilio_service"] = _RecordingTwilioService()
+    yield app
+    redis_extension.client.flushdb()
+
+
+def test_webhook_enqueues_and_returns_empty_twiml(app):
+    bot = BotRepository(redis_extension.client).create_bot(
+        {"name": "Async", "twilio_phone_number": "whatsapp:+444444444"}
+    )
+    response = app.test_client().post(
+        "/webhook/whatsapp",
+        data={"From": "whatsapp:+56911111111", "To": bot["twilio_phone_number"], "Body": "Hola", "MessageSid": "SM1"},
+    )
+
+    assert response.status_code == 200
+    assert "<Message>" not in response.get_data(as_text=True)
+    queue = InboundQueueService.from_config(redis_extension.client, app.config)
+    assert redis_extension.client.xlen(queue.stream_key) == 1
+
+
+def test_twilio_retry_is_enqueued_only_once(app):
+    bot = BotRepository(redis_extension.client).create_bot(
+        {"name": "Async", "twilio_phone_number": "whatsapp:+444444444"}
+    )
+    data = {"From": "whatsapp:+56911111111", "To": bot["twilio_phone_number"], "Body": "Hola", "MessageSid": "SM2"}
+    client = app.test_client()
+
+    assert client.post("/webhook/whatsapp", data=data).status_code == 200
+    assert client.post("/webhook/whatsapp", data=data).status_code == 200
+
+    queue = InboundQueueService.from_config(redis_extension.client, app.config)
+    assert redis_extension.client.xlen(queue.stream_key) == 1
+
+
+def test_worker_batch_runs_conversation_and_sends_reply(app):
+    bot = BotRepository(redis_extension.client).create_bot(
+        {"name": "Async", "twilio_phone_number": "whatsapp:+444444444"}
+    )
+    app.test_client().post(
+        "/webhook/whatsapp",
+        data={"From": "whatsapp:+56911111111", "To": bot["twilio_phone_number"], "Body": "Hola"},
+    )
+
+    queue = InboundQueueService.from_config(redis_extension.client, app.config)
+    queue.ensure_group()
+    with app.app_context():
+        processed = queue.consume_batch("test-worker", process_queued_message)
+
+    assert processed == 1
+    sent = app.extensions["twilio_service"].sent
+    assert sent[0]["to_number"] == "+56911111111"
+    assert sent[0]["body"] == "Respuesta en segundo plano"
+    assert redis_extension.client.xlen(queue.stream_key) == 0
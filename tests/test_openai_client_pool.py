@@ -0,0 +1,85 @@
+"""Tests for per-bot OpenAI API keys and the keyed client pool."""
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+
+from app import create_app
+from app.extensions import OpenAIExtension, redis_extension
+from app.repositories import BotRepository
+from app.services.openai_service import OpenAIAssistantService
+
+
+class _ChatCompletions:
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def create(self, **kwargs):
+        message = SimpleNamespace(content=self.name, tool_calls=None)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+def _fake_client(name: str):
+    return SimpleNamespace(chat=SimpleNamespace(completions=_ChatCompletions(name)))
+
+
+@pytest.fixture()
+def app():
+    app = create_app("testing")
+    yield app
+    redis_extension.client.flushdb()
+
+
+def test_one_pooled_client_per_key_with_lru_eviction(app):
+    app.config.update(OPENAI_API_KEY="sk-default", OPENAI_CLIENT_POOL_SIZE=2)
+    extension = OpenAIExtension()
+    extension.init_app(app)
+
+    assert extension.client_for(None) is extension.client
+    assert extension.client_for("sk-default") is extension.client
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        clients = set(map(id, pool.map(lambda _: extension.client_for("sk-a"), range(16))))
+    assert len(clients) == 1
+    first_a = extension.client_for("sk-a")
+    assert first_a.api_key == "sk-a"
+    assert extension.client_for("sk-b") is not first_a
+
+    extension.client_for("sk-a")  # most recently used: "sk-b" goes first
+    extension.client_for("sk-c")
+    assert extension.client_for("sk-a") is first_a
+    assert extension.client_for("sk-b").api_key == "sk-b"
+    assert extension.client_for("sk-c") is not None
+
+
+def test_replies_use_the_bot_key_and_the_api_hides_it(app):
+    extension = SimpleNamespace(client=_fake_client("default"), client_for=lambda key: _fake_client(key))
+    service = OpenAIAssistantService(extension)
+    conversation = [{"role": "user", "content": "hola"}]
+
+    with app.app_context():
+        own = service.generate_reply(bot={"id": "b1", "openai_api_key": "sk-tenant"}, conversation=conversation)
+        shared = service.generate_reply(bot={"id": "b2"}, conversation=conversation)
+
+    assert (own.reply_text, shared.reply_text) == ("sk-tenant", "default")
+
+    bot = BotRepository(redis_extension.client).create_bot({"name": "Propio", "openai_api_key": "sk-secret-1234"})
+    body = app.test_client().get(f"/bots/{bot['id']}").get_json()
+    assert body["data"]["openai_api_key"] == "***1234"
+
+
+def test_get_edit_put_round_trip_keeps_the_stored_key(app):
+    repository = BotRepository(redis_extension.client)
+    bot = repository.create_bot({"name": "Propio", "openai_api_key": "sk-secret-1234"})
+    client = app.test_client()
+
+    edited = {**client.get(f"/bots/{bot['id']}").get_json()["data"], "name": "Propio 2"}
+    response = client.put(f"/bots/{bot['id']}", json=edited)
+
+    assert response.status_code == 200 and response.get_json()["data"]["openai_api_key"] == "***1234"
+    stored = repository.get_bot(bot["id"])
+    assert (stored["name"], stored["openai_api_key"]) == ("Propio 2", "sk-secret-1234")
+
+    client.put(f"/bots/{bot['id']}", json={"openai_api_key": "sk-rotated-9876"})
+    assert repository.get_bot(bot["id"])["openai_api_key"] == "sk-rotated-9876"
@@ -0,0 +1,149 @@
+"""Tests for the per-tenant / per-key OpenAI rate and concurrency governor."""
+from __future__ import annotations
+
+import asyncio
+import time
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+
+from app import create_app
+from app.extensions import redis_extension
+from app.services.openai_governor import (
+    AsyncGovernedClient,
+    AsyncOpenAIGovernor,
+    GovernedClient,
+    OpenAIGovernor,
+    OpenAIThrottled,
+)
+from app.services.openai_service import OpenAIAssistantService
+from app.utils.deadline import Deadline, deadline_scope
+
+
+def _error(cls, status: int, headers=None, code=None):
+    response = httpx.Response(status, headers=headers, request=httpx.Request("POST", "https://api.openai.test"))
+    return cls("boom", response=response, body={"code": code} if code else None)
+
+
+class _ChatCompletions:
+    def __init__(self, failures=()) -> None:
+        self.failures = list(failures)
+        self.calls = 0
+
+    def create(self, **kwargs):
+        self.calls += 1
+        if self.failures:
+            raise self.failures.pop(0)
+        message = SimpleNamespace(content="ok", tool_calls=None)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+@pytest.fixture()
+def app():
+    app = create_app("testing")
+    app.config["OPENAI_GOVERNOR_MAX_WAIT_SECONDS"] = 0.2
+    with app.app_context():
+        yield app
+    redis_extension.client.flushdb()
+
+
+def _service(completions) -> OpenAIAssistantService:
+    client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    return OpenAIAssistantService(SimpleNamespace(client=client))
+
+
+def _reply(service, bot):
+    return service.generate_reply(bot=bot, conversation=[{"role": "user", "content": "hola"}])
+
+
+def test_noisy_tenant_is_throttled_without_affecting_others(app):
+    service = _service(_ChatCompletions())
+    noisy = {"id": "bot-a", "metadata": {"tenant_id": "campaña", "openai_rpm": 6, "openai_burst": 2}}
+    quiet = {"id": "bot-b", "metadata": {}}
+
+    assert _reply(service, noisy).reply_text == "ok"
+    assert _reply(service, noisy).reply_text == "ok"
+    with pytest.raises(OpenAIThrottled):
+        _reply(service, noisy)  # bucket empty, refill takes 10s > max wait
+
+    assert _reply(service, quiet).reply_text == "ok"
+
+
+def test_429_and_5xx_are_retried_but_quota_errors_are_not(app):
+    completions = _ChatCompletions([
+        _error(openai.RateLimitError, 429, headers={"retry-after-ms": "10"}),
+        _error(openai.InternalServerError, 503),
+    ])
+    service = _service(completions)
+
+    assert _reply(service, {"id": "bot-a"}).reply_text == "ok"
+    assert completions.calls == 3
+
+    quota = _ChatCompletions([_error(openai.RateLimitError, 429, code="insufficient_quota")])
+    with pytest.raises(openai.RateLimitError):
+        _reply(_service(quota), {"id": "bot-a"})
+    assert quota.calls == 1
+
+
+def test_open_streams_hold_their_concurrency_slot(app):
+    class _Manager:
+        def __enter__(self):
+            return "stream"
+
+        def __exit__(self, *exc_info):
+            return False
+
+    runs = SimpleNamespace(
+        stream=lambda **kwargs: _Manager(), create=lambda **kwargs: "run", retrieve=lambda **kwargs: "polled"
+    )
+    bot = {"id": "bot-a", "metadata": {"openai_max_concurrency": 1}}
+    client = GovernedClient(SimpleNamespace(runs=runs), OpenAIGovernor.for_bot(redis_extension.client, client=None, bot=bot))
+
+    with client.runs.stream(thread_id="t") as stream:
+        assert stream == "stream"
+        assert client.runs.retrieve(run_id="r") == "polled"  # polls never take a permit
+        with pytest.raises(OpenAIThrottled):
+            client.runs.create(thread_id="t")
+    assert client.runs.create(thread_id="t") == "run"
+
+
+def test_limits_are_opt_in_and_throttled_turns_wait_within_their_deadline(app):
+    service = _service(_ChatCompletions())
+    assert _reply(service, {"id": "bot-free", "metadata": {}}).reply_text == "ok"
+    assert not redis_extension.client.keys("oa:gov:*")  # no limit configured: no Redis round trip
+
+    limited = {"id": "bot-a", "metadata": {"openai_rpm": 120, "openai_burst": 1}}
+    assert _reply(service, limited).reply_text == "ok"
+    started = time.monotonic()
+    with deadline_scope(Deadline.after(3)):
+        # The bucket refills in 0.5s: longer than the 0.2s max wait, well within the deadline.
+        assert _reply(service, limited).reply_text == "ok"
+    assert time.monotonic() - started >= 0.3
+
+
+def test_async_calls_are_governed_and_retried(app):
+    calls = []
+
+    async def create(**kwargs):
+        calls.append(kwargs)
+        if len(calls) == 1:
+            raise _error(openai.InternalServerError, 500, headers={"retry-after": "0.01"})
+        return "ok"
+
+    async def _run():
+        redis_client = redis_extension.create_async_client()
+        bot = {"id": "bot-a", "metadata": {"openai_rpm": 6, "openai_burst": 2}}
+        governor = AsyncOpenAIGovernor.for_bot(redis_client, client=None, bot=bot)
+        client = AsyncGovernedClient(SimpleNamespace(responses=SimpleNamespace(create=create)), governor)
+        try:
+            first = await client.responses.create(model="m")
+            with pytest.raises(OpenAIThrottled):
+                await client.responses.create(model="m")  # the retry spent the second token
+            return first
+        finally:
+            await redis_client.aclose()
+
+    assert asyncio.run(_run()) == "ok"
+    assert len(calls) == 2
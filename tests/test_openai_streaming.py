@@ -0,0 +1,218 @@
+"""Tests for assistant run streaming, polling fallback and thread reuse."""
+from __future__ import annotations
+
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+
+from app import create_app
+from app.extensions import redis_extension
+from app.services import openai_service as openai_module
+from app.services.openai_service import AssistantFunctionCall, OpenAIAssistantService, ToolResult
+
+
+def _run(status, run_id="run_1", tool_calls=None):
+    required_action = None
+    if tool_calls:
+        required_action = SimpleNamespace(
+            type="submit_tool_outputs",
+            submit_tool_outputs=SimpleNamespace(tool_calls=tool_calls),
+        )
+    return SimpleNamespace(id=run_id, status=status, required_action=required_action, last_error=None)
+
+
+def _message(text):
+    return SimpleNamespace(role="assistant", content=[SimpleNamespace(text=SimpleNamespace(value=text))])
+
+
+def _event(name, data):
+    return SimpleNamespace(event=name, data=data)
+
+
+class _StreamManager:
+    def __init__(self, events=None, error=None):
+        self._events = events or []
+        self._error = error
+
+    def __enter__(self):
+        if self._error:
+            raise self._error
+        return iter(self._events)
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _Runs:
+    def __init__(self):
+        self.calls: list[str] = []
+        self.streams: list[_StreamManager] = []
+        self.retrieved: list[SimpleNamespace] = []
+
+    def stream(self, **kwargs):
+        self.calls.append("stream")
+        return self.streams.pop(0)
+
+    def submit_tool_outputs_stream(self, **kwargs):
+        self.calls.append(f"submit_stream:{[o['output'] for o in kwargs['tool_outputs']]}")
+        return self.streams.pop(0)
+
+    def create(self, **kwargs):
+        self.calls.append("create")
+        return _run("queued")
+
+    def retrieve(self, **kwargs):
+        self.calls.append("retrieve")
+        return self.retrieved.pop(0)
+
+
+class _FakeClient:
+    def __init__(self):
+        self.runs = _Runs()
+        self.listed = 0
+        self.retrieved_threads: list[str] = []
+        self.created_threads = 0
+        self.missing_threads: set[str] = set()
+        self.posted: list[str] = []
+        messages = SimpleNamespace(
+            create=self._create_message,
+            list=self._list_messages,
+        )
+        threads = SimpleNamespace(
+            create=self._create_thread,
+            retrieve=self._retrieve_thread,
+            messages=messages,
+            runs=self.runs,
+        )
+        self.beta = SimpleNamespace(threads=threads)
+
+    def _create_thread(self):
+        self.created_threads += 1
+        return SimpleNamespace(id=f"thread_{self.created_threads}")
+
+    def _retrieve_thread(self, thread_id):
+        self.retrieved_threads.append(thread_id)
+        return SimpleNamespace(id=thread_id)
+
+    def _create_message(self, *, thread_id, **kwargs):
+        if thread_id in self.missing_threads:
+            response = httpx.Response(404, request=httpx.Request("POST", "https://api.openai.test"))
+            raise openai.NotFoundError("No thread found", response=response, body=None)
+        self.posted.append(thread_id)
+
+    def _list_messages(self, **kwargs):
+        self.listed += 1
+        return SimpleNamespace(data=[_message("respuesta por polling")])
+
+
+@pytest.fixture()
+def app():
+    app = create_app("testing")
+    with app.app_context():
+        yield app
+    redis_extension.client.flushdb()
+
+
+def test_streamed_run_replies_without_polling(app):
+    client = _FakeClient()
+    client.runs.streams.append(_StreamManager([
+        _event("thread.run.created", _run("queued")),
+        _event("thread.run.in_progress", _run("in_progress")),
+        _event("thread.run.step.created", SimpleNamespace(id="step_1")),
+        _event("thread.message.completed", _message("hola desde el stream")),
+        _event("thread.run.completed", _run("completed")),
+    ]))
+    service = OpenAIAssistantService(SimpleNamespace(client=client))
+
+    response = service._generate_assistant_reply(client, "asst_1", [{"role": "user", "content": "hola"}], "+56911111111")
+
+    assert response.reply_text == "hola desde el stream"
+    assert client.runs.calls == ["stream"]
+    assert client.listed == 0
+    assert redis_extension.client.get("oa:thread:thread_1:active_run") is None
+
+
+def test_stream_failure_falls_back_to_backoff_polling(app, monkeypatch):
+    sleeps: list[float] = []
+    monkeypatch.setattr(openai_module.time, "sleep", sleeps.append)
+    client = _FakeClient()
+    client.runs.streams.append(_StreamManager(error=ConnectionError("no SSE")))
+    client.runs.retrieved.extend([_run("in_progress"), _run("in_progress"), _run("completed")])
+    service = OpenAIAssistantService(SimpleNamespace(client=client))
+
+    response = service._generate_assistant_reply(client, "asst_1", [{"role": "user", "content": "hola"}], "+56911111111")
+
+    assert response.reply_text == "respuesta por polling"
+    assert client.runs.calls == ["stream", "create", "retrieve", "retrieve", "retrieve"]
+    assert sleeps == [0.25, 0.375, 0.5625]
+
+
+def test_tool_rounds_are_submitted_over_the_stream(app):
+    tool_call = SimpleNamespace(
+        id="call_2", type="function",
+        function=SimpleNamespace(name="buscar", arguments='{"q": "motos"}'),
+    )
+    client = _FakeClient()
+    client.runs.streams.extend([
+        _StreamManager([_event("thread.run.requires_action", _run("requires_action", tool_calls=[tool_call]))]),
+        _StreamManager([
+            _event("thread.message.completed", _message("listo")),
+            _event("thread.run.completed", _run("completed")),
+        ]),
+    ])
+    seen: list[list[AssistantFunctionCall]] = []
+
+    def _on_tool_calls(calls):
+        seen.append(calls)
+        return [ToolResult(name="buscar", content='{"ok": true}')]
+
+    service = OpenAIAssistantService(SimpleNamespace(client=client))
+    reply = service.submit_tool_outputs_and_wait(
+        "thread_1", "run_1", [{"tool_call_id": "call_1", "output": "{}"}], on_tool_calls=_on_tool_calls
+    )
+
+    assert reply == "listo"
+    assert seen == [[AssistantFunctionCall(name="buscar", arguments={"q": "motos"})]]
+    assert client.runs.calls == ["submit_stream:['{}']", "submit_stream:['{\"ok\": true}']"]
+
+
+def _completed_stream(text):
+    return _StreamManager([
+        _event("thread.message.completed", _message(text)),
+        _event("thread.run.completed", _run("completed")),
+    ])
+
+
+def test_verified_thread_is_reused_without_retrieve(app):
+    client = _FakeClient()
+    client.runs.streams.extend([_completed_stream("uno"), _completed_stream("dos"), _completed_stream("tres")])
+    service = OpenAIAssistantService(SimpleNamespace(client=client))
+    turn = [{"role": "user", "content": "hola"}]
+
+    service._generate_assistant_reply(client, "asst_1", turn, "+56911111111")
+    service._generate_assistant_reply(client, "asst_1", turn, "+56911111111")
+    redis_extension.client.delete("thread:asst_1:+56911111111:verified")  # trust window lapsed
+    service._generate_assistant_reply(client, "asst_1", turn, "+56911111111")
+
+    # Only the turn after the trust window lapsed paid a retrieve.
+    assert client.posted == ["thread_1", "thread_1", "thread_1"]
+    assert client.retrieved_threads == ["thread_1"]
+    assert client.created_threads == 1
+
+
+def test_lost_thread_is_recreated_when_message_is_rejected(app):
+    redis_extension.client.set("thread:asst_1:+56911111111", "thread_gone")
+    redis_extension.client.set("thread:asst_1:+56911111111:verified", "thread_gone")
+    client = _FakeClient()
+    client.missing_threads.add("thread_gone")
+    client.runs.streams.append(_completed_stream("de nuevo"))
+    service = OpenAIAssistantService(SimpleNamespace(client=client))
+
+    response = service._generate_assistant_reply(client, "asst_1", [{"role": "user", "content": "hola"}], "+56911111111")
+
+    assert response.reply_text == "de nuevo"
+    assert client.retrieved_threads == []
+    assert client.posted == ["thread_1"]
+    assert redis_extension.client.get("thread:asst_1:+56911111111") == "thread_1"
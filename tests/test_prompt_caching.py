@@ -0,0 +1,69 @@
+"""Tests for the cache-friendly prompt layout and usage metrics."""
+from __future__ import annotations
+
+import re
+from types import SimpleNamespace
+
+import pytest
+
+from app import create_app
+from app.extensions import redis_extension
+from app.repositories import BotRepository
+from app.services.conversation_service import handle_incoming_message
+from app.services.openai_service import OpenAIAssistantService, _build_date_instructions
+
+
+class _ChatCompletions:
+    def __init__(self) -> None:
+        self.prompts: list[list[dict]] = []
+
+    def create(self, *, messages, **kwargs):
+        self.prompts.append(messages)
+        usage = SimpleNamespace(
+            prompt_tokens=1000,
+            completion_tokens=20,
+            prompt_tokens_details=SimpleNamespace(cached_tokens=768 if len(self.prompts) > 1 else 0),
+        )
+        message = SimpleNamespace(content=f"respuesta {len(self.prompts)}", tool_calls=None)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+
+@pytest.fixture()
+def app():
+    app = create_app("testing")
+    yield app
+    redis_extension.client.flushdb()
+
+
+def test_state_goes_last_and_prefix_is_stable_across_turns(app):
+    completions = _ChatCompletions()
+    service = OpenAIAssistantService(SimpleNamespace(client=SimpleNamespace(chat=SimpleNamespace(completions=completions))))
+    repository = BotRepository(redis_extension.client)
+    bot = repository.create_bot({"name": "Chat", "instructions": "Eres un asesor."})
+
+    with app.app_context():
+        for text in ("tengo un toyota", "es un yaris 2020", "estoy en maipu"):
+            handle_incoming_message(
+                bot_id=bot["id"], user_number="+56933333333", message=text,
+                repository=repository, openai_service=service,
+            )
+
+    first, second, third = completions.prompts
+    assert first[0] == {"role": "system", "content": "Eres un asesor."}
+    assert third[-1]["role"] == "system" and third[-1]["content"].startswith("ESTADO ACTUAL DEL CLIENTE:")
+    # Everything before the volatile state is a prefix of the next turn's prompt.
+    assert second[: len(first) - 1] == first[:-1]
+    assert third[: len(second) - 1] == second[:-1]
+
+    client = app.test_client()
+    usage = client.get("/bots/metrics/openai-usage").get_json()["data"]["chat"]
+    assert usage == {
+        "requests": 3, "prompt_tokens": 3000, "cached_tokens": 1536,
+        "completion_tokens": 60, "cached_ratio": 0.512,
+    }
+
+
+def test_date_instructions_are_stable_within_the_day(app):
+    with app.app_context():
+        instructions = _build_date_instructions()
+    assert re.search(r"Fecha ISO: \d{4}-\d{2}-\d{2}\n", instructions)
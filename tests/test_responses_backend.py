@@ -0,0 +1,123 @@
+"""Tests for the Responses-API backend with previous_response_id chaining."""
+from __future__ import annotations
+
+import json
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+
+from app import create_app
+from app.extensions import redis_extension
+from app.repositories import BotRepository
+from app.services.conversation_service import handle_incoming_message
+from app.services.openai_service import OpenAIAssistantService
+
+
+class _Responses:
+    def __init__(self, outputs):
+        self.requests: list[dict] = []
+        self._outputs = list(outputs)
+        self.expired: set[str] = set()
+
+    def create(self, **kwargs):
+        if kwargs.get("previous_response_id") in self.expired:
+            response = httpx.Response(404, request=httpx.Request("POST", "https://api.openai.test"))
+            raise openai.NotFoundError("Previous response not found", response=response, body=None)
+        self.requests.append(kwargs)
+        output = self._outputs.pop(0)
+        return SimpleNamespace(id=f"resp_{len(self.requests)}", output=output, usage=None)
+
+
+def _text(value):
+    return [{"type": "message", "role": "assistant", "content": [{"type": "output_text", "text": value}]}]
+
+
+class _Horizon:
+    def __init__(self):
+        self.calls = []
+
+    def execute_action(self, *, action_name, defined_actions, arguments):
+        self.calls.append((action_name, arguments))
+        return {"customer": arguments.get("customer_id"), "status": "activo"}
+
+
+@pytest.fixture()
+def app():
+    app = create_app("testing")
+    yield app
+    redis_extension.client.flushdb()
+
+
+def _setup(outputs, **bot_fields):
+    responses = _Responses(outputs)
+    service = OpenAIAssistantService(SimpleNamespace(client=SimpleNamespace(responses=responses)))
+    repository = BotRepository(redis_extension.client)
+    bot = repository.create_bot({"name": "Resp", "metadata": {"openai_backend": "responses"}, **bot_fields})
+    return responses, service, repository, bot
+
+
+def _turn(service, repository, bot, text, **kwargs):
+    return handle_incoming_message(
+        bot_id=bot["id"], user_number="+56944444444", message=text,
+        repository=repository, openai_service=service, **kwargs,
+    )
+
+
+def test_each_turn_is_one_request_chained_on_the_previous_response(app):
+    responses, service, repository, bot = _setup([_text("hola"), _text("claro")], instructions="Eres un asesor.")
+
+    with app.app_context():
+        assert _turn(service, repository, bot, "buenas") == "hola"
+        assert _turn(service, repository, bot, "una consulta") == "claro"
+
+    first, second = responses.requests
+    assert "previous_response_id" not in first
+    assert first["instructions"].startswith("Eres un asesor.\n\nINFORMACIÓN TEMPORAL CRÍTICA")
+    assert second["previous_response_id"] == "resp_1"
+    assert second["input"] == [{"role": "user", "content": "una consulta"}]
+    assert redis_extension.client.get(f"oa:responses:{bot['id']}:+56944444444") == "resp_2"
+
+
+def test_tool_calls_route_through_execute_tool_calls(app):
+    function_call = [{
+        "type": "function_call", "call_id": "call_1", "name": "lookup_customer",
+        "arguments": json.dumps({"customer_id": "123"}),
+    }]
+    responses, service, repository, bot = _setup(
+        [function_call, _text("Cliente 123 activo")],
+        horizon_actions=[{"name": "lookup_customer", "method": "GET", "path": "/customers/{customer_id}"}],
+        assistant_functions=[{"type": "function", "function": {"name": "lookup_customer", "parameters": {}}}],
+    )
+    horizon = _Horizon()
+
+    with app.app_context():
+        assert _turn(service, repository, bot, "busca al 123", horizon_service=horizon) == "Cliente 123 activo"
+
+    assert horizon.calls == [("lookup_customer", {"customer_id": "123"})]
+    submit = responses.requests[1]
+    assert submit["previous_response_id"] == "resp_1"
+    assert submit["input"][0]["type"] == "function_call_output" and submit["input"][0]["call_id"] == "call_1"
+    assert submit["tools"] == [{
+        "type": "function", "name": "lookup_customer", "description": "",
+        "parameters": {"type": "object", "properties": {}},
+    }]
+    assert redis_extension.client.get(f"oa:responses:{bot['id']}:+56944444444") == "resp_2"
+
+
+def test_expired_chain_restarts_from_the_session_history(app):
+    responses, service, repository, bot = _setup([_text("uno"), _text("dos")])
+
+    with app.app_context():
+        _turn(service, repository, bot, "primero")
+        responses.expired.add("resp_1")
+        assert _turn(service, repository, bot, "segundo") == "dos"
+
+    restarted = responses.requests[1]
+    assert "previous_response_id" not in restarted
+    assert restarted["input"] == [
+        {"role": "user", "content": "primero"},
+        {"role": "assistant", "content": "uno"},
+        {"role": "user", "content": "segundo"},
+    ]
@@ -0,0 +1,89 @@
+"""Tests for the append-only list storage of conversation sessions."""
+from __future__ import annotations
+
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from app import create_app
+from app.extensions import redis_extension
+from app.repositories import BotRepository
+from app.services.conversation_service import CLIENT_STATE_PREFIX, handle_incoming_message
+from app.services.openai_service import OpenAIAssistantService
+from app.services.session_store import AsyncSessionStore, SessionStore
+
+
+class _ChatCompletions:
+    def __init__(self) -> None:
+        self.prompts: list[list] = []
+
+    def create(self, *, messages, **kwargs):
+        self.prompts.append(messages)
+        message = SimpleNamespace(content=f"respuesta {len(self.prompts)}", tool_calls=None)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+@pytest.fixture()
+def app():
+    app = create_app("testing")
+    yield app
+    redis_extension.client.flushdb()
+
+
+def _stored(key: str) -> list:
+    return [json.loads(m) for m in redis_extension.client.lrange(key, 0, -1)]
+
+
+def test_turns_append_only_their_messages_and_trim_to_the_window(app):
+    store = SessionStore(redis_extension.client, bot_id="b1", user_number="+569", ttl_seconds=600)
+    history = [{"role": "user", "content": f"m{i}"} for i in range(4)]
+    store.save(store.writer(history, max_messages=3))
+    assert [m["content"] for m in store.load()] == ["m1", "m2", "m3"]
+
+    # A concurrent (unlocked) writer appended meanwhile: appending never drops it.
+    redis_extension.client.rpush(store.key, json.dumps({"role": "user", "content": "otro"}))
+    turn = store.load()[:3] + [{"role": "user", "content": "m4"}, {"role": "assistant", "content": "r4"}]
+    store.save(store.writer(turn, appended=2, max_messages=4))
+
+    assert [m["content"] for m in _stored(store.key)] == ["m3", "otro", "m4", "r4"]
+    assert [m["content"] for m in store.load(window=2)] == ["m4", "r4"]
+    assert 0 < redis_extension.client.ttl(store.key) <= 600
+
+
+def test_legacy_blob_sessions_are_migrated_on_read(app):
+    key = "session:b1:+56911111111"
+    legacy = [
+        {"role": "user", "content": "hola"},
+        {"role": "system", "content": f"{CLIENT_STATE_PREFIX} modelo yaris"},
+        {"role": "assistant", "content": "¿En qué te ayudo?"},
+    ]
+    redis_extension.client.setex(key, 500, json.dumps(legacy))
+
+    async def _load():
+        redis_client = redis_extension.create_async_client()
+        try:
+            return await AsyncSessionStore(redis_client, bot_id="b1", user_number="+56911111111").load()
+        finally:
+            await redis_client.aclose()
+
+    assert [m["content"] for m in asyncio.run(_load())] == ["hola", f"{CLIENT_STATE_PREFIX} modelo yaris", "¿En qué te ayudo?"]
+    assert redis_extension.client.type(key) == "list"
+    assert 0 < redis_extension.client.ttl(key) <= 500
+
+    # The conversation flow migrates too, dropping stale client-state copies.
+    redis_extension.client.delete(key)
+    bot = BotRepository(redis_extension.client).create_bot({"name": "Chat", "instructions": "Eres un asesor."})
+    key = f"session:{bot['id']}:+56911111111"
+    redis_extension.client.set(key, json.dumps(legacy))
+    completions = _ChatCompletions()
+    service = OpenAIAssistantService(SimpleNamespace(client=SimpleNamespace(chat=SimpleNamespace(completions=completions))))
+    with app.app_context():
+        handle_incoming_message(
+            bot_id=bot["id"], user_number="+56911111111", message="¿tienen stock?",
+            repository=BotRepository(redis_extension.client), openai_service=service,
+        )
+
+    assert [m["content"] for m in _stored(key)] == ["hola", "¿En qué te ayudo?", "¿tienen stock?", "respuesta 1"]
+    assert {"role": "assistant", "content": "¿En qué te ayudo?"} in completions.prompts[0]
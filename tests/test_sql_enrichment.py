@@ -0,0 +1,76 @@
+"""Tests for the versioned, negative-cached SQL enrichment of bot snapshots."""
+from __future__ import annotations
+
+import pytest
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.pool import StaticPool
+
+from app import create_app
+from app.extensions import db_extension, redis_extension
+from app.repositories import BotRepository
+from app.repositories.bot_repository import BOT_VERSION_KEY
+from app.services.conversation_service import _enrich_bot_from_sql
+
+
+@pytest.fixture()
+def app():
+    app = create_app("testing")
+    yield app
+    redis_extension.client.flushdb()
+
+
+@pytest.fixture()
+def statements(monkeypatch):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE gestion_whatsappbot (id TEXT PRIMARY KEY, client_id TEXT, external_ref TEXT,"
+            " twilio_phone_number TEXT, twilio_messaging_service_sid TEXT, twilio_account_sid TEXT,"
+            " assistant_id TEXT, assistant_model TEXT, assistant_instructions TEXT, assistant_functions TEXT,"
+            " openai_api_key TEXT, horizon_actions TEXT, metadata TEXT, status TEXT, created_at TEXT, updated_at TEXT)"
+        ))
+        conn.execute(text(
+            "INSERT INTO gestion_whatsappbot (id, client_id, twilio_account_sid, updated_at)"
+            " VALUES ('b1', 'c1', 'AC1', '2026-01-01T10:00:00')"
+        ))
+    executed: list = []
+    event.listen(engine, "before_cursor_execute", lambda conn, cursor, sql, *args: executed.append(sql))
+    monkeypatch.setattr(db_extension, "_engine", engine)
+    return engine, executed
+
+
+def test_bots_with_nothing_more_in_sql_skip_it_until_the_ttl_or_the_row_changes(app, statements):
+    engine, executed = statements
+    repository = BotRepository(redis_extension.client)
+    # No notification routing anywhere: the snapshot "needs enrichment" forever.
+    repository.create_bot({"id": "b1", "name": "Repuestos", "metadata": {"tenant_id": "t1"}})
+
+    with app.app_context():
+        bot = _enrich_bot_from_sql("b1", repository.get_bot("b1"), repository)
+        assert (bot["client_id"], bot["twilio_account_sid"]) == ("c1", "AC1")
+        assert repository.get_sql_enrichment("b1")["updated_at"] == "2026-01-01T10:00:00"
+        assert len(executed) == 1
+        version = redis_extension.client.hget(BOT_VERSION_KEY, "b1")
+
+        for _ in range(3):
+            bot = _enrich_bot_from_sql("b1", repository.get_bot("b1"), repository)
+        assert len(executed) == 1  # negative cache: no SQL while the stamp is fresh
+
+        # TTL over, row unchanged: only updated_at is read and the stamp renewed.
+        app.config["BOT_SQL_ENRICHMENT_TTL_SECONDS"] = 0.01
+        repository.set_sql_enrichment("b1", {**repository.get_sql_enrichment("b1"), "checked_at": 0})
+        bot = _enrich_bot_from_sql("b1", repository.get_bot("b1"), repository)
+        assert len(executed) == 2 and executed[-1].startswith("SELECT updated_at")
+        assert repository.get_sql_enrichment("b1")["checked_at"] > 0
+        # Renewing the negative cache never re-versions (and evicts) the bot.
+        assert redis_extension.client.hget(BOT_VERSION_KEY, "b1") == version
+
+        # The row changed: the full row is read again.
+        with engine.begin() as conn:
+            conn.execute(text("UPDATE gestion_whatsappbot SET client_id = 'c2', updated_at = '2026-02-01T10:00:00' WHERE id = 'b1'"))
+        executed.clear()
+        repository.set_sql_enrichment("b1", {**repository.get_sql_enrichment("b1"), "checked_at": 0})
+        bot = _enrich_bot_from_sql("b1", repository.get_bot("b1"), repository)
+        assert len(executed) == 2  # updated_at, then the full row
+        assert bot["client_id"] == "c2"
+        assert repository.get_sql_enrichment("b1")["updated_at"] == "2026-02-01T10:00:00"
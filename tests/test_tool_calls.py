@@ -0,0 +1,78 @@
+"""Tests for concurrent execution of the tool calls of one run step."""
+from __future__ import annotations
+
+import json
+import threading
+import time
+
+import pytest
+
+from app import create_app
+from app.extensions import redis_extension
+from app.services.conversation_service import _execute_tool_calls
+from app.services.openai_service import AssistantFunctionCall
+
+
+class _SlowHorizon:
+    def __init__(self, delays: dict[str, float]) -> None:
+        self.delays = delays
+        self.release = threading.Event()
+
+    def execute_action(self, *, action_name, defined_actions, arguments):
+        if action_name == "romper":
+            raise RuntimeError("CRM caído")
+        if action_name == "colgado":
+            self.release.wait(2)
+        time.sleep(self.delays.get(action_name, 0))
+        return {"action": action_name, **arguments}
+
+
+@pytest.fixture()
+def app():
+    app = create_app("testing")
+    with app.app_context():
+        yield app
+    redis_extension.client.flushdb()
+
+
+def _calls(*names):
+    return [AssistantFunctionCall(name=name, arguments={"n": i}) for i, name in enumerate(names)]
+
+
+def test_calls_run_concurrently_in_call_order(app):
+    horizon = _SlowHorizon({"consultar_stock": 0.3, "cotizar_repuesto": 0.1})
+
+    started = time.monotonic()
+    results = _execute_tool_calls(
+        bot={"id": "bot-1"},
+        horizon_service=horizon,
+        defined_actions=[],
+        function_calls=_calls("consultar_stock", "cotizar_repuesto"),
+        user_number="+56944444444",
+    )
+
+    assert time.monotonic() - started < 0.38
+    assert [r.name for r in results] == ["consultar_stock", "cotizar_repuesto"]
+    assert json.loads(results[1].content) == {"action": "cotizar_repuesto", "n": 1}
+
+
+def test_failing_and_slow_calls_are_isolated(app):
+    app.config["TOOL_CALL_TIMEOUT_SECONDS"] = 0.3
+    horizon = _SlowHorizon({})
+
+    try:
+        results = _execute_tool_calls(
+            bot={"id": "bot-1"},
+            horizon_service=horizon,
+            defined_actions=[],
+            function_calls=_calls("romper", "colgado", "ok"),
+            user_number="+56944444444",
+        )
+    finally:
+        horizon.release.set()
+
+    assert [json.loads(r.content) for r in results] == [
+        {"error": "CRM caído", "success": False},
+        {"error": "timeout", "success": False},
+        {"action": "ok", "n": 2},
+    ]
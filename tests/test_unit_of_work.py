@@ -0,0 +1,85 @@
+"""Tests for the per-message Redis unit of work."""
+from __future__ import annotations
+
+import json
+import logging
+from types import SimpleNamespace
+
+import pytest
+
+from app import create_app
+from app.extensions import redis_extension
+from app.repositories import BotRepository
+from app.services.conversation_service import handle_incoming_message
+from app.services.openai_service import OpenAIAssistantService
+from app.utils.unit_of_work import cached_read, current_unit_of_work, deferred_write, forget, redis_unit_of_work
+
+
+class _ChatCompletions:
+    def create(self, **kwargs):
+        message = SimpleNamespace(content="Perfecto, lo reviso", tool_calls=None)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+@pytest.fixture()
+def app():
+    app = create_app("testing")
+    yield app
+    redis_extension.client.flushdb()
+
+
+def test_prefetched_reads_and_buffered_writes_cost_one_round_trip_each(app):
+    raw = redis_extension.client
+    raw.set("client_data:b1:569", json.dumps({"marca": "Toyota"}))
+    raw.hset("tenant:twilio:t1", mapping={"twilio_account_sid": "AC1"})
+
+    with redis_unit_of_work(raw) as unit:
+        unit.prefetch(get=["client_data:b1:569", "lead_id:569"], hgetall=["tenant:twilio:t1"])
+        assert json.loads(cached_read(raw, "get", "client_data:b1:569")) == {"marca": "Toyota"}
+        assert cached_read(raw, "get", "lead_id:569") is None
+        assert cached_read(raw, "hget", "tenant:twilio:t1", "twilio_account_sid") == "AC1"
+
+        deferred_write(raw, "setex", "client_data:b1:569", 60, json.dumps({"marca": "Kia"}))
+        assert json.loads(cached_read(raw, "get", "client_data:b1:569")) == {"marca": "Kia"}  # read-your-writes
+        assert json.loads(raw.get("client_data:b1:569")) == {"marca": "Toyota"}  # not yet written
+        assert unit.round_trips == 1
+
+        # Before a direct write, forget() applies the writes still pending for that key.
+        forget(raw, "client_data:b1:569")
+        raw.expire("client_data:b1:569", 30)
+        assert json.loads(raw.get("client_data:b1:569")) == {"marca": "Kia"}
+        assert unit.round_trips == 2
+        deferred_write(raw, "set", "wa:last_inbound:t1:+569", "1700000000")
+
+    assert raw.get("wa:last_inbound:t1:+569") == "1700000000"
+    assert unit.round_trips == 3
+    assert current_unit_of_work() is None
+
+
+def _turn_round_trips(app, caplog, *, enabled: bool, user_number: str) -> int:
+    app.config["REDIS_UNIT_OF_WORK_ENABLED"] = enabled
+    service = OpenAIAssistantService(SimpleNamespace(client=SimpleNamespace(chat=SimpleNamespace(completions=_ChatCompletions()))))
+    repository = BotRepository(redis_extension.client)
+    bot = repository.create_bot({"name": "Repuestos", "instructions": "Eres un asesor.", "metadata": {"tenant_id": "t1"}})
+    caplog.clear()
+    with app.app_context(), caplog.at_level(logging.INFO, logger="app.utils.unit_of_work"):
+        handle_incoming_message(
+            bot_id=bot["id"], user_number=user_number,
+            message="tengo un toyota corolla 2015, patente ABCD12",
+            repository=repository, openai_service=service,
+        )
+    record = next(r for r in caplog.records if r.getMessage().startswith("🔁 Redis round trips"))
+    stored = json.loads(redis_extension.client.get(f"client_data:{bot['id']}:{user_number.lstrip('+')}"))
+    assert {"marca", "modelo"} <= set(stored)
+    return record.args[1]
+
+
+def test_turn_reads_and_writes_are_batched(app, caplog):
+    unbatched = _turn_round_trips(app, caplog, enabled=False, user_number="+56911111111")
+    batched = _turn_round_trips(app, caplog, enabled=True, user_number="+56922222222")
+
+    # Only the turn's data is counted (locks, governor and the fenced session
+    # write are not): six reads and writes one by one, a prefetch and a flush
+    # with the unit.
+    assert unbatched == 6
+    assert batched == 2
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Entrena el diccionario compartido del codec de Redis con nuestros propios datos
+(bots, sesiones en español, datos de clientes, caché de Horizon).
+
+    python train_codec_dictionary.py --output codec.dict
+    python train_codec_dictionary.py --samples muestras.jsonl --output codec.dict
+
+Con ``zstandard`` instalado usa su entrenador; si no, arma un diccionario para
+zlib (``zdict``) con los fragmentos más repetidos. Luego agrega el archivo al
+inicio de ``CODEC_DICTIONARY_PATHS`` (deja los anteriores para seguir leyendo
+los valores que los usan).
+"""
+
+import argparse
+import collections
+import os
+import re
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Claves con payloads del codec (además de bots:registry)
+SAMPLE_PATTERNS = (
+    "session:*",
+    "client_data:*",
+    "horizon_bot_config:*",
+    "wa:outbound:idempotency:*",
+    "wa:outbound:message:*",
+)
+ZLIB_WINDOW = 32 * 1024
+_TOKEN = re.compile(r'"[^"\\]{2,40}"\s*:?|[A-Za-zÁÉÍÓÚáéíóúñÑü]{3,}(?:\s+[A-Za-zÁÉÍÓÚáéíóúñÑü]{2,}){0,3}')
+
+
+def collect_samples(redis_client, limit):
+    """Valores JSON (sin comprimir) de las claves que usan el codec."""
+    from app.utils import codec
+
+    plain = codec.Codec(compression="none")
+    samples = []
+
+    def _add(raw):
+        try:
+            value = codec.loads(raw)
+        except ValueError:
+            return
+        samples.append(plain.dumps(value).encode("utf-8"))
+
+    for raw in redis_client.hvals("bots:registry"):
+        _add(raw)
+    for pattern in SAMPLE_PATTERNS:
+        for key in redis_client.scan_iter(match=pattern, count=500):
+            if len(samples) >= limit:
+                return samples
+            key_type = redis_client.type(key)
+            if key_type == "list":
+                for raw in redis_client.lrange(key, 0, -1):
+                    _add(raw)
+            elif key_type == "hash":
+                fields = {}
+                for field, raw in redis_client.hgetall(key).items():
+                    try:
+                        fields[field] = codec.loads(raw)
+                    except ValueError:
+                        fields[field] = raw
+                samples.append(plain.dumps(fields).encode("utf-8"))
+            elif key_type == "string":
+                _add(redis_client.get(key))
+    return samples
+
+
+def read_sample_file(path):
+    with open(path, "rb") as handle:
+        return [line.rstrip(b"\n") for line in handle if line.strip()]
+
+
+def train_zlib_dictionary(samples, size):
+    """Fragmentos frecuentes, los más útiles al final (zlib busca desde el final de la ventana)."""
+    scores = collections.Counter()
+    for sample in samples:
+        text = sample.decode("utf-8", errors="ignore")
+        for token in set(_TOKEN.findall(text)):
+            scores[token] += 1
+    ranked = [token for token, count in scores.most_common() if count > 1]
+    chosen, used = [], 0
+    for token in ranked:
+        encoded = token.encode("utf-8")
+        if used + len(encoded) > size:
+            break
+        chosen.append(encoded)
+        used += len(encoded)
+    return b"".join(reversed(chosen))
+
+
+def train_dictionary(samples, size):
+    from app.utils.codec import zstandard
+
+    if zstandard is not None:
+        return zstandard.train_dictionary(size, samples).as_bytes(), "zstd"
+    return train_zlib_dictionary(samples, min(size, ZLIB_WINDOW)), "zlib"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", required=True, help="Archivo donde guardar el diccionario")
+    parser.add_argument("--samples", help="Archivo JSONL con muestras (por defecto se leen de REDIS_URL)")
+    parser.add_argument("--size", type=int, default=16 * 1024, help="Tamaño del diccionario en bytes")
+    parser.add_argument("--limit", type=int, default=5000, help="Máximo de muestras a leer de Redis")
+    args = parser.parse_args()
+
+    if args.samples:
+        samples = read_sample_file(args.samples)
+    else:
+        import redis
+
+        redis_url = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+        print(f"Conectando a Redis: {redis_url}")
+        samples = collect_samples(redis.from_url(redis_url, decode_responses=True), args.limit)
+
+    if len(samples) < 10:
+        print(f"❌ Muy pocas muestras ({len(samples)}) para entrenar un diccionario")
+        return 1
+
+    dictionary, kind = train_dictionary(samples, args.size)
+    with open(args.output, "wb") as handle:
+        handle.write(dictionary)
+
+    from app.utils.codec import dictionary_id
+
+    print(f"✅ Diccionario {kind} de {len(dictionary)} bytes ({len(samples)} muestras): {args.output}")
+    print(f"   id: {dictionary_id(dictionary)}")
+    print("   Agrégalo al inicio de CODEC_DICTIONARY_PATHS")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
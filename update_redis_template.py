@@ -11,6 +11,9 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 def update_template():
     import redis
+    from app.utils import codec
+    
+    codec.configure_codec(os.environ)
     
     redis_url = os.getenv("REDIS_URL", "redis://localhost:6379/0")
     print(f"Conectando a Redis: {redis_url}")
@@ -25,7 +28,7 @@ def update_template():
         print(f"❌ No se encontró el bot {bot_id}")
         return False
     
-    bot = json.loads(bot_json)
+    bot = codec.loads(bot_json)
     
     print(f"\n📋 Bot encontrado: {bot.get('name', 'N/A')}")
     print(f"   Assistant ID: {bot.get('assistant_id', 'N/A')}")
@@ -43,7 +46,7 @@ def update_template():
     bot['metadata'] = metadata
     
     # Guardar de vuelta
-    r.hset("bots:registry", bot_id, json.dumps(bot))
+    r.hset("bots:registry", bot_id, codec.dumps(bot))
     
     print(f"\n✅ Metadata actualizado!")
     print(f"\n📋 Nueva configuración:")
@@ -0,0 +1,19 @@
+"""Redis Streams conversation worker used when WEBHOOK_ASYNC_MODE is enabled."""
+from __future__ import annotations
+
+import asyncio
+import os
+import socket
+
+from app import create_app
+from app.services.async_conversation_service import run_async_worker
+from app.services.inbound_queue_service import run_worker
+
+app = create_app()
+
+if __name__ == "__main__":
+    consumer_name = os.getenv("INBOUND_WORKER_NAME") or f"{socket.gethostname()}-{os.getpid()}"
+    if app.config.get("INBOUND_WORKER_MODE") == "asyncio":
+        asyncio.run(run_async_worker(app, consumer_name=consumer_name))
+    else:
+        run_worker(app, consumer_name=consumer_name)